@@ -0,0 +1,30 @@
+from scrapenhl2.manipulate import manipulate as manip
+from scrapenhl2.plot import visualization_helper as vhelper
+from scrapenhl2.scrape import teams
+
+
+def test_update_team_logs(benchmark, parsed_season):
+    benchmark.pedantic(teams.update_team_logs, args=(parsed_season['season'],), kwargs={'force_overwrite': True},
+                       rounds=3, iterations=1)
+
+
+def test_generate_5v5_player_log(benchmark, parsed_season):
+    log = benchmark.pedantic(manip.generate_5v5_player_log, args=(parsed_season['season'],), rounds=3, iterations=1)
+    assert len(log) > 0
+
+
+def test_get_game_h2h_toi(benchmark, parsed_season):
+    h2h = benchmark(manip.get_game_h2h_toi, parsed_season['season'], parsed_season['games'][0])
+    assert len(h2h) > 0
+
+
+def test_get_line_combos(benchmark, parsed_season):
+    lines = benchmark(manip.get_line_combos, parsed_season['season'], parsed_season['games'][0])
+    assert len(lines) > 0
+
+
+def test_make_5v5_rolling_gp(benchmark, parsed_season):
+    season = parsed_season['season']
+    log = manip.get_5v5_player_log(season).assign(Season=season)
+    rolled = benchmark(vhelper.make_5v5_rolling_gp, log, roll_len=5)
+    assert '5-game CFON' in rolled.columns
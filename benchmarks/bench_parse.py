@@ -0,0 +1,93 @@
+import os.path
+
+import pandas as pd
+import pytest
+
+from scrapenhl2.scrape import general_helpers as helpers
+from scrapenhl2.scrape import parse_pbp, parse_toi, scrape_pbp, scrape_toi, shift_report
+
+
+def _shift_rows(rawtoi):
+    # The shift rows read_shifts_from_page passes to _finish_toidf_manipulations
+    df = pd.DataFrame(rawtoi['data'])
+    periods = df.period.astype(int)
+    starts = df.startTime.apply(helpers.mmss_to_secs)
+    ends = df.endTime.apply(helpers.mmss_to_secs)
+    return pd.DataFrame({'PlayerID': df.playerId, 'Period': periods, 'Start': 1200 * (periods - 1) + starts + 1,
+                         'End': 1200 * (periods - 1) + ends, 'Team': df.teamId,
+                         'Duration': ends - starts - 1})
+
+
+def test_read_events_from_page(benchmark, synthetic_data):
+    season, game = synthetic_data['season'], synthetic_data['games'][0]
+    rawpbp = scrape_pbp.get_raw_pbp(season, game)
+    pbp = benchmark(parse_pbp.read_events_from_page, rawpbp, season, game)
+    assert len(pbp) > 0
+
+
+def test_read_shifts_from_page(benchmark, synthetic_data):
+    season, game = synthetic_data['season'], synthetic_data['games'][0]
+    rawtoi = scrape_toi.get_raw_toi(season, game)
+    toi = benchmark(parse_toi.read_shifts_from_page, rawtoi, season, game)
+    assert len(toi) > 3000
+
+
+def test_finish_toidf_manipulations(benchmark, synthetic_data):
+    season, game = synthetic_data['season'], synthetic_data['games'][0]
+    shifts = _shift_rows(scrape_toi.get_raw_toi(season, game))
+    toi = benchmark(parse_toi._finish_toidf_manipulations, shifts, season, game)
+    assert len(toi) > 3000
+
+
+def test_read_shift_rows_from_html_page(benchmark, synthetic_data):
+    season, game = synthetic_data['season'], synthetic_data['games'][0]
+    rawtoi = scrape_toi.get_raw_html_toi(season, game, 'H')
+    team = synthetic_data['teams'][0]
+    sweaters = parse_toi.get_sweater_numbers_from_pbp(scrape_pbp.get_raw_pbp(season, game))
+    shifts = benchmark(parse_toi.read_shift_rows_from_html_page, rawtoi, team, sweaters[team])
+    assert len(shifts) > 0
+    assert shifts.PlayerID.isin(sweaters[team].values()).all()
+
+
+@pytest.mark.parametrize('parser', shift_report.get_parsers())
+def test_read_shift_report(benchmark, parser):
+    if parser not in shift_report.get_available_parsers():
+        pytest.skip('{0:s} is not installed'.format(parser))
+    page = _read_shift_report_fixture()
+    shifts = benchmark(shift_report.read_shift_report, page, parser)
+    assert len(shifts) > 0
+
+
+def test_read_shift_rows_from_shift_report(benchmark, monkeypatch):
+    page = _read_shift_report_fixture()
+    _look_up_names(monkeypatch)
+    shifts = benchmark(parse_toi.read_shift_rows_from_html_page, page, 15, {8: 8471214, 70: 8474651})
+    assert len(shifts) == 35
+
+
+def test_read_shift_rows_baseline(benchmark, monkeypatch):
+    # read_shift_rows_from_html_page before shift_report (see legacy_parse_toi): html_table_extractor, and a name
+    # lookup per player. Compare with test_read_shift_rows_from_shift_report, on the same page
+    pytest.importorskip('html_table_extractor.extractor')
+    import legacy_parse_toi
+    page = _read_shift_report_fixture()
+    _look_up_names(monkeypatch)
+    shifts = benchmark(legacy_parse_toi.read_shift_rows_from_html_page, page, 15)
+    expected = parse_toi.read_shift_rows_from_html_page(page, 15)
+    pd.testing.assert_frame_equal(shifts[sorted(shifts.columns)], expected[sorted(expected.columns)])
+
+
+def _look_up_names(monkeypatch):
+    # The fixture's players aren't in the synthetic season's player file
+    ids = {'Alex Ovechkin': 8471214, "Liam O'Brien": 8477070, 'Braden Holtby': 8474651}
+    monkeypatch.setattr(parse_toi.players, 'player_as_id', lambda name: ids[name])
+
+
+def _read_shift_report_fixture():
+    # The shift report page from tests/data, with each player repeated to make a full team's report
+    filename = os.path.join(os.path.dirname(__file__), os.pardir, 'tests', 'data', 'TH020001.html')
+    with open(filename, 'r', encoding='latin-1') as reader:
+        page = reader.read()
+    start = page.index('<tr><td colspan="8">&nbsp;</td></tr>')
+    end = page.rindex('</table>', 0, page.rindex('</table>'))
+    return page[:start] + page[start:end] * 7 + page[end:]
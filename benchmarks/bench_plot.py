@@ -0,0 +1,28 @@
+import os.path
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+from scrapenhl2.plot import game_h2h, game_timeline, rolling_cf_gf  # noqa: E402
+
+
+def test_game_h2h(benchmark, parsed_season, tmpdir):
+    save_file = os.path.join(str(tmpdir), 'h2h.png')
+    benchmark(game_h2h.game_h2h, parsed_season['season'], parsed_season['games'][0], save_file=save_file)
+    assert os.path.exists(save_file)
+
+
+def test_game_timeline(benchmark, parsed_season, tmpdir):
+    save_file = os.path.join(str(tmpdir), 'timeline.png')
+    benchmark(game_timeline.game_timeline, parsed_season['season'], parsed_season['games'][0], save_file=save_file)
+    assert os.path.exists(save_file)
+
+
+def test_rolling_player_cf(benchmark, parsed_season, tmpdir):
+    save_file = os.path.join(str(tmpdir), 'rolling_cf.png')
+    season = parsed_season['season']
+    player = int(parsed_season['players'].ID.iloc[0])
+    benchmark(rolling_cf_gf.rolling_player_cf, player, roll_len=5, startdate='{0:d}-09-15'.format(season),
+              enddate='{0:d}-06-21'.format(season + 1), save_file=save_file)
+    assert os.path.exists(save_file)
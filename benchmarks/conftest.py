@@ -0,0 +1,49 @@
+"""
+Benchmarks run on a synthetic season (see synthetic.py) written to a temporary folder, which SCRAPENHL2_DATA_DIR points
+to. The data is generated here, at import, because scrapenhl2 reads team, player, and schedule files when it is
+imported.
+
+Sizes can be set with SCRAPENHL2_BENCH_TEAMS (default 4) and SCRAPENHL2_BENCH_GAMES (default 12).
+"""
+
+import os
+import tempfile
+
+import pytest
+
+import synthetic
+
+_DATADIR = tempfile.mkdtemp(prefix='scrapenhl2-bench-')
+os.environ['SCRAPENHL2_DATA_DIR'] = _DATADIR
+_SYNTHETIC = synthetic.generate_synthetic_data(_DATADIR,
+                                               nteams=int(os.environ.get('SCRAPENHL2_BENCH_TEAMS', 4)),
+                                               ngames=int(os.environ.get('SCRAPENHL2_BENCH_GAMES', 12)))
+
+
+@pytest.fixture(scope='session')
+def synthetic_data():
+    """
+    The synthetic season, raw files only.
+
+    :return: dict from synthetic.generate_synthetic_data
+    """
+    return _SYNTHETIC
+
+
+@pytest.fixture(scope='session')
+def parsed_season(synthetic_data):
+    """
+    The synthetic season, parsed, with team logs and the 5v5 player log.
+
+    :return: dict from synthetic.generate_synthetic_data
+    """
+    from scrapenhl2.scrape import parse_pbp, parse_toi, teams
+    from scrapenhl2.manipulate import manipulate as manip
+
+    season = synthetic_data['season']
+    for game in synthetic_data['games']:
+        parse_pbp.parse_game_pbp(season, game, True)
+        parse_toi.parse_game_toi(season, game, True)
+    teams.update_team_logs(season, force_overwrite=True)
+    manip.get_5v5_player_log(season, force_create=True)
+    return synthetic_data
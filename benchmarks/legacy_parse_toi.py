@@ -0,0 +1,70 @@
+"""
+parse_toi.read_shift_rows_from_html_page as it was before scrape.shift_report replaced html_table_extractor, kept as a
+baseline for bench_parse. Needs html-table-extractor (and BeautifulSoup), which scrapenhl2 no longer installs.
+"""
+
+import re
+
+import pandas as pd
+
+import scrapenhl2.scrape.general_helpers as helpers
+import scrapenhl2.scrape.players as players
+
+
+def read_shift_rows_from_html_page(rawtoi, teamid):
+    """
+    Reads shifts from one team's html shift log, with one row per shift. Every player is matched by name.
+
+    :param rawtoi: str, html page of shift log for teamid
+    :param teamid: int, team id corresponding to rawtoi
+
+    :return: dataframe with columns PlayerID, Period, Start, End, Team, and Duration
+    """
+
+    from bs4 import BeautifulSoup
+    from html_table_extractor.extractor import Extractor
+    # Given the page as a string, Extractor looks for tables in its first tag, <head>; <body> holds the report
+    extractor = Extractor(BeautifulSoup(rawtoi, 'html.parser').body)
+    extractor.parse()
+    tables = extractor.return_list()
+
+    ids = []
+    periods = []
+    starts = []
+    ends = []
+    durationtime = []
+    teams = []
+    i = 0
+    while i < len(tables):
+        # A convenient artefact of this package: search for [p, p, p, p, p, p, p, p]
+        if len(tables[i]) == 8 and helpers.check_number_last_first_format(tables[i][0]):
+            pname = helpers.remove_leading_number(tables[i][0])
+            pname = helpers.flip_first_last(pname)
+            pid = players.player_as_id(pname)
+            i += 2  # skip the header row
+            # First entry is shift number. (Checks i too, as this page can end with a shift)
+            while i < len(tables) and re.match(r'\d{1,2}', tables[i][0]):
+                shiftnum, per, start, end, dur, ev = tables[i]
+                ids.append(pid)
+                periods.append(int(per))
+                starts.append(start[:start.index('/')].strip())
+                ends.append(end[:end.index('/')].strip())
+                durationtime.append(helpers.mmss_to_secs(dur))
+                teams.append(teamid)
+                i += 1
+            i += 1
+        else:
+            i += 1
+
+    startmin = [x[:x.index(':')] for x in starts]
+    startsec = [x[x.index(':') + 1:] for x in starts]
+    starttimes = [1200 * (p - 1) + 60 * int(m) + int(s) + 1 for p, m, s in zip(periods, startmin, startsec)]
+    endmin = [x[:x.index(':')] for x in ends]
+    endsec = [x[x.index(':') + 1:] for x in ends]
+    # There is an extra -1 in endtimes to avoid overlapping start/end
+    endtimes = [1200 * (p - 1) + 60 * int(m) + int(s) for p, m, s in zip(periods, endmin, endsec)]
+
+    durationtime = [e - s for s, e in zip(starttimes, endtimes)]
+
+    return pd.DataFrame({'PlayerID': ids, 'Period': periods, 'Start': starttimes, 'End': endtimes,
+                         'Team': teams, 'Duration': durationtime})
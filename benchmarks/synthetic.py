@@ -0,0 +1,382 @@
+"""
+This module generates a deterministic, synthetic season of data for benchmarks, without any network access.
+
+It writes, under a data folder laid out like scrapenhl2/data:
+
+- other/TEAM_INFO.feather and other/PLAYER_INFO.feather (and PLAYER_LOG.feather)
+- other/[season]_schedule.feather for every season scrapenhl2 reads at import (empty except for the synthetic one)
+- raw/pbp/[season]/[game].zlib, JSON play by play in the NHL API format
+- raw/toi/[season]/[game].zlib, JSON shifts in the NHL API format
+- raw/toi/[season]/[game]H.html and [game]R.html, HTML shift reports
+
+This module doesn't import scrapenhl2, since scrapenhl2 reads these files at import. Call generate_synthetic_data and
+point SCRAPENHL2_DATA_DIR at the folder before importing scrapenhl2.
+"""
+
+import datetime
+import json
+import os
+import os.path
+import zlib
+
+import feather
+import numpy as np
+import pandas as pd
+
+# Real IDs and abbreviations, so team colors etc. work
+TEAMS = [(15, 'WSH', 'Washington Capitals'), (5, 'PIT', 'Pittsburgh Penguins'), (4, 'PHI', 'Philadelphia Flyers'),
+         (3, 'NYR', 'New York Rangers'), (1, 'NJD', 'New Jersey Devils'), (2, 'NYI', 'New York Islanders'),
+         (6, 'BOS', 'Boston Bruins'), (10, 'TOR', 'Toronto Maple Leafs')]
+
+_FIRST_NAMES = ['Alex', 'Nicklas', 'Evgeny', 'John', 'Tom', 'Jakub', 'Brett', 'Matt', 'Dmitry', 'Lars', 'Andre',
+                'Jay', 'Kris', 'Sidney', 'Phil', 'Carl', 'Patric', 'Olli', 'Connor', 'Sean']
+_LAST_NAMES = ['Abbott', 'Baker', 'Carver', 'Dalton', 'Ellis', 'Foster', 'Garner', 'Hayes', 'Irving', 'Jensen',
+               'Keller', 'Larson', 'Mercer', 'Nolan', 'Olsen', 'Parker', 'Quinn', 'Ramsey', 'Sutter', 'Tanner',
+               'Upton', 'Vance', 'Walsh', 'Young', 'Zimmer', 'Archer', 'Barrett', 'Collins', 'Dawson', 'Everett',
+               'Fleming', 'Griffin', 'Hudson', 'Ingram', 'Jordan', 'Kendall', 'Lawson', 'Morgan', 'Norris', 'Owens']
+
+_POSITIONS = ['C', 'L', 'R'] * 4 + ['D'] * 6 + ['G'] * 2
+
+
+def generate_synthetic_data(datadir, season=2017, nteams=4, ngames=12, seed=0):
+    """
+    Writes a synthetic season to datadir.
+
+    :param datadir: str, the data folder (what SCRAPENHL2_DATA_DIR will point to)
+    :param season: int, the synthetic season
+    :param nteams: int, number of teams, 2-8
+    :param ngames: int, number of regular season games
+    :param seed: int, random seed
+
+    :return: dict with season, games, teams (IDs), and players (dataframe of PLAYER_INFO)
+    """
+    rng = np.random.RandomState(seed)
+    teams = TEAMS[:nteams]
+    rosters = _make_rosters(teams)
+    playerinfo = _make_player_info(rosters)
+
+    for folder in ('other', os.path.join('raw', 'pbp', str(season)), os.path.join('raw', 'toi', str(season)),
+                   os.path.join('parsed', 'pbp', str(season)), os.path.join('parsed', 'toi', str(season)),
+                   os.path.join('teams', 'pbp', str(season)), os.path.join('teams', 'toi', str(season))):
+        os.makedirs(os.path.join(datadir, folder), exist_ok=True)
+    other = os.path.join(datadir, 'other')
+
+    feather.write_dataframe(pd.DataFrame({'ID': [t[0] for t in TEAMS], 'Abbreviation': [t[1] for t in TEAMS],
+                                          'Name': [t[2] for t in TEAMS]}),
+                            os.path.join(other, 'TEAM_INFO.feather'))
+    feather.write_dataframe(playerinfo, os.path.join(other, 'PLAYER_INFO.feather'))
+
+    schedule = []
+    playerlog = []
+    startdate = datetime.date(season, 10, 4)
+    for i in range(ngames):
+        game = 20001 + i
+        home = teams[i % nteams]
+        road = teams[(i + 1 + (i // nteams) % (nteams - 1)) % nteams]
+        date = (startdate + datetime.timedelta(days=i // max(nteams // 2, 1))).strftime('%Y-%m-%d')
+        homegoalie = rosters[home[0]][18 + i % 2]
+        roadgoalie = rosters[road[0]][18 + i % 2]
+
+        shifts = _make_shifts(rng, home[0], rosters[home[0]][:18], homegoalie) + \
+            _make_shifts(rng, road[0], rosters[road[0]][:18], roadgoalie)
+        plays, homescore, roadscore = _make_plays(rng, home[0], road[0], shifts, playerinfo)
+
+        rawpbp = _make_raw_pbp(plays, home[0], road[0], rosters, homegoalie, roadgoalie, playerinfo)
+        _write_zlib_json(rawpbp, os.path.join(datadir, 'raw', 'pbp', str(season), '{0:d}.zlib'.format(game)))
+        _write_zlib_json({'data': shifts}, os.path.join(datadir, 'raw', 'toi', str(season),
+                                                         '{0:d}.zlib'.format(game)))
+        for team, hr in ((home[0], 'H'), (road[0], 'R')):
+            with open(os.path.join(datadir, 'raw', 'toi', str(season), '{0:d}{1:s}.html'.format(game, hr)), 'w') \
+                    as writer:
+                writer.write(_make_shift_html(shifts, team, playerinfo))
+
+        schedule.append({'Date': date, 'Game': game, 'Type': 'R', 'Status': 'Final',
+                         'Road': road[0], 'RoadScore': roadscore, 'Home': home[0], 'HomeScore': homescore,
+                         'Venue': '{0:s} Arena'.format(home[1]), 'Season': season,
+                         'HomeCoach': 'N/A', 'RoadCoach': 'N/A',
+                         'Result': 'W' if homescore > roadscore else ('L' if homescore < roadscore else 'N/A'),
+                         'PBPStatus': 'Scraped', 'TOIStatus': 'Scraped'})
+        for team, goalie in ((home[0], homegoalie), (road[0], roadgoalie)):
+            for pid in rosters[team][:18] + [goalie]:
+                playerlog.append({'ID': pid, 'Team': team, 'Status': 'P', 'Season': season, 'Game': game})
+
+    columns = ['Date', 'Game', 'Type', 'Status', 'Road', 'RoadScore', 'Home', 'HomeScore', 'Venue', 'Season',
+               'HomeCoach', 'RoadCoach', 'Result', 'PBPStatus', 'TOIStatus']
+    schedule = pd.DataFrame(schedule)[columns]
+    for sch_season in range(2005, _current_season() + 1):
+        if sch_season == season:
+            df = schedule
+        else:
+            df = schedule.iloc[:0]
+        feather.write_dataframe(df, os.path.join(other, '{0:d}_schedule.feather'.format(sch_season)))
+    feather.write_dataframe(pd.DataFrame(playerlog)[['ID', 'Team', 'Status', 'Season', 'Game']],
+                            os.path.join(other, 'PLAYER_LOG.feather'))
+
+    return {'season': season, 'games': list(schedule.Game), 'teams': [t[0] for t in teams], 'players': playerinfo}
+
+
+def _current_season():
+    """
+    Same as schedules._get_current_season: this year minus 1, or this year if it's September or later.
+
+    :return: int
+    """
+    today = datetime.date.today()
+    return today.year if today.month >= 9 else today.year - 1
+
+
+def _make_rosters(teams):
+    """
+    Makes 12 forwards (C/L/R by line), 6 defensemen, and 2 goalies per team.
+
+    :param teams: list of (ID, abbreviation, name)
+
+    :return: dict of team ID to list of 20 player IDs, in _POSITIONS order
+    """
+    return {tid: [8470000 + 100 * i + j for j in range(len(_POSITIONS))] for i, (tid, _, _) in enumerate(teams)}
+
+
+def _make_player_info(rosters):
+    """
+    Makes PLAYER_INFO rows for all rostered players. Names are letters only, as in NHL shift reports.
+
+    :param rosters: dict from _make_rosters
+
+    :return: dataframe with columns ID, Name, DOB, Hand, Pos, Height, Weight, Nationality
+    """
+    rows = []
+    k = 0
+    for team, pids in sorted(rosters.items()):
+        for pid, pos in zip(pids, _POSITIONS):
+            name = '{0:s} {1:s}'.format(_FIRST_NAMES[k % len(_FIRST_NAMES)],
+                                        _LAST_NAMES[(k // len(_FIRST_NAMES) + k) % len(_LAST_NAMES)])
+            rows.append({'ID': pid, 'Name': name, 'DOB': '1990-01-01', 'Hand': 'LR'[k % 2], 'Pos': pos,
+                         'Height': "6'1\"", 'Weight': 200, 'Nationality': 'CAN'})
+            k += 1
+    return pd.DataFrame(rows)[['ID', 'Name', 'DOB', 'Hand', 'Pos', 'Height', 'Weight', 'Nationality']]
+
+
+def _make_shifts(rng, team, skaters, goalie):
+    """
+    Makes one team's shifts for a three-period game. Forward lines and defense pairs rotate on their own clocks, and
+    now and then a forward shift is a man short (as on a penalty kill).
+
+    :param rng: np.random.RandomState
+    :param team: int, team ID
+    :param skaters: list of 18 player IDs, 12 forwards then 6 defensemen
+    :param goalie: int, player ID
+
+    :return: list of dicts, in the NHL shift API format
+    """
+    shifts = []
+    for period in (1, 2, 3):
+        shifts.append(_shift(team, goalie, period, 0, 1200))
+        for unit_size, units, lo, hi in ((3, 4, 30, 60), (2, 3, 35, 70)):
+            t = 0
+            unit = 0
+            while t < 1200:
+                end = min(t + rng.randint(lo, hi), 1200)
+                first = (0 if unit_size == 3 else 12) + unit * unit_size
+                onice = skaters[first:first + unit_size]
+                if unit_size == 3 and rng.rand() < 0.05:
+                    onice = onice[:2]
+                for pid in onice:
+                    shifts.append(_shift(team, pid, period, t, end))
+                t = end
+                unit = (unit + 1) % units
+    return shifts
+
+
+def _shift(team, pid, period, start, end):
+    """
+    One shift in the NHL shift API format.
+
+    :param team: int
+    :param pid: int
+    :param period: int
+    :param start: int, seconds into the period
+    :param end: int, seconds into the period
+
+    :return: dict
+    """
+    return {'playerId': int(pid), 'teamId': int(team), 'period': period, 'startTime': _mmss(start),
+            'endTime': _mmss(end), 'duration': _mmss(end - start)}
+
+
+def _make_plays(rng, home, road, shifts, playerinfo):
+    """
+    Makes events for a game: period starts and ends, faceoffs, shots, misses, blocks, goals, and hits, with actors
+    taken from players on ice at the time.
+
+    :param rng: np.random.RandomState
+    :param home: int, home team ID
+    :param road: int, road team ID
+    :param shifts: list of dicts, from _make_shifts for both teams
+    :param playerinfo: dataframe from _make_player_info
+
+    :return: (list of event dicts, home goals, road goals)
+    """
+    posdict = dict(zip(playerinfo.ID, playerinfo.Pos))
+    onice = {}  # (period, second) -> team -> list of skaters; goalie separately
+    for shift in shifts:
+        start = _secs(shift['startTime'])
+        end = _secs(shift['endTime'])
+        for sec in range(start, end):
+            onice.setdefault((shift['period'], sec), {}).setdefault(shift['teamId'], []).append(shift['playerId'])
+
+    plays = []
+    score = {home: 0, road: 0}
+    for period in (1, 2, 3):
+        plays.append(('Period Start', period, 0, None, None))
+        for sec in np.sort(rng.choice(np.arange(1, 1199), 45, replace=False)):
+            kind = rng.choice(['Shot', 'Missed Shot', 'Blocked Shot', 'Goal', 'Hit', 'Faceoff'],
+                              p=[0.3, 0.15, 0.15, 0.03, 0.17, 0.2])
+            team = home if rng.rand() < 0.5 else road
+            plays.append((kind, period, int(sec), team, onice.get((period, int(sec)), {})))
+        plays.append(('Period End', period, 1200, None, None))
+
+    events = []
+    for kind, period, sec, team, players in plays:
+        event = {'about': {'period': period, 'periodTime': _mmss(sec)}, 'result': {'event': kind, 'description': ''}}
+        if team is not None and players is not None:
+            opp = road if team == home else home
+            mine = [p for p in players.get(team, []) if posdict[p] != 'G']
+            theirs = [p for p in players.get(opp, []) if posdict[p] != 'G']
+            mygoalie = [p for p in players.get(team, []) if posdict[p] == 'G']
+            theirgoalie = [p for p in players.get(opp, []) if posdict[p] == 'G']
+            if len(mine) == 0 or len(theirs) == 0 or len(theirgoalie) == 0:
+                continue
+            shooter = int(rng.choice(mine))
+            other = int(rng.choice(theirs))
+            event['coordinates'] = {'x': float(rng.randint(-99, 100)), 'y': float(rng.randint(-42, 43))}
+            if kind == 'Goal':
+                score[team] += 1
+                assists = [int(p) for p in rng.choice([p for p in mine if p != shooter], 2, replace=False)]
+                event['players'] = [_player(shooter, 'Scorer', playerinfo)] + \
+                    [_player(p, 'Assist', playerinfo) for p in assists] + \
+                    [_player(theirgoalie[0], 'Goalie', playerinfo)]
+                event['result']['description'] = '{0:s} ({1:d}) Wrist Shot, assists: {2:s} (1), {3:s} (1)'.format(
+                    _name(shooter, playerinfo), score[team], _name(assists[0], playerinfo),
+                    _name(assists[1], playerinfo))
+            elif kind == 'Blocked Shot':
+                # The API credits blocks to the blocking team and player
+                event['players'] = [_player(other, 'Blocker', playerinfo), _player(shooter, 'Shooter', playerinfo)]
+                team = opp
+            elif kind in ('Shot', 'Missed Shot'):
+                event['players'] = [_player(shooter, 'Shooter', playerinfo),
+                                    _player(theirgoalie[0], 'Goalie', playerinfo)]
+            elif kind == 'Hit':
+                event['players'] = [_player(shooter, 'Hitter', playerinfo), _player(other, 'Hittee', playerinfo)]
+            else:
+                event['players'] = [_player(shooter, 'Winner', playerinfo), _player(other, 'Loser', playerinfo)]
+            event['team'] = {'id': int(team)}
+            event['result']['description'] = event['result']['description'] or kind
+        events.append(event)
+
+    return events, score[home], score[road]
+
+
+def _make_raw_pbp(plays, home, road, rosters, homegoalie, roadgoalie, playerinfo):
+    """
+    Wraps events in the NHL game feed format, with player and boxscore sections.
+
+    :return: dict
+    """
+    names = dict(zip(playerinfo.ID, playerinfo.Name))
+    dressed = {home: rosters[home][:18] + [homegoalie], road: rosters[road][:18] + [roadgoalie]}
+    boxscore = {hr: {'players': {'ID{0:d}'.format(pid): {'person': {'id': pid}, 'jerseyNumber': str(_sweater(pid))}
+                                 for pid in dressed[team]}, 'scratches': [],
+                     'coaches': [{'person': {'fullName': 'Coach {0:d}'.format(team)}}]}
+                for hr, team in (('home', home), ('away', road))}
+    return {'gameData': {'players': {'ID{0:d}'.format(pid): {'id': pid, 'fullName': names[pid]}
+                                     for pid in dressed[home] + dressed[road]},
+                         'teams': {'home': {'id': home}, 'away': {'id': road}}},
+            'liveData': {'plays': {'allPlays': plays},
+                         'linescore': {'currentPeriodOrdinal': '3rd'},
+                         'boxscore': {'teams': boxscore}}}
+
+
+def _make_shift_html(shifts, team, playerinfo):
+    """
+    Makes an HTML shift report for one team, in the layout scrapenhl2.scrape.parse_toi.read_shift_rows_from_html_page
+    reads: for each player, a row with "[number] LAST, FIRST" spanning 8 columns, a header row, and one row per shift.
+
+    :return: str
+    """
+    names = dict(zip(playerinfo.ID, playerinfo.Name))
+    rows = []
+    byplayer = {}
+    for shift in shifts:
+        if shift['teamId'] == team:
+            byplayer.setdefault(shift['playerId'], []).append(shift)
+    for pid, pshifts in sorted(byplayer.items()):
+        first, last = names[pid].split(' ', 1)
+        rows.append('<tr><td class="playerHeading" colspan="8">{0:d} {1:s}, {2:s}</td></tr>'.format(
+            _sweater(pid), last.upper(), first.upper()))
+        rows.append('<tr><td>Shift #</td><td>Per</td><td>Start of Shift</td><td>End of Shift</td>'
+                    '<td>Duration</td><td>Event</td></tr>')
+        for i, shift in enumerate(pshifts, start=1):
+            start = _secs(shift['startTime'])
+            end = _secs(shift['endTime'])
+            rows.append('<tr><td>{0:d}</td><td>{1:d}</td><td>{2:s} / {3:s}</td><td>{4:s} / {5:s}</td>'
+                        '<td>{6:s}</td><td>&nbsp;</td></tr>'.format(i, shift['period'], _mmss(start),
+                                                                   _mmss(1200 - start), _mmss(end),
+                                                                   _mmss(1200 - end), shift['duration']))
+        rows.append('<tr><td>Per</td><td>SHF</td><td>AVG</td><td>TOI</td><td>EV TOT</td><td>PP TOT</td></tr>')
+    return '<html><body><table>\n{0:s}\n</table></body></html>'.format('\n'.join(rows))
+
+
+def _player(pid, role, playerinfo):
+    """
+    A player entry for an event, in the NHL game feed format.
+
+    :return: dict
+    """
+    return {'player': {'id': int(pid), 'fullName': _name(pid, playerinfo)}, 'playerType': role}
+
+
+def _name(pid, playerinfo):
+    """
+    Returns the player's name.
+
+    :return: str
+    """
+    return playerinfo.Name.values[playerinfo.ID.values == pid][0]
+
+
+def _write_zlib_json(obj, filename):
+    """
+    Writes JSON compressed with zlib, as scrape_pbp.save_raw_pbp and scrape_toi.save_raw_toi do.
+
+    :return: nothing
+    """
+    with open(filename, 'wb') as writer:
+        writer.write(zlib.compress(json.dumps(obj).encode('latin-1'), 9))
+
+
+def _sweater(pid):
+    """
+    Returns the player's sweater number, as in the boxscore and the HTML shift reports. Unique within a team.
+
+    :return: int
+    """
+    return pid % 100 + 2
+
+
+def _mmss(secs):
+    """
+    Converts seconds to m:ss.
+
+    :return: str
+    """
+    return '{0:d}:{1:02d}'.format(int(secs) // 60, int(secs) % 60)
+
+
+def _secs(mmss):
+    """
+    Converts m:ss to seconds.
+
+    :return: int
+    """
+    mins, secs = mmss.split(':')
+    return 60 * int(mins) + int(secs)
@@ -1,2 +1,7 @@
 __all__ = ['manipulate',
-           'add_onice_players']
\ No newline at end of file
+           'add_onice_players',
+           'build_graph',
+           'game_context',
+           'rolling',
+           'log_store',
+           'player_cumsums']
\ No newline at end of file
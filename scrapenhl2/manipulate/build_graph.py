@@ -0,0 +1,525 @@
+"""
+This module contains a small build system for the files derived from the schedule.
+
+Each file (or set of files) is a node in a graph, with the nodes it depends on and a fingerprint of its inputs:
+
+- schedule
+- raw_pbp:[game], raw_toi:[game] (depend on schedule)
+- parsed_pbp:[game], parsed_toi:[game] (depend on raw)
+- team:[team] (team pbp and toi logs; depend on that team's parsed games)
+- toi60, toicomp, player_log (depend on team logs)
+
+Fingerprints from the last successful build are stored in /scrape/data/other/[season]_build_state.json. A node is
+rebuilt when its outputs are missing, its fingerprint has changed, or something upstream of it is being rebuilt.
+Fingerprints are taken after a node's action runs, so actions that touch their own inputs (e.g. the TOICOMP update
+also updates TOI60) don't look changed next time. Raw and parsed game files that already exist when a node has no
+stored fingerprint (e.g. the first build over an existing data folder) are adopted rather than rebuilt.
+Nodes whose dependencies are done run in parallel, subject to per-group limits (e.g. one parser at a time, since
+parsing updates the schedule and player files).
+
+Use build_season(season, dry_run=True) to see what would be rebuilt without doing anything.
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import json
+import os
+import os.path
+import threading
+
+from scrapenhl2.scrape import organization, schedules, manipulate_schedules, scrape_pbp, scrape_toi, parse_pbp, \
+    parse_toi, teams, team_info, raw_archive
+from scrapenhl2.manipulate import manipulate
+
+Node = collections.namedtuple('Node', ['name', 'kind', 'deps', 'fingerprint', 'outputs', 'action', 'group'])
+Node.__doc__ = """
+A node in the build graph.
+
+- name: str, unique within the graph, e.g. parsed_pbp:20001
+- kind: str, e.g. parsed_pbp
+- deps: list of str, names of upstream nodes
+- fingerprint: function of no arguments returning a JSON-serializable summary of this node's inputs
+- outputs: list of str, the files this node writes
+- action: function taking (old fingerprint, new fingerprint) that builds the outputs
+- group: str, concurrency group (see get_default_group_limits)
+"""
+
+
+def get_build_state_filename(season):
+    """
+    Returns the filename for stored fingerprints.
+
+    :param season: int, the season
+
+    :return: str, /scrape/data/other/[season]_build_state.json
+    """
+    return os.path.join(organization.get_other_data_folder(), '{0:d}_build_state.json'.format(season))
+
+
+def get_build_state(season):
+    """
+    Reads fingerprints from the last build.
+
+    :param season: int, the season
+
+    :return: dict of node name to fingerprint
+    """
+    try:
+        with open(get_build_state_filename(season), 'r') as reader:
+            return json.load(reader)
+    except FileNotFoundError:
+        return {}
+
+
+def save_build_state(state, season):
+    """
+    Saves fingerprints.
+
+    :param state: dict of node name to fingerprint
+    :param season: int, the season
+
+    :return: nothing
+    """
+    tempname = get_build_state_filename(season) + '.tmp'
+    with open(tempname, 'w') as writer:
+        json.dump(state, writer, sort_keys=True)
+    os.replace(tempname, get_build_state_filename(season))
+
+
+def get_default_group_limits():
+    """
+    Returns the maximum number of nodes that run at once in each group.
+
+    - scrape: 2, to go easy on NHL servers
+    - parse: 1, because parsing updates the schedule and player files
+    - team: 2, since each team log update reads and rewrites that team's HDF pbp and TOI logs
+    - season: 1
+
+    :return: dict
+    """
+    return {'scrape': 2, 'parse': 1, 'team': 2, 'season': 1}
+
+
+def file_fingerprint(filename, method='mtime'):
+    """
+    Fingerprints a file.
+
+    :param filename: str
+    :param method: str, 'mtime' for modification time and size, or 'hash' for a SHA-1 of the contents
+
+    :return: str, or None if the file does not exist (and isn't in a raw archive; see raw_archive)
+    """
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return raw_archive.get_archived_file_fingerprint(filename, method)
+    if method == 'hash':
+        sha = hashlib.sha1()
+        with open(filename, 'rb') as reader:
+            for chunk in iter(lambda: reader.read(1 << 20), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+    return '{0:d}-{1:d}'.format(int(stat.st_mtime * 1e6), stat.st_size)
+
+
+def files_fingerprint(filenames, method='mtime'):
+    """
+    Fingerprints a list of files together.
+
+    :param filenames: iterable of str
+    :param method: str, 'mtime' or 'hash'
+
+    :return: str
+    """
+    sha = hashlib.sha1()
+    for filename in filenames:
+        sha.update('{0:s}={1:s};'.format(filename, str(file_fingerprint(filename, method))).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def get_season_build_graph(season, method='mtime', tolerance=0):
+    """
+    Creates the build graph for this season from the current schedule. Nodes are in dependency order.
+
+    :param season: int, the season
+    :param method: str, 'mtime' or 'hash', for file fingerprints
+    :param tolerance: float, TOI60 staleness tolerance for TOICOMP (see manipulate.update_toicomp_file)
+
+    :return: OrderedDict of node name to Node
+    """
+    graph = collections.OrderedDict()
+
+    def add(name, kind, deps, fingerprint, outputs, action, group):
+        graph[name] = Node(name, kind, deps, fingerprint, outputs, action, group)
+
+    graph['schedule'] = _schedule_node(season)
+
+    sch = schedules.get_season_schedule(season).query('Status == "Final"')
+    statuses = dict(zip(sch.Game, sch.Status))
+
+    for game in sorted(sch.Game):
+        game = int(game)
+        status = statuses[game]
+
+        if season < 2010:
+            rawtoi = [scrape_toi.get_home_shiftlog_filename(season, game),
+                      scrape_toi.get_road_shiftlog_filename(season, game)]
+        else:
+            rawtoi = [scrape_toi.get_game_raw_toi_filename(season, game)]
+
+        add('raw_pbp:{0:d}'.format(game), 'raw_pbp', ['schedule'], _constant(status),
+            [scrape_pbp.get_game_raw_pbp_filename(season, game)], _scrape_pbp_action(season, game), 'scrape')
+        add('raw_toi:{0:d}'.format(game), 'raw_toi', ['schedule'], _constant(status),
+            rawtoi, _scrape_toi_action(season, game), 'scrape')
+        add('parsed_pbp:{0:d}'.format(game), 'parsed_pbp', ['raw_pbp:{0:d}'.format(game)],
+            _files(method, [scrape_pbp.get_game_raw_pbp_filename(season, game)]),
+            [parse_pbp.get_game_parsed_pbp_filename(season, game)], _parse_pbp_action(season, game), 'parse')
+        add('parsed_toi:{0:d}'.format(game), 'parsed_toi', ['raw_toi:{0:d}'.format(game)],
+            _files(method, rawtoi), [parse_toi.get_game_parsed_toi_filename(season, game)],
+            _parse_toi_action(season, game), 'parse')
+
+    regular = sch[(sch.Game >= 20001) & (sch.Game <= 30417)]
+    teamnodes = []
+    teamfiles = []
+    teamtoi = []
+    for team in sorted(set(regular.Home) | set(regular.Road)):
+        team = int(team)
+        teamgames = sorted(int(g) for g in regular[(regular.Home == team) | (regular.Road == team)].Game)
+        name = 'team:{0:s}'.format(team_info.team_as_str(team))
+        deps = ['parsed_{0:s}:{1:d}'.format(x, g) for g in teamgames for x in ('pbp', 'toi')]
+        outputs = [teams.get_team_pbp_filename(season, team), teams.get_team_toi_filename(season, team)]
+        add(name, 'team', deps, _team_fingerprint(season, teamgames, method), outputs,
+            _team_action(season, team), 'team')
+        teamnodes.append(name)
+        teamfiles += outputs
+        teamtoi.append(teams.get_team_toi_filename(season, team))
+
+    toi60file = manipulate.get_player_toion_toioff_filename(season)
+    toicompfile = manipulate.get_toicomp_filename(season)
+
+    add('toi60', 'toi60', teamnodes, _files(method, teamtoi), [toi60file],
+        lambda old, new: manipulate.update_player_toion_toioff_file(season), 'season')
+    add('toicomp', 'toicomp', ['toi60'], _files(method, [toi60file] + teamtoi), [toicompfile],
+        lambda old, new: manipulate.update_toicomp_file(season, tolerance), 'season')
+    add('player_log', 'player_log', ['toicomp'] + teamnodes, _files(method, [toicompfile] + teamfiles),
+        [manipulate.get_5v5_player_log_filename(season)],
+        lambda old, new: manipulate.update_5v5_player_log(season, tolerance), 'season')
+
+    return graph
+
+
+def find_stale_nodes(graph, state, force=()):
+    """
+    Finds nodes that need rebuilding, in dependency order.
+
+    Nodes of kinds in _ADOPTABLE_KINDS that have no stored fingerprint, but whose outputs all exist, are adopted: their
+    current fingerprint is added to state and they aren't rebuilt (unless something upstream is).
+
+    :param graph: OrderedDict of name to Node, from get_season_build_graph
+    :param state: dict of name to fingerprint, from get_build_state. Adopted nodes are added in place
+    :param force: iterable of node names to rebuild regardless
+
+    :return: OrderedDict of name to (reason, fingerprint)
+    """
+    force = set(force)
+    stale = collections.OrderedDict()
+    for name, node in graph.items():
+        fingerprint = node.fingerprint()
+        if name in force:
+            reason = 'forced'
+        elif any(not _output_exists(output) for output in node.outputs):
+            reason = 'missing output'
+        elif name not in state and node.kind not in _ADOPTABLE_KINDS:
+            reason = 'not built before'
+        elif name not in state and any(dep in stale for dep in node.deps):
+            reason = 'upstream rebuilt'
+        elif name not in state:
+            state[name] = fingerprint
+            continue
+        elif state[name] != fingerprint:
+            reason = 'inputs changed'
+        elif any(dep in stale for dep in node.deps):
+            reason = 'upstream rebuilt'
+        else:
+            continue
+        stale[name] = (reason, fingerprint)
+    return stale
+
+
+def build_season(season=None, dry_run=False, workers=4, method='mtime', refresh_schedule=True, tolerance=0,
+                 group_limits=None):
+    """
+    Rebuilds stale files for this season.
+
+    This runs in two phases. The schedule is refreshed first (unless refresh_schedule is False, or this is a dry run),
+    and then the rest of the graph is created from the updated schedule and built.
+
+    :param season: int, the season. If None, uses the current season
+    :param dry_run: bool, if True, prints and returns what would be rebuilt but doesn't build anything
+    :param workers: int, number of threads
+    :param method: str, 'mtime' or 'hash', for file fingerprints
+    :param refresh_schedule: bool, whether to update the schedule from the NHL API first
+    :param tolerance: float, TOI60 staleness tolerance for TOICOMP (see manipulate.update_toicomp_file)
+    :param group_limits: dict of group to max concurrent nodes. Defaults to get_default_group_limits()
+
+    :return: dict with keys stale (name to reason), built, failed, and skipped (lists of names)
+    """
+    if season is None:
+        season = schedules.get_current_season()
+    if group_limits is None:
+        group_limits = get_default_group_limits()
+
+    state = get_build_state(season)
+    report = {'stale': collections.OrderedDict(), 'built': [], 'failed': [], 'skipped': []}
+
+    if refresh_schedule and not dry_run:
+        _run_nodes({'schedule': _schedule_node(season)}, {'schedule': ('forced', None)}, state, report, 1,
+                   group_limits)
+
+    graph = get_season_build_graph(season, method, tolerance)
+    graph.pop('schedule')
+    stale = find_stale_nodes(graph, state)
+    report['stale'].update((name, reason) for name, (reason, _) in stale.items())
+
+    if dry_run:
+        print_build_report(report, dry_run=True)
+        return report
+
+    try:
+        _run_nodes(graph, stale, state, report, workers, group_limits)
+    finally:
+        save_build_state(state, season)
+    print_build_report(report)
+    return report
+
+
+def print_build_report(report, dry_run=False):
+    """
+    Prints a summary of a build: stale nodes by kind and reason, and what was built, failed, or skipped.
+
+    :param report: dict, from build_season
+    :param dry_run: bool, whether this was a dry run
+
+    :return: nothing
+    """
+    counts = collections.OrderedDict()
+    for name, reason in report['stale'].items():
+        kind = name.split(':')[0]
+        counts.setdefault(kind, collections.Counter())[reason] += 1
+
+    print('Would rebuild:' if dry_run else 'Stale:')
+    if len(counts) == 0:
+        print('\tnothing')
+    for kind, reasons in counts.items():
+        print('\t{0:s}: {1:d} ({2:s})'.format(kind, sum(reasons.values()),
+                                               ', '.join('{0:d} {1:s}'.format(v, k) for k, v in reasons.items())))
+    if not dry_run:
+        print('Built {0:d}, failed {1:d}, skipped {2:d}'.format(
+            len(report['built']), len(report['failed']), len(report['skipped'])))
+        for name in report['failed']:
+            print('\tFailed:', name)
+
+
+def _run_nodes(graph, stale, state, report, workers, group_limits):
+    """
+    Runs stale nodes, in parallel where dependencies and group limits allow. Nodes downstream of a failure are
+    skipped. Fingerprints of successful nodes are written to state.
+
+    :param graph: dict of name to Node
+    :param stale: OrderedDict of name to (reason, fingerprint), in dependency order
+    :param state: dict of name to fingerprint; updated in place
+    :param report: dict; built, failed, and skipped are appended to in place
+    :param workers: int, number of threads
+    :param group_limits: dict of group to max concurrent nodes (None for no limit)
+
+    :return: nothing
+    """
+    # Count unfinished upstream nodes for each stale node
+    waiting_on = {name: sum(1 for dep in graph[name].deps if dep in stale) for name in stale}
+    downstream = collections.defaultdict(list)
+    for name in stale:
+        for dep in graph[name].deps:
+            if dep in stale:
+                downstream[dep].append(name)
+
+    ready = collections.deque(name for name in stale if waiting_on[name] == 0)
+    running = {}
+    group_counts = collections.Counter()
+    blocked = set()
+
+    def finish(name, ok):
+        for child in downstream[name]:
+            if not ok:
+                blocked.add(child)
+            waiting_on[child] -= 1
+            if waiting_on[child] == 0:
+                ready.append(child)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        while ready or running:
+            deferred = collections.deque()
+            while ready:
+                name = ready.popleft()
+                if name in blocked:
+                    report['skipped'].append(name)
+                    finish(name, False)
+                    continue
+                node = graph[name]
+                limit = group_limits.get(node.group)
+                if len(running) >= workers or (limit is not None and group_counts[node.group] >= limit):
+                    deferred.append(name)
+                    continue
+                group_counts[node.group] += 1
+                running[executor.submit(_run_node, node, state.get(name))] = name
+            ready.extend(deferred)
+
+            if not running:
+                continue
+            done, _ = concurrent.futures.wait(list(running), return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                group_counts[graph[name].group] -= 1
+                try:
+                    state[name] = future.result()
+                    report['built'].append(name)
+                    finish(name, True)
+                except Exception as e:
+                    print('Issue building', name)
+                    print(e, e.args)
+                    state.pop(name, None)
+                    report['failed'].append(name)
+                    finish(name, False)
+
+
+def _run_node(node, old_fingerprint):
+    """
+    Runs one node's action, fingerprinting its inputs just before (upstream nodes may have just changed them), and
+    again after, since some actions update their own inputs (e.g. update_toicomp_file updates TOI60 first).
+
+    :param node: Node
+    :param old_fingerprint: the fingerprint from the last build, or None
+
+    :return: the fingerprint after the action, to store
+    """
+    node.action(old_fingerprint, node.fingerprint())
+    missing = [output for output in node.outputs if not _output_exists(output)]
+    if len(missing) > 0:
+        raise FileNotFoundError('{0:s} did not write {1:s}'.format(node.name, ', '.join(missing)))
+    return node.fingerprint()
+
+
+def _output_exists(filename):
+    """
+    Returns whether an output file exists, counting raw files moved into a season's raw archive.
+    """
+    return os.path.exists(filename) or raw_archive.is_archived_file(filename)
+
+
+def _schedule_node(season):
+    """
+    Returns the schedule node. It has no inputs, so it's only rebuilt when missing or forced.
+    """
+    return Node('schedule', 'schedule', [], lambda: None, [schedules.get_season_schedule_filename(season)],
+                lambda old, new: schedules.generate_season_schedule_file(season), 'scrape')
+
+
+def _constant(value):
+    """
+    Returns a fingerprint function for a fixed value.
+    """
+    return lambda: value
+
+
+def _files(method, filenames):
+    """
+    Returns a fingerprint function for a list of files.
+    """
+    return lambda: files_fingerprint(filenames, method)
+
+
+def _team_fingerprint(season, games, method):
+    """
+    Returns a fingerprint function for a team log: a dict of game to fingerprint of its parsed pbp and toi, so the
+    action can tell which games changed.
+    """
+    def fingerprint():
+        return {str(game): files_fingerprint([parse_pbp.get_game_parsed_pbp_filename(season, game),
+                                              parse_toi.get_game_parsed_toi_filename(season, game)], method)
+                for game in games}
+
+    return fingerprint
+
+
+def _team_action(season, team):
+    """
+    Returns the action for a team log node. New games are picked up by teams.update_team_logs; games whose parsed
+    files changed since the last build are forced.
+    """
+    def action(old, new):
+        old = old or {}
+        changed = [int(game) for game, fingerprint in new.items() if game in old and old[game] != fingerprint]
+        teams.update_team_logs(season, force_games=changed if len(changed) > 0 else None, for_teams=[team])
+
+    return action
+
+
+def _scrape_pbp_action(season, game):
+    """
+    Returns the action for a raw pbp node.
+    """
+    def action(old, new):
+        scrape_pbp.scrape_game_pbp(season, game, True)
+        with _SCHEDULE_LOCK:
+            manipulate_schedules.update_schedule_with_pbp_scrape(season, game)
+
+    return action
+
+
+def _scrape_toi_action(season, game):
+    """
+    Returns the action for a raw toi node. Uses html before 2010 and json after, same as autoupdate.
+    """
+    def action(old, new):
+        if season < 2010:
+            scrape_toi.scrape_game_toi_from_html(season, game, True)
+        else:
+            scrape_toi.scrape_game_toi(season, game, True)
+        with _SCHEDULE_LOCK:
+            manipulate_schedules.update_schedule_with_toi_scrape(season, game)
+
+    return action
+
+
+def _parse_pbp_action(season, game):
+    """
+    Returns the action for a parsed pbp node.
+    """
+    def action(old, new):
+        with _SCHEDULE_LOCK:
+            parse_pbp.parse_game_pbp(season, game, True)
+
+    return action
+
+
+def _parse_toi_action(season, game):
+    """
+    Returns the action for a parsed toi node. As in autoupdate, falls back to html if the json is incomplete.
+    """
+    def action(old, new):
+        with _SCHEDULE_LOCK:
+            if season < 2010:
+                parse_toi.parse_game_toi_from_html(season, game, True)
+                return
+            parse_toi.parse_game_toi(season, game, True)
+            if len(parse_toi.get_parsed_toi(season, game)) < 3600:
+                print('Not enough rows in json for {0:d} {1:d}; reading from html'.format(season, game))
+                scrape_toi.scrape_game_toi_from_html(season, game, True)
+                parse_toi.parse_game_toi_from_html(season, game, True)
+
+    return action
+
+
+# Per-game files that stand on their own, so existing ones can be trusted without a stored fingerprint
+_ADOPTABLE_KINDS = {'raw_pbp', 'raw_toi', 'parsed_pbp', 'parsed_toi'}
+_SCHEDULE_LOCK = threading.RLock()
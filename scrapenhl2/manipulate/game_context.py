@@ -0,0 +1,172 @@
+"""
+This module contains a per-game analysis context, so that charts needing several views of one game (TOI, line
+combinations, pairs, H2H TOI and Corsi) read the parsed files and player positions only once.
+
+Use get_game_context(season, game) to get a context. Contexts are kept for recently used games and rebuilt if the
+parsed pbp or toi files change on disk (e.g. for in-progress games).
+"""
+
+import collections
+import os.path
+import threading
+
+from scrapenhl2.manipulate import manipulate as manip
+from scrapenhl2.scrape import parse_pbp, parse_toi, schedules
+
+
+class GameContext(object):
+    """
+    Loads a game's parsed pbp and toi once and computes derived dataframes lazily, keeping each one after the first
+    call. Methods return the stored dataframes, so copy before modifying them in place.
+    """
+
+    def __init__(self, season, game, toi=None, pbp=None):
+        """
+        :param season: int, the season
+        :param game: int, the game
+        :param toi: dataframe, parsed toi for this game. Read when first needed if None
+        :param pbp: dataframe, parsed pbp for this game. Read when first needed if None
+        """
+        self.season = season
+        self.game = game
+        self._toi = toi
+        self._pbp = pbp
+        self._results = {}
+
+    @property
+    def toi(self):
+        """Parsed toi for this game"""
+        if self._toi is None:
+            self._toi = parse_toi.get_parsed_toi(self.season, self.game)
+        return self._toi
+
+    @property
+    def pbp(self):
+        """Parsed pbp for this game"""
+        if self._pbp is None:
+            self._pbp = parse_pbp.get_parsed_pbp(self.season, self.game)
+        return self._pbp
+
+    @property
+    def on_ice(self):
+        """5v5 players on ice by second, with team and position. See manipulate.get_5v5_players_on_ice"""
+        return self._get('on_ice', lambda: manip.get_5v5_players_on_ice(self.toi))
+
+    def player_toi(self, pos=None, homeroad='H'):
+        """
+        5v5 TOI by player for one team. See manipulate.get_player_toi.
+
+        :param pos: specify 'L', 'C', 'R', 'D', 'F' or None for all
+        :param homeroad: str, 'H' for home or 'R' for road
+
+        :return: pandas df with columns PlayerID, Secs, Pos
+        """
+        return self._get(('player_toi', pos, homeroad),
+                         lambda: manip.player_toi_from_on_ice(self.on_ice, pos, homeroad))
+
+    def line_combos(self, homeroad='H'):
+        """
+        5v5 forward lines for one team. See manipulate.get_line_combos.
+
+        :param homeroad: str, 'H' for home or 'R' for road
+
+        :return: pandas dataframe with columns PlayerID1, PlayerID2, PlayerID3, Secs
+        """
+        return self._get(('line_combos', homeroad), lambda: manip.line_combos_from_on_ice(self.on_ice, homeroad))
+
+    def pairings(self, homeroad='H'):
+        """
+        5v5 D pairs for one team. See manipulate.get_pairings.
+
+        :param homeroad: str, 'H' for home or 'R' for road
+
+        :return: pandas dataframe with columns PlayerID1, PlayerID2, Secs
+        """
+        return self._get(('pairings', homeroad), lambda: manip.pairings_from_on_ice(self.on_ice, homeroad))
+
+    @property
+    def h2h_toi(self):
+        """5v5 H2H TOI. See manipulate.get_game_h2h_toi"""
+        return self._get('h2h_toi', lambda: manip.h2h_toi_from_on_ice(self.on_ice))
+
+    def h2h_corsi(self, cfca=None):
+        """
+        5v5 H2H Corsi. See manipulate.get_game_h2h_corsi.
+
+        :param cfca: str, or None. 'cf' for CF only, 'ca' for CA only, None for CF - CA.
+
+        :return: a df with [P1, P1Team, P2, P2Team, HomeCorsi]
+        """
+        return self._get(('h2h_corsi', cfca),
+                         lambda: manip.h2h_corsi_from_on_ice(self.on_ice, self.pbp,
+                                                             schedules.get_home_team(self.season, self.game), cfca))
+
+    def _get(self, key, func):
+        """
+        Returns the stored result for key, computing it with func first if need be.
+
+        :param key: hashable
+        :param func: function with no arguments
+
+        :return: func()
+        """
+        if key not in self._results:
+            self._results[key] = func()
+        return self._results[key]
+
+
+def get_game_context(season, game):
+    """
+    Returns the analysis context for this game, reusing a recent one if the parsed files have not changed since.
+
+    :param season: int, the season
+    :param game: int, the game
+
+    :return: GameContext
+    """
+    key = (season, game)
+    mtimes = _get_parsed_mtimes(season, game)
+    with _LOCK:
+        entry = _CONTEXTS.get(key)
+        if entry is not None and entry[0] == mtimes:
+            _CONTEXTS.move_to_end(key)
+            return entry[1]
+
+    context = GameContext(season, game)
+    with _LOCK:
+        _CONTEXTS[key] = (mtimes, context)
+        _CONTEXTS.move_to_end(key)
+        while len(_CONTEXTS) > _MAX_CONTEXTS:
+            _CONTEXTS.popitem(last=False)
+    return context
+
+
+def clear_game_contexts():
+    """
+    Drops all stored game contexts.
+
+    :return: nothing
+    """
+    with _LOCK:
+        _CONTEXTS.clear()
+
+
+def _get_parsed_mtimes(season, game):
+    """
+    Returns modification times of the parsed pbp and toi files for this game, with None for missing files.
+
+    :param season: int, the season
+    :param game: int, the game
+
+    :return: tuple of (float or None, float or None)
+    """
+    mtimes = []
+    for filename in (parse_pbp.get_game_parsed_pbp_filename(season, game),
+                     parse_toi.get_game_parsed_toi_filename(season, game)):
+        mtimes.append(os.path.getmtime(filename) if os.path.exists(filename) else None)
+    return tuple(mtimes)
+
+
+_LOCK = threading.Lock()
+_CONTEXTS = collections.OrderedDict()
+_MAX_CONTEXTS = 8
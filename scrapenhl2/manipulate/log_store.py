@@ -0,0 +1,179 @@
+"""
+This module contains an in-memory store of the 5v5 player log across seasons, for fast date-range queries (e.g. from
+the player app).
+
+Season logs are read once and combined, with game dates attached. Rows are sorted by (PlayerID, Date), and there are
+sorted indexes by (TeamID, Date) and by Date alone, so a query for one player or team over a date range is two binary
+searches rather than a scan of the whole log. A season is reread when its log file changes on disk.
+"""
+
+import os.path
+import threading
+
+import numpy as np
+import pandas as pd
+
+from scrapenhl2.manipulate import manipulate as manip
+from scrapenhl2.scrape import general_helpers as helpers
+from scrapenhl2.scrape import schedules
+
+
+def get_5v5_log(startdate, enddate, players=None, team=None):
+    """
+    Returns 5v5 player log rows for games in this date range, optionally for given players and/or team, sorted by date.
+
+    :param startdate: str, YYYY-MM-DD, inclusive
+    :param enddate: str, YYYY-MM-DD, inclusive
+    :param players: None, or int or list of int, player IDs
+    :param team: None, or int, team ID
+
+    :return: dataframe with the log's columns plus Season
+    :raises ValueError: if any of players is None or NaN
+    """
+    startday, endday = _to_days([startdate, enddate])
+    seasons = range(helpers.infer_season_from_date(startdate), helpers.infer_season_from_date(enddate) + 1)
+    index = _refresh(seasons)
+
+    if players is not None:
+        if helpers.check_number(players):
+            players = [players]
+        if any(pd.isnull(pid) for pid in players):
+            raise ValueError('Player IDs must not be missing; resolve names first (see players.player_as_id)')
+        positions = [_range_positions(index['player_keys'], pid, startday, endday) for pid in players]
+        positions = np.concatenate(positions) if len(positions) > 0 else np.array([], dtype=np.int64)
+        if team is not None:
+            positions = positions[index['team'][positions] == team]
+    elif team is not None:
+        positions = index['team_order'][_range_positions(index['team_keys'], team, startday, endday)]
+    else:
+        lo, hi = np.searchsorted(index['day_sorted'], [startday, endday + 1], side='left')
+        positions = index['day_order'][lo:hi]
+
+    # Sort by date (when games are rescheduled, game IDs are not in order)
+    positions = positions[np.argsort(index['day'][positions], kind='mergesort')]
+    return index['df'].iloc[positions].drop('_Day', axis=1).reset_index(drop=True)
+
+
+def clear_5v5_log_store():
+    """
+    Drops all seasons from the store.
+
+    :return: nothing
+    """
+    global _INDEX
+    with _LOCK:
+        _SEASONS.clear()
+        _INDEX = None
+
+
+def _refresh(seasons):
+    """
+    Makes sure these seasons are loaded and current, rereading changed log files, and returns the index.
+
+    :param seasons: iterable of int
+
+    :return: dict, see _build_index
+    """
+    global _INDEX
+    with _LOCK:
+        changed = False
+        for season in seasons:
+            fname = manip.get_5v5_player_log_filename(season)
+            mtime = os.path.getmtime(fname) if os.path.exists(fname) else None
+            if season in _SEASONS and mtime is not None and _SEASONS[season][0] == mtime:
+                continue
+            df = _load_season(season)
+            _SEASONS[season] = (os.path.getmtime(fname), df)
+            changed = True
+        if changed or _INDEX is None:
+            _INDEX = _build_index([df for _, df in _SEASONS.values()])
+        return _INDEX
+
+
+def _load_season(season):
+    """
+    Reads a season's 5v5 player log (creating it if need be) and attaches game dates as day numbers.
+
+    :param season: int, the season
+
+    :return: dataframe with extra columns Season and _Day
+    """
+    log = manip.get_5v5_player_log(season)
+    dates = schedules.get_season_schedule(season)[['Game', 'Date']]
+    log = log.merge(dates, how='inner', on='Game').dropna(subset=['Date'])
+    log = log.assign(_Day=_to_days(log.Date), Season=season).drop('Date', axis=1)
+    return log
+
+
+def _build_index(dflst):
+    """
+    Combines season logs and builds sorted indexes.
+
+    :param dflst: list of dataframes, from _load_season
+
+    :return: dict with the combined dataframe (sorted by PlayerID, then date) and arrays for searching
+    """
+    if len(dflst) == 0:
+        df = pd.DataFrame({'PlayerID': [], 'TeamID': [], '_Day': []})
+    else:
+        df = pd.concat(dflst, ignore_index=True)
+    df = df.sort_values(['PlayerID', '_Day'], kind='mergesort').reset_index(drop=True)
+
+    day = df._Day.values.astype(np.int64)
+    team = df.TeamID.values.astype(np.int64)
+    team_keys = _make_keys(team, day)
+    team_order = np.argsort(team_keys, kind='mergesort')
+    day_order = np.argsort(day, kind='mergesort')
+
+    return {'df': df,
+            'day': day,
+            'team': team,
+            'player_keys': _make_keys(df.PlayerID.values.astype(np.int64), day),
+            'team_order': team_order,
+            'team_keys': team_keys[team_order],
+            'day_order': day_order,
+            'day_sorted': day[day_order]}
+
+
+def _range_positions(keys, keyid, startday, endday):
+    """
+    Binary searches sorted composite keys for one ID between two days.
+
+    :param keys: sorted array of int64, from _make_keys
+    :param keyid: int, player or team ID
+    :param startday: int, inclusive
+    :param endday: int, inclusive
+
+    :return: array of positions in keys
+    """
+    lo, hi = np.searchsorted(keys, _make_keys(np.array([keyid, keyid], dtype=np.int64),
+                                              np.array([startday, endday + 1], dtype=np.int64)), side='left')
+    return np.arange(lo, hi)
+
+
+def _make_keys(ids, days):
+    """
+    Combines IDs and day numbers into one sortable int64 key: ID in the high bits, day in the low 32.
+
+    :param ids: array of int64
+    :param days: array of int64, days since 1970
+
+    :return: array of int64
+    """
+    return (ids << 32) | days
+
+
+def _to_days(dates):
+    """
+    Converts dates to days since 1970.
+
+    :param dates: iterable of str, YYYY-MM-DD
+
+    :return: array of int64
+    """
+    return pd.to_datetime(pd.Series(list(dates))).values.astype('datetime64[D]').astype(np.int64)
+
+
+_LOCK = threading.RLock()
+_SEASONS = {}
+_INDEX = None
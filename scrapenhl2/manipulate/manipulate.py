@@ -1,13 +1,17 @@
+import collections
 import functools
+import itertools
 import os
 import os.path
 import os.path
 
 import feather
+import numpy as np
 import pandas as pd
 
 from scrapenhl2.scrape import general_helpers as helpers
 from scrapenhl2.scrape import organization, schedules, teams, parse_pbp, parse_toi, players, events, team_info, scrape_pbp
+from scrapenhl2.scrape import instrumentation, profiling
 
 
 def get_player_toion_toioff_filename(season):
@@ -29,14 +33,18 @@ def save_player_toion_toioff_file(df, season):
     df.to_csv(get_player_toion_toioff_filename(season), index=False)
 
 
-def get_player_toion_toioff_file(season, force_create=False):
+def get_player_toion_toioff_file(season, force_create=False, incremental=False):
     """
 
     :param season: int, the season
     :param force_create: bool, should this be read from file if possible, or created from scratch
+    :param incremental: bool, if True, adds newly final games to the stored per-game contributions and rewrites the
+        file from those instead of regenerating the whole season. See update_player_toion_toioff_file.
     :return:
     """
     fname = get_player_toion_toioff_filename(season)
+    if incremental:
+        return update_player_toion_toioff_file(season)
     if os.path.exists(fname) and not force_create:
         return pd.read_csv(fname)
     else:
@@ -372,16 +380,19 @@ def _teams_to_read(**kwargs):
     return teamlst
 
 
-def get_5v5_player_game_toi(season, team):
+def get_5v5_player_game_toi(season, team, games=None):
     """
     Gets TOION and TOIOFF by game and player for given team in given season.
     :param season: int, the season
     :param team: int, team id
+    :param games: None, or iterable of games to restrict to
     :return: df with game, player, TOION, and TOIOFF
     """
     fives = teams.get_team_toi(season, team) \
         .query('TeamStrength == "5" & OppStrength == "5"') \
         .filter(items=['Game', 'Time', 'Team1', 'Team2', 'Team3', 'Team4', 'Team5'])
+    if games is not None:
+        fives = fives[fives.Game.isin(games)]
 
     # Get TOI by game. This is to get TOIOFF
     time_by_game = fives[['Game', 'Time']].groupby('Game').count().reset_index().rename(columns={'Time': 'TeamTOI'})
@@ -393,12 +404,10 @@ def get_5v5_player_game_toi(season, team):
                                      var_name='Team', value_name='Player') \
         .drop('Team', axis=1)
 
-    fives_long = merge_onto_all_team_games_and_zero_fill(fives_long, season, team)
-
     # Now, by player. First at a game level to get TOIOFF
-    # Need to drop rows with Time = 1 because merge_onto_all_team_games will introduce rows where the player missed
-    # games, so they'll have count Time = 1.
-    toi_by_player = fives_long.groupby(['Player', 'Game'], as_index=False).count() \
+    # There's no need to fill in games players missed (merge_onto_all_team_games_and_zero_fill) only to drop them
+    # again, so just count seconds. Player-games with a single second have always been left out, so keep doing that.
+    toi_by_player = fives_long.dropna().groupby(['Player', 'Game'], as_index=False).count() \
         .query('Time > 1') \
         .rename(columns={'Time': 'TOION'}) \
         .merge(time_by_game, how='left', on='Game')
@@ -437,13 +446,137 @@ def generate_player_toion_toioff(season):
             team_by_team.append(toi_indiv)
 
     toi60 = pd.concat(team_by_team)
-    toi60 = toi60.groupby('PlayerID').sum().reset_index()
+    return _toi60_from_player_toi(toi60)
+
+
+def _toi60_from_player_toi(df):
+    """
+    Sums TOION and TOIOFF by player and calculates TOI% and TOI60.
+
+    :param df: dataframe with columns PlayerID, TOION, and TOIOFF (and perhaps others, like Game)
+
+    :return: df with columns PlayerID, TOION, TOIOFF, TOI%, and TOI60
+    """
+    toi60 = df[['PlayerID', 'TOION', 'TOIOFF']].groupby('PlayerID').sum().reset_index()
     toi60.loc[:, 'TOI%'] = toi60.TOION / (toi60.TOION + toi60.TOIOFF)
     toi60.loc[:, 'TOI60'] = toi60['TOI%'] * 60
 
     return toi60
 
 
+def get_player_game_toi_filename(season):
+    """
+    Returns the filename of the per-game TOION/TOIOFF contributions used to update TOI60 incrementally.
+
+    :param season: int, the season
+
+    :return: str, /scrape/data/other/[season]_player_game_toi60.feather
+    """
+    return os.path.join(organization.get_other_data_folder(), '{0:d}_player_game_toi60.feather'.format(season))
+
+
+def get_player_game_toi_file(season):
+    """
+    Returns the per-game TOION/TOIOFF contributions, or an empty dataframe if they have not been generated.
+
+    :param season: int, the season
+
+    :return: df with columns Game, PlayerID, Team, TOION, TOIOFF, and TeamTOI
+    """
+    fname = get_player_game_toi_filename(season)
+    if os.path.exists(fname):
+        return feather.read_dataframe(fname)
+    return pd.DataFrame({'Game': [], 'PlayerID': [], 'Team': [], 'TOION': [], 'TOIOFF': [], 'TeamTOI': []})
+
+
+def save_player_game_toi_file(df, season):
+    """
+    Saves the per-game TOION/TOIOFF contributions.
+
+    :param df: dataframe
+    :param season: int, the season
+
+    :return: nothing
+    """
+    feather.write_dataframe(df.reset_index(drop=True), get_player_game_toi_filename(season))
+
+
+def get_team_games_not_in(season, done, logs=('toi',)):
+    """
+    Finds final regular season and playoff games that are in the team logs but not yet in done.
+
+    Games must be in the team logs (not just final in the schedule), so a game marked final before its team log rows
+    were written is picked up once they are, rather than being counted as done with no data.
+
+    :param season: int, the season
+    :param done: dataframe with columns Game and Team, the team-games already in the output. Use an empty dataframe
+        if nothing has been done yet.
+    :param logs: iterable of 'pbp' and/or 'toi', the team logs a game must be in
+
+    :return: dict of team ID to sorted list of games
+    """
+    sch = schedules.get_season_schedule(season).query('Status == "Final"')
+    sch = sch[(sch.Game >= 20001) & (sch.Game <= 30417)]
+    teamgames = pd.concat([sch[['Game', 'Home']].rename(columns={'Home': 'Team'}),
+                           sch[['Game', 'Road']].rename(columns={'Road': 'Team'})])
+    inlogs = []
+    for team in teamgames.Team.unique():
+        games = None
+        for log in logs:
+            loggames = set(teams.get_team_log_games(season, team, log))
+            games = loggames if games is None else games & loggames
+        inlogs.append(pd.DataFrame({'Game': sorted(games), 'Team': team}))
+    if len(inlogs) > 0:
+        inlogs = pd.concat(inlogs, ignore_index=True).astype(teamgames.Game.dtype)
+        teamgames = teamgames.merge(inlogs, how='inner', on=['Game', 'Team'])
+    if len(done) > 0:
+        done = done[['Game', 'Team']].drop_duplicates()
+        done.loc[:, 'Game'] = done.Game.astype(teamgames.Game.dtype)
+        done.loc[:, 'Team'] = done.Team.astype(teamgames.Team.dtype)
+        teamgames = helpers.anti_join(teamgames, done, on=['Game', 'Team'])
+
+    return {team: sorted(grp.Game.unique()) for team, grp in teamgames.groupby('Team')}
+
+
+def update_player_toion_toioff_file(season):
+    """
+    Updates the TOI60 file incrementally. Per-game TOION and TOIOFF are stored in a separate file
+    (see get_player_game_toi_filename); this method computes them for final games not yet included, for only the
+    teams involved, then sums by player to rewrite the TOI60 file. Time taken is proportional to the number of new
+    games, not the season to date. If there are no new games and the TOI60 file exists, it is not rewritten, so its
+    modification time only changes when its contents do.
+
+    The first time this runs for a season, it reads all team logs (same as generate_player_toion_toioff).
+
+    :param season: int, the season
+
+    :return: df with columns PlayerID, TOION, TOIOFF, TOI%, and TOI60
+    """
+    contributions = get_player_game_toi_file(season)
+    new_games = get_team_games_not_in(season, contributions)
+
+    to_concat = [contributions]
+    for team, games in new_games.items():
+        if not os.path.exists(teams.get_team_toi_filename(season, team)):
+            continue
+        temp = get_5v5_player_game_toi(season, team, games)
+        if len(temp) > 0:
+            to_concat.append(temp[['Game', 'PlayerID', 'TOION', 'TOIOFF', 'TeamTOI']].assign(Team=team))
+
+    changed = len(to_concat) > 1
+    if changed:
+        print('Adding TOI60 for {0:d} team-games in {1:d}'.format(sum(len(x) for x in new_games.values()), season))
+        contributions = pd.concat(to_concat, ignore_index=True)
+        for col in ['Game', 'PlayerID', 'Team', 'TeamTOI']:
+            contributions.loc[:, col] = pd.to_numeric(contributions[col])
+        save_player_game_toi_file(contributions, season)
+
+    toi60 = _toi60_from_player_toi(contributions)
+    if changed or not os.path.exists(get_player_toion_toioff_filename(season)):
+        save_player_toion_toioff_file(toi60, season)
+    return toi60
+
+
 def get_player_positions():
     """
     Use to get player positions
@@ -453,15 +586,20 @@ def get_player_positions():
     return players.get_player_ids_file()[['ID', 'Pos']]
 
 
-def get_toicomp_file(season, force_create=False):
+def get_toicomp_file(season, force_create=False, incremental=False, tolerance=0):
     """
     If you want to rewrite the TOI60 file, too, then run get_player_toion_toioff_file with force_create=True before
     running this method.
     :param season: int, the season
     :param force_create: bool, should this be read from file if possible, or created from scratch
+    :param incremental: bool, if True, updates the TOI60 and TOICOMP files for newly final games only. See
+        update_toicomp_file.
+    :param tolerance: float, TOI60 staleness tolerance (minutes) for incremental updates
     :return:
     """
 
+    if incremental:
+        return update_toicomp_file(season, tolerance)
     fname = get_toicomp_filename(season)
     if os.path.exists(fname) and not force_create:
         return pd.read_csv(fname)
@@ -498,7 +636,7 @@ def generate_toicomp(season):
     """
 
     team_by_team = []
-    allteams = team_info.get_teams_in_season(season)
+    allteams = schedules.get_teams_in_season(season)
     for i, team in enumerate(allteams):
         if os.path.exists(teams.get_team_toi_filename(season, team)):
             print('Generating TOICOMP for {0:d} {1:s} ({2:d}/{3:d})'.format(
@@ -512,14 +650,133 @@ def generate_toicomp(season):
     return df
 
 
-def get_5v5_player_log(season, force_create=False):
+def get_toicomp_pairs_filename(season):
+    """
+    Returns the filename of the seconds-faced pairs used to update TOICOMP incrementally.
+
+    :param season: int, the season
+
+    :return: str, /scrape/data/other/[season]_toicomp_pairs.feather
+    """
+    return os.path.join(organization.get_other_data_folder(), '{0:d}_toicomp_pairs.feather'.format(season))
+
+
+def get_toicomp_basis_filename(season):
+    """
+    Returns the filename of the TOI60 values last used to calculate TOICOMP for each player.
+
+    :param season: int, the season
+
+    :return: str, /scrape/data/other/[season]_toicomp_basis.csv
+    """
+    return os.path.join(organization.get_other_data_folder(), '{0:d}_toicomp_basis.csv'.format(season))
+
+
+def update_toicomp_file(season, tolerance=0):
+    """
+    Updates TOI60 and TOICOMP incrementally.
+
+    Seconds faced by each teammate and opponent pair are stored by game (see get_toicomp_pairs_filename), as are the
+    TOI60 values last used for each player (see get_toicomp_basis_filename). This method:
+
+    - Updates TOI60 with update_player_toion_toioff_file
+    - Adds pairs for newly final games, reading only the team logs involved
+    - Recalculates QoC and QoT sums for new games, and for player-games where a teammate or opponent's TOI60 has
+      moved by more than tolerance since it was last used
+
+    :param season: int, the season
+    :param tolerance: float, in minutes. TOI60 changes at or below this are not propagated. Use 0 for exact results.
+
+    :return: df, same format as generate_toicomp
+    """
+    toi60 = update_player_toion_toioff_file(season)
+
+    # Add pairs for new games
+    pairsfile = get_toicomp_pairs_filename(season)
+    if os.path.exists(pairsfile):
+        pairs = feather.read_dataframe(pairsfile)
+    else:
+        pairs = pd.DataFrame({'Game': [], 'Team': [], 'TeamPlayerID': [], 'OppPlayerID': [], 'Secs': [],
+                              'Suffix': []})
+    new_games = get_team_games_not_in(season, pairs)
+
+    to_concat = [pairs]
+    for team, games in new_games.items():
+        if not os.path.exists(teams.get_team_toi_filename(season, team)):
+            continue
+        toidf = _get_5v5_toi_for_toicomp(season, team, games)
+        if len(toidf) > 0:
+            qc1, qt1 = _get_toicomp_pairs(toidf)
+            to_concat.append(qc1.assign(Team=team, Suffix='Comp'))
+            to_concat.append(qt1.assign(Team=team, Suffix='Team'))
+    newpairs = pd.concat(to_concat[1:], ignore_index=True) if len(to_concat) > 1 else None
+    if newpairs is not None:
+        pairs = pd.concat([pairs, newpairs], ignore_index=True)
+        for col in ['Game', 'Team', 'TeamPlayerID', 'OppPlayerID', 'Secs']:
+            pairs.loc[:, col] = pd.to_numeric(pairs[col])
+        feather.write_dataframe(pairs, pairsfile)
+
+    # Find players whose TOI60 moved by more than tolerance since last used
+    basisfile = get_toicomp_basis_filename(season)
+    if os.path.exists(basisfile):
+        basis = pd.read_csv(basisfile)
+    else:
+        basis = pd.DataFrame({'PlayerID': [], 'TOI60': []})
+    moved = toi60[['PlayerID', 'TOI60']] \
+        .merge(basis.rename(columns={'TOI60': 'OldTOI60'}), how='left', on='PlayerID')
+    moved = moved[(moved.TOI60 - moved.OldTOI60).abs().fillna(tolerance + 1) > tolerance]
+
+    # Player-games to recalculate: new games, plus those with a moved teammate or opponent
+    affected = pairs[pairs.OppPlayerID.isin(moved.PlayerID)][['Game', 'TeamPlayerID']]
+    if newpairs is not None:
+        affected = pd.concat([affected, newpairs[['Game', 'TeamPlayerID']]])
+    affected = affected.drop_duplicates()
+
+    fname = get_toicomp_filename(season)
+    if os.path.exists(fname):
+        toicomp = pd.read_csv(fname)
+    else:
+        toicomp = None
+
+    if len(affected) > 0 or toicomp is None:
+        print('Updating TOICOMP for {0:d} player-games in {1:d}'.format(len(affected), season))
+        topairs = pairs.merge(affected, how='inner', on=['Game', 'TeamPlayerID'])
+        qc2 = _merge_toi60_position_calculate_sums(topairs.query('Suffix == "Comp"').drop({'Team', 'Suffix'}, axis=1),
+                                                   season, 'Comp', toi60)
+        qt2 = _merge_toi60_position_calculate_sums(topairs.query('Suffix == "Team"').drop({'Team', 'Suffix'}, axis=1),
+                                                   season, 'Team', toi60)
+        recalculated = qc2.merge(qt2, how='inner', on=['Game', 'TeamPlayerID']) \
+            .merge(topairs[['Game', 'TeamPlayerID', 'Team']].drop_duplicates(), how='left',
+                   on=['Game', 'TeamPlayerID']) \
+            .rename(columns={'TeamPlayerID': 'PlayerID'})
+
+        if toicomp is not None:
+            toicomp = helpers.anti_join(toicomp, recalculated[['Game', 'PlayerID']], on=['Game', 'PlayerID'])
+            toicomp = pd.concat([toicomp, recalculated], ignore_index=True)
+        else:
+            toicomp = recalculated
+        save_toicomp_file(toicomp, season)
+
+        # Update basis only for players who moved, so small changes accumulate until they pass tolerance
+        basis = pd.concat([helpers.anti_join(basis, moved[['PlayerID']], on='PlayerID'), moved[['PlayerID', 'TOI60']]],
+                          ignore_index=True)
+        basis.to_csv(basisfile, index=False)
+
+    return toicomp
+
+
+def get_5v5_player_log(season, force_create=False, update=False):
     """
 
     :param season: int, the season
     :param force_create: bool, create from scratch even if it exists?
+    :param update: bool, add newly final games to the existing log instead of recreating it. See
+        update_5v5_player_log.
     :return:
     """
     fname = get_5v5_player_log_filename(season)
+    if update and not force_create:
+        return update_5v5_player_log(season)
     if os.path.exists(fname) and not force_create:
         return feather.read_dataframe(fname)
     else:
@@ -537,13 +794,21 @@ def get_5v5_player_log_filename(season):
     return os.path.join(organization.get_other_data_folder(), '{0:d}_player_5v5_log.feather'.format(season))
 
 
+@instrumentation.instrument('manipulate.write_player_log')
 def save_5v5_player_log(df, season):
     """
+    Saves the log, and the manifest of team-games it includes (see get_5v5_player_log_manifest_filename). Also updates
+    the per-player cumulative sums, if enabled (see player_cumsums).
 
     :param season: int, the season
     :return: nothing
     """
-    return feather.write_dataframe(df, get_5v5_player_log_filename(season))
+    feather.write_dataframe(df, get_5v5_player_log_filename(season))
+    instrumentation.add_file_written(get_5v5_player_log_filename(season))
+    save_5v5_player_log_manifest(df[['Game', 'TeamID']].rename(columns={'TeamID': 'Team'}), season)
+
+    from scrapenhl2.manipulate import player_cumsums
+    player_cumsums.update_player_cumsums_after_log_save(df, season)
 
 
 def filter_for_team(pbp, team):
@@ -571,8 +836,31 @@ def count_by_keys(df, *args):
     return df[args].dropna().assign(Count=1).groupby(args).count().reset_index()
 
 
-def get_5v5_player_game_boxcars(season, team):
-    df = teams.get_team_pbp(season, team)
+def _restrict_to_games(df, games):
+    """
+    Filters dataframe for rows where Game is in games.
+
+    :param df: dataframe with column Game
+    :param games: None, or iterable of games. If None, returns df as is.
+
+    :return: dataframe
+    """
+    if games is None:
+        return df
+    return df[df.Game.isin(games)]
+
+
+def get_5v5_player_game_boxcars(season, team, games=None):
+    """
+    Gets iG, iA1, iA2, iSOG, iFF, and iCF by game for given team in given season.
+
+    :param season: int, the season
+    :param team: int, team id
+    :param games: None, or iterable of games to restrict to
+
+    :return: df with game, player, and individual counts
+    """
+    df = _restrict_to_games(teams.get_team_pbp(season, team), games)
     fives = filter_for_five_on_five(df)
     fives = filter_for_team(fives, team)
 
@@ -617,7 +905,7 @@ def get_5v5_player_game_boxcars(season, team):
         .merge(iff, how='outer', on=['Game', 'PlayerID']) \
         .merge(icf, how='outer', on=['Game', 'PlayerID'])
 
-    boxcars = merge_onto_all_team_games_and_zero_fill(boxcars, season, team)
+    boxcars = merge_onto_all_team_games_and_zero_fill(boxcars, season, team, games)
 
     for col in boxcars.columns:
         boxcars.loc[:, col] = boxcars[col].fillna(0)
@@ -625,15 +913,21 @@ def get_5v5_player_game_boxcars(season, team):
     return boxcars
 
 
-def get_5v5_player_game_toicomp(season, team):
+def _get_5v5_toi_for_toicomp(season, team, games=None):
     """
-    Calculates data for QoT and QoC at a player-game level for given team in given season.
+    A helper method for get_5v5_player_game_toicomp. Reads the team TOI log and filters to 5v5, keeping only Game and
+    the skater columns.
+
     :param season: int, the season
     :param team: int, team id
-    :return: df with game, player,
-    """
+    :param games: None, or iterable of games to restrict to
 
-    toidf = teams.get_team_toi(season, team).drop_duplicates()
+    :return: dataframe with columns Game, Team1-Team5, and Opp1-Opp5
+    """
+    toidf = teams.get_team_toi(season, team)
+    if games is not None:
+        toidf = toidf[toidf.Game.isin(games)]
+    toidf = toidf.drop_duplicates()
     toidf.loc[:, 'TeamStrength'] = toidf.TeamStrength.astype(str)
     toidf.loc[:, 'OppStrength'] = toidf.OppStrength.astype(str)
     # Filter to 5v5
@@ -641,17 +935,38 @@ def get_5v5_player_game_toicomp(season, team):
         .drop({'FocusTeam', 'TeamG', 'OppG', 'Team6', 'Opp6', 'TeamScore', 'OppScore',
                'Team', 'Opp', 'Time', 'TeamStrength', 'OppStrength', 'Home', 'Road'},
               axis=1, errors='ignore')
+    return toidf
 
-    if len(toidf) > 0:
-        df_for_qoc = toidf
-        df_for_qot = toidf.assign(Opp1=toidf.Team1, Opp2=toidf.Team2,
-                                  Opp3=toidf.Team3, Opp4=toidf.Team4, Opp5=toidf.Team5)
 
-        qc1 = _long_on_player_and_opp(df_for_qoc)
-        qc2 = _merge_toi60_position_calculate_sums(qc1, season, 'Comp')
+def _get_toicomp_pairs(toidf):
+    """
+    A helper method for get_5v5_player_game_toicomp. Gets seconds faced by each pair of opponents (for QoC) and
+    teammates (for QoT).
 
-        qt1 = _long_on_player_and_opp(df_for_qot)
-        qt2 = _merge_toi60_position_calculate_sums(qt1, season, 'Team')
+    :param toidf: dataframe from _get_5v5_toi_for_toicomp
+
+    :return: (qoc pairs, qot pairs), each a dataframe with columns Game, TeamPlayerID, OppPlayerID, and Secs
+    """
+    df_for_qot = toidf.assign(Opp1=toidf.Team1, Opp2=toidf.Team2,
+                              Opp3=toidf.Team3, Opp4=toidf.Team4, Opp5=toidf.Team5)
+    return _long_on_player_and_opp(toidf), _long_on_player_and_opp(df_for_qot)
+
+
+def get_5v5_player_game_toicomp(season, team):
+    """
+    Calculates data for QoT and QoC at a player-game level for given team in given season.
+    :param season: int, the season
+    :param team: int, team id
+    :return: df with game, player,
+    """
+
+    toidf = _get_5v5_toi_for_toicomp(season, team)
+
+    if len(toidf) > 0:
+        toi60df = get_player_toion_toioff_file(season)
+        posdf = get_player_positions()
+        qc2 = _get_toicomp_sums_from_toi(toidf, toi60df, posdf, 'Comp')
+        qt2 = _get_toicomp_sums_from_toi(toidf, toi60df, posdf, 'Team')
 
         qct = qc2.merge(qt2, how='inner', on=['Game', 'TeamPlayerID'])
         qct.loc[:, 'Team'] = team
@@ -661,69 +976,144 @@ def get_5v5_player_game_toicomp(season, team):
         return None
 
 
+def _get_toicomp_sums_from_toi(toidf, toi60df, posdf, suffix='Comp'):
+    """
+    A helper method for get_5v5_player_game_toicomp. Calculates QoC or QoT sums straight from the 5v5 TOI log, without
+    going through pairs of players (see _long_on_player_and_opp): for each second, the TOI60s of opposing (or other
+    team) forwards and defensemen are summed, and those sums are credited to each team player on ice.
+
+    Gives the same results as _merge_toi60_position_calculate_sums on _long_on_player_and_opp.
+
+    :param toidf: dataframe from _get_5v5_toi_for_toicomp
+    :param toi60df: dataframe with columns PlayerID and TOI60
+    :param posdf: dataframe with columns ID and Pos
+    :param suffix: use 'Comp' for QoC and 'Team' for QoT
+
+    :return: a dataframe with QoC or QoT sums by player and game
+    """
+    team = toidf[['Team1', 'Team2', 'Team3', 'Team4', 'Team5']].values
+    if suffix == 'Team':
+        opp = team.astype(float)
+    else:
+        opp = toidf[['Opp1', 'Opp2', 'Opp3', 'Opp4', 'Opp5']].values.astype(float)
+
+    toi60, isd, present = _gather_toi60_and_position(opp, toi60df, posdf)
+    isf = present & ~isd
+    isd = present & isd
+
+    # Sums over the five players on ice each second
+    fsum = (toi60 * isf).sum(axis=1)[:, np.newaxis]
+    fn = isf.sum(axis=1)[:, np.newaxis]
+    dsum = (toi60 * isd).sum(axis=1)[:, np.newaxis]
+    dn = isd.sum(axis=1)[:, np.newaxis]
+
+    if suffix == 'Team':
+        # Take out each player's own contribution
+        fsum = fsum - toi60 * isf
+        fn = fn - isf
+        dsum = dsum - toi60 * isd
+        dn = dn - isd
+    else:
+        fsum, fn, dsum, dn = [np.repeat(x, 5, axis=1) for x in (fsum, fn, dsum, dn)]
+
+    return _toicomp_sums_by_player_game(np.repeat(toidf.Game.values, 5), team.ravel(), fsum.ravel(), fn.ravel(),
+                                        dsum.ravel(), dn.ravel(), suffix)
+
+
 def _long_on_player_and_opp(df):
     """
     A helper method for get_5v5_player_game_toicomp. Goes from standard format (which has one row per second) to
     long format (one row per player1-player2 pair)
     :param df: dataframe with game and players
-    :return: dataframe, melted
-    """
-
-    # Melt opponents down. Group by Game, TeamPlayers, and Opponent, and take counts
-    # Then melt by team players. Group by game, team player, and opp player, and sum counts
-    df2 = helpers.melt_helper(df, id_vars=['Game', 'Team1', 'Team2', 'Team3', 'Team4', 'Team5'],
-                              value_vars=['Opp1', 'Opp2', 'Opp3', 'Opp4', 'Opp5'],
-                              var_name='OppNum', value_name='OppPlayerID').drop('OppNum', axis=1).assign(Secs=1)
-    df2 = df2.groupby(['Game', 'OppPlayerID', 'Team1',
-                       'Team2', 'Team3', 'Team4', 'Team5']).sum().reset_index()
-    df2 = helpers.melt_helper(df2, id_vars=['Game', 'OppPlayerID', 'Secs'],
-                              value_vars=['Team1', 'Team2', 'Team3', 'Team4', 'Team5'],
-                              var_name='TeamNum', value_name='TeamPlayerID').drop('TeamNum', axis=1)
+    :return: dataframe with columns Game, TeamPlayerID, OppPlayerID, and Secs
+    """
+
+    # Each second gives 25 team player-opp player pairs. Lay them out flat and count
+    team = df[['Team1', 'Team2', 'Team3', 'Team4', 'Team5']].values
+    opp = df[['Opp1', 'Opp2', 'Opp3', 'Opp4', 'Opp5']].values
+    pairs = pd.DataFrame({'Game': np.repeat(df.Game.values, 25),
+                          'TeamPlayerID': np.repeat(team, 5, axis=1).ravel(),
+                          'OppPlayerID': np.tile(opp, (1, 5)).ravel()})
     # Filter out self for team cases
-    df2 = df2.query("TeamPlayerID != OppPlayerID")
-    df2 = df2.groupby(['Game', 'TeamPlayerID', 'OppPlayerID']).sum().reset_index()
-    return df2
+    pairs = pairs[pairs.TeamPlayerID != pairs.OppPlayerID]
+    return pairs.groupby(['Game', 'TeamPlayerID', 'OppPlayerID']).size().rename('Secs').reset_index()
 
 
-def _merge_toi60_position_calculate_sums(df, season, suffix='Comp'):
+def _merge_toi60_position_calculate_sums(df, season, suffix='Comp', toi60df=None):
     """
     Merges dataframe with toi60 and positions to calculate sums for QoC or QoT by player and game.
     The reason this method doesn't calculate QoC and QoT is because you may want to sum over games.
     So it gives you the sum of TOI, and the N. Just sum over the games you want and divide TOI by N to get QoC/QoT.
 
-    Used in get_5v5_player_game_toicomp.
+    Used in update_toicomp_file.
 
     :param df: dataframe with players and times faced
     :param suffix: use 'Comp' for QoC and 'Team' for QoT
+    :param toi60df: None, or the TOI60 dataframe to use. If None, reads get_player_toion_toioff_file(season)
 
     :return: a dataframe with QoC and QoT by player and game
     """
 
-    toi60df = get_player_toion_toioff_file(season)
+    if toi60df is None:
+        toi60df = get_player_toion_toioff_file(season)
     posdf = get_player_positions()
 
-    # Attach toi60 and positions, and calculate sums
-    qoc = df.merge(toi60df, how='left', left_on='OppPlayerID', right_on='PlayerID') \
-        .merge(posdf, how='left', left_on='OppPlayerID', right_on='ID') \
-        .drop({'PlayerID', 'TOION', 'TOIOFF', 'TOI%', 'ID'}, axis=1)
-    qoc.loc[:, 'Pos2'] = qoc.Pos.apply(
-        lambda x: 'D' + suffix if x == 'D' else 'F' + suffix)  # There shouldn't be any goalies
-    qoc.loc[:, 'TOI60Sum'] = qoc.Secs * qoc.TOI60
-    qoc = qoc.drop('Pos', axis=1)
-    qoc = qoc.drop({'OppPlayerID', 'TOI60'}, axis=1) \
-        .groupby(['Game', 'TeamPlayerID', 'Pos2']).sum().reset_index()
+    secs = df.Secs.values.astype(float)
+    toi60, isd, present = _gather_toi60_and_position(df.OppPlayerID.values.astype(float), toi60df, posdf)
+    isf = (present & ~isd) * secs
+    isd = (present & isd) * secs
 
-    sums = qoc.drop('Secs', axis=1)
-    sums.loc[:, 'Pos2'] = sums.Pos2.apply(lambda x: x + 'Sum')
-    sums = sums.pivot_table(index=['Game', 'TeamPlayerID'], columns='Pos2', values='TOI60Sum').reset_index()
+    return _toicomp_sums_by_player_game(df.Game.values, df.TeamPlayerID.values, toi60 * isf, isf, toi60 * isd, isd,
+                                        suffix)
 
-    ns = qoc.drop('TOI60Sum', axis=1)
-    ns.loc[:, 'Pos2'] = ns.Pos2.apply(lambda x: x + 'N')
-    ns = ns.pivot_table(index=['Game', 'TeamPlayerID'], columns='Pos2', values='Secs').reset_index()
 
-    assert len(sums) == len(ns)
+def _gather_toi60_and_position(playerids, toi60df, posdf):
+    """
+    A helper method for QoC and QoT. Looks up TOI60 and position for an array of player IDs.
+
+    :param playerids: array of float (NaN for no player)
+    :param toi60df: dataframe with columns PlayerID and TOI60
+    :param posdf: dataframe with columns ID and Pos
+
+    :return: (TOI60, with 0 where unknown; bool array, is a defenseman; bool array, is a player), all shaped like
+        playerids
+    """
+    toi60index = pd.Index(toi60df.PlayerID.values.astype(float))
+    toi60pos = toi60index.get_indexer(playerids.ravel())
+    toi60 = np.where(toi60pos >= 0, toi60df.TOI60.values.astype(float)[toi60pos], 0)
+    toi60 = np.nan_to_num(toi60)
+
+    posdf = posdf.drop_duplicates('ID')
+    posindex = pd.Index(posdf.ID.values.astype(float))
+    pospos = posindex.get_indexer(playerids.ravel())
+    isd = np.where(pospos >= 0, posdf.Pos.values[pospos] == 'D', False)  # There shouldn't be any goalies
 
-    return sums.merge(ns, how='inner', on=['Game', 'TeamPlayerID'])
+    return toi60.reshape(playerids.shape), isd.reshape(playerids.shape), ~np.isnan(playerids)
+
+
+def _toicomp_sums_by_player_game(games, playerids, fsum, fn, dsum, dn, suffix):
+    """
+    A helper method for QoC and QoT. Sums forward and defense TOI60s and counts by game and player. Where a player
+    didn't face any forwards (or defensemen) in a game, the sum and N are NaN.
+
+    :param games: array
+    :param playerids: array
+    :param fsum: array, TOI60 sums for forwards
+    :param fn: array, counts of forwards
+    :param dsum: array, TOI60 sums for defensemen
+    :param dn: array, counts of defensemen
+    :param suffix: use 'Comp' for QoC and 'Team' for QoT
+
+    :return: dataframe with columns Game, TeamPlayerID, D[suffix]Sum, F[suffix]Sum, D[suffix]N, and F[suffix]N
+    """
+    cols = ['D' + suffix + 'Sum', 'F' + suffix + 'Sum', 'D' + suffix + 'N', 'F' + suffix + 'N']
+    df = pd.DataFrame({'Game': games, 'TeamPlayerID': playerids,
+                       cols[0]: dsum, cols[1]: fsum, cols[2]: dn, cols[3]: fn})
+    df = df.groupby(['Game', 'TeamPlayerID'])[cols].sum()
+    for pos in ('D', 'F'):
+        none = df[pos + suffix + 'N'] == 0
+        df.loc[none, [pos + suffix + 'Sum', pos + suffix + 'N']] = np.nan
+    return df.reset_index()
 
 
 def _retrieve_start_end_times(toidf):
@@ -773,12 +1163,13 @@ def _retrieve_start_end_times(toidf):
     return shifts
 
 
-def get_5v5_player_game_shift_startend(season, team):
+def get_5v5_player_game_shift_startend(season, team, games=None):
     """
     Generates shift starts and ends for shifts that start and end at 5v5--OZ, DZ, NZ, OtF.
 
     :param season: int, the season
     :param team: int or str, the team
+    :param games: None, or iterable of games to restrict to
 
     :return: dataframe with shift starts and ends
     """
@@ -786,11 +1177,12 @@ def get_5v5_player_game_shift_startend(season, team):
     team = team_info.team_as_id(team)
 
     # First, turn TOI into start and end times
-    teamtoi = teams.get_team_toi(season, team)
+    teamtoi = _restrict_to_games(teams.get_team_toi(season, team), games)
     shifts = _retrieve_start_end_times(teamtoi)
 
     # Now join faceoffs
-    teamfo = filter_for_event_types(teams.get_team_pbp(season, team), 'Faceoff')[['Game', 'Time', 'X', 'Y', 'Team']]
+    teamfo = filter_for_event_types(_restrict_to_games(teams.get_team_pbp(season, team), games), 'Faceoff')[
+        ['Game', 'Time', 'X', 'Y', 'Team']]
     teamfo.loc[:, 'StartWL'] = teamfo.Team.apply(lambda x: 'W' if x == team else 'L')
     teamfo = teamfo.drop('Team', axis=1)
 
@@ -804,7 +1196,7 @@ def get_5v5_player_game_shift_startend(season, team):
         how='left', on=['Game', 'StartTime'])
 
     # Add locations
-    directions = get_directions_for_xy_for_season(season, team)
+    directions = get_directions_for_xy_for_season(season, team, games)
     foshifts = infer_zones_for_faceoffs(foshifts, directions, 'StartX', 'StartY', 'StartTime') \
         .rename(columns={'FacLoc': 'Start'})
     foshifts.loc[:, 'Start'] = foshifts.Start.fillna('S-OtF')
@@ -836,16 +1228,17 @@ def get_5v5_player_game_shift_startend(season, team):
     return finalshifts
 
 
-def get_directions_for_xy_for_season(season, team):
+def get_directions_for_xy_for_season(season, team, games=None):
     """
     Gets directions for team specified using get_directions_for_xy_for_game
 
     :param season: int, the season
     :param team: int or str, the team
+    :param games: None, or iterable of games to restrict to
 
     :return: dataframe
     """
-    sch = schedules.get_team_schedule(season, team) \
+    sch = _restrict_to_games(schedules.get_team_schedule(season, team), games) \
         .query('Status == "Final" & Game >= 20001')[['Game', 'Home', 'Road']]
 
     lrswitch = {'left': 'right', 'right': 'left', 'N/A': 'N/A'}
@@ -1003,45 +1396,84 @@ def infer_zones_for_faceoffs(df, directions, xcol='X', ycol='Y', timecol='Time',
     return df2
 
 
-def generate_5v5_player_log(season):
+@profiling.profiled('generate_5v5_player_log')
+@instrumentation.instrument('manipulate.player_log')
+def generate_5v5_player_log(season, incremental_toicomp=False, tolerance=0):
     """
     Takes the play by play and adds player 5v5 info to the master player log file, noting TOI, CF, etc.
     This takes awhile because it has to calculate TOICOMP.
     :param season: int, the season
+    :param incremental_toicomp: bool, if True, updates TOI60 and TOICOMP incrementally (see update_toicomp_file)
+        instead of recreating them
+    :param tolerance: float, TOI60 staleness tolerance (minutes) for incremental TOICOMP
     :return: nothing
     """
     print('Generating player log for {0:d}'.format(season))
 
     to_concat = []
 
-    # Recreate TOI60 file.
-    _ = get_player_toion_toioff_file(season, force_create=True)
+    if incremental_toicomp:
+        allcomp = update_toicomp_file(season, tolerance)
+    else:
+        # Recreate TOI60 file.
+        _ = get_player_toion_toioff_file(season, force_create=True)
+        allcomp = None
 
     for team in schedules.get_teams_in_season(season):
         try:
-            goals = get_5v5_player_game_boxcars(season, team)  # G, A1, A2, SOG, iCF
-            cfca = get_5v5_player_game_cfca(season, team)  # CFON, CAON, CFOFF, CAOFF
-            gfga = get_5v5_player_game_gfga(season, team)  # GFON, GAON, GFOFF, GAOFF
-            toi = get_5v5_player_game_toi(season, team)  # TOION and TOIOFF
-            toicomp = get_5v5_player_game_toicomp(season, team)  # FQoC, F QoT, D QoC, D QoT, and respective Ns
-            shifts = get_5v5_player_game_shift_startend(season, team)  # OZ, NZ, DZ, OTF-O, OTF-D, OTF-N
-
-            temp = toi \
-                .merge(cfca, how='left', on=['PlayerID', 'Game']) \
-                .merge(gfga, how='left', on=['PlayerID', 'Game']) \
-                .merge(toicomp.drop('Team', axis=1), how='left', on=['PlayerID', 'Game']) \
-                .merge(goals, how='left', on=['PlayerID', 'Game']) \
-                .merge(shifts, how='left', on=['PlayerID', 'Game']) \
-                .assign(TeamID=team)
-
-            to_concat.append(temp)
+            to_concat.append(_generate_5v5_player_log_for_team(season, team, allcomp))
         except Exception as e:
             print('Issue with generating game-by-game for', season, team)
             print(e, e.args)
 
     print('Done generating for teams; aggregating')
 
-    df = pd.concat(to_concat)
+    df = _clean_5v5_player_log(pd.concat(to_concat))
+    print('Done generating game-by-game')
+    return df
+
+
+def _generate_5v5_player_log_for_team(season, team, allcomp=None, games=None):
+    """
+    A helper method for generate_5v5_player_log and update_5v5_player_log. Calculates player-game rows for one team.
+
+    :param season: int, the season
+    :param team: int, the team
+    :param allcomp: None, or a TOICOMP dataframe (as from get_toicomp_file) to take QoC and QoT from. If None,
+        calculates them from the team log.
+    :param games: None, or iterable of games to restrict to
+
+    :return: dataframe
+    """
+    goals = get_5v5_player_game_boxcars(season, team, games)  # G, A1, A2, SOG, iCF
+    cfca = get_5v5_player_game_cfca(season, team, games)  # CFON, CAON, CFOFF, CAOFF
+    gfga = get_5v5_player_game_gfga(season, team, games)  # GFON, GAON, GFOFF, GAOFF
+    toi = get_5v5_player_game_toi(season, team, games)  # TOION and TOIOFF
+    # FQoC, F QoT, D QoC, D QoT, and respective Ns
+    if allcomp is not None:
+        toicomp = _restrict_to_games(allcomp[allcomp.Team == team], games)
+    else:
+        toicomp = get_5v5_player_game_toicomp(season, team)
+    shifts = get_5v5_player_game_shift_startend(season, team, games)  # OZ, NZ, DZ, OTF-O, OTF-D, OTF-N
+
+    return toi \
+        .merge(cfca, how='left', on=['PlayerID', 'Game']) \
+        .merge(gfga, how='left', on=['PlayerID', 'Game']) \
+        .merge(toicomp.drop('Team', axis=1), how='left', on=['PlayerID', 'Game']) \
+        .merge(goals, how='left', on=['PlayerID', 'Game']) \
+        .merge(shifts, how='left', on=['PlayerID', 'Game']) \
+        .assign(TeamID=team)
+
+
+def _clean_5v5_player_log(df):
+    """
+    A helper method for generate_5v5_player_log and update_5v5_player_log. Converts columns to numeric, removes
+    preseason and exhibition games, and fills nulls with zeroes.
+
+    :param df: dataframe
+
+    :return: dataframe
+    """
     for col in df.columns:
         df.loc[:, col] = pd.to_numeric(df[col])
     df = df[df.Game >= 20001]  # no preseason
@@ -1050,17 +1482,148 @@ def generate_5v5_player_log(season):
         if df[col].isnull().sum() > 0:
             print('In player log, {0:s} has null values; filling with zeroes'.format(col))
             df.loc[:, col] = df[col].fillna(0)
-    print('Done generating game-by-game')
     return df
 
 
-def _get_5v5_player_game_fa(season, team, gc):
+def get_5v5_player_log_manifest_filename(season):
+    """
+    Returns the filename of the list of team-games included in the 5v5 player log.
+
+    :param season: int, the season
+
+    :return: str, /scrape/data/other/[season]_player_5v5_log_manifest.csv
+    """
+    return os.path.join(organization.get_other_data_folder(), '{0:d}_player_5v5_log_manifest.csv'.format(season))
+
+
+def get_5v5_player_log_manifest(season):
+    """
+    Returns the list of team-games included in the 5v5 player log, or an empty dataframe if there is none.
+
+    :param season: int, the season
+
+    :return: dataframe with columns Game and Team
+    """
+    fname = get_5v5_player_log_manifest_filename(season)
+    if os.path.exists(fname):
+        return pd.read_csv(fname)
+    return pd.DataFrame({'Game': [], 'Team': []})
+
+
+def save_5v5_player_log_manifest(df, season):
+    """
+    Saves the list of team-games included in the 5v5 player log.
+
+    :param df: dataframe with columns Game and Team
+    :param season: int, the season
+
+    :return: nothing
+    """
+    df[['Game', 'Team']].drop_duplicates().sort_values(['Game', 'Team']) \
+        .to_csv(get_5v5_player_log_manifest_filename(season), index=False)
+
+
+def _check_5v5_player_log_manifest(season, log, manifest):
+    """
+    A helper method for update_5v5_player_log. Checks the existing log and manifest against the schedule, and returns
+    the team-games that are fine to keep. Team-games are dropped (and so will be recalculated) when:
+
+    - The game is no longer final, or not in the schedule
+    - The team did not play in that game according to the schedule
+    - The log has rows for a team-game not in the manifest, or vice versa
+
+    :param season: int, the season
+    :param log: dataframe, the existing 5v5 player log
+    :param manifest: dataframe, the existing manifest
+
+    :return: dataframe with columns Game and Team
+    """
+    sch = schedules.get_season_schedule(season).query('Status == "Final"')
+    sch = sch[(sch.Game >= 20001) & (sch.Game <= 30417)]
+    scheduled = pd.concat([sch[['Game', 'Home']].rename(columns={'Home': 'Team'}),
+                           sch[['Game', 'Road']].rename(columns={'Road': 'Team'})]).astype(int)
+
+    manifest = manifest[['Game', 'Team']].drop_duplicates().astype(int)
+    inlog = log[['Game', 'TeamID']].drop_duplicates().rename(columns={'TeamID': 'Team'}).astype(int)
+
+    keep = manifest.merge(scheduled, how='inner', on=['Game', 'Team']) \
+        .merge(inlog, how='inner', on=['Game', 'Team'])
+
+    dropped = len(manifest) - len(keep)
+    unlisted = len(helpers.anti_join(inlog, manifest, on=['Game', 'Team']))
+    if dropped > 0:
+        print('{0:d} team-games in {1:d} 5v5 log manifest did not match schedule or log; will recalculate'.format(
+            dropped, season))
+    if unlisted > 0:
+        print('{0:d} team-games in {1:d} 5v5 log were not in manifest; will recalculate'.format(unlisted, season))
+    return keep
+
+
+@instrumentation.instrument('manipulate.update_player_log')
+def update_5v5_player_log(season, tolerance=0):
+    """
+    Updates the 5v5 player log with newly final games, rather than recalculating the whole season.
+
+    A manifest of team-games in the log is kept alongside it (see get_5v5_player_log_manifest_filename) and checked
+    against the schedule each time (see _check_5v5_player_log_manifest). Player-game rows are calculated only for
+    team-games that are final but not in the manifest, and only those teams' logs are read.
+
+    TOI60 and TOICOMP are updated incrementally too (see update_toicomp_file), and QoC and QoT columns are refreshed
+    for every row so they stay consistent with the current TOI60.
+
+    If there is no log yet, generates one for the whole season.
+
+    :param season: int, the season
+    :param tolerance: float, TOI60 staleness tolerance (minutes) for TOICOMP
+
+    :return: df, the updated log
+    """
+    fname = get_5v5_player_log_filename(season)
+    if not os.path.exists(fname):
+        df = generate_5v5_player_log(season, incremental_toicomp=True, tolerance=tolerance)
+        save_5v5_player_log(df, season)
+        return df
+
+    log = feather.read_dataframe(fname)
+    keep = _check_5v5_player_log_manifest(season, log, get_5v5_player_log_manifest(season))
+    log = log.merge(keep.rename(columns={'Team': 'TeamID'}), how='inner', on=['Game', 'TeamID'])
+
+    allcomp = update_toicomp_file(season, tolerance)
+    new_games = get_team_games_not_in(season, keep, logs=('pbp', 'toi'))
+
+    to_concat = []
+    for team, games in new_games.items():
+        if not os.path.exists(teams.get_team_toi_filename(season, team)):
+            continue
+        try:
+            temp = _generate_5v5_player_log_for_team(season, team, allcomp, games)
+            if len(temp) > 0:
+                to_concat.append(temp)
+        except Exception as e:
+            print('Issue with updating game-by-game for', season, team)
+            print(e, e.args)
+
+    if len(to_concat) > 0:
+        print('Adding {0:d} team-games to {1:d} player log'.format(sum(len(x.Game.unique()) for x in to_concat),
+                                                                   season))
+    # Refresh QoC and QoT for existing rows
+    compcols = [col for col in allcomp.columns if col not in {'Game', 'PlayerID', 'Team'}]
+    log = log.drop(compcols, axis=1, errors='ignore') \
+        .merge(allcomp.drop('Team', axis=1), how='left', on=['PlayerID', 'Game'])
+
+    df = _clean_5v5_player_log(pd.concat([log] + to_concat, ignore_index=True))
+    save_5v5_player_log(df, season)
+    return df
+
+
+def _get_5v5_player_game_fa(season, team, gc, games=None):
     """
     A helper method for get_5v5_player_game_cfca and _gfga.
 
     :param season: int, the season
     :param team: int, the team
     :param gc: use 'G' for goals and 'C' for Corsi.
+    :param games: None, or iterable of games to restrict to
 
     :return: dataframe
     """
@@ -1075,7 +1638,7 @@ def _get_5v5_player_game_fa(season, team, gc):
 
     team = team_info.team_as_id(team)
     # TODO create generate methods. Get methods check if file exists and if not, create anew (or overwrite)
-    pbp = filter_for_five_on_five(teams.get_team_pbp(season, team))
+    pbp = filter_for_five_on_five(_restrict_to_games(teams.get_team_pbp(season, team), games))
     if gc == 'G':
         pbp = filter_for_goals(pbp)
     elif gc == 'C':
@@ -1089,7 +1652,7 @@ def _get_5v5_player_game_fa(season, team, gc):
         .pivot_table(index='Game', columns='TeamEvent', values='Count').reset_index() \
         .rename(columns={metrics['F']: metrics['TeamF'], metrics['A']: metrics['TeamA']})
 
-    toi = teams.get_team_toi(season, team)
+    toi = _restrict_to_games(teams.get_team_toi(season, team), games)
     toi = toi[['Game', 'Time', 'Team1', 'Team2', 'Team3', 'Team4', 'Team5']].drop_duplicates()
     indivtotals = pbp.merge(toi, how='left', on=['Game', 'Time'])
     indivtotals = helpers.melt_helper(indivtotals[['Game', 'TeamEvent', 'Team1', 'Team2', 'Team3', 'Team4', 'Team5']],
@@ -1104,7 +1667,7 @@ def _get_5v5_player_game_fa(season, team, gc):
 
     df = indivtotals.merge(teamtotals, how='inner', on='Game')
 
-    df = merge_onto_all_team_games_and_zero_fill(df, season, team)
+    df = merge_onto_all_team_games_and_zero_fill(df, season, team, games)
 
     for col in [metrics['FON'], metrics['AON'], metrics['TeamF'], metrics['TeamA']]:
         if col not in df.columns:
@@ -1115,7 +1678,7 @@ def _get_5v5_player_game_fa(season, team, gc):
     return df
 
 
-def merge_onto_all_team_games_and_zero_fill(df, season, team):
+def merge_onto_all_team_games_and_zero_fill(df, season, team, games=None):
     """
     A method that gets all team games from this season and left joins df onto it on game, then zero fills NAs.
     Makes sure you didn't miss any games and get NAs later.
@@ -1123,11 +1686,14 @@ def merge_onto_all_team_games_and_zero_fill(df, season, team):
     :param df: dataframe with columns Game and PlayerID or Player
     :param season: int, the season
     :param team: int or str, the team
+    :param games: None, or iterable of games to restrict the team schedule to
 
     :return: dataframe
     """
     # Join onto schedule in case there were 0-0 games at 5v5
     sch = schedules.get_team_schedule(season, team)
+    if games is not None:
+        sch = sch[sch.Game.isin(games)]
     df2 = sch[['Game']].merge(df, how='left', on='Game')
     if 'Player' in df2.columns:
         df2 = convert_to_all_combos(df2, 0, 'Game', 'Player')
@@ -1142,28 +1708,30 @@ def merge_onto_all_team_games_and_zero_fill(df, season, team):
     return df2
 
 
-def get_5v5_player_game_cfca(season, team):
+def get_5v5_player_game_cfca(season, team, games=None):
     """
     Gets CFON, CAON, CFOFF, and CAOFF by game for given team in given season.
 
     :param season: int, the season
     :param team: int, team id
+    :param games: None, or iterable of games to restrict to
 
     :return: df with game, player, CFON, CAON, CFOFF, and CAOFF
     """
-    return _get_5v5_player_game_fa(season, team, 'C')
+    return _get_5v5_player_game_fa(season, team, 'C', games)
 
 
-def get_5v5_player_game_gfga(season, team):
+def get_5v5_player_game_gfga(season, team, games=None):
     """
     Gets GFON, GAON, GFOFF, and GAOFF by game for given team in given season.
 
     :param season: int, the season
     :param team: int, team id
+    :param games: None, or iterable of games to restrict to
 
     :return: df with game, player, GFON, GAON, GFOFF, and GAOFF
     """
-    return _get_5v5_player_game_fa(season, team, 'G')
+    return _get_5v5_player_game_fa(season, team, 'G', games)
 
 
 def convert_to_all_combos(df, fillval=0, *args):
@@ -1172,37 +1740,71 @@ def convert_to_all_combos(df, fillval=0, *args):
     For example, if you want df to have all combos of P1 and P2, it will create a dataframe with all possible combos,
     left join existing dataframe onto that, and return that df. Uses fillval to fill *all* non-key columns.
 
+    Each argument's unique values are numbered, and df is reindexed onto the product of those numbers
+    (pd.MultiIndex.from_product), so there are no cross joins. If df has more than one row for some combination, falls
+    back to joining df onto the full product.
+
     :param df: the pandas dataframe
     :param fillval: obj, the value with which to fill. Default fill is 0
     :param args: str, column names, or tuples of combinations of column names
 
-    :return: df with all combos of columns specified
+    :return: df with all combos of columns specified. Key columns come first, in the order given
     """
-    args = set(args)
+    args = list(collections.OrderedDict.fromkeys(args))
     if len(args) == 1:
         df.loc[:, list(args)[0]] = df[list(args)[0]].fillna(fillval)
         return df  # Nothing else to do here
 
-    dfs_with_unique = []
-    for combo in args:
-        if isinstance(combo, str):
-            tempdf = df[[combo]].drop_duplicates()
-        else:
-            tempdf = df[list(combo)].drop_duplicates()
-        dfs_with_unique.append(tempdf.assign(JoinKey=1))
+    groups = [[combo] if isinstance(combo, str) else list(combo) for combo in args]
+    key_cols = [col for cols in groups for col in cols]
+
+    # Number each group's unique values and find each row's number
+    uniques = []
+    codes = []
+    for cols in groups:
+        unique = df[cols].drop_duplicates().reset_index(drop=True)
+        uniques.append(unique)
+        codes.append(df[cols].merge(unique.assign(_Code=np.arange(len(unique))), how='left', on=cols)._Code.values)
+
+    index = pd.MultiIndex.from_arrays(codes)
+    if index.has_duplicates:
+        return _convert_to_all_combos_by_merge(df, fillval, groups)
+
+    complete_index = pd.MultiIndex.from_product([np.arange(len(unique)) for unique in uniques])
+    values = df.drop(key_cols, axis=1)
+    values.index = index
+    values = values.reindex(complete_index, fill_value=fillval).reset_index(drop=True)
+    if not pd.isnull(fillval):
+        values = values.fillna(fillval)
+
+    keys = [unique.iloc[complete_index.get_level_values(i)].reset_index(drop=True)
+            for i, unique in enumerate(uniques)]
+    return pd.concat(keys + [values], axis=1)
+
+
+def _convert_to_all_combos_by_merge(df, fillval, groups):
+    """
+    A helper method for convert_to_all_combos. Creates the product of groups' unique values with cross joins and left
+    joins df onto it. Used when df has duplicate rows for some combination.
+
+    :param df: the pandas dataframe
+    :param fillval: obj, the value with which to fill
+    :param groups: list of lists of column names
+
+    :return: df with all combos of columns specified
+    """
+    dfs_with_unique = [df[cols].drop_duplicates().assign(JoinKey=1) for cols in groups]
 
     # Now join all these dfs together
     complete_df = functools.reduce(lambda x, y: pd.merge(x, y, how='inner', on='JoinKey'), dfs_with_unique)
 
     # And left join on original
-    all_key_cols = set()
-    for i in range(len(dfs_with_unique)):
-        all_key_cols = all_key_cols.union(set(dfs_with_unique[i].columns))
-    final_df = complete_df.merge(df.assign(JoinKey=1), how='left', on=list(all_key_cols)).drop('JoinKey', axis=1)
+    key_cols = [col for cols in groups for col in cols]
+    final_df = complete_df.merge(df, how='left', on=key_cols).drop('JoinKey', axis=1)
 
     # Fill in values
     for col in final_df.columns:
-        if col not in all_key_cols:
+        if col not in key_cols:
             final_df.loc[:, col] = final_df.loc[:, col].fillna(fillval)
 
     return final_df
@@ -1222,18 +1824,83 @@ def get_player_toi(season, game, pos=None, homeroad='H'):
 
     # TODO this isn't working properly for in-progress games. Or maybe it's my scraping earlier.
 
-    toi = parse_toi.get_parsed_toi(season, game)
-    posdf = get_player_positions()
+    onice = get_5v5_players_on_ice(parse_toi.get_parsed_toi(season, game))
+    return player_toi_from_on_ice(onice, pos, homeroad)
+
+
+def get_line_combos(season, game, homeroad='H'):
+    """
+    Returns a df listing the 5v5 line combinations used in this game for specified team,
+    and time they each played together
+
+    :param season: int, the game
+    :param game: int, the season
+    :param homeroad: str, 'H' for home or 'R' for road
+
+    :return: pandas dataframe with columns PlayerID1, PlayerID2, PlayerID3, Secs. Each line appears once, with
+        PlayerID1 < PlayerID2 < PlayerID3
+    """
+
+    onice = get_5v5_players_on_ice(parse_toi.get_parsed_toi(season, game))
+    return line_combos_from_on_ice(onice, homeroad)
+
+
+def get_pairings(season, game, homeroad='H'):
+    """
+    Returns a df listing the 5v5 pairs used in this game for specified team, and time they each played together
+
+    :param season: int, the game
+    :param game: int, the season
+    :param homeroad: str, 'H' for home or 'R' for road
+
+    :return: pandas dataframe with columns PlayerID1, PlayerID2, Secs. Each pair appears once, with
+        PlayerID1 < PlayerID2
+    """
+
+    onice = get_5v5_players_on_ice(parse_toi.get_parsed_toi(season, game))
+    return pairings_from_on_ice(onice, homeroad)
+
+
+def get_5v5_players_on_ice(toi, posdf=None):
+    """
+    Melts 5v5 seconds of a parsed game TOI df into one row per player per second.
+
+    :param toi: dataframe, from parse_toi.get_parsed_toi
+    :param posdf: dataframe, from get_player_positions. Read if None
+
+    :return: dataframe with columns Time, PlayerID, Team ('H' or 'R'), Pos
+    """
+    if posdf is None:
+        posdf = get_player_positions()
 
     fives = toi[(toi.HomeStrength == "5") & (toi.RoadStrength == "5")]
-    cols_to_keep = ['Time'] + ['{0:s}{1:d}'.format(homeroad, i + 1) for i in range(5)]
-    playersonice = helpers.melt_helper(fives[cols_to_keep],
-                                       id_vars='Time', var_name='P', value_name='PlayerID') \
-        .drop('P', axis=1) \
+    dflst = []
+    for homeroad in ['H', 'R']:
+        cols_to_keep = ['Time'] + ['{0:s}{1:d}'.format(homeroad, i + 1) for i in range(5)]
+        dflst.append(helpers.melt_helper(fives[cols_to_keep], id_vars='Time', var_name='P', value_name='PlayerID')
+                     .drop('P', axis=1)
+                     .assign(Team=homeroad))
+    return pd.concat(dflst, ignore_index=True) \
+        .merge(posdf, how='left', left_on='PlayerID', right_on='ID') \
+        .drop('ID', axis=1)
+
+
+def player_toi_from_on_ice(onice, pos=None, homeroad='H'):
+    """
+    Returns a df listing 5v5 ice time for each player for specified team. See get_player_toi.
+
+    :param onice: dataframe, from get_5v5_players_on_ice
+    :param pos: specify 'L', 'C', 'R', 'D', 'F' or None for all
+    :param homeroad: str, 'H' for home or 'R' for road
+
+    :return: pandas df with columns PlayerID, Secs, Pos
+    """
+    playersonice = onice[onice.Team == homeroad]
+    posdf = playersonice[['PlayerID', 'Pos']].drop_duplicates(subset='PlayerID')
+    playersonice = playersonice[['Time', 'PlayerID']] \
         .groupby('PlayerID').count().reset_index() \
         .rename(columns={'Time': 'Secs'}) \
-        .merge(posdf, how='left', left_on='PlayerID', right_on='ID') \
-        .drop('ID', axis=1) \
+        .merge(posdf, how='left', on='PlayerID') \
         .sort_values('Secs', ascending=False)
     if pos is not None:
         if pos == 'F':
@@ -1243,65 +1910,158 @@ def get_player_toi(season, game, pos=None, homeroad='H'):
     return playersonice
 
 
-def get_line_combos(season, game, homeroad='H'):
+def line_combos_from_on_ice(onice, homeroad='H'):
     """
-    Returns a df listing the 5v5 line combinations used in this game for specified team,
-    and time they each played together
+    Returns a df listing 5v5 line combinations for specified team. See get_line_combos.
 
-    :param season: int, the game
-    :param game: int, the season
+    :param onice: dataframe, from get_5v5_players_on_ice
     :param homeroad: str, 'H' for home or 'R' for road
 
-    :return: pandas dataframe with columns P1, P2, P3, Secs. May contain duplicates
+    :return: pandas dataframe with columns PlayerID1, PlayerID2, PlayerID3, Secs. Each line appears once
     """
+    playersonice = onice[(onice.Team == homeroad) & (onice.Pos != "D")]
+    return count_player_combinations(playersonice, 3)
 
-    toi = parse_toi.get_parsed_toi(season, game)
-    pos = get_player_positions()
 
-    fives = toi[(toi.HomeStrength == "5") & (toi.RoadStrength == "5")]
-    cols_to_keep = ['Time'] + ['{0:s}{1:d}'.format(homeroad, i + 1) for i in range(5)]
-    playersonice = helpers.melt_helper(fives[cols_to_keep],
-                                       id_vars='Time', var_name='P', value_name='PlayerID') \
-        .drop('P', axis=1) \
-        .merge(pos, how='left', left_on='PlayerID', right_on='ID') \
-        .query('Pos != "D"') \
-        .drop({'Pos', 'ID'}, axis=1)
-    wide = playersonice.merge(playersonice, how='inner', on='Time', suffixes=['1', '2']) \
-        .merge(playersonice, how='inner', on='Time') \
-        .rename(columns={'PlayerID': 'PlayerID3'}) \
-        .query('PlayerID1 != PlayerID2 & PlayerID1 != PlayerID3 & PlayerID2 != PlayerID3')
-    counts = wide.groupby(['PlayerID1', 'PlayerID2', 'PlayerID3']).count().reset_index() \
-        .rename(columns={'Time': 'Secs'})
+def pairings_from_on_ice(onice, homeroad='H'):
+    """
+    Returns a df listing 5v5 pairs for specified team. See get_pairings.
+
+    :param onice: dataframe, from get_5v5_players_on_ice
+    :param homeroad: str, 'H' for home or 'R' for road
+
+    :return: pandas dataframe with columns PlayerID1, PlayerID2, Secs. Each pair appears once
+    """
+    playersonice = onice[(onice.Team == homeroad) & (onice.Pos == "D")]
+    return count_player_combinations(playersonice, 2)
+
+
+def count_player_combinations(playersonice, size, by='Time'):
+    """
+    Counts the seconds each combination of players was on ice together.
+
+    Players on ice at each second are sorted, so each combination gets one key no matter the order players are listed
+    in. If more than size players are on ice at a second (e.g. four forwards), every combination of size of them is
+    counted for that second.
+
+    :param playersonice: dataframe with columns PlayerID and those in by, one row per player per second
+    :param size: int, number of players in a combination (3 for lines, 2 for pairs)
+    :param by: str or list of str, columns identifying a second (e.g. 'Time', or ['Game', 'Time'])
+
+    :return: dataframe with columns PlayerID1, ..., PlayerID[size], Secs, sorted by Secs descending
+    """
+    if isinstance(by, str):
+        by = [by]
+    idcols = ['PlayerID{0:d}'.format(i + 1) for i in range(size)]
+
+    # Parsed TOI can have object dtype player columns, which np.unique can't sort row-wise, so make IDs int64
+    playersonice = playersonice[by + ['PlayerID']]
+    playersonice = playersonice.assign(PlayerID=pd.to_numeric(playersonice.PlayerID, errors='coerce')) \
+        .dropna() \
+        .drop_duplicates()
+    playersonice = playersonice.assign(PlayerID=playersonice.PlayerID.astype(np.int64)).sort_values(by + ['PlayerID'])
+    if len(playersonice) == 0:
+        return pd.DataFrame(columns=idcols + ['Secs'])
+
+    # One row per second, players sorted left to right. Empty slots are 0 but never end up in a combination
+    slots = playersonice.assign(Slot=playersonice.groupby(by).cumcount())
+    wide = slots.set_index(by + ['Slot']).PlayerID.unstack('Slot')
+    numonice = wide.notnull().sum(axis=1).values
+    ids = wide.fillna(0).astype(np.int64).values
+
+    keys = []
+    for cols in itertools.combinations(range(ids.shape[1]), size):
+        rows = numonice > cols[-1]
+        if rows.any():
+            keys.append(ids[rows][:, list(cols)])
+    if len(keys) == 0:
+        return pd.DataFrame(columns=idcols + ['Secs'])
+
+    combos, secs = np.unique(np.concatenate(keys), axis=0, return_counts=True)
+    counts = pd.DataFrame(combos, columns=idcols) \
+        .assign(Secs=secs) \
+        .sort_values('Secs', ascending=False) \
+        .reset_index(drop=True)
     return counts
 
 
-def get_pairings(season, game, homeroad='H'):
+def get_team_line_combos(season, team, games=None):
     """
-    Returns a df listing the 5v5 pairs used in this game for specified team, and time they each played together
+    Returns a df listing the 5v5 line combinations the team used in the season (or in specified games), and time they
+    each played together.
 
-    :param season: int, the game
-    :param game: int, the season
-    :param homeroad: str, 'H' for home or 'R' for road
+    :param season: int, the season
+    :param team: int or str, the team
+    :param games: None, or iterable of games to restrict to
 
-    :return: pandas dataframe with columns P1, P2, Secs. May contain duplicates
+    :return: pandas dataframe with columns PlayerID1, PlayerID2, PlayerID3, Secs. Each line appears once
     """
+    playersonice = _get_team_5v5_players_on_ice(season, team, games)
+    return count_player_combinations(playersonice[playersonice.Pos != "D"], 3, ['Game', 'Time'])
 
-    toi = parse_toi.get_parsed_toi(season, game)
-    pos = get_player_positions()
 
-    fives = toi[(toi.HomeStrength == "5") & (toi.RoadStrength == "5")]
-    cols_to_keep = ['Time'] + ['{0:s}{1:d}'.format(homeroad, i + 1) for i in range(5)]
-    playersonice = helpers.melt_helper(fives[cols_to_keep],
-                                       id_vars='Time', var_name='P', value_name='PlayerID') \
+def get_team_pairings(season, team, games=None):
+    """
+    Returns a df listing the 5v5 D pairs the team used in the season (or in specified games), and time they each
+    played together.
+
+    :param season: int, the season
+    :param team: int or str, the team
+    :param games: None, or iterable of games to restrict to
+
+    :return: pandas dataframe with columns PlayerID1, PlayerID2, Secs. Each pair appears once
+    """
+    playersonice = _get_team_5v5_players_on_ice(season, team, games)
+    return count_player_combinations(playersonice[playersonice.Pos == "D"], 2, ['Game', 'Time'])
+
+
+def _get_team_5v5_players_on_ice(season, team, games=None):
+    """
+    Melts the team TOI log at 5v5 into one row per player per second.
+
+    :param season: int, the season
+    :param team: int or str, the team
+    :param games: None, or iterable of games to restrict to
+
+    :return: dataframe with columns Game, Time, PlayerID, Pos
+    """
+    cols = ['Team{0:d}'.format(i + 1) for i in range(5)]
+    fives = teams.get_team_toi(season, team) \
+        .query('TeamStrength == "5" & OppStrength == "5"') \
+        .filter(items=['Game', 'Time'] + cols)
+    fives = _restrict_to_games(fives, games)
+    return helpers.melt_helper(fives, id_vars=['Game', 'Time'], value_vars=cols,
+                               var_name='P', value_name='PlayerID') \
         .drop('P', axis=1) \
-        .merge(pos, how='left', left_on='PlayerID', right_on='ID') \
-        .query('Pos == "D"') \
-        .drop({'Pos', 'ID'}, axis=1)
-    wide = playersonice.merge(playersonice, how='inner', on='Time', suffixes=['1', '2']) \
-        .query('PlayerID1 != PlayerID2')
-    counts = wide.groupby(['PlayerID1', 'PlayerID2']).count().reset_index() \
-        .rename(columns={'Time': 'Secs'})
-    return counts
+        .merge(get_player_positions(), how='left', left_on='PlayerID', right_on='ID') \
+        .drop('ID', axis=1)
+
+
+def get_most_common_lines(linecombos, pairings, numlines=4, numpairs=3):
+    """
+    Picks lines and pairs greedily: the line with the most time together, then the line with the most time together
+    that has no players already picked, and so on. Same for pairs.
+
+    :param linecombos: dataframe, from get_line_combos or get_team_line_combos
+    :param pairings: dataframe, from get_pairings or get_team_pairings
+    :param numlines: int, number of forward lines to pick
+    :param numpairs: int, number of D pairs to pick
+
+    :return: (list of lists of 3 player IDs, list of lists of 2 player IDs). Lists may be shorter than requested
+    """
+    picked = set()
+    result = []
+    for df, size, num in ((linecombos, 3, numlines), (pairings, 2, numpairs)):
+        idcols = ['PlayerID{0:d}'.format(i + 1) for i in range(size)]
+        combos = []
+        for row in df.sort_values('Secs', ascending=False)[idcols].itertuples(index=False):
+            if len(combos) >= num:
+                break
+            if not picked.intersection(row):
+                combos.append(list(row))
+                picked.update(row)
+        result.append(combos)
+    return result[0], result[1]
 
 
 def get_game_h2h_toi(season, games):
@@ -1316,40 +2076,38 @@ def get_game_h2h_toi(season, games):
     # TODO add strength arg
     if helpers.check_number(games):
         games = [games]
+    posdf = get_player_positions()
     dflst = []
     for game in games:
-        toi = parse_toi.get_parsed_toi(season, game)
-        fives = toi[(toi.HomeStrength == "5") & (toi.RoadStrength == "5")]
-        home = helpers.melt_helper(fives[['Time', 'H1', 'H2', 'H3', 'H4', 'H5']],
-                                   id_vars='Time', var_name='P', value_name='PlayerID') \
-            .drop('P', axis=1) \
-            .assign(Team='H')
-        road = helpers.melt_helper(fives[['Time', 'R1', 'R2', 'R3', 'R4', 'R5']],
-                                   id_vars='Time', var_name='P', value_name='PlayerID') \
-            .drop('P', axis=1) \
-            .assign(Team='R')
-
-        hh = home.merge(home, how='inner', on='Time', suffixes=['1', '2'])
-        hr = home.merge(road, how='inner', on='Time', suffixes=['1', '2'])
-        rh = road.merge(home, how='inner', on='Time', suffixes=['1', '2'])
-        rr = road.merge(road, how='inner', on='Time', suffixes=['1', '2'])
-
-        pairs = pd.concat([hh, hr, rh, rr]) \
-            .assign(Secs=1) \
-            .drop('Time', axis=1) \
-            .groupby(['PlayerID1', 'PlayerID2', 'Team1', 'Team2']).count().reset_index()
-
-        # One last to-do: make sure I have all possible pairs of players covered
-
-        allpairs = convert_to_all_combos(pairs, 0, ('PlayerID1', 'Team1'), ('PlayerID2', 'Team2'))
-
-        allpairs.loc[:, 'Min'] = allpairs.Secs / 60
+        onice = get_5v5_players_on_ice(parse_toi.get_parsed_toi(season, game), posdf)
+        allpairs = h2h_toi_from_on_ice(onice)
         if len(games) > 1:
             allpairs = allpairs.assign(Game=game)
         dflst.append(allpairs)
     return pd.concat(dflst)
 
 
+def h2h_toi_from_on_ice(onice):
+    """
+    Returns H2H TOI at 5v5 for one game. See get_game_h2h_toi.
+
+    :param onice: dataframe, from get_5v5_players_on_ice
+
+    :return: a df with [P1, P1Team, P2, P2Team, TOI]. Entries will be duplicated (one with given P as P1, another as P2)
+    """
+    players = onice[['Time', 'PlayerID', 'Team']]
+    pairs = players.merge(players, how='inner', on='Time', suffixes=['1', '2']) \
+        .assign(Secs=1) \
+        .drop('Time', axis=1) \
+        .groupby(['PlayerID1', 'PlayerID2', 'Team1', 'Team2']).count().reset_index()
+
+    # One last to-do: make sure I have all possible pairs of players covered
+
+    allpairs = convert_to_all_combos(pairs, 0, ('PlayerID1', 'Team1'), ('PlayerID2', 'Team2'))
+
+    allpairs.loc[:, 'Min'] = allpairs.Secs / 60
+    return allpairs
+
 
 def filter_for_event_types(pbp, eventtype):
     """
@@ -1444,56 +2202,58 @@ def get_game_h2h_corsi(season, games, cfca=None):
     if helpers.check_number(games):
         games = [games]
 
+    posdf = get_player_positions()
     dflst = []
     for game in games:
-        toi = parse_toi.get_parsed_toi(season, game)
+        onice = get_5v5_players_on_ice(parse_toi.get_parsed_toi(season, game), posdf)
         pbp = parse_pbp.get_parsed_pbp(season, game)
-        # toi.to_csv('/Users/muneebalam/Desktop/toi.csv')
-        # pbp.to_csv('/Users/muneebalam/Desktop/pbp.csv')
-        # pbp.loc[:, 'Event'] = pbp.Event.apply(lambda x: ss.convert_event(x))
-        pbp = pbp[['Time', 'Event', 'Team']] \
-            .merge(toi[['Time', 'R1', 'R2', 'R3', 'R4', 'R5', 'H1', 'H2', 'H3', 'H4', 'H5',
-                        'HomeStrength', 'RoadStrength']], how='inner', on='Time')
-        corsi = filter_for_five_on_five(filter_for_corsi(pbp)).drop(['HomeStrength', 'RoadStrength'], axis=1)
-
-        hometeam = schedules.get_home_team(season, game)
-        # Add HomeCorsi which will be 1 or -1. Need to separate out blocks because they're credited to defending team
-        # Never mind, switched block attribution at time of parsing, so we're good now
-        if cfca is None:
-            corsi.loc[:, 'HomeCorsi'] = corsi.Team.apply(lambda x: 1 if x == hometeam else -1)
-        elif cfca == 'cf':
-            corsi.loc[:, 'HomeCorsi'] = corsi.Team.apply(lambda x: 1 if x == hometeam else 0)
-        elif cfca == 'ca':
-            corsi.loc[:, 'HomeCorsi'] = corsi.Team.apply(lambda x: 0 if x == hometeam else 1)
-
-        corsipm = corsi[['Time', 'HomeCorsi']]
-
-        home = helpers.melt_helper(corsi[['Time', 'H1', 'H2', 'H3', 'H4', 'H5']],
-                                   id_vars='Time', var_name='P', value_name='PlayerID') \
-            .drop('P', axis=1) \
-            .drop_duplicates()
-        road = helpers.melt_helper(corsi[['Time', 'R1', 'R2', 'R3', 'R4', 'R5']],
-                                   id_vars='Time', var_name='P', value_name='PlayerID') \
-            .drop('P', axis=1)
-
-        hh = home.merge(home.drop_duplicates(), how='inner', on='Time', suffixes=['1', '2']).assign(Team1='H', Team2='H')
-        hr = home.merge(road.drop_duplicates(), how='inner', on='Time', suffixes=['1', '2']).assign(Team1='H', Team2='R')
-        rh = road.merge(home.drop_duplicates(), how='inner', on='Time', suffixes=['1', '2']).assign(Team1='R', Team2='H')
-        rr = road.merge(road.drop_duplicates(), how='inner', on='Time', suffixes=['1', '2']).assign(Team1='R', Team2='R')
-
-        pairs = pd.concat([hh, hr, rh, rr]) \
-            .merge(corsipm, how='inner', on='Time') \
-            .drop('Time', axis=1) \
-            .groupby(['PlayerID1', 'PlayerID2', 'Team1', 'Team2']).sum().reset_index()
-        if cfca is None:
-            pairs.loc[pairs.Team1 == 'R', 'HomeCorsi'] = pairs.loc[pairs.Team1 == 'R', 'HomeCorsi'] * -1
-        allpairs = convert_to_all_combos(pairs, 0, ('PlayerID1', 'Team1'), ('PlayerID2', 'Team2'))
+        allpairs = h2h_corsi_from_on_ice(onice, pbp, schedules.get_home_team(season, game), cfca)
         if len(games) > 1:
             allpairs = allpairs.assign(Game=game)
         dflst.append(allpairs)
     return pd.concat(dflst)
 
 
+def h2h_corsi_from_on_ice(onice, pbp, hometeam, cfca=None):
+    """
+    Returns H2H Corsi at 5v5 for one game. See get_game_h2h_corsi.
+
+    :param onice: dataframe, from get_5v5_players_on_ice
+    :param pbp: dataframe, from parse_pbp.get_parsed_pbp
+    :param hometeam: int, the home team ID
+    :param cfca: str, or None. If you specify 'cf', returns CF only. For CA, use 'ca'. None returns CF - CA.
+
+    :return: a df with [P1, P1Team, P2, P2Team, CF, CA, C+/-]. Entries will be duplicated, as with get_game_h2h_toi.
+        Each attempt counts once for every pair on ice, even when several attempts share a second (pairs with a road
+        player as P1 used to count each of n attempts in one second n times).
+    """
+    # Only keep corsi events at 5v5 seconds
+    corsi = filter_for_corsi(pbp[['Time', 'Event', 'Team']])
+    corsi = corsi[corsi.Time.isin(onice.Time)]
+
+    # Add HomeCorsi which will be 1 or -1. Need to separate out blocks because they're credited to defending team
+    # Never mind, switched block attribution at time of parsing, so we're good now
+    if cfca is None:
+        corsi = corsi.assign(HomeCorsi=corsi.Team.apply(lambda x: 1 if x == hometeam else -1))
+    elif cfca == 'cf':
+        corsi = corsi.assign(HomeCorsi=corsi.Team.apply(lambda x: 1 if x == hometeam else 0))
+    elif cfca == 'ca':
+        corsi = corsi.assign(HomeCorsi=corsi.Team.apply(lambda x: 0 if x == hometeam else 1))
+
+    corsipm = corsi[['Time', 'HomeCorsi']]
+
+    # Players on ice for each second with a corsi event; each event at that second is then counted once
+    players = onice[onice.Time.isin(corsipm.Time)][['Time', 'PlayerID', 'Team']].drop_duplicates()
+    pairs = players.merge(players, how='inner', on='Time', suffixes=['1', '2']) \
+        .merge(corsipm, how='inner', on='Time') \
+        .drop('Time', axis=1) \
+        .groupby(['PlayerID1', 'PlayerID2', 'Team1', 'Team2']).sum().reset_index()
+    if cfca is None:
+        pairs.loc[pairs.Team1 == 'R', 'HomeCorsi'] = pairs.loc[pairs.Team1 == 'R', 'HomeCorsi'] * -1
+    allpairs = convert_to_all_combos(pairs, 0, ('PlayerID1', 'Team1'), ('PlayerID2', 'Team2'))
+    return allpairs
+
+
 def time_to_mss(sectime):
     """
     Converts a number of seconds to m:ss format
@@ -0,0 +1,181 @@
+"""
+This module contains an optional materialized table of per-player cumulative sums of the 5v5 player log, so rolling
+sums over any window length and date range can be answered without reading the season logs.
+
+For each season there's a file with one row per player-game, sorted by player and date, holding the running total of
+each log column for that player in that season. A rolling sum over games i-n+1 through i is then the difference of two
+running totals. Answering a query for one player takes a binary search for the player's rows and a subtraction per
+game.
+
+Files are written by save_5v5_player_log for seasons that already have one, or for every season if the
+SCRAPENHL2_PLAYER_CUMSUMS environment variable is set to 1. Use generate_player_cumsums to create one for a season.
+"""
+
+import os
+import os.path
+import threading
+
+import feather
+import numpy as np
+import pandas as pd
+
+from scrapenhl2.manipulate import manipulate as manip
+from scrapenhl2.scrape import general_helpers as helpers
+from scrapenhl2.scrape import organization, schedules
+
+
+def get_player_rolling_sums(player, startdate, enddate, roll_len, metrics=None):
+    """
+    Returns rolling sums over roll_len games for each of the player's games in the date range, as
+    visualization_helper.make_5v5_rolling_gp would on the log filtered to that player and date range. Windows don't
+    reach back before startdate.
+
+    :param player: int, player ID
+    :param startdate: str, YYYY-MM-DD, inclusive
+    :param enddate: str, YYYY-MM-DD, inclusive
+    :param roll_len: int, number of games
+    :param metrics: list of str, log columns (e.g. ['CFON', 'CAON']), or None for all
+
+    :return: dataframe with Season, Game, TeamID, PlayerID, and [roll_len]-game [metric] columns, in date order. None if
+        some season in the range has no cumulative sums file.
+    """
+    seasons = range(helpers.infer_season_from_date(startdate), helpers.infer_season_from_date(enddate) + 1)
+    startday, endday = pd.to_datetime(pd.Series([startdate, enddate])).values.astype('datetime64[D]') \
+        .astype(np.int64)
+
+    parts = []
+    for season in seasons:
+        index = _get_season_index(season)
+        if index is None:
+            return None
+        lo, hi = np.searchsorted(index['keys'], [(int(player) << 32) | startday, (int(player) << 32) | (endday + 1)])
+        if hi > lo:
+            parts.append((index, lo, hi))
+    if len(parts) == 0:
+        return None
+
+    if metrics is None:
+        metrics = parts[0][0]['metrics']
+
+    # Stitch seasons together. Running totals restart each season, so offset each season by the totals so far
+    ids = []
+    totals = [np.zeros((1, len(metrics)))]
+    for index, lo, hi in parts:
+        rows = index['df'].iloc[lo:hi]
+        ids.append(rows[['Season', 'Game', 'TeamID', 'PlayerID']])
+        cums = rows[metrics].values.astype(float)
+        # Running total just before the first game in range, within this season
+        before = index['df'][metrics].values[lo - 1].astype(float) if lo > 0 and \
+            index['df'].PlayerID.values[lo - 1] == player else np.zeros(len(metrics))
+        totals.append(cums - before + totals[-1][-1])
+    totals = np.concatenate(totals)  # leading row of zeros, then running totals for each game in range
+
+    games = np.arange(1, len(totals))
+    starts = np.maximum(games - roll_len, 0)
+    sums = totals[games] - totals[starts]
+
+    df = pd.concat(ids, ignore_index=True)
+    rolled = pd.DataFrame(sums, columns=['{0:d}-game {1:s}'.format(roll_len, col) for col in metrics])
+    return pd.concat([df, rolled], axis=1)
+
+
+def generate_player_cumsums(season, log=None):
+    """
+    Creates and saves the cumulative sums file for this season.
+
+    :param season: int, the season
+    :param log: dataframe, the season's 5v5 player log. Read if None
+
+    :return: dataframe
+    """
+    if log is None:
+        log = manip.get_5v5_player_log(season)
+    dates = schedules.get_season_schedule(season)[['Game', 'Date']]
+    df = log.merge(dates, how='inner', on='Game') \
+        .sort_values(['PlayerID', 'Date', 'Game'], kind='mergesort') \
+        .reset_index(drop=True)
+    metrics = _get_metric_columns(df)
+
+    cums = df[['PlayerID'] + metrics].groupby('PlayerID', sort=False).cumsum()
+    df = pd.concat([df[['PlayerID', 'TeamID', 'Game', 'Date']].assign(Season=season), cums], axis=1)
+    save_player_cumsums(df, season)
+    return df
+
+
+def save_player_cumsums(df, season):
+    """
+    Saves the cumulative sums file for this season.
+
+    :param df: dataframe
+    :param season: int, the season
+
+    :return: nothing
+    """
+    feather.write_dataframe(df, get_player_cumsums_filename(season))
+
+
+def update_player_cumsums_after_log_save(log, season):
+    """
+    Regenerates the cumulative sums file if this season has one or the SCRAPENHL2_PLAYER_CUMSUMS environment variable
+    is 1. Called by manipulate.save_5v5_player_log.
+
+    :param log: dataframe, the season's 5v5 player log
+    :param season: int, the season
+
+    :return: nothing
+    """
+    if os.environ.get('SCRAPENHL2_PLAYER_CUMSUMS') == '1' or os.path.exists(get_player_cumsums_filename(season)):
+        generate_player_cumsums(season, log)
+
+
+def get_player_cumsums_filename(season):
+    """
+    Returns the cumulative sums filename.
+
+    :param season: int, the season
+
+    :return: str, /scrape/data/other/[season]_player_5v5_cumsums.feather
+    """
+    return os.path.join(organization.get_other_data_folder(), '{0:d}_player_5v5_cumsums.feather'.format(season))
+
+
+def _get_metric_columns(df):
+    """
+    Returns log columns to sum: numeric columns other than IDs.
+
+    :param df: dataframe
+
+    :return: list of str
+    """
+    to_exclude = {'Game', 'Season', 'Team', 'TeamID', 'PlayerID'}
+    return [col for col in df.select_dtypes(include=[np.number]).columns if col not in to_exclude]
+
+
+def _get_season_index(season):
+    """
+    Returns the season's cumulative sums with a sorted (PlayerID, date) key, reading the file if it changed.
+
+    :param season: int, the season
+
+    :return: dict with df, keys, and metrics; or None if there is no file
+    """
+    fname = get_player_cumsums_filename(season)
+    if not os.path.exists(fname):
+        return None
+    mtime = os.path.getmtime(fname)
+    with _LOCK:
+        if season in _INDEXES and _INDEXES[season][0] == mtime:
+            return _INDEXES[season][1]
+
+    df = feather.read_dataframe(fname)
+    days = pd.to_datetime(df.Date).values.astype('datetime64[D]').astype(np.int64)
+    index = {'df': df,
+             'keys': (df.PlayerID.values.astype(np.int64) << 32) | days,
+             'metrics': _get_metric_columns(df)}
+    with _LOCK:
+        _INDEXES[season] = (mtime, index)
+    return index
+
+
+_LOCK = threading.Lock()
+_INDEXES = {}
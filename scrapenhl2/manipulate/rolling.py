@@ -0,0 +1,104 @@
+"""
+This module contains methods for rolling sums over sorted logs (e.g. the 5v5 player log), using prefix sums.
+
+Rows must be sorted by group (e.g. PlayerID) and then by date. For each row, the window is found directly: for
+game-count windows, as the row's offset within its group minus the window length; for day windows, with a binary
+search (searchsorted) on dates. Sums are then differences of cumulative sums, so there is no per-group rolling and no
+cross join of groups with calendar days.
+
+As with pandas' rolling(window, min_periods=1).sum(), missing values are skipped, and a window with no values sums to
+NaN.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def rolling_sum_by_count(df, group_col, value_cols, window):
+    """
+    Rolling sums over the last window rows (including the current one) of each group.
+
+    :param df: dataframe, sorted by group_col and then by date
+    :param group_col: str, e.g. 'PlayerID'
+    :param value_cols: list of str, columns to sum
+    :param window: int, number of rows (e.g. games)
+
+    :return: dataframe with value_cols, same index as df
+    """
+    codes = _group_codes(df[group_col])
+    positions = np.arange(len(df))
+    starts = np.maximum(_group_start_positions(codes), positions - window + 1)
+    return _window_sums(df, value_cols, starts, positions)
+
+
+def rolling_sum_by_days(df, group_col, date_col, value_cols, days):
+    """
+    Rolling sums over each group's rows dated within the last days days (including the current row's date). E.g. with
+    days=30, a row dated Jan 31 sums rows from Jan 2 through itself.
+
+    :param df: dataframe, sorted by group_col and then by date_col
+    :param group_col: str, e.g. 'PlayerID'
+    :param date_col: str, column of dates (YYYY-MM-DD strings or datetimes)
+    :param value_cols: list of str, columns to sum
+    :param days: int, window length in days
+
+    :return: dataframe with value_cols, same index as df
+    """
+    codes = _group_codes(df[group_col])
+    dates = pd.to_datetime(df[date_col]).values.astype('datetime64[D]').astype(np.int64)
+    if len(dates) > 0:
+        dates = dates - dates.min() + days  # so dates minus window stay positive within each group
+    keys = (codes.astype(np.int64) << 32) | dates
+
+    positions = np.arange(len(df))
+    starts = np.searchsorted(keys, keys - (days - 1), side='left')
+    return _window_sums(df, value_cols, starts, positions)
+
+
+def _group_codes(groups):
+    """
+    Numbers groups 0, 1, 2, ... in order of appearance. Groups must be contiguous.
+
+    :param groups: series
+
+    :return: array of int
+    """
+    codes, _ = pd.factorize(groups)
+    return codes
+
+
+def _group_start_positions(codes):
+    """
+    For each row, the position of the first row of its group.
+
+    :param codes: array of int, from _group_codes
+
+    :return: array of int
+    """
+    is_start = np.ones(len(codes), dtype=bool)
+    is_start[1:] = codes[1:] != codes[:-1]
+    return np.maximum.accumulate(np.where(is_start, np.arange(len(codes)), 0))
+
+
+def _window_sums(df, value_cols, starts, ends):
+    """
+    Sums value_cols over rows starts[i] through ends[i] (inclusive) for each row i, skipping NaNs.
+
+    :param df: dataframe
+    :param value_cols: list of str
+    :param starts: array of int
+    :param ends: array of int
+
+    :return: dataframe with value_cols, same index as df
+    """
+    values = df[value_cols].values.astype(float)
+    present = ~np.isnan(values)
+
+    sums = np.zeros((len(values) + 1, len(value_cols)))
+    np.cumsum(np.where(present, values, 0), axis=0, out=sums[1:])
+    counts = np.zeros((len(values) + 1, len(value_cols)), dtype=np.int64)
+    np.cumsum(present, axis=0, out=counts[1:])
+
+    result = sums[ends + 1] - sums[starts]
+    result[(counts[ends + 1] - counts[starts]) == 0] = np.nan
+    return pd.DataFrame(result, index=df.index, columns=value_cols)
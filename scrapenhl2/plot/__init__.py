@@ -8,4 +8,7 @@ __all__ = ['game_h2h',
            'rolling_boxcars',
            'label_lines',
            'defense_pairs',
-           'team_score_shot_rate']
+           'team_score_shot_rate',
+           'render_cache',
+           'render_pool',
+           'batch_render']
@@ -15,8 +15,7 @@ import flask
 import scrapenhl2.scrape.schedules as schedules
 import scrapenhl2.scrape.team_info as team_info
 import scrapenhl2.scrape.organization as organization
-import scrapenhl2.plot.game_h2h as game_h2h
-import scrapenhl2.plot.game_timeline as game_timeline
+import scrapenhl2.plot.render_cache as render_cache
 
 def get_images_url():
     """Returns /static/"""
@@ -28,9 +27,12 @@ def get_game_images_url():
     return '{0:s}{1:s}'.format(get_images_url(), 'game/')
 
 
-def get_game_image_url(season, game, charttype):
-    """Returns /static/game/2017/20001/H2H.png for example"""
-    return '{0:s}{1:d}/{2:d}/{3:s}.png'.format(get_game_images_url(), season, game, charttype)
+def get_game_image_url(season, game, charttype, version=None):
+    """Returns /static/game/2017/20001/H2H.png for example, with ?v=version appended if given"""
+    url = '{0:s}{1:d}/{2:d}/{3:s}.png'.format(get_game_images_url(), season, game, charttype)
+    if version is not None:
+        url += '?v={0:s}'.format(version)
+    return url
 
 
 def get_images_folder():
@@ -119,22 +121,23 @@ def update_game_dropdown_options_for_season(selected_season):
                                        Input('game-dropdown', 'value'),
                                        Input('game-graph-radio', 'value')])
 def update_game_graph(selected_season, selected_game, selected_chart):
-    if selected_chart == 'H2H':
-        game_h2h.game_h2h(selected_season, selected_game,
-                          save_file=get_game_image_filename(selected_season, selected_game, selected_chart))
-    elif selected_chart == 'TL':
-        game_timeline.game_timeline(selected_season, selected_game,
-                                    save_file=get_game_image_filename(selected_season, selected_game, selected_chart))
-    return get_game_image_url(selected_season, selected_game, selected_chart)
+    # Renders only if there's no up-to-date chart in the render cache. The version in the URL keeps browsers from
+    # showing a stale chart for in-progress games.
+    render_cache.get_game_chart(selected_season, selected_game, selected_chart)
+    version = render_cache.get_game_data_version(selected_season, selected_game)
+    return get_game_image_url(selected_season, selected_game, selected_chart, version)
 
 
-@app.server.route('{0:s}<season>/<game>/<charttype>.png'.format(get_game_images_url()))
+@app.server.route('{0:s}<int:season>/<int:game>/<charttype>.png'.format(get_game_images_url()))
 def serve_game_image(season, game, charttype):
-    fname = get_game_image_filename(int(season), int(game), charttype)
-    fname = fname[fname.rfind('/') + 1:]
-    return flask.send_from_directory(get_images_folder(), fname)
+    if charttype not in render_cache.get_game_chart_types():
+        flask.abort(404)
+    fname = render_cache.get_game_chart(season, game, charttype)
+    return flask.send_from_directory(os.path.dirname(fname), os.path.basename(fname))
 
 
 def browse_game_charts():
+    # Render in worker processes so charts requested at the same time don't wait on each other
+    render_cache.use_render_pool()
     print('Go to http://127.0.0.1:8050/')
     app.run_server(debug=True)
@@ -19,6 +19,7 @@ import scrapenhl2.plot.rolling_cf_gf as rolling_cf_gf
 import scrapenhl2.plot.rolling_boxcars as rolling_boxcars
 import scrapenhl2.plot.visualization_helper as vhelper
 import scrapenhl2.scrape.team_info as team_info
+import scrapenhl2.manipulate.player_cumsums as player_cumsums
 
 
 def generate_table(dataframe):
@@ -157,13 +158,31 @@ def player_graph(playerid, startdate, enddate, graphtype, roll_len):
         return rolling_boxcar_graph_plotly(playerid, startdate, enddate, roll_len)
 
 
+def _get_rolling_log(player, startdate, enddate, roll_len):
+    """
+    Returns the player's rolling sums from the precomputed cumulative sums (see player_cumsums) if they exist for these
+    seasons, and otherwise from the 5v5 log via visualization_helper.get_and_filter_5v5_log.
+
+    :param player: int, player ID
+    :param startdate: str, YYYY-MM-DD
+    :param enddate: str, YYYY-MM-DD
+    :param roll_len: int, number of games
+
+    :return: dataframe
+    """
+    df = player_cumsums.get_player_rolling_sums(players.player_as_id(player), startdate, enddate, roll_len)
+    if df is None:
+        df = vhelper.get_and_filter_5v5_log(player=player, startdate=startdate, enddate=enddate, roll_len=roll_len)
+    return df
+
+
 def rolling_boxcar_graph_plotly(playerid, startdate, enddate, roll_len):
     # TODO this seems broken...
     kwargs = {'player': playerid,
               'roll_len': roll_len,
               'startdate': startdate,
               'enddate': enddate}
-    boxcars = vhelper.get_and_filter_5v5_log(**kwargs)
+    boxcars = _get_rolling_log(**kwargs)
 
     boxcars = pd.concat([boxcars[['Season', 'Game']], rolling_boxcars.calculate_boxcar_rates(boxcars)], axis=1)
 
@@ -198,7 +217,7 @@ def rolling_f_graph_plotly(playerid, startdate, enddate, roll_len, gfcf):
 
     # Copy paste this code from rolling_f_graph
 
-    fa = vhelper.get_and_filter_5v5_log(**kwargs)
+    fa = _get_rolling_log(**kwargs)
 
     df = pd.concat([fa[['Season', 'Game']], rolling_cf_gf._calculate_f_rates(fa, gfcf)], axis=1)
     col_dict = {col[col.index(' ') + 1:]: col for col in df.columns if '%' in col}
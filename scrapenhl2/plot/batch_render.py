@@ -0,0 +1,228 @@
+"""
+This module contains methods for rendering game charts in bulk, e.g. for every game of a night or of a season.
+
+Each game is rendered in one worker process: all chart types for the game share that process's parsed pbp and toi
+(see scrapenhl2.scrape.data_cache and scrapenhl2.manipulate.game_context), schedule lookups and team info, and games
+are spread across workers. Charts newer than the game's parsed files are skipped.
+
+Example::
+
+    from scrapenhl2.plot import batch_render
+    batch_render.render_games(2017, batch_render.get_games_on_date(2017, '2017-11-01'), outdir='/tmp/charts')
+"""
+
+import concurrent.futures
+import os
+import os.path
+import time
+
+import pandas as pd
+
+import scrapenhl2.plot.render_cache as render_cache
+import scrapenhl2.plot.render_pool as render_pool
+import scrapenhl2.scrape.organization as organization
+import scrapenhl2.scrape.parse_pbp as parse_pbp
+import scrapenhl2.scrape.parse_toi as parse_toi
+import scrapenhl2.scrape.profiling as profiling
+import scrapenhl2.scrape.schedules as schedules
+
+
+def render_games(season, games, chart_types=None, workers=4, outdir=None, force=False, verbose=True):
+    """
+    Renders charts for these games, in parallel across games.
+
+    :param season: int, the season
+    :param games: iterable of int, the games
+    :param chart_types: iterable of str, or None for all. See render_cache.get_game_chart_types
+    :param workers: int, number of processes. Use 1 to render in this process
+    :param outdir: str, folder for the charts. Defaults to get_default_output_folder(season)
+    :param force: bool. If True, renders charts even if they are up to date
+    :param verbose: bool. If True, prints timings when done
+
+    :return: dataframe with columns Game, Chart, File, Status ('rendered', 'skipped', or 'error'), Secs, and Error
+    """
+    if chart_types is None:
+        chart_types = list(render_cache.get_game_chart_types().keys())
+    else:
+        chart_types = list(chart_types)
+    if outdir is None:
+        outdir = get_default_output_folder(season)
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+    games = [int(game) for game in games]
+
+    starttime = time.perf_counter()
+    rows = []
+    if workers <= 1:
+        for game in games:
+            rows += _render_game(season, game, chart_types, outdir, force)
+    else:
+        profiling.prepare_worker_processes()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_render_game_in_worker, season, game, chart_types, outdir, force): game
+                       for game in games}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    rows += future.result()
+                except Exception as e:
+                    game = futures[future]
+                    rows += [_timing_row(game, chart, None, 'error', 0, e) for chart in chart_types]
+
+    timings = pd.DataFrame(rows, columns=['Game', 'Chart', 'File', 'Status', 'Secs', 'Error']) \
+        .sort_values(['Game', 'Chart']) \
+        .reset_index(drop=True)
+    if verbose:
+        print_render_report(timings, time.perf_counter() - starttime)
+    return timings
+
+
+def render_season(season, chart_types=None, workers=4, outdir=None, force=False):
+    """
+    Renders charts for all final regular season and playoff games in the season. See render_games.
+
+    :param season: int, the season
+    :param chart_types: iterable of str, or None for all
+    :param workers: int, number of processes
+    :param outdir: str, folder for the charts
+    :param force: bool. If True, renders charts even if they are up to date
+
+    :return: dataframe, see render_games
+    """
+    sch = schedules.get_season_schedule(season).query('Status == "Final" & Game >= 20001 & Game <= 30417')
+    return render_games(season, sch.Game.values, chart_types, workers, outdir, force)
+
+
+def get_games_on_date(season, date):
+    """
+    Returns final games played on this date.
+
+    :param season: int, the season
+    :param date: str, YYYY-MM-DD
+
+    :return: list of int
+    """
+    sch = schedules.get_season_schedule(season)
+    return sorted(sch[(sch.Date == date) & (sch.Status == 'Final')].Game.values)
+
+
+def print_render_report(timings, elapsed=None):
+    """
+    Prints counts by status, time per chart type, and errors.
+
+    :param timings: dataframe, from render_games
+    :param elapsed: float, total wall time in seconds
+
+    :return: nothing
+    """
+    counts = timings.Status.value_counts()
+    print('Rendered {0:d}, skipped {1:d}, errors {2:d}'.format(int(counts.get('rendered', 0)),
+                                                              int(counts.get('skipped', 0)),
+                                                              int(counts.get('error', 0))))
+    rendered = timings[timings.Status == 'rendered']
+    if len(rendered) > 0:
+        bychart = rendered[['Chart', 'Secs']].groupby('Chart').agg(['count', 'sum', 'mean', 'max'])
+        print(bychart.to_string())
+    for _, row in timings[timings.Status == 'error'].iterrows():
+        print('Error in {0:d} {1:s}: {2:s}'.format(int(row.Game), row.Chart, str(row.Error)))
+    if elapsed is not None:
+        print('Total time: {0:.1f}s'.format(elapsed))
+
+
+def _render_game_in_worker(season, game, chart_types, outdir, force):
+    """
+    Sets up the worker process (see render_pool._init_worker), then renders chart types for one game. See _render_game.
+
+    :return: list of dicts, one per chart type
+    """
+    render_pool._init_worker()
+    return _render_game(season, game, chart_types, outdir, force)
+
+
+def _render_game(season, game, chart_types, outdir, force):
+    """
+    Renders chart types for one game. Runs in a worker process when workers > 1.
+
+    :param season: int, the season
+    :param game: int, the game
+    :param chart_types: list of str
+    :param outdir: str
+    :param force: bool
+
+    :return: list of dicts, one per chart type
+    """
+    import matplotlib.pyplot as plt
+
+    charts = render_cache.get_game_chart_types()
+    datatime = _get_data_mtime(season, game)
+    rows = []
+    for chart in chart_types:
+        filename = get_output_filename(outdir, season, game, chart)
+        if not force and os.path.exists(filename) and os.path.getmtime(filename) >= datatime:
+            rows.append(_timing_row(game, chart, filename, 'skipped', 0))
+            continue
+
+        starttime = time.perf_counter()
+        plt.close('all')
+        try:
+            if chart not in charts:
+                raise ValueError('Unknown chart type: {0:s}'.format(chart))
+            charts[chart](season, game, save_file=filename)
+            rows.append(_timing_row(game, chart, filename, 'rendered', time.perf_counter() - starttime))
+        except Exception as e:
+            rows.append(_timing_row(game, chart, filename, 'error', time.perf_counter() - starttime, e))
+        finally:
+            plt.close('all')
+    return rows
+
+
+def _timing_row(game, chart, filename, status, secs, error=None):
+    """
+    Returns one row for the render_games report.
+
+    :return: dict
+    """
+    return {'Game': game, 'Chart': chart, 'File': filename, 'Status': status, 'Secs': secs,
+            'Error': None if error is None else str(error)}
+
+
+def _get_data_mtime(season, game):
+    """
+    Returns the latest modification time of the game's parsed pbp and toi files.
+
+    :param season: int, the season
+    :param game: int, the game
+
+    :return: float, or infinity if a file is missing (so charts are never considered up to date)
+    """
+    mtimes = []
+    for filename in (parse_pbp.get_game_parsed_pbp_filename(season, game),
+                     parse_toi.get_game_parsed_toi_filename(season, game)):
+        if not os.path.exists(filename):
+            return float('inf')
+        mtimes.append(os.path.getmtime(filename))
+    return max(mtimes)
+
+
+def get_default_output_folder(season):
+    """
+    Returns the default folder for batch-rendered charts.
+
+    :param season: int, the season
+
+    :return: str, /scrape/data/other/charts/batch/[season]/
+    """
+    return os.path.join(organization.get_other_data_folder(), 'charts', 'batch', str(season))
+
+
+def get_output_filename(outdir, season, game, chart):
+    """
+    Returns the filename for a batch-rendered chart.
+
+    :param outdir: str, the folder
+    :param season: int, the season
+    :param game: int, the game
+    :param chart: str, e.g. 'H2H'
+
+    :return: str, [outdir]/[season]-[game]-[chart].png
+    """
+    return os.path.join(outdir, '{0:d}-{1:d}-{2:s}.png'.format(int(season), int(game), chart))
@@ -7,10 +7,11 @@ import matplotlib.pyplot as plt
 import matplotlib.colors as mplc
 
 import scrapenhl2.plot.visualization_helper as vhelper
-from scrapenhl2.scrape import schedules, team_info, teams, players
+from scrapenhl2.scrape import schedules, team_info, teams, players, profiling
 import scrapenhl2.scrape.general_helpers as helper
 import scrapenhl2.manipulate.manipulate as manip
 
+@profiling.profiled('team_dpair_shot_rates_scatter')
 def team_dpair_shot_rates_scatter(team, min_pair_toi=50, **kwargs):
     """
     Creates a scatterplot of team defense pair shot attempr rates.
@@ -7,7 +7,8 @@ import numpy as np  # standard scientific python stack
 import pandas as pd  # standard scientific python stack
 
 from scrapenhl2.manipulate import manipulate as manip
-from scrapenhl2.scrape import schedules, team_info, players
+from scrapenhl2.manipulate import game_context
+from scrapenhl2.scrape import schedules, team_info, players, profiling
 from scrapenhl2.plot import visualization_helper
 
 
@@ -30,20 +31,24 @@ def live_h2h(team1, team2, update=True, save_file=None):
     return game_h2h(2017, game, save_file)
 
 
-def game_h2h(season, game, save_file=None):
+@profiling.profiled('game_h2h')
+def game_h2h(season, game, save_file=None, context=None):
     """
     Creates the grid H2H charts seen on @muneebalamcu
 
     :param season: int, the season
     :param game: int, the game
     :param save_file: str, specify a valid filepath to save to file. If None, merely shows on screen.
+    :param context: manipulate.game_context.GameContext for this game, or None to get one
 
     :return: nothing
     """
-    h2htoi = manip.get_game_h2h_toi(season, game).query('Team1 == "H" & Team2 == "R"')
-    h2hcorsi = manip.get_game_h2h_corsi(season, game).query('Team1 == "H" & Team2 == "R"')
-    playerorder_h, numf_h = _get_h2h_chart_player_order(season, game, 'H')
-    playerorder_r, numf_r = _get_h2h_chart_player_order(season, game, 'R')
+    if context is None:
+        context = game_context.get_game_context(season, game)
+    h2htoi = context.h2h_toi.query('Team1 == "H" & Team2 == "R"')
+    h2hcorsi = context.h2h_corsi().query('Team1 == "H" & Team2 == "R"')
+    playerorder_h, numf_h = _get_h2h_chart_player_order(season, game, 'H', context)
+    playerorder_r, numf_r = _get_h2h_chart_player_order(season, game, 'R', context)
 
     # TODO create chart and filter out RH, HH, and RR
     # TODO link players by ID. When I link by name have issue with Mike Green for example
@@ -265,7 +270,7 @@ def _get_game_h2h_chart_title(season, game, homecf_diff=None, totaltoi=None):
     return '\n'.join(titletext)
 
 
-def _get_h2h_chart_player_order(season, game, homeroad='H'):
+def _get_h2h_chart_player_order(season, game, homeroad='H', context=None):
     """
     Reads lines and pairs for this game and finds arrangement using this algorithm:
 
@@ -278,17 +283,20 @@ def _get_h2h_chart_player_order(season, game, homeroad='H'):
     :param season: int, the game
     :param game: int, the season
     :param homeroad: str, 'H' for home or 'R' for road
+    :param context: manipulate.game_context.GameContext for this game, or None to get one
 
     :return: [list of IDs], NumFs
     """
-    combos = manip.get_line_combos(season, game, homeroad)
-    pairs = manip.get_pairings(season, game, homeroad)
+    if context is None:
+        context = game_context.get_game_context(season, game)
+    combos = context.line_combos(homeroad)
+    pairs = context.pairings(homeroad)
 
     playerlist = []
 
     # forwards
-    # I can simply drop PlayerID2 because dataframe contains duplicates of every line
-    ftoi = manip.get_player_toi(season, game, 'F', homeroad)
+    # combos lists each line once, with IDs sorted, so look for the player in any of the three columns
+    ftoi = context.player_toi('F', homeroad)
     while len(ftoi) > 0:
         next_player = ftoi.PlayerID.iloc[0]
         top_line_for_next_player = combos[(combos.PlayerID1 == next_player) | (combos.PlayerID2 == next_player) |
@@ -319,7 +327,7 @@ def _get_h2h_chart_player_order(season, game, homeroad='H'):
     numf = len(playerlist)
 
     # defensemen
-    dtoi = manip.get_player_toi(season, game, 'D', homeroad)
+    dtoi = context.player_toi('D', homeroad)
     while len(dtoi) > 0:
         next_player = dtoi.PlayerID.iloc[0]
         top_line_for_next_player = pairs[(pairs.PlayerID1 == next_player) | (pairs.PlayerID2 == next_player)] \
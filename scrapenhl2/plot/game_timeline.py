@@ -3,11 +3,12 @@ This module has methods for creating a game corsi timeline.
 """
 
 import matplotlib.pyplot as plt
+import numpy as np  # standard scientific python stack
 import pandas as pd  # standard scientific python stack
 
 from scrapenhl2.manipulate import manipulate as manip
 from scrapenhl2.plot import visualization_helper
-from scrapenhl2.scrape import parse_pbp, parse_toi, schedules, team_info
+from scrapenhl2.scrape import parse_pbp, parse_toi, profiling, schedules, team_info
 
 
 def live_timeline(team1, team2, update=True, save_file=None):
@@ -29,6 +30,7 @@ def live_timeline(team1, team2, update=True, save_file=None):
     return game_timeline(2017, game)
 
 
+@profiling.profiled('game_timeline')
 def game_timeline(season, game, save_file=None):
     """
     Creates a shot attempt timeline as seen on @muneebalamcu
@@ -44,9 +46,10 @@ def game_timeline(season, game, save_file=None):
     hname = team_info.team_as_str(schedules.get_home_team(season, game))
     rname = team_info.team_as_str(schedules.get_road_team(season, game))
 
-    cf = {hname: _get_home_cf_for_timeline(season, game), rname: _get_road_cf_for_timeline(season, game)}
-    pps = {hname: _get_home_adv_for_timeline(season, game), rname: _get_road_adv_for_timeline(season, game)}
-    gs = {hname: _get_home_goals_for_timeline(season, game), rname: _get_road_goals_for_timeline(season, game)}
+    data = get_timeline_data(season, game)
+    cf = {hname: data['H']['CF'], rname: data['R']['CF']}
+    pps = {hname: data['H']['Adv'], rname: data['R']['Adv']}
+    gs = {hname: data['H']['Goals'], rname: data['R']['Goals']}
     colors = {hname: plt.rcParams['axes.prop_cycle'].by_key()['color'][0],
               rname: plt.rcParams['axes.prop_cycle'].by_key()['color'][1]}
     darkercolors = {team: visualization_helper.make_color_darker(hex=col) for team, col in colors.items()}
@@ -116,48 +119,114 @@ def game_timeline(season, game, save_file=None):
     return None
 
 
-def _get_home_adv_for_timeline(season, game):
+def get_timeline_data(season, game, granularity='sec'):
     """
-    Identifies times where home team had a PP or extra attacker, for highlighting on timeline
+    Gets everything the timeline plots for both teams, from one read each of the parsed pbp and toi.
 
-    :param season: int, the game
-    :param game: int, the season
+    :param season: int, the season
+    :param game: int, the game
+    :param granularity: can respond in minutes ('min'), or seconds ('sec'), elapsed in game
+
+    :return: a dictionary, {'H': {'CF': df, 'Goals': list, 'Adv': dict}, 'R': {...}}. CF is as in
+        _get_cf_for_timeline, Goals as in get_goals_for_timeline, and Adv as in _get_home_adv_for_timeline
+    """
+    pbp = parse_pbp.get_parsed_pbp(season, game)
+    toi = parse_toi.get_parsed_toi(season, game)
+    maxtime = len(toi)
+
+    corsi = manip.filter_for_corsi(pbp)
+    goals = pbp[pbp.Event == 'Goal']
+
+    data = {}
+    for homeroad, teamid in (('H', schedules.get_home_team(season, game)),
+                             ('R', schedules.get_road_team(season, game))):
+        goal_times = np.sort(goals[goals.Team == teamid].Time.values)
+        if granularity == 'min':
+            goal_times = goal_times / 60
+        data[homeroad] = {'CF': _cumulative_cf_for_timeline(corsi[corsi.Team == teamid].Time.values, maxtime,
+                                                            granularity),
+                          'Goals': list(goal_times),
+                          'Adv': _get_adv_for_timeline(toi, homeroad)}
+    return data
+
+
+def _cumulative_cf_for_timeline(shot_times, maxtime, granularity='sec'):
+    """
+    Turns shot attempt times into a cumulative CF series. See _get_cf_for_timeline for the format.
+
+    At second granularity, a second with several attempts gets one row per attempt, so the line steps up one at a time.
+
+    :param shot_times: array of int, seconds elapsed
+    :param maxtime: int, game length in seconds. Attempts at or after this are dropped
+    :param granularity: can respond in minutes ('min'), or seconds ('sec'), elapsed in game
+
+    :return: a dataframe with two columns
+    """
+    shot_times = np.asarray(shot_times)
+    shot_times = shot_times[(shot_times >= 0) & (shot_times < maxtime)].astype(np.int64)
+    counts = np.bincount(shot_times, minlength=maxtime)
+
+    if granularity == 'min':
+        # Value at end of each minute (or end of game for the last partial minute)
+        nummins = (maxtime + 59) // 60
+        minute_ends = np.minimum(60 * (np.arange(nummins) + 1), maxtime) - 1
+        times = np.arange(nummins)
+        cumcf = np.cumsum(counts)[minute_ends]
+    else:
+        reps = np.maximum(counts, 1)
+        times = np.repeat(np.arange(maxtime), reps)
+        cumcf = np.cumsum(np.repeat(counts > 0, reps))
+
+    # I want it soccer style, so Time = 0 always has CumCF = 0, and that first shot at 30sec will register for Time=1
+    return pd.DataFrame({'Time': np.concatenate([[0], times + 1]),
+                         'CumCF': np.concatenate([[0], cumcf]).astype(float)})
+
+
+def _get_adv_for_timeline(toi, homeroad):
+    """
+    Identifies times where given team had a PP, for highlighting on timeline
+
+    :param toi: dataframe, parsed toi for the game
+    :param homeroad: str, 'H' for home and 'R' for road
 
     :return: a dictionary: {'PP+1': ((start, end), (start, end), ...), 'PP+2': ((start, end), (start, end), ...)...}
     """
     # TODO add functionality for extra attacker
+    if homeroad == 'H':
+        teamstrength, oppstrength = toi.HomeStrength.values, toi.RoadStrength.values
+    else:
+        teamstrength, oppstrength = toi.RoadStrength.values, toi.HomeStrength.values
+    times = toi.Time.values
 
-    toi = parse_toi.get_parsed_toi(season, game)
-
-    pp1 = toi[((toi.HomeStrength == "5") & (toi.RoadStrength == "4")) |
-              ((toi.HomeStrength == "4") & (toi.RoadStrength == "3"))].Time
-    pp2 = toi[(toi.HomeStrength == "5") & (toi.RoadStrength == "3")].Time
+    pp1 = ((teamstrength == "5") & (oppstrength == "4")) | ((teamstrength == "4") & (oppstrength == "3"))
+    pp2 = (teamstrength == "5") & (oppstrength == "3")
 
-    df = {'PP+1': _get_contiguous_times(sorted(list(pp1))),
-          'PP+2': _get_contiguous_times(sorted(list(pp2)))}
-    return df
+    return {'PP+1': _get_contiguous_times(np.sort(times[pp1])),
+            'PP+2': _get_contiguous_times(np.sort(times[pp2]))}
 
 
-def _get_road_adv_for_timeline(season, game):
+def _get_home_adv_for_timeline(season, game):
     """
     Identifies times where home team had a PP or extra attacker, for highlighting on timeline
 
     :param season: int, the game
     :param game: int, the season
 
-    :return: a dictionary, {'PP+1': ((start, end), (start, end), ...), 'PP+2': ((start, end), (start, end), ...)...}
+    :return: a dictionary: {'PP+1': ((start, end), (start, end), ...), 'PP+2': ((start, end), (start, end), ...)...}
     """
-    # TODO add functionality for extra attacker
+    return _get_adv_for_timeline(parse_toi.get_parsed_toi(season, game), 'H')
 
-    toi = parse_toi.get_parsed_toi(season, game)
 
-    pp1 = toi[((toi.HomeStrength == "4") & (toi.RoadStrength == "5")) |
-              ((toi.HomeStrength == "3") & (toi.RoadStrength == "4"))].Time
-    pp2 = toi[(toi.HomeStrength == "3") & (toi.RoadStrength == "5")].Time
+def _get_road_adv_for_timeline(season, game):
+    """
+    Identifies times where home team had a PP or extra attacker, for highlighting on timeline
+
+    :param season: int, the game
+    :param game: int, the season
 
-    df = {'PP+1': _get_contiguous_times(sorted(list(pp1))),
-          'PP+2': _get_contiguous_times(sorted(list(pp2)))}
-    return df
+    :return: a dictionary, {'PP+1': ((start, end), (start, end), ...), 'PP+2': ((start, end), (start, end), ...)...}
+    """
+    return _get_adv_for_timeline(parse_toi.get_parsed_toi(season, game), 'R')
 
 
 def _get_contiguous_times(times, tolerance=2):
@@ -170,17 +239,14 @@ def _get_contiguous_times(times, tolerance=2):
 
     :return: tuple of tuple-2s of ints
     """
-    cont_times = []
-    for i in range(len(times)):
-        if i == 0:
-            cont_times.append([times[i], times[i]])
-        else:
-            if times[i] == times[i - 1] + 1:
-                cont_times[-1][-1] = times[i]
-            else:
-                cont_times.append([times[i], times[i]])
-    cont_times = tuple((s, e) for s, e in cont_times if e - s >= tolerance)
-    return cont_times
+    times = np.asarray(times)
+    if len(times) == 0:
+        return ()
+    breaks = np.flatnonzero(np.diff(times) != 1)
+    starts = np.concatenate([times[:1], times[breaks + 1]])
+    ends = np.concatenate([times[breaks], times[-1:]])
+    keep = ends - starts >= tolerance
+    return tuple((int(s), int(e)) for s, e in zip(starts[keep], ends[keep]))
 
 
 def _get_corsi_timeline_title(season, game):
@@ -220,15 +286,15 @@ def _goal_times_to_scatter_for_timeline(goal_times, cfdf):
 
     :return: (x_coords, y_coords)
     """
+    cf_by_time = cfdf[['Time', 'CumCF']].groupby('Time').CumCF.max()
+    cf_at_times = cf_by_time.reindex(goal_times).values
+
     goal_xs = []
     goal_ys = []
-    cumgoals = 0
     for i in range(len(goal_times)):
-        cumgoals += 1
-        cf_at_time = cfdf[cfdf.Time == goal_times[i]].CumCF.max()
-        for j in range(cumgoals):
+        for j in range(i + 1):
             goal_xs.append(goal_times[i])
-            goal_ys.append(cf_at_time + j)
+            goal_ys.append(cf_at_times[i] + j)
     return goal_xs, goal_ys
 
 
@@ -306,31 +372,7 @@ def _get_cf_for_timeline(season, game, homeroad, granularity='sec'):
     pbp = pbp[pbp.Team == teamid]
 
     maxtime = len(parse_toi.get_parsed_toi(season, game))
-    df = pd.DataFrame({'Time': list(range(maxtime))})
-    df = df.merge(pbp[['Time']].assign(CF=1), how='left', on='Time')
-    # df.loc[:, 'Time'] = df.Time + 1
-    df.loc[:, 'CF'] = df.CF.fillna(0)
-    df.loc[:, 'CumCF'] = df.CF.cumsum()
-
-    # Now let's shift things down. Right now a shot at 30 secs will mean Time = 0 has CumCF = 1.
-
-    if granularity == 'min':
-        df.loc[:, 'Time'] = df.Time // 60
-        df = df.groupby('Time').max().reset_index()
-
-    # I want it soccer style, so Time = 0 always has CumCF = 0, and that first shot at 30sec will register for Time=1
-    df = pd.concat([pd.DataFrame({'Time': [-1], 'CumCF': [0], 'CF': [0]}), df])
-    df.loc[:, 'Time'] = df.Time + 1
-
-    # For every shot, want to plot a point as if that shot hadn't happened, and then one where it did
-    # So every segment of chart has either slope 0 or infinite
-    #shot_mins = df.query('CF > 0')
-    #shot_mins.loc[:, 'CumCF'] = shot_mins.CumCF - shot_mins.CF
-    #df = pd.concat([df, shot_mins]).sort_values(['Time', 'CumCF'])
-
-    df = df.drop('CF', axis=1)
-
-    return df
+    return _cumulative_cf_for_timeline(pbp.Time.values, maxtime, granularity)
 
 
 def _get_home_cf_for_timeline(season, game, granularity='sec'):
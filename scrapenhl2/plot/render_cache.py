@@ -0,0 +1,280 @@
+"""
+This module contains a cache for rendered game charts, used by the app.
+
+Charts are stored on disk, keyed by chart type, season, game, and a data version. The version is built from the game's
+status and the modification times and sizes of the parsed pbp and toi files, so a chart is re-rendered only after new
+data is parsed, including when a final game is re-parsed (e.g. after the league corrects it). Charts live in the data
+folder (other/charts/[season]/), not in the app's _static folder, so they survive app restarts.
+
+Pyplot keeps global state, so renders in this process are serialized with a lock, and each render closes its figures.
+Call use_render_pool() to render in worker processes instead (see scrapenhl2.plot.render_pool), so different charts can
+render at the same time.
+"""
+
+import os
+import os.path
+import threading
+
+import matplotlib.pyplot as plt
+
+import scrapenhl2.plot.game_h2h as game_h2h
+import scrapenhl2.plot.game_timeline as game_timeline
+import scrapenhl2.plot.render_pool as render_pool
+import scrapenhl2.scrape.organization as organization
+import scrapenhl2.scrape.parse_pbp as parse_pbp
+import scrapenhl2.scrape.parse_toi as parse_toi
+import scrapenhl2.scrape.schedules as schedules
+
+
+def get_game_chart_types():
+    """
+    Returns the game charts this cache can render.
+
+    :return: dict of chart type (e.g. 'H2H') to a function taking season, game, save_file
+    """
+    return {'H2H': game_h2h.game_h2h,
+            'TL': game_timeline.game_timeline}
+
+
+def get_game_chart(season, game, charttype):
+    """
+    Returns the filename of this chart, rendering it first if there is no up-to-date version on disk.
+
+    :param season: int, the season
+    :param game: int, the game
+    :param charttype: str, e.g. 'H2H'. See get_game_chart_types
+
+    :return: str, the filename
+    """
+    version = get_game_data_version(season, game)
+    filename = get_game_chart_filename(season, game, charttype, version)
+    if os.path.exists(filename):
+        return filename
+
+    with _get_render_lock(filename):
+        # Another thread may have rendered it while we waited
+        if not os.path.exists(filename):
+            _render_game_chart(season, game, charttype, filename)
+            _remove_old_versions(season, game, charttype, version)
+    return filename
+
+
+def get_game_data_version(season, game):
+    """
+    Returns the data version for this game: parsed pbp and toi modification times (in nanoseconds, so two parses in
+    the same second differ) and sizes, prefixed with 'final' for final games with parsed files and 'live' otherwise.
+
+    :param season: int, the season
+    :param game: int, the game
+
+    :return: str
+    """
+    stats = []
+    for filename in (parse_pbp.get_game_parsed_pbp_filename(season, game),
+                     parse_toi.get_game_parsed_toi_filename(season, game)):
+        try:
+            stat = os.stat(filename)
+            stats.append('{0:d}.{1:d}'.format(stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stats.append(None)
+
+    if schedules.get_game_status(season, game) == 'Final' and None not in stats:
+        return 'final' + '-'.join(stats)
+    return 'live' + '-'.join('0' if stat is None else stat for stat in stats)
+
+
+def is_game_chart_cached(season, game, charttype):
+    """
+    Checks whether an up-to-date version of this chart is on disk.
+
+    :param season: int, the season
+    :param game: int, the game
+    :param charttype: str, e.g. 'H2H'
+
+    :return: bool
+    """
+    return os.path.exists(get_game_chart_filename(season, game, charttype, get_game_data_version(season, game)))
+
+
+def use_render_pool(use_pool=True):
+    """
+    Sets whether charts are rendered in the process pool from render_pool or in this process.
+
+    :param use_pool: bool
+
+    :return: nothing
+    """
+    global _USE_POOL
+    _USE_POOL = use_pool
+
+
+def _get_render_lock(filename):
+    """
+    Returns the lock to hold while rendering this file. Without the pool, all renders share one lock, since pyplot
+    can only draw one chart at a time per process. With the pool, each file has its own lock, so only duplicate renders
+    wait on each other.
+
+    :param filename: str
+
+    :return: threading.Lock
+    """
+    if not _USE_POOL:
+        return _RENDER_LOCK
+    with _FILE_LOCKS_LOCK:
+        if filename not in _FILE_LOCKS:
+            _FILE_LOCKS[filename] = threading.Lock()
+        return _FILE_LOCKS[filename]
+
+
+def prerender_games(season, games, charttypes=None):
+    """
+    Renders charts for these games that are not already cached. Errors for one game are printed and skipped.
+
+    :param season: int, the season
+    :param games: iterable of int, the games
+    :param charttypes: iterable of str, or None for all chart types
+
+    :return: nothing
+    """
+    if charttypes is None:
+        charttypes = list(get_game_chart_types().keys())
+    for game in games:
+        for charttype in charttypes:
+            try:
+                get_game_chart(season, game, charttype)
+            except Exception as e:
+                print('Could not render {0:s} for {1:d} {2:d}: {3:s}'.format(charttype, season, game, str(e)))
+
+
+def start_prerender(season, games, charttypes=None):
+    """
+    Renders charts for these games in a background thread. See prerender_games.
+
+    The thread is not a daemon, so a script calling this waits for renders to finish before exiting.
+
+    :param season: int, the season
+    :param games: iterable of int, the games
+    :param charttypes: iterable of str, or None for all chart types
+
+    :return: the thread
+    """
+    thread = threading.Thread(target=prerender_games, args=(season, list(games), charttypes),
+                              name='scrapenhl2-prerender')
+    thread.start()
+    return thread
+
+
+def _render_game_chart(season, game, charttype, filename):
+    """
+    Renders one chart to filename. Writes to a temporary file first so readers never see a partial image.
+
+    :param season: int, the season
+    :param game: int, the game
+    :param charttype: str, e.g. 'H2H'
+    :param filename: str
+
+    :return: nothing
+    """
+    charts = get_game_chart_types()
+    if charttype not in charts:
+        raise ValueError('Unknown chart type: {0:s}'.format(charttype))
+
+    tempfile = filename[:-4] + '.tmp.png'
+    if _USE_POOL:
+        render_pool.render(charts[charttype], tempfile, season, game)
+    else:
+        plt.close('all')
+        try:
+            charts[charttype](season, game, save_file=tempfile)
+        finally:
+            plt.close('all')
+    os.replace(tempfile, filename)
+
+
+def _remove_old_versions(season, game, charttype, version):
+    """
+    Deletes cached versions of this chart other than the given one.
+
+    :param season: int, the season
+    :param game: int, the game
+    :param charttype: str, e.g. 'H2H'
+    :param version: str, the version to keep
+
+    :return: nothing
+    """
+    folder = get_season_chart_folder(season)
+    prefix = '{0:d}-{1:s}-'.format(int(game), charttype)
+    keep = os.path.basename(get_game_chart_filename(season, game, charttype, version))
+    for file in os.listdir(folder):
+        if file.startswith(prefix) and file != keep:
+            try:
+                os.remove(os.path.join(folder, file))
+            except OSError:
+                pass
+
+
+def clear_render_cache(season=None):
+    """
+    Deletes cached charts for a season, or for all seasons.
+
+    :param season: int, or None for all seasons
+
+    :return: nothing
+    """
+    folder = get_chart_folder() if season is None else get_season_chart_folder(season)
+    for root, _, files in os.walk(folder):
+        for file in files:
+            os.remove(os.path.join(root, file))
+
+
+def get_chart_folder():
+    """
+    Returns the folder for cached charts.
+
+    :return: str, /scrape/data/other/charts/
+    """
+    return os.path.join(organization.get_other_data_folder(), 'charts')
+
+
+def get_season_chart_folder(season):
+    """
+    Returns the folder for cached charts for this season, creating it if need be.
+
+    :param season: int, the season
+
+    :return: str, /scrape/data/other/charts/[season]/
+    """
+    folder = os.path.join(get_chart_folder(), str(season))
+    organization.check_create_folder(folder)
+    return folder
+
+
+def get_game_chart_filename(season, game, charttype, version):
+    """
+    Returns the filename for this chart.
+
+    :param season: int, the season
+    :param game: int, the game
+    :param charttype: str, e.g. 'H2H'
+    :param version: str, from get_game_data_version
+
+    :return: str, /scrape/data/other/charts/[season]/[game]-[charttype]-[version].png
+    """
+    return os.path.join(get_season_chart_folder(season),
+                        '{0:d}-{1:s}-{2:s}.png'.format(int(game), charttype, version))
+
+
+def render_cache_setup():
+    """
+    Creates the chart folder if need be
+
+    :return: nothing
+    """
+    organization.check_create_folder(get_chart_folder())
+
+
+_RENDER_LOCK = threading.Lock()
+_FILE_LOCKS = {}
+_FILE_LOCKS_LOCK = threading.Lock()
+_USE_POOL = False
+render_cache_setup()
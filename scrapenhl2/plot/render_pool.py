@@ -0,0 +1,250 @@
+"""
+This module contains a process pool for rendering charts in parallel.
+
+The chart methods in scrapenhl2.plot draw with pyplot, which keeps one global current figure per process, so two
+charts cannot be drawn at the same time in one process. Here each chart is drawn in a worker process instead. Workers
+use the non-interactive Agg backend and close all figures before and after each chart, so a failed chart doesn't leak
+into the next one.
+
+Jobs go through a queue (the pool's) with a cap on outstanding jobs: submitting past the cap waits for a slot, up to a
+timeout. Results have a timeout as well. Note that a job that times out keeps running in its worker until it
+finishes; it is only abandoned by the caller.
+
+Example::
+
+    from scrapenhl2.plot import render_pool
+    futures = [render_pool.submit_render('game_h2h', '/tmp/{0:d}.png'.format(game), 2017, game)
+               for game in range(20001, 20011)]
+    files = [future.result() for future in futures]
+"""
+
+import concurrent.futures
+import importlib
+import os
+import threading
+
+import scrapenhl2.scrape.profiling as profiling
+
+
+def get_render_functions():
+    """
+    Returns the chart methods the pool can render, by name. Each takes save_file as a keyword argument.
+
+    :return: dict of name to (module, method name)
+    """
+    return {'game_h2h': ('scrapenhl2.plot.game_h2h', 'game_h2h'),
+            'game_timeline': ('scrapenhl2.plot.game_timeline', 'game_timeline'),
+            'rolling_player_cf': ('scrapenhl2.plot.rolling_cf_gf', 'rolling_player_cf'),
+            'rolling_player_boxcars': ('scrapenhl2.plot.rolling_boxcars', 'rolling_player_boxcars'),
+            'team_dpair_shot_rates_scatter': ('scrapenhl2.plot.defense_pairs', 'team_dpair_shot_rates_scatter'),
+            'score_state_graph': ('scrapenhl2.plot.team_score_state_toi', 'score_state_graph')}
+
+
+def submit_render(chart, save_file, *args, **kwargs):
+    """
+    Queues a chart for rendering in the pool.
+
+    :param chart: str, a name from get_render_functions, or a chart method (must be importable by worker processes)
+    :param save_file: str, the file to save the chart to
+    :param args: positional arguments for the chart method, e.g. season and game
+    :param kwargs: keyword arguments for the chart method. You may also pass submit_timeout (seconds, default 60), how
+        long to wait for a slot if the cap on outstanding jobs is reached.
+
+    :return: a concurrent.futures.Future, whose result is save_file
+    """
+    submit_timeout = kwargs.pop('submit_timeout', 60)
+    target = _get_chart_target(chart)
+
+    pool = get_render_pool()
+    slots = _SLOTS
+    if not slots.acquire(timeout=submit_timeout):
+        raise RuntimeError('Render queue is full ({0:d} jobs outstanding)'.format(_MAX_OUTSTANDING))
+    try:
+        future = pool.submit(_render_in_worker, target, save_file, args, kwargs)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def render(chart, save_file, *args, **kwargs):
+    """
+    Renders a chart in the pool and waits for it.
+
+    :param chart: str or method. See submit_render
+    :param save_file: str, the file to save the chart to
+    :param args: positional arguments for the chart method
+    :param kwargs: keyword arguments for the chart method. You may also pass timeout (seconds, default 120), how long
+        to wait for the result, and submit_timeout (see submit_render)
+
+    :return: str, save_file
+    """
+    timeout = kwargs.pop('timeout', 120)
+    future = submit_render(chart, save_file, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+def render_many(jobs, timeout=None):
+    """
+    Renders several charts in the pool and waits for all of them.
+
+    :param jobs: iterable of (chart, save_file, args, kwargs). See submit_render
+    :param timeout: seconds to wait for each result, or None to wait indefinitely
+
+    :return: list with save_file, or the exception raised, for each job, in order
+    """
+    futures = []
+    for chart, save_file, args, kwargs in jobs:
+        try:
+            futures.append(submit_render(chart, save_file, *args, **kwargs))
+        except Exception as e:
+            futures.append(e)
+
+    results = []
+    for future in futures:
+        if isinstance(future, Exception):
+            results.append(future)
+            continue
+        try:
+            results.append(future.result(timeout=timeout))
+        except Exception as e:
+            future.cancel()
+            results.append(e)
+    return results
+
+
+def get_render_pool():
+    """
+    Returns the process pool, starting it if need be.
+
+    :return: concurrent.futures.ProcessPoolExecutor
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            profiling.prepare_worker_processes()
+            _POOL = concurrent.futures.ProcessPoolExecutor(max_workers=_WORKERS)
+        return _POOL
+
+
+def set_render_pool_size(workers=None, max_outstanding=None):
+    """
+    Sets the number of worker processes and the cap on outstanding jobs. Shuts down the current pool, if any; the
+    next render starts a new one.
+
+    :param workers: int, number of processes. None keeps the current value
+    :param max_outstanding: int, the cap on outstanding jobs. None keeps the current value
+
+    :return: nothing
+    """
+    global _WORKERS, _MAX_OUTSTANDING, _SLOTS
+    shutdown_render_pool()
+    with _POOL_LOCK:
+        if workers is not None:
+            _WORKERS = max(1, int(workers))
+        if max_outstanding is not None:
+            _MAX_OUTSTANDING = max(1, int(max_outstanding))
+        _SLOTS = threading.BoundedSemaphore(_MAX_OUTSTANDING)
+
+
+def shutdown_render_pool(wait=True):
+    """
+    Shuts down the process pool.
+
+    :param wait: bool, whether to wait for queued jobs to finish
+
+    :return: nothing
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=wait)
+            _POOL = None
+
+
+def _get_chart_target(chart):
+    """
+    Converts a chart name to (module, method name), which pickles cheaply and is imported in the worker.
+
+    :param chart: str or method
+
+    :return: (str, str)
+    """
+    if isinstance(chart, str):
+        functions = get_render_functions()
+        if chart not in functions:
+            raise ValueError('Unknown chart: {0:s}. Options: {1:s}'.format(chart, ', '.join(sorted(functions))))
+        return functions[chart]
+    return chart.__module__, chart.__name__
+
+
+def _init_worker():
+    """
+    Sets up a worker process, the first time it draws a chart: non-interactive backend, so charts never try to open a
+    window. (Called from _render_in_worker rather than as the pool's initializer, which needs Python 3.7.)
+
+    :return: nothing
+    """
+    global _WORKER_READY
+    if _WORKER_READY:
+        return
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    plt.switch_backend('Agg')
+    _WORKER_READY = True
+
+
+def _render_in_worker(target, save_file, args, kwargs):
+    """
+    Draws one chart. Runs in a worker process.
+
+    :param target: (module, method name)
+    :param save_file: str
+    :param args: tuple of positional arguments
+    :param kwargs: dict of keyword arguments
+
+    :return: str, save_file
+    """
+    _init_worker()
+    import matplotlib.pyplot as plt
+
+    module, name = target
+    func = getattr(importlib.import_module(module), name)
+    plt.close('all')
+    try:
+        func(*args, save_file=save_file, **kwargs)
+    finally:
+        plt.close('all')
+    return save_file
+
+
+def render_pool_setup():
+    """
+    Reads the pool size from the SCRAPENHL2_RENDER_WORKERS environment variable, if set. Defaults to the number of
+    CPUs, and the cap on outstanding jobs defaults to four times that.
+
+    :return: nothing
+    """
+    global _WORKERS, _MAX_OUTSTANDING, _SLOTS
+    try:
+        _WORKERS = max(1, int(os.environ.get('SCRAPENHL2_RENDER_WORKERS', os.cpu_count() or 1)))
+    except ValueError:
+        print('Could not read SCRAPENHL2_RENDER_WORKERS; using 1')
+        _WORKERS = 1
+    _MAX_OUTSTANDING = 4 * _WORKERS
+    _SLOTS = threading.BoundedSemaphore(_MAX_OUTSTANDING)
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+_WORKERS = 1
+_MAX_OUTSTANDING = 4
+_SLOTS = None
+_WORKER_READY = False
+render_pool_setup()
@@ -7,7 +7,9 @@ import matplotlib.pyplot as plt
 
 from scrapenhl2.plot import visualization_helper as vhelper
 from scrapenhl2.scrape import players
+from scrapenhl2.scrape import profiling
 
+@profiling.profiled('rolling_player_boxcars')
 def rolling_player_boxcars(player, **kwargs):
     """
     A method to generate the rolling boxcars graph.
@@ -9,8 +9,10 @@ import pandas as pd  # standard scientific python stack
 import scrapenhl2.manipulate.manipulate as manip
 from scrapenhl2.scrape import players
 from scrapenhl2.scrape import schedules
+from scrapenhl2.scrape import profiling
 from scrapenhl2.plot import visualization_helper as vhelper
 
+@profiling.profiled('rolling_player_gf')
 def rolling_player_gf(player, **kwargs):
     """
     Creates a graph with GF% and GF% off. Defaults to roll_len of 40.
@@ -25,6 +27,7 @@ def rolling_player_gf(player, **kwargs):
     _rolling_player_f(player, 'G', **kwargs)
 
 
+@profiling.profiled('rolling_player_cf')
 def rolling_player_cf(player, **kwargs):
     """
     Creates a graph with CF% and CF% off. Defaults to roll_len of 25.
@@ -6,6 +6,7 @@ import matplotlib.pyplot as plt
 import pandas as pd
 
 import scrapenhl2.scrape.players as players
+import scrapenhl2.scrape.profiling as profiling
 import scrapenhl2.scrape.schedules as schedules
 import scrapenhl2.scrape.general_helpers as helper
 import scrapenhl2.manipulate.manipulate as manip
@@ -13,14 +14,16 @@ import scrapenhl2.plot.visualization_helper as vhelper
 import scrapenhl2.plot.rolling_cf_gf as rolling_cfgf
 
 
+@profiling.profiled('team_lineup_cf_graph')
 def team_lineup_cf_graph(team, **kwargs):
     """
     This method builds a 4x5 matrix of rolling CF% line graphs. The left 4x3 matrix are forward lines and the top-right
     3x2 are defense pairs.
 
     :param team: str or id, team to build this graph for
-    :param kwargs: need to specify the following as iterables of names: l1, l2, l3, l4, p1, p2, p3.
-        Three players for each of the 'l's and two for each of the 'p's.
+    :param kwargs: specify the following as iterables of names: l1, l2, l3, l4, p1, p2, p3.
+        Three players for each of the 'l's and two for each of the 'p's. If not all are given, uses the team's most
+        common lines and pairs at 5v5 in the date range (see get_most_common_lineup).
 
     :return: figure, or nothing
     """
@@ -33,9 +36,11 @@ def team_lineup_cf_graph(team, **kwargs):
             kwargs[key] = [players.player_as_id(x) for x in kwargs[key]]
             allplayers += kwargs[key]
     else:
-        # TODO Find most common lines
-        # Edit get_line_combos etc from manip, and the method to get player order from game_h2h, to work at team level
-        pass
+        lines, pairs = get_most_common_lineup(team, **kwargs)
+        for key, combo in zip(['l1', 'p1', 'l2', 'p2', 'l3', 'p3', 'l4'],
+                              [lines[0], pairs[0], lines[1], pairs[1], lines[2], pairs[2], lines[3]]):
+            kwargs[key] = combo
+            allplayers += combo
 
     # Get data
     kwargs['add_missing_games'] = True
@@ -89,5 +94,28 @@ def team_lineup_cf_graph(team, **kwargs):
     return vhelper.savefilehelper(**kwargs)
 
 
+def get_most_common_lineup(team, **kwargs):
+    """
+    Finds the team's four most common forward lines and three most common D pairs at 5v5, using games in the last
+    season of the date range given by kwargs. Lines and pairs are picked greedily by time together, without reusing
+    players (see manipulate.get_most_common_lines).
+
+    :param team: str or id, team
+    :param kwargs: e.g. startdate, enddate, startseason, endseason. See visualization_helper.get_and_filter_5v5_log
+
+    :return: (list of 4 lists of 3 player IDs, list of 3 lists of 2 player IDs)
+    """
+    startdate, enddate = vhelper.get_startdate_enddate_from_kwargs(**kwargs)
+    season = helper.infer_season_from_date(enddate)
+    sch = schedules.get_team_schedule(season, team, startdate, enddate)
+    games = sch[sch.Status == 'Final'].Game
+
+    lines, pairs = manip.get_most_common_lines(manip.get_team_line_combos(season, team, games),
+                                               manip.get_team_pairings(season, team, games))
+    if len(lines) < 4 or len(pairs) < 3:
+        raise ValueError('Could not find 4 lines and 3 pairs for {0:s} in {1:d}'.format(str(team), season))
+    return lines, pairs
+
+
 def _team_lineup_cf_graph_title(**kwargs):
     return ', '.join(vhelper.generic_5v5_log_graph_title('Lineup CF%', **kwargs))
@@ -6,10 +6,12 @@ import matplotlib.pyplot as plt
 import math
 import pandas as pd
 
+import scrapenhl2.scrape.profiling as profiling
 import scrapenhl2.scrape.team_info as team_info
 import scrapenhl2.manipulate.manipulate as manip
 import scrapenhl2.plot.visualization_helper as vhelper
 
+@profiling.profiled('team_score_shot_rate_parallel')
 def team_score_shot_rate_parallel(team, startseason, endseason=None, save_file=None):
     """
 
@@ -67,6 +69,7 @@ def team_score_shot_rate_parallel(team, startseason, endseason=None, save_file=N
         plt.savefig(save_file)
 
 
+@profiling.profiled('team_score_shot_rate_scatter')
 def team_score_shot_rate_scatter(team, startseason, endseason=None, save_file=None):
     """
 
@@ -7,17 +7,21 @@ import matplotlib.pyplot as plt
 import numpy as np
 
 import scrapenhl2.manipulate.manipulate as manip
+import scrapenhl2.scrape.profiling as profiling
 import scrapenhl2.scrape.team_info as team_info
 import scrapenhl2.plot.visualization_helper as vhelper
 
-def score_state_graph(season):
+@profiling.profiled('score_state_graph')
+def score_state_graph(season, save_file=None):
     """
     Generates a horizontal stacked bar graph showing how much 5v5 TOI each team has played in each score state
     for given season.
 
     :param season: int, the season
+    :param save_file: str, specify a valid filepath to save to file. If None, merely shows on screen. Specify 'fig' to
+        return the figure
 
-    :return:
+    :return: nothing, or the figure
     """
     #TODO make kwargs match other methods: startseason, startdate, etc
 
@@ -64,7 +68,7 @@ def score_state_graph(season):
 
     lst = list(np.arange(-0.6, 0.61, 0.2))
     plt.xticks(lst, ['{0:d}%'.format(abs(int(round(100 * x)))) for x in lst])
-    plt.show()
+    return vhelper.savefilehelper(save_file=save_file)
 
 
 def _order_for_score_state_graph(toidf):
@@ -7,11 +7,12 @@ from matplotlib.animation import FuncAnimation
 import pandas as pd
 import numpy as np
 
-from scrapenhl2.scrape import players, team_info, schedules
+from scrapenhl2.scrape import players, team_info, schedules, profiling
 from scrapenhl2.scrape import general_helpers as helpers
 from scrapenhl2.plot import visualization_helper as vhelper
 from scrapenhl2.plot import label_lines
 
+@profiling.profiled('parallel_coords_team_comparison')
 def parallel_coords_team_comparison(**kwargs):
     """
 
@@ -76,6 +77,7 @@ def parallel_coords_team_comparison(**kwargs):
     return vhelper.savefilehelper(**kwargs)
 
 
+@profiling.profiled('parallel_usage_chart')
 def parallel_usage_chart(**kwargs):
     """
 
@@ -140,6 +142,7 @@ def parallel_usage_chart(**kwargs):
     return vhelper.savefilehelper(**kwargs)
 
 
+@profiling.profiled('animated_usage_chart')
 def animated_usage_chart(**kwargs):
     """
 
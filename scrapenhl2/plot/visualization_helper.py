@@ -9,6 +9,7 @@ import datetime
 
 from scrapenhl2.scrape import schedules, players, team_info
 from scrapenhl2.manipulate import manipulate as manip
+from scrapenhl2.manipulate import log_store, rolling
 from scrapenhl2.scrape import general_helpers as helper
 import scrapenhl2.plot.label_lines as label_lines
 
@@ -158,39 +159,16 @@ def make_5v5_rolling_days(df, **kwargs):
     if 'roll_len_days' in kwargs:
         roll_len = kwargs['roll_len_days']
 
-        # Join to schedules to get game dates
-        df2 = schedules.attach_game_dates_to_dateframe(df)
-
-        # Join to a dataframe full of days
-        # TODO use grouper to speed this up
-        daysdf = pd.DataFrame({'Date': [df2.Date.min(), df2.Date.max()]}) \
-            .assign(JoinKey=1) \
-            .set_index('Date') \
-            .asfreq('1D').reset_index() \
-            .assign(JoinKey=1)
-        playersdf = df2[['PlayerID']].drop_duplicates() \
-            .assign(JoinKey=1) \
-            .merge(daysdf, how='inner', on='JoinKey') \
-            .drop('JoinKey', axis=1)
-        playersdf.loc[:, 'Date'] = playersdf.Date.dt.strftime('%Y-%m-%d')
-        fulldf = playersdf.merge(df2, how='left', on=['PlayerID', 'Date'])
-
-        to_exclude = {'Game', 'Season', 'Team'}  # Don't want to sum these, even though they're numeric
-        numeric_df = df.select_dtypes(include=[np.number])
-        numeric_df = numeric_df.drop(to_exclude, axis=1, errors='ignore')
-
-        rolling_df = fulldf[numeric_df.columns] \
-            .groupby('PlayerID').rolling(roll_len, min_periods=1).sum() \
-            .drop('PlayerID', axis=1) \
-            .reset_index()
-
-        assert len(rolling_df) == len(fulldf)
-
-        # Rename columns
-        columnnames = {col: '{0:d}-day {1:s}'.format(roll_len, col) for col in numeric_df.columns}
-        rolling_df = rolling_df.rename(columns=columnnames)
-
-        finaldf = pd.concat([fulldf, rolling_df], axis=1).dropna(subset={'Game'}).drop('Date', axis=1)
+        # Join to schedules to get game dates, and sort so each player's games are together and in order
+        df2 = schedules.attach_game_dates_to_dateframe(df) \
+            .sort_values(['PlayerID', 'Date'], kind='mergesort') \
+            .reset_index(drop=True)
+
+        rolling_cols = _get_5v5_rolling_columns(df)
+        rolling_df = rolling.rolling_sum_by_days(df2, 'PlayerID', 'Date', rolling_cols, roll_len) \
+            .rename(columns={col: '{0:d}-day {1:s}'.format(roll_len, col) for col in rolling_cols})
+
+        finaldf = pd.concat([df2.drop('Date', axis=1), rolling_df], axis=1)
         return finaldf
 
     return df
@@ -210,38 +188,31 @@ def make_5v5_rolling_gp(df, **kwargs):
         roll_len = kwargs['roll_len']
 
         df = schedules.attach_game_dates_to_dateframe(df) \
-            .sort_values(['PlayerID', 'Date']) \
-            .drop('Date', axis=1)  # Need this to be in order, else the groupby-cumsum below won't work right
-
-        # Get df and roll
-        to_exclude = {'Game', 'Season', 'Team'}
-        numeric_df = df.select_dtypes(include=[np.number])
-        # Sometimes PlayerID gets converted to obj at some point, so just make sure it gets included
-        # if 'PlayerID' not in numeric_df.columns:
-        #     numeric_df.loc[:, 'PlayerID'] = df.PlayerID
-        numeric_df = numeric_df.drop(to_exclude, axis=1, errors='ignore')
-        rollingdf = numeric_df.groupby('PlayerID') \
-            .rolling(roll_len, min_periods=1).sum() \
-            .drop('PlayerID', axis=1) \
-            .reset_index() \
-            .drop('level_1', axis=1)
-
-        # Rename columns
-        columnnames = {col: '{0:d}-game {1:s}'.format(roll_len, col) for col in numeric_df.columns
-                       if not col == 'PlayerID'}
-        rollingdf = rollingdf.rename(columns=columnnames)
-
-        # Add back to original
-        # Order of players can change, so we'll assign row numbers in each player group
-        df.loc[:, '_Row'] = 1
-        df.loc[:, '_Row'] = df[['PlayerID', '_Row']].groupby('PlayerID').cumsum()
-        rollingdf.loc[:, '_Row'] = 1
-        rollingdf.loc[:, '_Row'] = rollingdf[['PlayerID', '_Row']].groupby('PlayerID').cumsum()
-        df2 = df.merge(rollingdf, how='left', on=['PlayerID', '_Row']).drop('_Row', axis=1)
+            .sort_values(['PlayerID', 'Date'], kind='mergesort') \
+            .drop('Date', axis=1) \
+            .reset_index(drop=True)  # Need this to be in order, else the rolling sums below won't work right
+
+        rolling_cols = _get_5v5_rolling_columns(df)
+        rollingdf = rolling.rolling_sum_by_count(df, 'PlayerID', rolling_cols, roll_len) \
+            .rename(columns={col: '{0:d}-game {1:s}'.format(roll_len, col) for col in rolling_cols})
+
+        df2 = pd.concat([df, rollingdf], axis=1)
         return df2
     return df
 
 
+def _get_5v5_rolling_columns(df):
+    """
+    Returns numeric columns to take rolling sums of: all but season, game, team, and player.
+
+    :param df: dataframe
+
+    :return: list of str
+    """
+    to_exclude = {'Game', 'Season', 'Team', 'PlayerID'}  # Don't want to sum these, even though they're numeric
+    return [col for col in df.select_dtypes(include=[np.number]).columns if col not in to_exclude]
+
+
 def filter_5v5_for_toi(df, **kwargs):
     """
     This method filters the given dataframe for minimum or max TOI or TOI60.
@@ -354,25 +325,32 @@ def get_5v5_df_start_end(**kwargs):
     """
     This method retrieves the correct years of the 5v5 player log and concatenates them.
 
-    :param kwargs: the relevant ones here are startseason and endseason
+    Reads through manipulate.log_store, so logs are read from disk once (and again only when they change). If player,
+    players, or team is in kwargs, only those rows are returned.
+
+    :param kwargs: the relevant ones here are startseason and endseason, and player, players, and team
 
     :return: dataframe
+    :raises ValueError: if player or players includes a name that can't be found
     """
 
     startdate, enddate = get_startdate_enddate_from_kwargs(**kwargs)
-    startseason, endseason = (helper.infer_season_from_date(x) for x in (startdate, enddate))
-
-    df = []
-    for season in range(startseason, endseason + 1):
-        temp = manip.get_5v5_player_log(season)
-        sch = schedules.get_season_schedule(season)
-
-        temp = temp.merge(sch[['Game', 'Date']], how='left', on='Game')
-        temp = temp[(temp.Date >= startdate) & (temp.Date <= enddate)]
-        temp = temp.assign(Season=season)
-        df.append(temp)
-    df = pd.concat(df).sort_values(['Date']).drop('Date', axis=1)  # When games rescheduled, Game ID not in order.
-    return df
+
+    pids = None
+    if 'player' in kwargs:
+        names = [kwargs['player']]
+        pids = [players.player_as_id(kwargs['player'])]
+    elif 'players' in kwargs:
+        names = list(set(kwargs['players']))
+        pids = list(players.playerlst_as_id(names))
+    if pids is not None:
+        missing = [str(name) for name, pid in zip(names, pids) if pd.isnull(pid)]
+        if len(missing) > 0:
+            raise ValueError('Could not find player(s): {0:s}'.format(', '.join(missing)))
+        pids = [int(pid) for pid in pids]
+    teamid = team_info.team_as_id(kwargs['team']) if 'team' in kwargs else None
+
+    return log_store.get_5v5_log(startdate, enddate, pids, teamid)
 
 
 def savefilehelper(**kwargs):
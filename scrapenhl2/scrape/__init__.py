@@ -3,16 +3,24 @@ Indicates to import all .py files
 """
 __all__ = ['autoupdate',
            'check_game_data',
+           'data_cache',
            'events',
            'games'
            'general_helpers',
+           'instrumentation',
            'manipulate_schedules',
            'organization',
+           'parse_live',
            'parse_pbp',
            'parse_toi',
            'players',
+           'profiling',
+           'raw_archive',
+           'raw_codec',
            'schedules',
            'scrape_pbp',
            'scrape_toi',
+           'shift_report',
            'team_info',
-           'teams']
+           'teams',
+           'work_queue']
@@ -4,16 +4,17 @@ This module contains methods for automatically scraping and parsing games.
 
 import os
 import os.path
-import requests
-from tqdm import tqdm
 
 import scrapenhl2.scrape.manipulate_schedules as manipulate_schedules
+import scrapenhl2.scrape.parse_live as parse_live
 import scrapenhl2.scrape.parse_pbp as parse_pbp
 import scrapenhl2.scrape.parse_toi as parse_toi
+import scrapenhl2.scrape.profiling as profiling
 import scrapenhl2.scrape.schedules as schedules
 import scrapenhl2.scrape.scrape_pbp as scrape_pbp
 import scrapenhl2.scrape.scrape_toi as scrape_toi
 import scrapenhl2.scrape.teams as teams
+import scrapenhl2.scrape.work_queue as work_queue
 
 
 def delete_game_html(season, game):
@@ -35,12 +36,15 @@ def delete_game_html(season, game):
             os.remove(filename)
 
 
-def autoupdate(season=None):
+@profiling.profiled('autoupdate')
+def autoupdate(season=None, prerender=False):
     """
     Run this method to update local data. It reads the schedule file for given season and scrapes and parses
     previously unscraped games that have gone final or are in progress. Use this for 2010 or later.
 
     :param season: int, the season. If None (default), will do current season
+    :param prerender: bool. If True, renders game charts for newly final games in a background thread afterwards
+        (see scrapenhl2.plot.render_cache), so the app can serve them from disk.
 
     :return: nothing
     """
@@ -53,19 +57,21 @@ def autoupdate(season=None):
 
     sch = schedules.get_season_schedule(season)
 
-    # First, for all games that were in progress during last scrape, delete html charts
-    inprogress = sch.query('Status == "In Progress"')
-    inprogressgames = inprogress.Game.values
-    inprogressgames.sort()
-    for game in inprogressgames:
-        delete_game_html(season, game)
-
-    # Now keep tabs on old final games
+    # Keep tabs on games that were in progress during last scrape, and old final games
+    old_inprogress_games = set(sch.query('Status == "In Progress"').Game.values)
     old_final_games = set(sch.query('Status == "Final" & Result != "N/A"').Game.values)
 
     # Update schedule to get current status
     schedules.generate_season_schedule_file(season)
 
+    # For games that were in progress during last scrape but have since gone final, delete html charts and live
+    # parser state. Games still in progress keep theirs.
+    sch = schedules.get_season_schedule(season)
+    newly_final = sorted(old_inprogress_games & set(sch.query('Status == "Final"').Game.values))
+    for game in newly_final:
+        delete_game_html(season, game)
+        parse_live.clear_live_state(season, game)
+
     # For games done previously, set pbp and toi status to scraped
     manipulate_schedules.update_schedule_with_pbp_scrape(season, old_final_games)
     manipulate_schedules.update_schedule_with_toi_scrape(season, old_final_games)
@@ -93,62 +99,39 @@ def autoupdate(season=None):
     except Exception as e:
         pass  # ed.print_and_log("Error with team logs in {0:d}: {1:s}".format(season, str(e)), 'warn')
 
+    if prerender:
+        # Imported here so scraping doesn't require matplotlib
+        from scrapenhl2.plot import render_cache
+        render_cache.start_prerender(season, games)
+
 
 def read_final_games(games, season):
     """
+    Scrapes and parses these final games through the work queue (see scrapenhl2.scrape.work_queue), so an
+    interrupted update resumes where it left off, failures are retried, and fetching overlaps with parsing. Team logs
+    are left to the caller.
 
-    :param games:
-    :param season:
+    :param games: iterable of int, the games
+    :param season: int, the season
 
-    :return:
+    :return: nothing
     """
-    for game in tqdm(games, desc="Parsing Games"):
-        try:
-            scrape_pbp.scrape_game_pbp(season, game, True)
-            manipulate_schedules.update_schedule_with_pbp_scrape(season, game)
-            parse_pbp.parse_game_pbp(season, game, True)
-        except requests.exceptions.HTTPError as he:
-            print('Could not access pbp url for {0:d} {1:d}'.format(season, game))
-            print(str(he))
-        except requests.exceptions.ConnectionError as ue:
-            print('Could not access pbp url for {0:d} {1:d}'.format(season, game))
-            print(str(ue))
-        except Exception as e:
-            print(str(e))
-        try:
-            # TODO update only a couple of days later from json and delete html and don't update with toi scrape until then
-            if season < 2010:
-                scrape_toi.scrape_game_toi_from_html(season, game, True)
-                manipulate_schedules.update_schedule_with_toi_scrape(season, game)
-                parse_toi.parse_game_toi_from_html(season, game, True)
-            else:
-                scrape_toi.scrape_game_toi(season, game, True)
-                manipulate_schedules.update_schedule_with_toi_scrape(season, game)
-                parse_toi.parse_game_toi(season, game, True)
-
-                # If you scrape soon after a game the json only has like the first period for example.
-                # If I don't have the full game, use html
-                if len(parse_toi.get_parsed_toi(season, game)) < 3600:
-                    print('Not enough rows in json for {0:d} {1:d}; reading from html'.format(int(season), int(game)))
-                    scrape_toi.scrape_game_toi_from_html(season, game, True)
-                    parse_toi.parse_game_toi_from_html(season, game, True)
-        except (
-            requests.exceptions.HTTPError,
-            requests.exceptions.ReadTimeout,
-        ) as he:
-            print('Could not access toi url for {0:d} {1:d}'.format(season, game))
-            print(str(he))
-        except Exception as e:
-            print(str(e))
-
-        print('Done with {0:d} {1:d} (final)'.format(season, game))
-
-
-def read_inprogress_games(inprogressgames, season):
+    games = [int(game) for game in games]
+    work_queue.enqueue_games(season, games, stages=('fetch_pbp', 'fetch_toi', 'parse_pbp', 'parse_toi'))
+    work_queue.run_queue([season])
+    failed = work_queue.get_failed_tasks([season])
+    failed = failed[failed.Game.isin(games)]
+    for _, row in failed.iterrows():
+        print('Could not {0:s} for {1:d} {2:d}: {3:s}'.format(row.Stage, int(row.Season), int(row.Game), row.Error))
+
+
+def read_inprogress_games(inprogressgames, season, live=True):
     """
     Saves these games to file via html (for toi) and json (for pbp)
 
     :param inprogressgames: list of int
+    :param live: bool. If True, parses only new plays and shifts since the last call (see parse_live). If False,
+        re-parses each game from scratch.
 
     :return:
     """
@@ -157,8 +140,11 @@ def read_inprogress_games(inprogressgames, season):
         # scrape_game_pbp_from_html(season, game, False)
         # parse_game_pbp_from_html(season, game, False)
         # PBP JSON updates live, so I can just use that, as before
-        scrape_pbp.scrape_game_pbp(season, game, True)
-        scrape_toi.scrape_game_toi_from_html(season, game, True)
-        parse_pbp.parse_game_pbp(season, game, True)
-        parse_toi.parse_game_toi_from_html(season, game, True)
+        if live:
+            parse_live.update_live_game(season, game)
+        else:
+            rawpbp = scrape_pbp.scrape_game_pbp(season, game, True, return_payload=True)
+            scrape_toi.scrape_game_toi_from_html(season, game, True)
+            parse_pbp.parse_game_pbp(season, game, True, rawpbp=rawpbp)
+            parse_toi.parse_game_toi_from_html(season, game, True)
         print('Done with {0:d} {1:d} (in progress)'.format(season, game))
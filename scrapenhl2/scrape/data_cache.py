@@ -0,0 +1,188 @@
+"""
+This module contains a process-wide, in-memory cache for dataframes read from disk (team logs and parsed game
+files).
+
+Entries are keyed by (kind, season, team or game) and validated against the file's modification time, so a file
+rewritten on disk is reread on the next access. The cache has a memory budget (in bytes) and evicts the least recently
+used entries once that budget is exceeded. Callers receive copies, so modifying a returned dataframe (e.g. with .loc)
+does not change the cached version.
+
+The budget defaults to 512 MB and can be changed with the SCRAPENHL2_CACHE_MB environment variable or
+set_memory_budget(). A budget of 0 disables caching.
+"""
+
+import collections
+import os
+import os.path
+import threading
+
+from scrapenhl2.scrape import instrumentation
+
+
+def get_cached_dataframe(kind, season, key, filename, reader):
+    """
+    Returns the dataframe stored in filename, using the in-memory copy if the file has not changed since it was read.
+
+    :param kind: str, e.g. 'team_pbp', 'team_toi', 'parsed_pbp', 'parsed_toi'
+    :param season: int, the season
+    :param key: team or game, to identify this file within the season
+    :param filename: str, the file to read
+    :param reader: function that takes filename and returns a dataframe
+
+    :return: a copy of the dataframe
+    """
+    if _BUDGET <= 0:
+        instrumentation.add_file_read(filename)
+        return reader(filename)
+
+    cachekey = (kind, season, key)
+    # Raises FileNotFoundError if the file is missing, same as the readers do
+    mtime = os.path.getmtime(filename)
+
+    with _LOCK:
+        entry = _CACHE.get(cachekey)
+        if entry is not None and entry[0] == mtime:
+            _CACHE.move_to_end(cachekey)
+            _STATS['hits'] += 1
+            return entry[1].copy()
+        _STATS['misses'] += 1
+
+    df = reader(filename)
+    instrumentation.add_file_read(filename)
+    _store(cachekey, mtime, df)
+    return df.copy()
+
+
+def invalidate(kind=None, season=None, key=None):
+    """
+    Drops entries from the cache. Arguments left as None match everything, so invalidate() clears the whole cache.
+
+    :param kind: str or None
+    :param season: int or None
+    :param key: team, game, or None
+
+    :return: nothing
+    """
+    with _LOCK:
+        for cachekey in list(_CACHE.keys()):
+            if (kind is None or cachekey[0] == kind) and (season is None or cachekey[1] == season) \
+                    and (key is None or cachekey[2] == key):
+                _remove(cachekey)
+
+
+def clear_cache():
+    """
+    Empties the cache and resets hit/miss statistics.
+
+    :return: nothing
+    """
+    invalidate()
+    with _LOCK:
+        for stat in _STATS:
+            _STATS[stat] = 0
+
+
+def set_memory_budget(nbytes):
+    """
+    Sets the memory budget for the cache, evicting entries if necessary. Use 0 to disable caching.
+
+    :param nbytes: int, number of bytes
+
+    :return: nothing
+    """
+    global _BUDGET
+    with _LOCK:
+        _BUDGET = int(nbytes)
+        _evict()
+
+
+def get_memory_budget():
+    """
+    Returns the memory budget for the cache.
+
+    :return: int, number of bytes
+    """
+    return _BUDGET
+
+
+def get_cache_stats():
+    """
+    Returns hit/miss statistics and current usage for the cache.
+
+    :return: dict with keys hits, misses, evictions, entries, bytes, budget
+    """
+    with _LOCK:
+        stats = dict(_STATS)
+        stats['entries'] = len(_CACHE)
+        stats['bytes'] = _CACHE_BYTES
+        stats['budget'] = _BUDGET
+    return stats
+
+
+def _store(cachekey, mtime, df):
+    """
+    Adds a dataframe to the cache and evicts older entries if the budget is exceeded. Frames larger than the whole
+    budget are not stored.
+
+    :param cachekey: tuple (kind, season, key)
+    :param mtime: float, file modification time
+    :param df: dataframe
+
+    :return: nothing
+    """
+    global _CACHE_BYTES
+    nbytes = int(df.memory_usage(deep=True).sum())
+    with _LOCK:
+        if cachekey in _CACHE:
+            _remove(cachekey)
+        if nbytes > _BUDGET:
+            return
+        _CACHE[cachekey] = (mtime, df, nbytes)
+        _CACHE_BYTES += nbytes
+        _evict()
+
+
+def _remove(cachekey):
+    """
+    Removes one entry from the cache. Caller must hold the lock.
+
+    :param cachekey: tuple (kind, season, key)
+
+    :return: nothing
+    """
+    global _CACHE_BYTES
+    _, _, nbytes = _CACHE.pop(cachekey)
+    _CACHE_BYTES -= nbytes
+
+
+def _evict():
+    """
+    Drops least recently used entries until the cache fits in its budget. Caller must hold the lock.
+
+    :return: nothing
+    """
+    while _CACHE and _CACHE_BYTES > _BUDGET:
+        _remove(next(iter(_CACHE)))
+        _STATS['evictions'] += 1
+
+
+def data_cache_setup():
+    """
+    Reads the memory budget from the SCRAPENHL2_CACHE_MB environment variable, if set.
+
+    :return: nothing
+    """
+    global _BUDGET
+    try:
+        _BUDGET = int(float(os.environ.get('SCRAPENHL2_CACHE_MB', 512)) * 1024 * 1024)
+    except ValueError:
+        print('Could not read SCRAPENHL2_CACHE_MB; using 512 MB')
+        _BUDGET = 512 * 1024 * 1024
+
+
+_LOCK = threading.RLock()
+_CACHE = collections.OrderedDict()
+_STATS = {'hits': 0, 'misses': 0, 'evictions': 0}
+_CACHE_BYTES = 0
+_BUDGET = 0
+data_cache_setup()
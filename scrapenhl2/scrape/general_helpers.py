@@ -1,13 +1,16 @@
 """
-This module contains general helper methods. None of these methods have dependencies on other scrapenhl2 modules.
+This module contains general helper methods. None of these methods have dependencies on other scrapenhl2 modules,
+except instrumentation (which has none itself), so HTTP requests are timed and counted.
 """
 
+import concurrent.futures
 import functools
 import logging
 import os
 import os.path
 import pickle
 import re
+import threading
 import time
 import requests
 
@@ -15,7 +18,12 @@ import numpy as np
 import pandas as pd
 from fuzzywuzzy import fuzz
 
+from scrapenhl2.scrape import instrumentation
+
 __SESSION__ = None
+_WRITER = None
+_PENDING_WRITES = {}
+_WRITES_LOCK = threading.Lock()
 
 
 def print_and_log(message, level='info', print_and_log=True):
@@ -334,6 +342,7 @@ def get_initials(pname):
     return ''.join([part[0] for part in pname.split(' ')])
 
 
+@instrumentation.instrument('scrape.http', labels=())
 def try_url_n_times(url, timeout=5, n=5):
     """
     A helper method that tries to access given url up to five times, returning the page.
@@ -355,6 +364,7 @@ def try_url_n_times(url, timeout=5, n=5):
         try:
             resp = __SESSION__.get(url, timeout=5)
             page = resp.text
+            instrumentation.add_bytes_read(len(resp.content))
             break
         except requests.HTTPError as httpe:
             if '404' in str(httpe):
@@ -400,3 +410,75 @@ def anti_join(df1, df2, **kwargs):
     return df1.merge(df2, how='left', indicator=True, **kwargs) \
         .query('_merge != "both"') \
         .drop('_merge', axis=1)
+
+
+def write_file_in_background(filename, data, encode=None):
+    """
+    Writes bytes to a file in a background thread, so the caller can move on (e.g. to parsing the same data). Writes
+    go to a temporary file that is then renamed, so readers never see a partial file, and happen in the order
+    submitted. Until a write finishes, get_pending_write returns its data. Call result() on the returned future to
+    wait for the write; it raises if the write failed. Writes still queued at exit finish before the interpreter exits.
+
+    :param filename: str
+    :param data: bytes
+    :param encode: method taking data and returning the bytes to write (e.g. to compress), or None to write data as
+        is. Runs in the background thread too, so get_pending_write returns data as given, not encoded.
+
+    :return: concurrent.futures.Future
+    """
+    global _WRITER
+    with _WRITES_LOCK:
+        if _WRITER is None:
+            _WRITER = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        _PENDING_WRITES[filename] = data
+        return _WRITER.submit(_write_pending_file, filename, data, encode)
+
+
+def get_pending_write(filename):
+    """
+    Returns data waiting to be written to this file in the background, if any.
+
+    :param filename: str
+
+    :return: the data, as passed to write_file_in_background (before encoding), or None
+    """
+    return _PENDING_WRITES.get(filename)
+
+
+def flush_background_writes():
+    """
+    Waits for all background writes submitted so far to finish.
+
+    :return: nothing
+    """
+    with _WRITES_LOCK:
+        writer = _WRITER
+    if writer is not None:
+        writer.submit(lambda: None).result()
+
+
+def _write_pending_file(filename, data, encode=None):
+    """
+    Does one background write. Errors are raised, so they reach whoever waits on the write's future.
+
+    :param filename: str
+    :param data: bytes
+    :param encode: method taking data and returning the bytes to write, or None
+
+    :return: nothing
+    """
+    tempfile = filename + '.tmp'
+    try:
+        encoded = data if encode is None else encode(data)
+        with open(tempfile, 'wb') as writer:
+            writer.write(encoded)
+        os.replace(tempfile, filename)
+    except Exception:
+        if os.path.exists(tempfile):
+            os.remove(tempfile)
+        raise
+    finally:
+        with _WRITES_LOCK:
+            if _PENDING_WRITES.get(filename) is data:
+                del _PENDING_WRITES[filename]
+
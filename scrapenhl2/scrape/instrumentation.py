@@ -0,0 +1,371 @@
+"""
+This module contains lightweight instrumentation for the scrape, parse, team log, and manipulate stages.
+
+Each instrumented stage records wall time, rows in and out, bytes read and written, and the process's peak RSS so far.
+Records are written as JSON lines, one per stage run, and totals by stage can be written as a Prometheus text file
+(e.g. for node_exporter's textfile collector).
+
+Instrumentation is off by default, and then instrumented functions just call through. To turn it on, set one or both
+of these environment variables before running (or call enable()):
+
+- SCRAPENHL2_METRICS_FILE: file to append JSON lines to
+- SCRAPENHL2_METRICS_PROM: Prometheus text file to write totals to (rewritten at exit, or with write_prometheus_file)
+
+Use the instrument decorator for whole functions, and stage as a context manager for parts of functions. Code running
+inside a stage can report I/O with add_bytes_read, add_bytes_written, add_file_read, and add_file_written; these go to
+the innermost stage running in the current thread.
+"""
+
+import atexit
+import functools
+import inspect
+import json
+import os
+import os.path
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def instrument(name, labels=('season', 'game', 'team')):
+    """
+    A decorator that runs the function as a stage. Rows in are counted from the first dataframe (or array) argument,
+    and rows out from the return value, if it is a dataframe or array.
+
+    :param name: str, the stage name, e.g. 'parse.pbp'
+    :param labels: iterable of str, names of arguments to record as labels, if the function has them
+
+    :return: decorator
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        label_args = [arg for arg in labels if arg in signature.parameters]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _ENABLED:
+                return func(*args, **kwargs)
+
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            with stage(name, **{arg: arguments[arg] for arg in label_args if arg in arguments}) as st:
+                st.rows_in = _count_rows(*args, *kwargs.values())
+                result = func(*args, **kwargs)
+                st.rows_out = _count_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def stage(name, **labels):
+    """
+    Returns a context manager that records a stage. Set rows_in, rows_out, bytes_read, and bytes_written on it as
+    needed.
+
+    :param name: str, the stage name, e.g. 'teams.write_toi'
+    :param labels: label values, e.g. season=2017, game=20001
+
+    :return: Stage, or a shared no-op stage if instrumentation is off
+    """
+    if not _ENABLED:
+        return _NO_STAGE
+    return Stage(name, labels)
+
+
+class Stage(object):
+    """
+    One run of a stage. Use via stage().
+    """
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.rows_in = None
+        self.rows_out = None
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._start = None
+
+    def __enter__(self):
+        _stack().append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        secs = time.perf_counter() - self._start
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        _record({'stage': self.name,
+                 'labels': {key: _jsonable(val) for key, val in self.labels.items()},
+                 'time': time.time(),
+                 'secs': secs,
+                 'rows_in': self.rows_in,
+                 'rows_out': self.rows_out,
+                 'bytes_read': self.bytes_read,
+                 'bytes_written': self.bytes_written,
+                 'peak_rss_bytes': get_peak_rss(),
+                 'error': None if exc_type is None else exc_type.__name__})
+        return False
+
+
+class _NoStage(object):
+    """
+    What stage() returns when instrumentation is off. Accepts and ignores everything.
+    """
+    rows_in = None
+    rows_out = None
+    bytes_read = 0
+    bytes_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def __setattr__(self, key, value):
+        pass
+
+
+def add_bytes_read(nbytes):
+    """
+    Adds to bytes read for the innermost stage in this thread.
+
+    :param nbytes: int
+
+    :return: nothing
+    """
+    if _ENABLED:
+        stack = _stack()
+        if stack:
+            stack[-1].bytes_read += nbytes
+
+
+def add_bytes_written(nbytes):
+    """
+    Adds to bytes written for the innermost stage in this thread.
+
+    :param nbytes: int
+
+    :return: nothing
+    """
+    if _ENABLED:
+        stack = _stack()
+        if stack:
+            stack[-1].bytes_written += nbytes
+
+
+def add_file_read(filename):
+    """
+    Adds the size of this file to bytes read for the innermost stage in this thread.
+
+    :param filename: str
+
+    :return: nothing
+    """
+    if _ENABLED and os.path.exists(filename):
+        add_bytes_read(os.path.getsize(filename))
+
+
+def add_file_written(filename):
+    """
+    Adds the size of this file to bytes written for the innermost stage in this thread.
+
+    :param filename: str
+
+    :return: nothing
+    """
+    if _ENABLED and os.path.exists(filename):
+        add_bytes_written(os.path.getsize(filename))
+
+
+def get_peak_rss():
+    """
+    Returns the peak resident set size of this process so far.
+
+    :return: int, bytes, or None where unavailable
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # kilobytes, except on macOS
+
+
+def get_stage_totals():
+    """
+    Returns totals by stage since instrumentation was turned on.
+
+    :return: dict of stage name to dict with calls, errors, secs, rows_in, rows_out, bytes_read, and bytes_written
+    """
+    with _LOCK:
+        return {name: dict(totals) for name, totals in _TOTALS.items()}
+
+
+def write_prometheus_file(filename=None):
+    """
+    Writes stage totals in the Prometheus text format.
+
+    :param filename: str, or None to use SCRAPENHL2_METRICS_PROM
+
+    :return: nothing
+    """
+    filename = filename or _PROM_FILE
+    if filename is None:
+        return
+
+    metrics = [('calls', 'counter', 'Number of times each stage ran'),
+               ('errors', 'counter', 'Number of times each stage raised an error'),
+               ('secs', 'counter', 'Wall time spent in each stage, in seconds'),
+               ('rows_in', 'counter', 'Rows passed into each stage'),
+               ('rows_out', 'counter', 'Rows returned from each stage'),
+               ('bytes_read', 'counter', 'Bytes read by each stage'),
+               ('bytes_written', 'counter', 'Bytes written by each stage')]
+    totals = get_stage_totals()
+    lines = []
+    for key, kind, desc in metrics:
+        metric = 'scrapenhl2_stage_{0:s}_total'.format(key)
+        lines.append('# HELP {0:s} {1:s}'.format(metric, desc))
+        lines.append('# TYPE {0:s} {1:s}'.format(metric, kind))
+        for name in sorted(totals):
+            lines.append('{0:s}{{stage="{1:s}"}} {2}'.format(metric, name, totals[name][key]))
+    peak = get_peak_rss()
+    if peak is not None:
+        lines.append('# HELP scrapenhl2_peak_rss_bytes Peak resident set size of the process')
+        lines.append('# TYPE scrapenhl2_peak_rss_bytes gauge')
+        lines.append('scrapenhl2_peak_rss_bytes {0:d}'.format(peak))
+
+    # Write and rename, so a collector never reads a partial file
+    tempfile = filename + '.tmp'
+    with open(tempfile, 'w') as writer:
+        writer.write('\n'.join(lines) + '\n')
+    os.replace(tempfile, filename)
+
+
+def enable(json_file=None, prometheus_file=None):
+    """
+    Turns instrumentation on.
+
+    :param json_file: str, file to append JSON lines to, or None for none
+    :param prometheus_file: str, Prometheus text file to write totals to at exit, or None for none
+
+    :return: nothing
+    """
+    global _ENABLED, _JSON_FILE, _PROM_FILE
+    with _LOCK:
+        _JSON_FILE = json_file
+        _PROM_FILE = prometheus_file
+        _ENABLED = True
+
+
+def disable():
+    """
+    Turns instrumentation off. Totals are kept.
+
+    :return: nothing
+    """
+    global _ENABLED
+    _ENABLED = False
+
+
+def is_enabled():
+    """
+    Returns whether instrumentation is on.
+
+    :return: bool
+    """
+    return _ENABLED
+
+
+def _record(record):
+    """
+    Adds a stage record to the totals and writes it to the JSON lines file.
+
+    :param record: dict
+
+    :return: nothing
+    """
+    with _LOCK:
+        totals = _TOTALS.setdefault(record['stage'], {'calls': 0, 'errors': 0, 'secs': 0.0, 'rows_in': 0,
+                                                      'rows_out': 0, 'bytes_read': 0, 'bytes_written': 0})
+        totals['calls'] += 1
+        totals['errors'] += record['error'] is not None
+        totals['secs'] += record['secs']
+        totals['rows_in'] += record['rows_in'] or 0
+        totals['rows_out'] += record['rows_out'] or 0
+        totals['bytes_read'] += record['bytes_read']
+        totals['bytes_written'] += record['bytes_written']
+
+        if _JSON_FILE is not None:
+            with open(_JSON_FILE, 'a') as writer:
+                writer.write(json.dumps(record) + '\n')
+
+
+def _count_rows(*objs):
+    """
+    Returns the number of rows of the first dataframe or array among objs.
+
+    :param objs: objects
+
+    :return: int, or None if there are none
+    """
+    for obj in objs:
+        shape = getattr(obj, 'shape', None)
+        if shape is not None and len(shape) > 0:
+            return int(shape[0])
+    return None
+
+
+def _jsonable(val):
+    """
+    Converts label values (e.g. numpy ints) to something json can write.
+
+    :param val: obj
+
+    :return: int, float, str, or None
+    """
+    if val is None or isinstance(val, (int, float, str)):
+        return val
+    try:
+        return val.item()  # numpy scalars
+    except (AttributeError, ValueError):
+        return str(val)
+
+
+def _stack():
+    """
+    Returns this thread's stack of running stages.
+
+    :return: list of Stage
+    """
+    stack = getattr(_LOCAL, 'stack', None)
+    if stack is None:
+        stack = _LOCAL.stack = []
+    return stack
+
+
+def instrumentation_setup():
+    """
+    Turns instrumentation on if SCRAPENHL2_METRICS_FILE or SCRAPENHL2_METRICS_PROM is set.
+
+    :return: nothing
+    """
+    json_file = os.environ.get('SCRAPENHL2_METRICS_FILE') or None
+    prometheus_file = os.environ.get('SCRAPENHL2_METRICS_PROM') or None
+    if json_file is not None or prometheus_file is not None:
+        enable(json_file, prometheus_file)
+
+
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+_TOTALS = {}
+_NO_STAGE = _NoStage()
+_ENABLED = False
+_JSON_FILE = None
+_PROM_FILE = None
+instrumentation_setup()
+atexit.register(write_prometheus_file)
@@ -1,7 +1,11 @@
 """
 This module contains paths to folders.
+
+Data lives in scrapenhl2/data by default. To use another folder (e.g. for benchmarks on synthetic data), set the
+SCRAPENHL2_DATA_DIR environment variable before importing scrapenhl2.
 """
 
+import os
 import os.path
 
 
@@ -27,13 +31,22 @@ def get_base_dir():
     return os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
 
+def get_data_folder():
+    """
+    Returns the folder containing all data: SCRAPENHL2_DATA_DIR if set, or else /scrape/data/
+
+    :return: str, /scrape/data/
+    """
+    return os.environ.get('SCRAPENHL2_DATA_DIR', os.path.join(get_base_dir(), 'data'))
+
+
 def get_raw_data_folder():
     """
     Returns the folder containing raw data
 
     :return: str, /scrape/data/raw/
     """
-    return os.path.join(get_base_dir(), 'data', 'raw')
+    return os.path.join(get_data_folder(), 'raw')
 
 
 def get_parsed_data_folder():
@@ -42,7 +55,7 @@ def get_parsed_data_folder():
 
     :return: str, /scrape/data/parsed/
     """
-    return os.path.join(get_base_dir(), 'data', 'parsed')
+    return os.path.join(get_data_folder(), 'parsed')
 
 
 def get_team_data_folder():
@@ -51,7 +64,7 @@ def get_team_data_folder():
 
     :return: str, /scrape/data/teams/
     """
-    return os.path.join(get_base_dir(), 'data', 'teams')
+    return os.path.join(get_data_folder(), 'teams')
 
 
 def get_other_data_folder():
@@ -60,7 +73,7 @@ def get_other_data_folder():
 
     :return: str, /scrape/data/other/
     """
-    return os.path.join(get_base_dir(), 'data', 'other')
+    return os.path.join(get_data_folder(), 'other')
 
 
 def get_season_raw_pbp_folder(season):
@@ -0,0 +1,288 @@
+"""
+This module contains methods for parsing in-progress games incrementally.
+
+For each live game, parser state is kept in memory (and checkpointed to disk, so it survives restarts): the parsed
+pbp so far, the last event index seen and the running score, the shifts seen so far, and the TOI matrix. On each poll,
+only plays past the last event index are parsed, and the TOI matrix is recalculated only from the earliest new shift
+onward.
+
+Plays already parsed are not revisited, so late corrections by the league (e.g. assist changes) are picked up when the
+game goes final and is re-parsed from scratch by autoupdate.
+"""
+
+import os
+import os.path
+import pickle
+
+import pandas as pd
+
+import scrapenhl2.scrape.general_helpers as helpers
+import scrapenhl2.scrape.manipulate_schedules as manipulate_schedules
+import scrapenhl2.scrape.organization as organization
+import scrapenhl2.scrape.parse_pbp as parse_pbp
+import scrapenhl2.scrape.parse_toi as parse_toi
+import scrapenhl2.scrape.players as players
+import scrapenhl2.scrape.schedules as schedules
+import scrapenhl2.scrape.scrape_pbp as scrape_pbp
+import scrapenhl2.scrape.scrape_toi as scrape_toi
+
+
+def update_live_game(season, game, checkpoint=True):
+    """
+    Scrapes the json pbp and html shift logs for this game, parses new plays and shifts, and saves parsed pbp and toi.
+
+    :param season: int, the season
+    :param game: int, the game
+    :param checkpoint: bool, whether to save parser state to disk as well as memory
+
+    :return: nothing
+    """
+    rawpbp = scrape_pbp.scrape_game_pbp(season, game, True, return_payload=True)
+    scrape_toi.scrape_game_toi_from_html(season, game, True)
+
+    state = get_live_state(season, game)
+
+    if state['pbp'] is None:
+        # First time seeing this game: coaches and rosters, as in parse_pbp.parse_game_pbp
+        players.update_player_ids_from_page(rawpbp)
+        players.update_player_logs_from_page(rawpbp, season, game)
+        manipulate_schedules.update_schedule_with_coaches(rawpbp, season, game)
+    else:
+        players.update_player_ids_from_page(rawpbp)
+
+    if update_live_pbp(state, rawpbp):
+        parse_pbp.save_parsed_pbp(state['pbp'], season, game)
+
+    gameinfo = schedules.get_game_data_from_schedule(season, game)
+    sweaters = parse_toi.get_sweater_numbers_from_pbp(rawpbp)
+    shifts = pd.concat([parse_toi.read_shift_rows_from_html_page(scrape_toi.get_raw_html_toi(season, game, 'H'),
+                                                                 gameinfo['Home'], sweaters.get(gameinfo['Home'])),
+                        parse_toi.read_shift_rows_from_html_page(scrape_toi.get_raw_html_toi(season, game, 'R'),
+                                                                 gameinfo['Road'], sweaters.get(gameinfo['Road']))],
+                       ignore_index=True)
+    if update_live_toi(state, shifts):
+        parse_toi.save_parsed_toi(state['toi'], season, game)
+
+    if checkpoint:
+        save_live_state(state)
+
+
+def update_live_pbp(state, rawpbp):
+    """
+    Parses plays past the last event index in state and appends them to the parsed pbp in state.
+
+    If the feed has fewer plays than already parsed (e.g. plays were deleted), the pbp is re-parsed from scratch.
+
+    :param state: dict, from get_live_state. Updated in place
+    :param rawpbp: json, the raw json pbp
+
+    :return: bool, True if the parsed pbp changed
+    """
+    plays = helpers.try_to_access_dict(rawpbp, 'liveData', 'plays', 'allPlays')
+    if plays is None:
+        return False
+
+    if len(plays) < state['pbp_count']:
+        _reset_live_pbp(state)
+
+    newplays = [play for i, play in enumerate(plays)
+                if helpers.try_to_access_dict(play, 'about', 'eventIdx', default_return=i) > state['last_event']]
+    if len(newplays) == 0:
+        return False
+
+    gameinfo = schedules.get_game_data_from_schedule(state['season'], state['game'])
+    newdf = parse_pbp._create_pbp_df_json(newplays, gameinfo)
+    newdf.loc[:, 'Index'] = newdf.Index + state['pbp_count']
+    newdf = _add_scores_to_live_pbp(newdf, gameinfo, state)
+    newdf = parse_pbp._add_times_to_pbp(newdf)
+
+    if state['pbp'] is None:
+        state['pbp'] = newdf
+    else:
+        state['pbp'] = pd.concat([state['pbp'], newdf], ignore_index=True)
+    state['pbp_count'] = len(state['pbp'])
+    state['last_event'] = helpers.try_to_access_dict(newplays, -1, 'about', 'eventIdx',
+                                                     default_return=len(plays) - 1)
+    return True
+
+
+def _add_scores_to_live_pbp(pbpdf, gameinfo, state):
+    """
+    Adds HomeScore and RoadScore to new plays, continuing from the running score in state (which is then updated).
+    Matches parse_pbp._add_scores_to_pbp: each goal counts on its own row, and the first row of the game is 0-0.
+
+    :param pbpdf: dataframe of new plays
+    :param gameinfo: dict, one row of the schedule file
+    :param state: dict, from get_live_state. Updated in place
+
+    :return: dataframe with two extra columns
+    """
+    goals = pbpdf.Event == 'Goal'
+    pbpdf.loc[:, 'HomeScore'] = ((goals & (pbpdf.Team == gameinfo['Home'])).cumsum() + state['home_score']) \
+        .astype(float)
+    pbpdf.loc[:, 'RoadScore'] = ((goals & (pbpdf.Team == gameinfo['Road'])).cumsum() + state['road_score']) \
+        .astype(float)
+    pbpdf.loc[pbpdf.Index == 0, 'HomeScore'] = 0
+    pbpdf.loc[pbpdf.Index == 0, 'RoadScore'] = 0
+
+    state['home_score'] = pbpdf.HomeScore.iloc[-1]
+    state['road_score'] = pbpdf.RoadScore.iloc[-1]
+    return pbpdf
+
+
+def update_live_toi(state, shifts):
+    """
+    Finds shifts not seen before and recalculates the TOI matrix from the earliest new shift start (or the end of the
+    previous matrix, if earlier) onward. Seconds before that are kept from the previous matrix.
+
+    If shifts seen before are missing or changed (e.g. the league corrected them), recalculates the whole matrix.
+
+    :param state: dict, from get_live_state. Updated in place
+    :param shifts: dataframe with one row per shift, from parse_toi.read_shift_rows_from_html_page
+
+    :return: bool, True if the TOI matrix changed
+    """
+    keys = ['PlayerID', 'Period', 'Start', 'End']
+    if len(shifts) == 0:
+        return False
+    if state['shifts'] is None or state['toi'] is None:
+        newshifts = shifts
+        start = None
+    else:
+        newshifts = helpers.anti_join(shifts, state['shifts'][keys], on=keys)
+        if len(newshifts) == 0:
+            return False
+        dropped = helpers.anti_join(state['shifts'][keys], shifts[keys], on=keys)
+        if len(dropped) > 0 or len(state['toi']) == 0:
+            start = None
+        else:
+            # The previous matrix stops a second short of its last shift end (see
+            # parse_toi._finish_toidf_manipulations), and new shifts start a second after it, so pick up from there
+            start = min(newshifts.Start.min(), state['toi'].Time.max() + 1)
+
+    if start is None:
+        toi = parse_toi._finish_toidf_manipulations(shifts, state['season'], state['game'])
+    else:
+        # Only shifts still going at start affect the matrix from start onward. Shifts ending before they start
+        # cross a period break (see parse_toi._finish_toidf_manipulations), so keep those too.
+        ongoing = shifts[(shifts.End >= start) | (shifts.End < shifts.Start)]
+        partial = parse_toi._finish_toidf_manipulations(ongoing, state['season'], state['game'])
+        toi = pd.concat([state['toi'][state['toi'].Time < start], partial[partial.Time >= start]],
+                        ignore_index=True)
+        toi = toi[_toi_column_order(toi.columns)]
+
+    state['shifts'] = shifts
+    state['toi'] = toi
+    return True
+
+
+def _toi_column_order(columns):
+    """
+    Returns TOI columns in the order parse_toi._finish_toidf_manipulations uses: Time, players (H1...HG, R1...RG),
+    then strengths.
+
+    :param columns: iterable of str
+
+    :return: list of str
+    """
+    strengths = ['HomeStrength', 'RoadStrength']
+    others = sorted(col for col in columns if col != 'Time' and col not in strengths)
+    return ['Time'] + others + [col for col in strengths if col in columns]
+
+
+def get_live_state(season, game):
+    """
+    Returns parser state for this game: from memory if available, else from a disk checkpoint, else a new state.
+
+    :param season: int, the season
+    :param game: int, the game
+
+    :return: dict
+    """
+    key = (season, game)
+    if key not in _LIVE_STATES:
+        try:
+            with open(get_live_state_filename(season, game), 'rb') as reader:
+                _LIVE_STATES[key] = pickle.load(reader)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            _LIVE_STATES[key] = {'season': season, 'game': game, 'pbp': None, 'shifts': None, 'toi': None}
+            _reset_live_pbp(_LIVE_STATES[key])
+    return _LIVE_STATES[key]
+
+
+def _reset_live_pbp(state):
+    """
+    Clears pbp-related parser state.
+
+    :param state: dict, from get_live_state. Updated in place
+
+    :return: nothing
+    """
+    state['pbp'] = None
+    state['pbp_count'] = 0
+    state['last_event'] = -1
+    state['home_score'] = 0
+    state['road_score'] = 0
+
+
+def save_live_state(state):
+    """
+    Checkpoints parser state to disk.
+
+    :param state: dict, from get_live_state
+
+    :return: nothing
+    """
+    filename = get_live_state_filename(state['season'], state['game'])
+    with open(filename + '.tmp', 'wb') as writer:
+        pickle.dump(state, writer)
+    os.replace(filename + '.tmp', filename)
+
+
+def clear_live_state(season, game):
+    """
+    Removes parser state for this game from memory and disk. Use when the game goes final.
+
+    :param season: int, the season
+    :param game: int, the game
+
+    :return: nothing
+    """
+    _LIVE_STATES.pop((season, game), None)
+    filename = get_live_state_filename(season, game)
+    if os.path.exists(filename):
+        os.remove(filename)
+
+
+def get_live_state_folder():
+    """
+    Returns the folder for live parser checkpoints.
+
+    :return: str, /scrape/data/other/live/
+    """
+    return os.path.join(organization.get_other_data_folder(), 'live')
+
+
+def get_live_state_filename(season, game):
+    """
+    Returns the filename for this game's live parser checkpoint.
+
+    :param season: int, the season
+    :param game: int, the game
+
+    :return: str, /scrape/data/other/live/[season]-[game].pkl
+    """
+    return os.path.join(get_live_state_folder(), '{0:d}-{1:d}.pkl'.format(int(season), int(game)))
+
+
+def parse_live_setup():
+    """
+    Creates the live checkpoint folder if need be
+
+    :return: nothing
+    """
+    organization.check_create_folder(get_live_state_folder())
+
+
+_LIVE_STATES = {}
+parse_live_setup()
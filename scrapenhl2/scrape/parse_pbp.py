@@ -7,7 +7,9 @@ import os.path
 import numpy as np
 import pandas as pd
 
+import scrapenhl2.scrape.data_cache as data_cache
 import scrapenhl2.scrape.general_helpers as helpers
+import scrapenhl2.scrape.instrumentation as instrumentation
 import scrapenhl2.scrape.manipulate_schedules as manipulate_schedules
 import scrapenhl2.scrape.organization as organization
 import scrapenhl2.scrape.players as players
@@ -53,9 +55,11 @@ def get_parsed_pbp(season, game):
 
     :return: json, the json pbp
     """
-    return pd.read_hdf(get_game_parsed_pbp_filename(season, game))
+    return data_cache.get_cached_dataframe('parsed_pbp', season, game, get_game_parsed_pbp_filename(season, game),
+                                           pd.read_hdf)
 
 
+@instrumentation.instrument('parse.write_pbp')
 def save_parsed_pbp(pbp, season, game):
     """
     Saves the pandas dataframe containing pbp information to disk as an HDF5.
@@ -69,6 +73,8 @@ def save_parsed_pbp(pbp, season, game):
     pbp.to_hdf(get_game_parsed_pbp_filename(season, game),
                key='P{0:d}0{1:d}'.format(season, game),
                mode='w', complib='zlib')
+    instrumentation.add_file_written(get_game_parsed_pbp_filename(season, game))
+    data_cache.invalidate('parsed_pbp', season, game)
 
 
 def _create_pbp_df_json(pbp, gameinfo):
@@ -204,6 +210,7 @@ def _add_times_to_pbp(pbpdf):
     return pbpdf
 
 
+@instrumentation.instrument('parse.pbp')
 def read_events_from_page(rawpbp, season, game):
     """
     This method takes the json pbp and returns a pandas dataframe with the following columns:
@@ -255,7 +262,7 @@ def get_game_parsed_pbp_filename(season, game):
     return os.path.join(organization.get_season_parsed_pbp_folder(season), str(game) + '.h5')
 
 
-def parse_game_pbp(season, game, force_overwrite=False):
+def parse_game_pbp(season, game, force_overwrite=False, rawpbp=None):
     """
     Reads the raw pbp from file, updates player IDs, updates player logs, and parses the JSON to a pandas DF
     and writes to file. Also updates team logs accordingly.
@@ -263,6 +270,8 @@ def parse_game_pbp(season, game, force_overwrite=False):
     :param season: int, the season
     :param game: int, the game
     :param force_overwrite: bool. If True, will execute. If False, executes only if file does not exist yet.
+    :param rawpbp: json, the raw pbp, if already in memory (e.g. from scrape_pbp.scrape_game_pbp). If None, reads it
+        from file
 
     :return: True if parsed, False if not
     """
@@ -272,7 +281,8 @@ def parse_game_pbp(season, game, force_overwrite=False):
         return False
 
     # Looks like 2010-11 is the first year where this feed supplies more than just boxscore data
-    rawpbp = scrape_pbp.get_raw_pbp(season, game)
+    if rawpbp is None:
+        rawpbp = scrape_pbp.get_raw_pbp(season, game)
     players.update_player_ids_from_page(rawpbp)
     players.update_player_logs_from_page(rawpbp, season, game)
     manipulate_schedules.update_schedule_with_coaches(rawpbp, season, game)
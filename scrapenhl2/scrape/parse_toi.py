@@ -3,15 +3,18 @@ This module contains methods for parsing TOI.
 """
 
 import os.path
-import re
 
 import pandas as pd
 
+import scrapenhl2.scrape.data_cache as data_cache
 import scrapenhl2.scrape.general_helpers as helpers
+import scrapenhl2.scrape.instrumentation as instrumentation
 import scrapenhl2.scrape.organization as organization
 import scrapenhl2.scrape.players as players
 import scrapenhl2.scrape.schedules as schedules
+import scrapenhl2.scrape.scrape_pbp as scrape_pbp
 import scrapenhl2.scrape.scrape_toi as scrape_toi
+import scrapenhl2.scrape.shift_report as shift_report
 
 
 def parse_season_toi(season, force_overwrite=False):
@@ -34,13 +37,15 @@ def parse_season_toi(season, force_overwrite=False):
         parse_game_toi(season, game, force_overwrite)
 
 
-def parse_game_toi(season, game, force_overwrite=False):
+def parse_game_toi(season, game, force_overwrite=False, rawtoi=None):
     """
     Parses TOI from json for this game
 
     :param season: int, the season
     :param game: int, the game
     :param force_overwrite: bool. If True, will execute. If False, executes only if file does not exist yet.
+    :param rawtoi: json, the raw shifts, if already in memory (e.g. from scrape_toi.scrape_game_toi). If None, reads
+        them from file
 
     :return: nothing
     """
@@ -50,7 +55,8 @@ def parse_game_toi(season, game, force_overwrite=False):
 
     # TODO for some earlier seasons I need to read HTML instead. Also for live games
     # Looks like 2010-11 is the first year where this feed supplies more than just boxscore data
-    rawtoi = scrape_toi.get_raw_toi(season, game)
+    if rawtoi is None:
+        rawtoi = scrape_toi.get_raw_toi(season, game)
     try:
         parsedtoi = read_shifts_from_page(rawtoi, season, game)
     except ValueError as ve:
@@ -111,9 +117,11 @@ def get_parsed_toi(season, game):
 
     :return: json, the json shifts
     """
-    return pd.read_hdf(get_game_parsed_toi_filename(season, game))
+    return data_cache.get_cached_dataframe('parsed_toi', season, game, get_game_parsed_toi_filename(season, game),
+                                           pd.read_hdf)
 
 
+@instrumentation.instrument('parse.write_toi')
 def save_parsed_toi(toi, season, game):
     """
     Saves the pandas dataframe containing shift information to disk as an HDF5.
@@ -130,9 +138,11 @@ def save_parsed_toi(toi, season, game):
     toi.to_hdf(get_game_parsed_toi_filename(season, game),
                key='T{0:d}0{1:d}'.format(season, game),
                mode='w', complib='zlib')
+    instrumentation.add_file_written(get_game_parsed_toi_filename(season, game))
+    data_cache.invalidate('parsed_toi', season, game)
 
 
-def read_shifts_from_html_pages(rawtoi1, rawtoi2, teamid1, teamid2, season, game):
+def read_shifts_from_html_pages(rawtoi1, rawtoi2, teamid1, teamid2, season, game, rawpbp=None):
     """
     Aggregates information from two html pages given into a dataframe with one row per second and one col per player.
 
@@ -142,64 +152,101 @@ def read_shifts_from_html_pages(rawtoi1, rawtoi2, teamid1, teamid2, season, game
     :param teamid2: int, team id corresponding to rawtoi1
     :param season: int, the season
     :param game: int, the game
+    :param rawpbp: json, the game's raw pbp, used to match sweater numbers to player IDs. If None, reads it from file
+        (and falls back to matching names if there is none)
 
     :return: dataframe
     """
+    if rawpbp is None:
+        try:
+            rawpbp = scrape_pbp.get_raw_pbp(season, game)
+        except FileNotFoundError:
+            rawpbp = {}
+    sweaters = get_sweater_numbers_from_pbp(rawpbp)
 
-    from html_table_extractor.extractor import Extractor
     dflst = []
     for rawtoi, teamid in zip((rawtoi1, rawtoi2), (teamid1, teamid2)):
-        extractor = Extractor(rawtoi)
-        extractor.parse()
-        tables = extractor.return_list()
-
-        ids = []
-        periods = []
-        starts = []
-        ends = []
-        durationtime = []
-        teams = []
-        i = 0
-        while i < len(tables):
-            # A convenient artefact of this package: search for [p, p, p, p, p, p, p, p]
-            if len(tables[i]) == 8 and helpers.check_number_last_first_format(tables[i][0]):
-                pname = helpers.remove_leading_number(tables[i][0])
-                pname = helpers.flip_first_last(pname)
-                pid = players.player_as_id(pname)
-                i += 2  # skip the header row
-                while re.match('\d{1,2}', tables[i][0]):  # First entry is shift number
-                    # print(tables[i])
-                    shiftnum, per, start, end, dur, ev = tables[i]
-                    # print(pname, pid, shiftnum, per, start, end)
-                    ids.append(pid)
-                    periods.append(int(per))
-                    starts.append(start[:start.index('/')].strip())
-                    ends.append(end[:end.index('/')].strip())
-                    durationtime.append(helpers.mmss_to_secs(dur))
-                    teams.append(teamid)
-                    i += 1
-                i += 1
-            else:
-                i += 1
-
-        startmin = [x[:x.index(':')] for x in starts]
-        startsec = [x[x.index(':') + 1:] for x in starts]
-        starttimes = [1200 * (p - 1) + 60 * int(m) + int(s) + 1 for p, m, s in zip(periods, startmin, startsec)]
-        # starttimes = [0 if x == 1 else x for x in starttimes]
-        endmin = [x[:x.index(':')] for x in ends]
-        endsec = [x[x.index(':') + 1:] for x in ends]
-        # There is an extra -1 in endtimes to avoid overlapping start/end
-        endtimes = [1200 * (p - 1) + 60 * int(m) + int(s) for p, m, s in zip(periods, endmin, endsec)]
-
-        durationtime = [e - s for s, e in zip(starttimes, endtimes)]
-
-        df = pd.DataFrame({'PlayerID': ids, 'Period': periods, 'Start': starttimes, 'End': endtimes,
-                           'Team': teams, 'Duration': durationtime})
-        dflst.append(df)
+        dflst.append(read_shift_rows_from_html_page(rawtoi, teamid, sweaters.get(teamid)))
 
     return _finish_toidf_manipulations(pd.concat(dflst), season, game)
 
 
+def get_sweater_numbers_from_pbp(rawpbp):
+    """
+    Reads each team's sweater numbers from the boxscore in the json pbp, so html shift logs can be matched to player
+    IDs without searching names.
+
+    :param rawpbp: json, the raw pbp
+
+    :return: dict of team ID to dict of sweater number (int) to player ID
+    """
+    sweaters = {}
+    for homeroad in ('home', 'away'):
+        teamid = helpers.try_to_access_dict(rawpbp, 'gameData', 'teams', homeroad, 'id')
+        if teamid is None:
+            teamid = helpers.try_to_access_dict(rawpbp, 'liveData', 'boxscore', 'teams', homeroad, 'team', 'id')
+        roster = helpers.try_to_access_dict(rawpbp, 'liveData', 'boxscore', 'teams', homeroad, 'players')
+        if teamid is None or roster is None:
+            continue
+        numbers = {}
+        for key, player in roster.items():
+            try:
+                numbers[int(player['jerseyNumber'])] = int(key[2:])
+            except (KeyError, TypeError, ValueError):
+                continue
+        sweaters[teamid] = numbers
+    return sweaters
+
+
+@instrumentation.instrument('parse.toi_html')
+def read_shift_rows_from_html_page(rawtoi, teamid, sweaters=None):
+    """
+    Reads shifts from one team's html shift log, with one row per shift.
+
+    :param rawtoi: str, html page of shift log for teamid
+    :param teamid: int, team id corresponding to rawtoi
+    :param sweaters: dict of sweater number to player ID for this team (see get_sweater_numbers_from_pbp). Players
+        not in it are matched by name
+
+    :return: dataframe with columns PlayerID, Period, Start, End, Team, and Duration
+    """
+    if sweaters is None:
+        sweaters = {}
+
+    ids = []
+    periods = []
+    starts = []
+    ends = []
+    teams = []
+    pids = {}
+    for number, pname, per, start, end, dur in shift_report.read_shift_report(rawtoi):
+        if (number, pname) not in pids:
+            pid = sweaters.get(number)
+            if pid is None:
+                pid = players.player_as_id(helpers.flip_first_last(pname))
+            pids[(number, pname)] = pid
+        ids.append(pids[(number, pname)])
+        periods.append(int(per))
+        starts.append(start)
+        ends.append(end)
+        teams.append(teamid)
+
+    startmin = [x[:x.index(':')] for x in starts]
+    startsec = [x[x.index(':') + 1:] for x in starts]
+    starttimes = [1200 * (p - 1) + 60 * int(m) + int(s) + 1 for p, m, s in zip(periods, startmin, startsec)]
+    # starttimes = [0 if x == 1 else x for x in starttimes]
+    endmin = [x[:x.index(':')] for x in ends]
+    endsec = [x[x.index(':') + 1:] for x in ends]
+    # There is an extra -1 in endtimes to avoid overlapping start/end
+    endtimes = [1200 * (p - 1) + 60 * int(m) + int(s) for p, m, s in zip(periods, endmin, endsec)]
+
+    durationtime = [e - s for s, e in zip(starttimes, endtimes)]
+
+    return pd.DataFrame({'PlayerID': ids, 'Period': periods, 'Start': starttimes, 'End': endtimes,
+                         'Team': teams, 'Duration': durationtime})
+
+
+@instrumentation.instrument('parse.toi')
 def read_shifts_from_page(rawtoi, season, game):
     """
     Turns JSON shift start-ends into TOI matrix with one row per second and one col per player
@@ -255,6 +302,7 @@ def read_shifts_from_page(rawtoi, season, game):
     return _finish_toidf_manipulations(df, season, game)
 
 
+@instrumentation.instrument('parse.toi_matrix')
 def _finish_toidf_manipulations(df, season, game):
     """
     Takes dataframe of shifts (one row per shift) and makes into a matrix of players on ice for each second.
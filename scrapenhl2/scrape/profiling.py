@@ -0,0 +1,345 @@
+"""
+This module contains opt-in profiling hooks for the main entry points: autoupdate, team log updates, 5v5 player log
+generation, and the charts.
+
+Profiling is off by default, and then profiled functions just call through. To turn it on for a whole run, set the
+SCRAPENHL2_PROFILE environment variable to a comma-separated list of profilers (or call enable()):
+
+- cprofile: the deterministic profiler in the standard library. Writes a .prof file (pstats format; open with
+  snakeviz, or pstats)
+- sample: a sampling profiler (a background thread that records the profiled thread's stack every few milliseconds).
+  Writes a .collapsed file of stacks, which flamegraph.pl and speedscope read
+- pyinstrument: pyinstrument's sampling profiler, if installed. Writes an .html report
+- 1 or true: cprofile and sample
+
+To profile one call, pass profile=True (or a list of profilers as above) to a profiled function instead, e.g.
+autoupdate.autoupdate(profile=True). profile=False turns profiling off for that call.
+
+Output goes to a folder per run: SCRAPENHL2_PROFILE_DIR if set, and otherwise profiles/ in the data folder, then a
+subfolder named by start time and process ID. Worker processes (e.g. scrapenhl2.plot.render_pool) write to the same
+folder as the process that started them, which calls prepare_worker_processes() before starting them. At exit, the
+starting process writes summary.txt, with the top functions by cumulative time across all profiles of the run, and
+all.collapsed, with all sampled stacks merged.
+
+Only the outermost profiled call in a thread is profiled; nested ones (e.g. update_team_logs inside autoupdate) just
+call through.
+"""
+
+import atexit
+import collections
+import cProfile
+import functools
+import glob
+import io
+import itertools
+import os
+import os.path
+import pstats
+import sys
+import threading
+import time
+
+
+def profiled(name):
+    """
+    A decorator that profiles the function when profiling is on, or when it is called with profile=True.
+
+    :param name: str, a name for output files, e.g. 'autoupdate'
+
+    :return: decorator
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = kwargs.pop('profile', None)
+            if profile is None:
+                modes = _MODES
+            else:
+                modes = _parse_modes(profile)
+            if not modes or getattr(_LOCAL, 'active', False):
+                return func(*args, **kwargs)
+
+            _LOCAL.active = True
+            try:
+                return _run_profiled(name, modes, func, args, kwargs)
+            finally:
+                _LOCAL.active = False
+        return wrapper
+    return decorator
+
+
+def enable(modes='cprofile,sample', folder=None):
+    """
+    Turns profiling on for all profiled functions.
+
+    :param modes: str or iterable of str. See module docstring
+    :param folder: str, folder for this run's output, or None to make one (see module docstring)
+
+    :return: nothing
+    """
+    global _MODES, _RUN_FOLDER, _RUN_OWNER_PID
+    _MODES = _parse_modes(modes)
+    if folder is not None:
+        _RUN_FOLDER = folder
+        _RUN_OWNER_PID = os.getpid()
+        os.environ['SCRAPENHL2_PROFILE_RUN_DIR'] = folder
+
+
+def disable():
+    """
+    Turns profiling off for all profiled functions. Calls with profile=True are still profiled.
+
+    :return: nothing
+    """
+    global _MODES
+    _MODES = ()
+
+
+def get_run_folder():
+    """
+    Returns the folder for this run's output, creating it if need be. Worker processes started after this is called
+    use the same folder.
+
+    :return: str
+    """
+    global _RUN_FOLDER, _RUN_OWNER_PID
+    with _LOCK:
+        if _RUN_FOLDER is None:
+            _RUN_FOLDER = os.environ.get('SCRAPENHL2_PROFILE_RUN_DIR')
+        if _RUN_FOLDER is None:
+            basefolder = os.environ.get('SCRAPENHL2_PROFILE_DIR')
+            if basefolder is None:
+                from scrapenhl2.scrape import organization
+                basefolder = os.path.join(organization.get_data_folder(), 'profiles')
+            _RUN_FOLDER = os.path.join(basefolder, '{0:s}-{1:d}'.format(time.strftime('%Y%m%d-%H%M%S'), os.getpid()))
+            _RUN_OWNER_PID = os.getpid()
+            os.environ['SCRAPENHL2_PROFILE_RUN_DIR'] = _RUN_FOLDER
+        if not os.path.exists(_RUN_FOLDER):
+            os.makedirs(_RUN_FOLDER, exist_ok=True)
+        return _RUN_FOLDER
+
+
+def prepare_worker_processes():
+    """
+    Call before starting worker processes (e.g. a process pool). If profiling is on, creates this run's folder first,
+    so workers write their profiles to it and they are included in this process's summary at exit.
+
+    :return: nothing
+    """
+    if _MODES or getattr(_LOCAL, 'active', False):
+        get_run_folder()
+
+
+def summarize_profiles(folder=None, top=30):
+    """
+    Aggregates all profiles in a run folder: the top functions by cumulative time (from cprofile output) and by
+    share of samples (from sample output). Writes summary.txt and all.collapsed to the folder.
+
+    :param folder: str, the run folder, or None for this run's
+    :param top: int, number of functions to list
+
+    :return: str, the summary
+    """
+    if folder is None:
+        folder = get_run_folder()
+    sections = []
+
+    proffiles = sorted(glob.glob(os.path.join(folder, '*.prof')))
+    if len(proffiles) > 0:
+        stream = io.StringIO()
+        stats = pstats.Stats(proffiles[0], stream=stream)
+        for filename in proffiles[1:]:
+            stats.add(filename)
+        stats.sort_stats('cumulative').print_stats(top)
+        sections.append('Top {0:d} functions by cumulative time, from {1:d} profiles\n{2:s}'.format(
+            top, len(proffiles), stream.getvalue().rstrip()))
+
+    stacks = collections.Counter()
+    for filename in sorted(glob.glob(os.path.join(folder, '*.collapsed'))):
+        if os.path.basename(filename) == 'all.collapsed':
+            continue
+        with open(filename) as reader:
+            for line in reader:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    stacks[stack] += int(count)
+    if len(stacks) > 0:
+        _write_collapsed(stacks, os.path.join(folder, 'all.collapsed'))
+        total = sum(stacks.values())
+        inclusive = collections.Counter()
+        for stack, count in stacks.items():
+            for func in set(stack.split(';')):
+                inclusive[func] += count
+        lines = ['{0:7.1%}  {1:s}'.format(count / total, func) for func, count in inclusive.most_common(top)]
+        sections.append('Top {0:d} functions by share of {1:d} samples (cumulative)\n{2:s}'.format(
+            top, total, '\n'.join(lines)))
+
+    summary = '\n\n'.join(sections)
+    with open(os.path.join(folder, 'summary.txt'), 'w') as writer:
+        writer.write(summary + '\n')
+    return summary
+
+
+def _run_profiled(name, modes, func, args, kwargs):
+    """
+    Runs func under the profilers in modes and writes their output to the run folder.
+
+    :param name: str, for output filenames
+    :param modes: tuple of str
+    :param func: the function
+    :param args: tuple
+    :param kwargs: dict
+
+    :return: what func returns
+    """
+    folder = get_run_folder()
+    stem = os.path.join(folder, '{0:s}.{1:d}.{2:d}'.format(name, os.getpid(), next(_CALL_NUMBERS)))
+
+    profiler = cProfile.Profile() if 'cprofile' in modes else None
+    sampler = _Sampler(threading.get_ident(), _SAMPLE_INTERVAL) if 'sample' in modes else None
+    pyinst = _get_pyinstrument_profiler() if 'pyinstrument' in modes else None
+
+    if sampler is not None:
+        sampler.start()
+    if pyinst is not None:
+        pyinst.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(stem + '.prof')
+        if pyinst is not None:
+            pyinst.stop()
+            with open(stem + '.html', 'w') as writer:
+                writer.write(pyinst.output_html())
+        if sampler is not None:
+            sampler.stop()
+            _write_collapsed(sampler.stacks, stem + '.collapsed')
+
+
+class _Sampler(threading.Thread):
+    """
+    A thread that records another thread's stack at regular intervals.
+    """
+
+    def __init__(self, thread_id, interval):
+        super(_Sampler, self).__init__(name='scrapenhl2-profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{0:s} ({1:s}:{2:d})'.format(code.co_name, os.path.basename(code.co_filename),
+                                                          code.co_firstlineno))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _write_collapsed(stacks, filename):
+    """
+    Writes stacks in the collapsed format flamegraph.pl reads: one line per stack, root first, separated by
+    semicolons, then a space and the count.
+
+    :param stacks: dict of str to int
+    :param filename: str
+
+    :return: nothing
+    """
+    with open(filename, 'w') as writer:
+        for stack, count in sorted(stacks.items()):
+            writer.write('{0:s} {1:d}\n'.format(stack, count))
+
+
+def _get_pyinstrument_profiler():
+    """
+    Returns a pyinstrument profiler, or None (with a message) if pyinstrument isn't installed.
+
+    :return: pyinstrument.Profiler, or None
+    """
+    try:
+        import pyinstrument
+    except ImportError:
+        print('pyinstrument is not installed; skipping it')
+        return None
+    return pyinstrument.Profiler(interval=_SAMPLE_INTERVAL)
+
+
+def _parse_modes(modes):
+    """
+    Converts a profile option or SCRAPENHL2_PROFILE value to a tuple of profilers.
+
+    :param modes: bool, str, iterable of str, or None
+
+    :return: tuple of str, empty if off
+    """
+    if modes is None or modes is False:
+        return ()
+    if modes is True:
+        return 'cprofile', 'sample'
+    if isinstance(modes, str):
+        modes = modes.split(',')
+    parsed = []
+    for mode in modes:
+        mode = mode.strip().lower()
+        if mode in ('', '0', 'false', 'no', 'off'):
+            continue
+        if mode in ('1', 'true', 'yes', 'on'):
+            parsed += ['cprofile', 'sample']
+        elif mode in ('cprofile', 'sample', 'pyinstrument'):
+            parsed.append(mode)
+        else:
+            print('Unknown profiler {0:s}. Options: cprofile, sample, pyinstrument'.format(mode))
+    return tuple(collections.OrderedDict.fromkeys(parsed))
+
+
+def _summarize_at_exit():
+    """
+    Writes the run summary, if this process started the run and anything was profiled.
+
+    :return: nothing
+    """
+    if _RUN_OWNER_PID == os.getpid() and _RUN_FOLDER is not None and os.path.exists(_RUN_FOLDER):
+        if len(os.listdir(_RUN_FOLDER)) > 0:
+            summarize_profiles(_RUN_FOLDER)
+            print('Profiles written to {0:s}'.format(_RUN_FOLDER))
+
+
+def profiling_setup():
+    """
+    Reads SCRAPENHL2_PROFILE and SCRAPENHL2_PROFILE_INTERVAL (sampling interval in seconds, default 0.005).
+
+    :return: nothing
+    """
+    global _MODES, _SAMPLE_INTERVAL
+    _MODES = _parse_modes(os.environ.get('SCRAPENHL2_PROFILE'))
+    try:
+        _SAMPLE_INTERVAL = float(os.environ.get('SCRAPENHL2_PROFILE_INTERVAL', 0.005))
+    except ValueError:
+        print('Could not read SCRAPENHL2_PROFILE_INTERVAL; using 0.005')
+        _SAMPLE_INTERVAL = 0.005
+
+
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+_CALL_NUMBERS = itertools.count()
+_MODES = ()
+_SAMPLE_INTERVAL = 0.005
+_RUN_FOLDER = None
+_RUN_OWNER_PID = None
+profiling_setup()
+atexit.register(_summarize_at_exit)
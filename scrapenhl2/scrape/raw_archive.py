@@ -0,0 +1,383 @@
+"""
+This module contains per-season archives of raw data, so a season's raw files can be kept in one file instead of
+thousands of small ones (which are slow on network filesystems and to back up).
+
+Each season's archive is a SQLite file, /scrape/data/raw/[season]_raw.sqlite, with one row per game and kind of raw
+data:
+
+- pbp: the raw JSON pbp ([game].zlib in the raw pbp folder), stored as is
+- toi: the raw JSON shifts ([game].zlib in the raw toi folder), stored as is
+- toi_H, toi_R: the home and road HTML shift reports ([game]H.html and [game]R.html), compressed with raw_codec
+
+pack_season moves a season's raw files into its archive (new rows replace old ones for the same game and kind).
+scrape_pbp.get_raw_pbp, scrape_toi.get_raw_toi, and scrape_toi.get_raw_html_toi read through read_raw_or_file: from
+the archive first if the season has one (so reading a packed season doesn't try to open a missing file per game), and
+otherwise from the game's loose file, so newly scraped games work before they are packed. Saving a loose file for an
+archived game drops its archived copy (see discard_raw), so the new file is read instead. Scraping without
+force_overwrite treats archived games as already scraped.
+
+raw_codec.migrate_raw_files migrates archived JSON (and HTML shift reports) too, through rewrite_raw.
+
+Example::
+
+    from scrapenhl2.scrape import raw_archive
+    raw_archive.pack_season(2016)
+"""
+
+import glob
+import hashlib
+import locale
+import os
+import os.path
+import re
+import sqlite3
+import threading
+
+import scrapenhl2.scrape.organization as organization
+import scrapenhl2.scrape.raw_codec as raw_codec
+
+
+def get_season_raw_archive_filename(season):
+    """
+    Returns the season's archive file.
+
+    :param season: int, the season
+
+    :return: str, /scrape/data/raw/[season]_raw.sqlite
+    """
+    return os.path.join(organization.get_raw_data_folder(), '{0:d}_raw.sqlite'.format(int(season)))
+
+
+def read_raw(season, game, kind):
+    """
+    Reads a game's raw data from the season's archive.
+
+    :param season: int, the season
+    :param game: int, the game
+    :param kind: str, 'pbp', 'toi', 'toi_H', or 'toi_R'
+
+    :return: bytes as stored (see module docstring), or None if not archived
+    """
+    conn = _get_connection(season)
+    if conn is None:
+        return None
+    row = conn.execute("SELECT data FROM raw WHERE game = ? AND kind = ?", (int(game), kind)).fetchone()
+    return None if row is None else row[0]
+
+
+def read_raw_html(season, game, kind):
+    """
+    Reads a game's raw HTML shift report from the season's archive.
+
+    :param season: int, the season
+    :param game: int, the game
+    :param kind: str, 'toi_H' or 'toi_R'
+
+    :return: str, or None if not archived
+    """
+    data = read_raw(season, game, kind)
+    if data is None:
+        return None
+    # Decode the original bytes the way open(filename, 'r') would have
+    return raw_codec.decode_raw(data).encode('latin-1').decode(locale.getpreferredencoding(False))
+
+
+def read_raw_or_file(season, game, kind, read_file):
+    """
+    Reads a game's raw data from the season's archive if it is there, and otherwise with read_file. Whether a season
+    has an archive is remembered, and checked again if the loose file is missing too (e.g. another process just packed
+    the season).
+
+    :param season: int, the season
+    :param game: int, the game
+    :param kind: str, 'pbp', 'toi', 'toi_H', or 'toi_R'
+    :param read_file: function of no arguments that reads the loose file, raising FileNotFoundError if there is none
+
+    :return: as read_raw for 'pbp' and 'toi', and as read_raw_html for 'toi_H' and 'toi_R'
+    """
+    read = read_raw_html if kind.startswith('toi_') else read_raw
+    data = read(season, game, kind)
+    if data is not None:
+        return data
+    try:
+        return read_file()
+    except FileNotFoundError:
+        _forget_connection(season)
+        data = read(season, game, kind)
+        if data is None:
+            raise
+        return data
+
+
+def discard_raw(season, game, kind):
+    """
+    Deletes a game's raw data from the season's archive, if it is there. Called when a new loose file is saved for
+    the game, so reads (see read_raw_or_file) don't keep returning the archived copy.
+
+    :param season: int, the season
+    :param game: int, the game
+    :param kind: str, 'pbp', 'toi', 'toi_H', or 'toi_R'
+
+    :return: nothing
+    """
+    conn = _get_connection(season)
+    if conn is not None:
+        with conn:
+            conn.execute("DELETE FROM raw WHERE game = ? AND kind = ?", (int(game), kind))
+
+
+def rewrite_raw(season, func):
+    """
+    Rewrites archived data in place, e.g. to change codecs (see raw_codec.migrate_raw_files). All changes are
+    committed together, so an interrupted rewrite leaves the archive as it was.
+
+    :param season: int, the season
+    :param func: function taking (kind, data) and returning new data, or None to leave that row alone
+
+    :return: nothing
+    """
+    conn = _get_connection(season)
+    if conn is None:
+        return
+    keys = conn.execute("SELECT game, kind FROM raw ORDER BY game, kind").fetchall()
+    with conn:
+        for game, kind in keys:
+            data = conn.execute("SELECT data FROM raw WHERE game = ? AND kind = ?", (game, kind)).fetchone()[0]
+            newdata = func(kind, data)
+            if newdata is not None:
+                conn.execute("UPDATE raw SET data = ? WHERE game = ? AND kind = ?", (newdata, game, kind))
+
+
+def has_raw(season, game, kind):
+    """
+    Returns whether a game's raw data is in the season's archive.
+
+    :param season: int, the season
+    :param game: int, the game
+    :param kind: str, 'pbp', 'toi', 'toi_H', or 'toi_R'
+
+    :return: bool
+    """
+    conn = _get_connection(season)
+    if conn is None:
+        return False
+    return conn.execute("SELECT COUNT(*) FROM raw WHERE game = ? AND kind = ?", (int(game), kind)).fetchone()[0] > 0
+
+
+def get_archived_games(season, kind):
+    """
+    Returns games in the season's archive.
+
+    :param season: int, the season
+    :param kind: str, 'pbp', 'toi', 'toi_H', or 'toi_R'
+
+    :return: list of int
+    """
+    conn = _get_connection(season)
+    if conn is None:
+        return []
+    return [row[0] for row in conn.execute("SELECT game FROM raw WHERE kind = ? ORDER BY game", (kind,))]
+
+
+def pack_season(season, delete_files=True, verbose=True):
+    """
+    Moves the season's raw JSON and HTML shift files into its archive. Safe to rerun; files are only deleted after
+    the archive is committed.
+
+    :param season: int, the season
+    :param delete_files: bool. If True, deletes the files once archived
+    :param verbose: bool. If True, prints a summary
+
+    :return: int, the number of files archived
+    """
+    files = _get_season_raw_files(season)
+    conn = sqlite3.connect(get_season_raw_archive_filename(season))
+    try:
+        _create_tables(conn)
+        for filename, game, kind in files:
+            with open(filename, 'rb') as reader:
+                data = reader.read()
+            stat = os.stat(filename)
+            stored = raw_codec.encode_raw(data.decode('latin-1')) if kind.startswith('toi_') else data
+            conn.execute("INSERT OR REPLACE INTO raw (game, kind, data, size, mtime_us, sha1) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         (game, kind, stored, stat.st_size, int(stat.st_mtime * 1e6), hashlib.sha1(data).hexdigest()))
+        conn.commit()
+    finally:
+        conn.close()
+
+    _forget_connection(season)
+    if delete_files:
+        for filename, _, _ in files:
+            os.remove(filename)
+    if verbose:
+        print('Archived {0:d} raw files for {1:d} in {2:s}'.format(len(files), int(season),
+                                                                   get_season_raw_archive_filename(season)))
+    return len(files)
+
+
+def unpack_season(season, overwrite=False):
+    """
+    Writes the season's archived raw data back out as files (e.g. for tools that expect them).
+
+    :param season: int, the season
+    :param overwrite: bool. If False, skips games that already have a file
+
+    :return: int, the number of files written
+    """
+    conn = _get_connection(season)
+    if conn is None:
+        return 0
+    nfiles = 0
+    for game, kind, data in conn.execute("SELECT game, kind, data FROM raw ORDER BY game, kind"):
+        filename = get_raw_filename(season, game, kind)
+        if not overwrite and os.path.exists(filename):
+            continue
+        if kind.startswith('toi_'):
+            data = raw_codec.decode_raw(data).encode('latin-1')
+        with open(filename, 'wb') as writer:
+            writer.write(data)
+        nfiles += 1
+    return nfiles
+
+
+def get_raw_filename(season, game, kind):
+    """
+    Returns the loose file for a game's raw data.
+
+    :param season: int, the season
+    :param game: int, the game
+    :param kind: str, 'pbp', 'toi', 'toi_H', or 'toi_R'
+
+    :return: str
+    """
+    if kind == 'pbp':
+        return os.path.join(organization.get_season_raw_pbp_folder(season), str(game) + '.zlib')
+    if kind == 'toi':
+        return os.path.join(organization.get_season_raw_toi_folder(season), str(game) + '.zlib')
+    return os.path.join(organization.get_season_raw_toi_folder(season), str(game) + kind[-1] + '.html')
+
+
+def get_archived_file_fingerprint(filename, method='mtime'):
+    """
+    Fingerprints an archived raw file the same way it was fingerprinted as a file (see
+    scrapenhl2.manipulate.build_graph.file_fingerprint), so packing a season doesn't look like a change.
+
+    :param filename: str, the loose file's name
+    :param method: str, 'mtime' for modification time and size, or 'hash' for a SHA-1 of the contents
+
+    :return: str, or None if not archived
+    """
+    parsed = _parse_raw_filename(filename)
+    if parsed is None:
+        return None
+    season, game, kind = parsed
+    conn = _get_connection(season)
+    if conn is None:
+        return None
+    row = conn.execute("SELECT size, mtime_us, sha1 FROM raw WHERE game = ? AND kind = ?", (game, kind)).fetchone()
+    if row is None:
+        return None
+    if method == 'hash':
+        return row[2]
+    return '{0:d}-{1:d}'.format(row[1], row[0])
+
+
+def is_archived_file(filename):
+    """
+    Returns whether this loose raw file's data is in its season's archive.
+
+    :param filename: str
+
+    :return: bool
+    """
+    parsed = _parse_raw_filename(filename)
+    return parsed is not None and has_raw(*parsed)
+
+
+def _parse_raw_filename(filename):
+    """
+    Converts a loose raw file's name to season, game, and kind.
+
+    :param filename: str
+
+    :return: (int, int, str), or None if it isn't an archivable raw file
+    """
+    folder, basename = os.path.split(filename)
+    folder, season = os.path.split(folder)
+    folder, datatype = os.path.split(folder)
+    match = re.match(r'^(\d+)(H|R)?\.(zlib|html)$', basename)
+    if match is None or not season.isdigit() or datatype not in ('pbp', 'toi'):
+        return None
+    game, homeroad, extension = match.groups()
+    if extension == 'zlib' and homeroad is None:
+        return int(season), int(game), datatype
+    if extension == 'html' and homeroad is not None and datatype == 'toi':
+        return int(season), int(game), 'toi_' + homeroad
+    return None
+
+
+def _get_season_raw_files(season):
+    """
+    Lists the season's loose raw files.
+
+    :param season: int, the season
+
+    :return: list of (filename, game, kind)
+    """
+    files = []
+    for pattern in (os.path.join(organization.get_season_raw_pbp_folder(season), '*.zlib'),
+                    os.path.join(organization.get_season_raw_toi_folder(season), '*.zlib'),
+                    os.path.join(organization.get_season_raw_toi_folder(season), '*.html')):
+        for filename in sorted(glob.glob(pattern)):
+            parsed = _parse_raw_filename(filename)
+            if parsed is not None:
+                files.append((filename, parsed[1], parsed[2]))
+    return files
+
+
+def _get_connection(season):
+    """
+    Returns this thread's connection to the season's archive, opening it if need be. A season without an archive is
+    remembered as such, so later calls don't check the filesystem again; see _forget_connection.
+
+    :param season: int, the season
+
+    :return: sqlite3 connection, or None if the season has no archive
+    """
+    connections = getattr(_LOCAL, 'connections', None)
+    if connections is None:
+        connections = _LOCAL.connections = {}
+    filename = get_season_raw_archive_filename(season)
+    if filename not in connections:
+        connections[filename] = sqlite3.connect(filename, timeout=60) if os.path.exists(filename) else None
+    return connections[filename]
+
+
+def _forget_connection(season):
+    """
+    Closes this thread's connection to the season's archive, if any, and forgets whether the season has one.
+
+    :param season: int, the season
+
+    :return: nothing
+    """
+    connections = getattr(_LOCAL, 'connections', {})
+    conn = connections.pop(get_season_raw_archive_filename(season), None)
+    if conn is not None:
+        conn.close()
+
+
+def _create_tables(conn):
+    """
+    Creates the raw table, if it doesn't exist yet.
+
+    :param conn: sqlite3 connection
+
+    :return: nothing
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS raw (game INTEGER NOT NULL, kind TEXT NOT NULL, data BLOB NOT NULL, "
+                 "size INTEGER, mtime_us INTEGER, sha1 TEXT, PRIMARY KEY (game, kind))")
+
+
+_LOCAL = threading.local()
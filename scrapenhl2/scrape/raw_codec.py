@@ -0,0 +1,436 @@
+"""
+This module contains the codec for raw JSON pbp and shifts on disk (the .zlib files in the raw data folders).
+
+Raw files have always been zlib, level 9. That is slow to write, and zstd and lz4 both decompress several times faster.
+Set SCRAPENHL2_RAW_CODEC to choose the codec for new files:
+
+- zlib (default): readable by older versions of scrapenhl2
+- zstd: needs the zstandard package. Can use a dictionary trained on NHL JSON (see train_zstd_dictionary), which
+  helps the ratio a lot for small files like shifts
+- lz4: needs the lz4 package. Fastest, but the largest files
+
+SCRAPENHL2_RAW_LEVEL sets the compression level (defaults: zlib 9, zstd 3, lz4 0).
+
+Reading detects the codec from the first bytes of the file, so folders can mix codecs, and the files keep their .zlib
+names. To rewrite existing files in the current codec, use migrate_raw_files (or scripts/migrate_raw_files.py). To
+compare codecs on your own data, use benchmark_codecs (or scripts/benchmark_raw_codecs.py).
+
+Note: files written with a zstd dictionary can only be read with that same dictionary. Each trained dictionary is
+also saved under its ID (e.g. raw_zstd.123456.dict, next to raw_zstd.dict), and reading picks the one the file was
+written with, so retraining doesn't orphan older files; migrate_raw_files rewrites them with the current dictionary.
+Keep these files (and back them up) with the data.
+"""
+
+import glob
+import os
+import os.path
+import shutil
+import time
+import zlib
+
+import scrapenhl2.scrape.organization as organization
+
+
+def get_codecs():
+    """
+    Returns codec names.
+
+    :return: tuple of str
+    """
+    return 'zlib', 'zstd', 'lz4'
+
+
+def get_available_codecs():
+    """
+    Returns codecs that can be used here (zstd and lz4 need optional packages).
+
+    :return: list of str
+    """
+    return [codec for codec in get_codecs() if codec == 'zlib' or _import_codec_module(codec) is not None]
+
+
+def encode_raw(page, codec=None, level=None):
+    """
+    Compresses a raw JSON page for saving.
+
+    :param page: str, the page
+    :param codec: str, or None for the current codec (SCRAPENHL2_RAW_CODEC)
+    :param level: int, or None for the codec's default level (or SCRAPENHL2_RAW_LEVEL)
+
+    :return: bytes
+    """
+    if codec is None:
+        codec = _CODEC
+    if level is None:
+        level = _LEVEL if codec == _CODEC and _LEVEL is not None else _DEFAULT_LEVELS[codec]
+    data = page.encode('latin-1')
+
+    if codec == 'zstd':
+        return _get_zstd_compressor(level).compress(data)
+    if codec == 'lz4':
+        return _import_codec_module('lz4').compress(data, compression_level=level)
+    return zlib.compress(data, level)
+
+
+def decode_raw(data):
+    """
+    Decompresses a raw JSON page, whichever codec it was saved with.
+
+    :param data: bytes, from the file
+
+    :return: str, the page
+    """
+    codec = get_codec_of(data)
+    if codec == 'zstd':
+        zstandard = _import_codec_module('zstd')
+        if zstandard is None:
+            raise ImportError('This file is zstd; install zstandard to read it')
+        page = _get_zstd_decompressor(zstandard.get_frame_parameters(data).dict_id).decompress(data)
+    elif codec == 'lz4':
+        lz4 = _import_codec_module('lz4')
+        if lz4 is None:
+            raise ImportError('This file is lz4; install lz4 to read it')
+        page = lz4.decompress(data)
+    else:
+        page = zlib.decompress(data)
+    return page.decode('latin-1')
+
+
+def get_codec_of(data):
+    """
+    Detects the codec from the magic bytes at the start of the data.
+
+    :param data: bytes
+
+    :return: str, 'zstd', 'lz4', or 'zlib'
+    """
+    if data[:4] == _ZSTD_MAGIC:
+        return 'zstd'
+    if data[:4] == _LZ4_MAGIC:
+        return 'lz4'
+    return 'zlib'
+
+
+def get_raw_filenames(season):
+    """
+    Returns raw JSON pbp and shift files for this season.
+
+    :param season: int, the season
+
+    :return: list of str
+    """
+    return sorted(glob.glob(os.path.join(organization.get_season_raw_pbp_folder(season), '*.zlib'))) + \
+        sorted(glob.glob(os.path.join(organization.get_season_raw_toi_folder(season), '*.zlib')))
+
+
+def migrate_raw_files(startseason, endseason=None, codec=None, verbose=True):
+    """
+    Rewrites raw JSON files for these seasons in the given codec. Files already in that codec (and for zstd, written
+    with the current dictionary) are skipped, so this can be stopped and rerun. Each file is written to a temporary
+    file and then renamed, so an interrupted migration never leaves a partial file. Seasons packed into a raw archive
+    are migrated in the archive (JSON and HTML shift reports; see raw_archive.rewrite_raw), and count as files.
+
+    :param startseason: int, the first season
+    :param endseason: int, the last season. Defaults to startseason
+    :param codec: str, or None for the current codec (SCRAPENHL2_RAW_CODEC)
+    :param verbose: bool. If True, prints progress by season
+
+    :return: dict with counts of files rewritten and skipped, and bytes before and after
+    """
+    if codec is None:
+        codec = _CODEC
+    if endseason is None:
+        endseason = startseason
+
+    from scrapenhl2.scrape import raw_archive
+
+    counts = {'rewritten': 0, 'skipped': 0, 'bytes_before': 0, 'bytes_after': 0}
+
+    def migrate(kind, data):
+        if _is_current_encoding(data, codec):
+            counts['skipped'] += 1
+            return None
+        newdata = encode_raw(decode_raw(data), codec)
+        counts['rewritten'] += 1
+        counts['bytes_before'] += len(data)
+        counts['bytes_after'] += len(newdata)
+        return newdata
+
+    for season in range(startseason, endseason + 1):
+        for filename in get_raw_filenames(season):
+            with open(filename, 'rb') as reader:
+                newdata = migrate(None, reader.read())
+            if newdata is None:
+                continue
+            tempfile = filename + '.tmp'
+            with open(tempfile, 'wb') as writer:
+                writer.write(newdata)
+            os.replace(tempfile, filename)
+        raw_archive.rewrite_raw(season, migrate)
+        if verbose:
+            print('Done with {0:d}: {1:d} files rewritten, {2:d} skipped'.format(season, counts['rewritten'],
+                                                                                 counts['skipped']))
+    return counts
+
+
+def benchmark_codecs(season, codecs=None, max_files=None, verbose=True):
+    """
+    Compresses and decompresses a season's raw JSON files with each codec and reports ratio and throughput. Files on
+    disk are not changed.
+
+    :param season: int, the season
+    :param codecs: iterable of str, or None for all available. See get_available_codecs
+    :param max_files: int, or None to use all of the season's files
+    :param verbose: bool. If True, prints a table
+
+    :return: list of dict with Codec, Files, RawMB, CompressedMB, Ratio, EncodeMBps, and DecodeMBps
+    """
+    if codecs is None:
+        codecs = get_available_codecs()
+    filenames = get_raw_filenames(season)[:max_files]
+    pages = []
+    for filename in filenames:
+        with open(filename, 'rb') as reader:
+            pages.append(decode_raw(reader.read()))
+    rawbytes = sum(len(page) for page in pages)
+
+    results = []
+    for codec in codecs:
+        starttime = time.perf_counter()
+        encoded = [encode_raw(page, codec) for page in pages]
+        encodesecs = time.perf_counter() - starttime
+
+        starttime = time.perf_counter()
+        for data in encoded:
+            decode_raw(data)
+        decodesecs = time.perf_counter() - starttime
+
+        compressedbytes = sum(len(data) for data in encoded)
+        results.append({'Codec': codec + (' (dict)' if codec == 'zstd' and _get_zstd_dictionary() else ''),
+                        'Files': len(pages),
+                        'RawMB': rawbytes / 1e6,
+                        'CompressedMB': compressedbytes / 1e6,
+                        'Ratio': rawbytes / max(compressedbytes, 1),
+                        'EncodeMBps': rawbytes / 1e6 / max(encodesecs, 1e-9),
+                        'DecodeMBps': rawbytes / 1e6 / max(decodesecs, 1e-9)})
+
+    if verbose:
+        print('{0:<14s} {1:>6s} {2:>9s} {3:>9s} {4:>7s} {5:>11s} {6:>11s}'.format(
+            'Codec', 'Files', 'Raw MB', 'Comp MB', 'Ratio', 'Enc MB/s', 'Dec MB/s'))
+        for row in results:
+            print('{Codec:<14s} {Files:>6d} {RawMB:>9.1f} {CompressedMB:>9.1f} {Ratio:>7.2f} {EncodeMBps:>11.1f} '
+                  '{DecodeMBps:>11.1f}'.format(**row))
+    return results
+
+
+def train_zstd_dictionary(startseason, endseason=None, filename=None, size=112640, max_files=2000):
+    """
+    Trains a zstd dictionary on raw JSON files from these seasons and saves it. New zstd files use it from then on.
+    The new dictionary, and the one it replaces, are also saved under their IDs (see get_zstd_dictionary_filename), so
+    files written with either can still be read.
+
+    :param startseason: int, the first season
+    :param endseason: int, the last season. Defaults to startseason
+    :param filename: str, where to save it, or None for get_zstd_dictionary_filename()
+    :param size: int, dictionary size in bytes
+    :param max_files: int, the most files to sample
+
+    :return: str, the filename
+    """
+    zstandard = _import_codec_module('zstd')
+    if zstandard is None:
+        raise ImportError('Install zstandard to train a dictionary')
+    if endseason is None:
+        endseason = startseason
+    if filename is None:
+        filename = get_zstd_dictionary_filename()
+
+    filenames = []
+    for season in range(startseason, endseason + 1):
+        filenames += get_raw_filenames(season)
+    step = max(1, len(filenames) // max_files)
+    samples = []
+    for rawfile in filenames[::step]:
+        with open(rawfile, 'rb') as reader:
+            samples.append(decode_raw(reader.read()).encode('latin-1'))
+
+    dictionary = zstandard.train_dictionary(size, samples)
+    if os.path.exists(filename):
+        with open(filename, 'rb') as reader:
+            olddict = zstandard.ZstdCompressionDict(reader.read())
+        oldfile = get_zstd_dictionary_filename(olddict.dict_id(), filename)
+        if not os.path.exists(oldfile):
+            shutil.copyfile(filename, oldfile)
+    for dictfile in (get_zstd_dictionary_filename(dictionary.dict_id(), filename), filename):
+        with open(dictfile, 'wb') as writer:
+            writer.write(dictionary.as_bytes())
+    raw_codec_setup()
+    return filename
+
+
+def get_zstd_dictionary_filename(dict_id=None, filename=None):
+    """
+    Returns the zstd dictionary file: SCRAPENHL2_ZSTD_DICT if set, or else raw_zstd.dict in the raw data folder. With
+    dict_id, returns the copy of that dictionary saved next to it, e.g. raw_zstd.123456.dict.
+
+    :param dict_id: int, or None for the current dictionary
+    :param filename: str, the current dictionary file, or None for the default above
+
+    :return: str
+    """
+    if filename is None:
+        if 'SCRAPENHL2_ZSTD_DICT' in os.environ:
+            filename = os.environ['SCRAPENHL2_ZSTD_DICT']
+        else:
+            filename = os.path.join(organization.get_raw_data_folder(), 'raw_zstd.dict')
+    if dict_id is None:
+        return filename
+    root, ext = os.path.splitext(filename)
+    return '{0:s}.{1:d}{2:s}'.format(root, int(dict_id), ext)
+
+
+def _get_zstd_dictionary():
+    """
+    Returns the zstd dictionary, if there is one.
+
+    :return: zstandard.ZstdCompressionDict, or None
+    """
+    global _ZSTD_DICT
+    if _ZSTD_DICT is None:
+        filename = get_zstd_dictionary_filename()
+        zstandard = _import_codec_module('zstd')
+        if zstandard is not None and os.path.exists(filename):
+            with open(filename, 'rb') as reader:
+                _ZSTD_DICT = zstandard.ZstdCompressionDict(reader.read())
+        else:
+            _ZSTD_DICT = False
+    return _ZSTD_DICT
+
+
+def _get_zstd_dictionary_by_id(dict_id):
+    """
+    Returns the zstd dictionary with this ID: the current one if it matches, or else the copy saved under that ID.
+
+    :param dict_id: int
+
+    :return: zstandard.ZstdCompressionDict, or None if there isn't one
+    """
+    dictionary = _get_zstd_dictionary()
+    if dictionary and dictionary.dict_id() == dict_id:
+        return dictionary
+    if dict_id not in _ZSTD_DICTS_BY_ID:
+        filename = get_zstd_dictionary_filename(dict_id)
+        if not os.path.exists(filename):
+            return None
+        with open(filename, 'rb') as reader:
+            _ZSTD_DICTS_BY_ID[dict_id] = _import_codec_module('zstd').ZstdCompressionDict(reader.read())
+    return _ZSTD_DICTS_BY_ID[dict_id]
+
+
+def _is_current_encoding(data, codec):
+    """
+    Checks whether data is in this codec, and for zstd, written with the current dictionary (or none, if there isn't
+    one).
+
+    :param data: bytes
+    :param codec: str
+
+    :return: bool
+    """
+    if get_codec_of(data) != codec:
+        return False
+    if codec != 'zstd':
+        return True
+    dictionary = _get_zstd_dictionary()
+    current_id = dictionary.dict_id() if dictionary else 0
+    return _import_codec_module('zstd').get_frame_parameters(data).dict_id == current_id
+
+
+def _get_zstd_compressor(level):
+    """
+    Returns a zstd compressor, using the dictionary if there is one. Compressors aren't thread-safe, so this makes a
+    new one each time; that is cheap next to compressing a game.
+
+    :param level: int
+
+    :return: zstandard.ZstdCompressor
+    """
+    zstandard = _import_codec_module('zstd')
+    dictionary = _get_zstd_dictionary()
+    if dictionary:
+        return zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+    return zstandard.ZstdCompressor(level=level)
+
+
+def _get_zstd_decompressor(dict_id):
+    """
+    Returns a zstd decompressor.
+
+    :param dict_id: int, the ID of the dictionary the data was written with (from the frame header), or 0 for none
+
+    :return: zstandard.ZstdDecompressor
+    """
+    zstandard = _import_codec_module('zstd')
+    if dict_id == 0:
+        return zstandard.ZstdDecompressor()
+    dictionary = _get_zstd_dictionary_by_id(dict_id)
+    if dictionary is None:
+        raise ValueError('This file was written with zstd dictionary {0:d}, but neither {1:s} nor {2:s} has it'.format(
+            dict_id, get_zstd_dictionary_filename(), get_zstd_dictionary_filename(dict_id)))
+    return zstandard.ZstdDecompressor(dict_data=dictionary)
+
+
+def _import_codec_module(codec):
+    """
+    Imports the optional package for a codec.
+
+    :param codec: str, 'zstd' or 'lz4'
+
+    :return: module, or None if not installed
+    """
+    try:
+        if codec == 'zstd':
+            import zstandard
+            return zstandard
+        if codec == 'lz4':
+            import lz4.frame
+            return lz4.frame
+    except ImportError:
+        return None
+    return None
+
+
+def raw_codec_setup():
+    """
+    Reads SCRAPENHL2_RAW_CODEC and SCRAPENHL2_RAW_LEVEL. Falls back to zlib, with a message, if the codec isn't
+    available.
+
+    :return: nothing
+    """
+    global _CODEC, _LEVEL, _ZSTD_DICT
+    codec = os.environ.get('SCRAPENHL2_RAW_CODEC', 'zlib').lower()
+    if codec not in get_codecs():
+        print('Unknown raw codec {0:s}; using zlib. Options: {1:s}'.format(codec, ', '.join(get_codecs())))
+        codec = 'zlib'
+    elif codec != 'zlib' and _import_codec_module(codec) is None:
+        print('Raw codec {0:s} needs a package that is not installed; using zlib'.format(codec))
+        codec = 'zlib'
+    _CODEC = codec
+
+    try:
+        _LEVEL = int(os.environ['SCRAPENHL2_RAW_LEVEL']) if 'SCRAPENHL2_RAW_LEVEL' in os.environ else None
+    except ValueError:
+        print('Could not read SCRAPENHL2_RAW_LEVEL; using the default')
+        _LEVEL = None
+    _ZSTD_DICT = None  # Reloaded when next needed
+    _ZSTD_DICTS_BY_ID.clear()
+
+
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+_LZ4_MAGIC = b'\x04\x22\x4d\x18'
+_DEFAULT_LEVELS = {'zlib': 9, 'zstd': 3, 'lz4': 0}
+_CODEC = 'zlib'
+_LEVEL = None
+_ZSTD_DICT = None
+_ZSTD_DICTS_BY_ID = {}
+raw_codec_setup()
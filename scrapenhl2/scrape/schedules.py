@@ -442,12 +442,11 @@ def attach_game_dates_to_dateframe(df):
 
     :return: dataframe with one more column
     """
-    dflst = []
-    for season in df.Season.unique():
-        temp = df.query("Season == {0:d}".format(int(season))) \
-            .merge(get_season_schedule(season)[['Game', 'Date']], how='left', on='Game')
-        dflst.append(temp)
-    df2 = pd.concat(dflst)
+    # One merge against all needed seasons' schedules, rather than one per season
+    dates = pd.concat([get_season_schedule(season)[['Game', 'Date']].assign(Season=season)
+                       for season in df.Season.unique()])
+    dates.loc[:, 'Season'] = dates.Season.astype(df.Season.dtype)
+    df2 = df.merge(dates, how='left', on=['Season', 'Game'])
     return df2
 
 
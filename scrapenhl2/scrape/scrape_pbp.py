@@ -5,12 +5,14 @@ This module contains methods for scraping pbp.
 import json
 import os.path
 import urllib.request
-import zlib
 from time import sleep
 
 import scrapenhl2.scrape.organization as organization
+import scrapenhl2.scrape.raw_archive as raw_archive
+import scrapenhl2.scrape.raw_codec as raw_codec
 import scrapenhl2.scrape.schedules as schedules
 import scrapenhl2.scrape.general_helpers as helpers
+import scrapenhl2.scrape.instrumentation as instrumentation
 
 
 def scrape_game_pbp_from_html(season, game, force_overwrite=True):
@@ -38,19 +40,41 @@ def scrape_game_pbp_from_html(season, game, force_overwrite=True):
     return True
 
 
-def scrape_game_pbp(season, game, force_overwrite=False):
+def scrape_game_pbp(season, game, force_overwrite=False, return_payload=False):
     """
     This method scrapes the pbp for the given game.
 
     :param season: int, the season
     :param game: int, the game
     :param force_overwrite: bool. If file exists already, won't scrape again
+    :param return_payload: bool. If True, returns the json pbp instead of True, so it can be parsed without reading
+        it back from disk (see parse_pbp.parse_game_pbp). The file is then compressed and written in the background,
+        and may not be on disk yet when this returns (see fetch_game_pbp to wait for it)
 
-    :return: bool, False if not scraped, else True
+    :return: bool, False if not scraped, else True. If return_payload, the json pbp, or None if not scraped
+    """
+    page, _ = fetch_game_pbp(season, game, force_overwrite, background=return_payload)
+    if return_payload:
+        return None if page is None else json.loads(page)
+    return page is not None
+
+
+def fetch_game_pbp(season, game, force_overwrite=False, background=True):
+    """
+    Scrapes the pbp for the given game and saves it (see save_raw_pbp).
+
+    :param season: int, the season
+    :param game: int, the game
+    :param force_overwrite: bool. If file exists already, won't scrape again
+    :param background: bool. If True, compresses and writes the file in a background thread
+
+    :return: (page, write): the json pbp as bytes, and the concurrent.futures.Future for the write if background, else
+        None. (None, None) if not scraped
     """
     filename = get_game_raw_pbp_filename(season, game)
-    if not force_overwrite and os.path.exists(filename):
-        return False
+    if not force_overwrite and (os.path.exists(filename) or helpers.get_pending_write(filename) is not None
+                                or raw_archive.has_raw(season, game, 'pbp')):
+        return None, None
 
     # Use the season schedule file to get the home and road team names
     # schedule_item = get_files.get_season_schedule(season) \
@@ -60,14 +84,10 @@ def scrape_game_pbp(season, game, force_overwrite=False):
     # schedule_item = {k: v.values[0] for k, v in schedule_item.items()}
 
     page = get_game_from_url(season, game)
-    save_raw_pbp(page, season, game)
+    write = save_raw_pbp(page, season, game, background=background)
     # ed.print_and_log('Scraped pbp for {0:d} {1:d}'.format(season, game))
     sleep(1)  # Don't want to overload NHL servers
-
-    # It's most efficient to parse with page in memory, but for sake of simplicity will do it later
-    # pbp = read_pbp_events_from_page(page)
-    # update_team_logs(pbp, season, schedule_item['Home'])
-    return True
+    return page, write
 
 
 def save_raw_html_pbp(page, season, game):
@@ -86,39 +106,51 @@ def save_raw_html_pbp(page, season, game):
     w.close()
 
 
-def save_raw_pbp(page, season, game):
+def save_raw_pbp(page, season, game, background=False):
     """
-    Takes the bytes page containing pbp information and saves to disk as a compressed zlib.
+    Takes the bytes page containing pbp information and saves to disk, compressed (see raw_codec).
 
     :param page: bytes. str(page) would yield a string version of the json pbp
     :param season: int, the season
     :param game: int, the game
+    :param background: bool. If True, compresses and writes in a background thread (see
+        general_helpers.write_file_in_background)
 
-    :return: nothing
+    :return: concurrent.futures.Future for the write if background, else nothing
     """
-    try:
-        page2 = zlib.compress(page.encode('latin-1'), level=9)
-    except TypeError:
-        # No level kwarg before Python 3.6
-        page2 = zlib.compress(page.encode('latin-1'))
     filename = get_game_raw_pbp_filename(season, game)
+    raw_archive.discard_raw(season, game, 'pbp')
+    if background:
+        return helpers.write_file_in_background(filename, page, raw_codec.encode_raw)
+    page2 = raw_codec.encode_raw(page)
     w = open(filename, 'wb')
     w.write(page2)
     w.close()
 
 
+@instrumentation.instrument('scrape.read_raw_pbp')
 def get_raw_pbp(season, game):
     """
-    Loads the compressed json file containing this game's play by play from disk.
+    Loads the compressed json file containing this game's play by play from disk, or from the season's raw archive
+    (see raw_archive.read_raw_or_file).
 
     :param season: int, the season
     :param game: int, the game
 
     :return: json, the json pbp
     """
-    with open(get_game_raw_pbp_filename(season, game), 'rb') as reader:
-        page = reader.read()
-    return json.loads(str(zlib.decompress(page).decode('latin-1')))
+    filename = get_game_raw_pbp_filename(season, game)
+
+    def read_file():
+        with open(filename, 'rb') as reader:
+            return reader.read()
+
+    page = helpers.get_pending_write(filename)
+    if page is not None:
+        return json.loads(page)  # Not written yet, so not compressed yet either
+    page = raw_archive.read_raw_or_file(season, game, 'pbp', read_file)
+    instrumentation.add_bytes_read(len(page))
+    return json.loads(raw_codec.decode_raw(page))
 
 
 def get_raw_html_pbp(season, game):
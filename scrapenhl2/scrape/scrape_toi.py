@@ -5,36 +5,57 @@ This module contains methods for scraping TOI.
 import json
 import os.path
 import urllib.request
-import zlib
 from time import sleep
 
 from scrapenhl2.scrape import organization
+from scrapenhl2.scrape import raw_archive
 from scrapenhl2.scrape import schedules
 from scrapenhl2.scrape import general_helpers as helpers
+from scrapenhl2.scrape import instrumentation
+from scrapenhl2.scrape import raw_codec
 
 
-def scrape_game_toi(season, game, force_overwrite=False):
+def scrape_game_toi(season, game, force_overwrite=False, return_payload=False):
     """
     This method scrapes the toi for the given game.
 
     :param season: int, the season
     :param game: int, the game
     :param force_overwrite: bool. If file exists already, won't scrape again
+    :param return_payload: bool. If True, returns the json shifts instead of True, so they can be parsed without
+        reading them back from disk (see parse_toi.parse_game_toi). The file is then compressed and written in the
+        background, and may not be on disk yet when this returns (see fetch_game_toi to wait for it)
 
-    :return: nothing
+    :return: bool, False if not scraped, else True. If return_payload, the json shifts, or None if not scraped
+    """
+    page, _ = fetch_game_toi(season, game, force_overwrite, background=return_payload)
+    if return_payload:
+        return None if page is None else json.loads(page)
+    return page is not None
+
+
+def fetch_game_toi(season, game, force_overwrite=False, background=True):
+    """
+    Scrapes the toi for the given game and saves it (see save_raw_toi).
+
+    :param season: int, the season
+    :param game: int, the game
+    :param force_overwrite: bool. If file exists already, won't scrape again
+    :param background: bool. If True, compresses and writes the file in a background thread
+
+    :return: (page, write): the json shifts as bytes, and the concurrent.futures.Future for the write if background,
+        else None. (None, None) if not scraped
     """
     filename = get_game_raw_toi_filename(season, game)
-    if not force_overwrite and os.path.exists(filename):
-        return False
+    if not force_overwrite and (os.path.exists(filename) or helpers.get_pending_write(filename) is not None
+                                or raw_archive.has_raw(season, game, 'toi')):
+        return None, None
 
     page = helpers.try_url_n_times(get_shift_url(season, game))
-    save_raw_toi(page, season, game)
+    write = save_raw_toi(page, season, game, background=background)
     # ed.print_and_log('Scraped toi for {0:d} {1:d}'.format(season, game))
     sleep(1)  # Don't want to overload NHL servers
-
-    # It's most efficient to parse with page in memory, but for sake of simplicity will do it later
-    # toi = read_toi_from_page(page)
-    return True
+    return page, write
 
 
 def get_home_shiftlog_filename(season, game):
@@ -84,22 +105,23 @@ def scrape_game_toi_from_html(season, game, force_overwrite=True):
         print('Scraped html toi for {0:d} {1:d}'.format(season, game))
 
 
-def save_raw_toi(page, season, game):
+def save_raw_toi(page, season, game, background=False):
     """
-    Takes the bytes page containing shift information and saves to disk as a compressed zlib.
+    Takes the bytes page containing shift information and saves to disk, compressed (see raw_codec).
 
     :param page: bytes. str(page) would yield a string version of the json shifts
     :param season: int, the season
     :param game: int, the game
+    :param background: bool. If True, compresses and writes in a background thread (see
+        general_helpers.write_file_in_background)
 
-    :return: nothing
+    :return: concurrent.futures.Future for the write if background, else nothing
     """
-    try:
-        page2 = zlib.compress(page.encode('latin-1'), level=9)
-    except TypeError:
-        # No level kwarg before Python 3.6
-        page2 = zlib.compress(page.encode('latin-1'))
     filename = get_game_raw_toi_filename(season, game)
+    raw_archive.discard_raw(season, game, 'toi')
+    if background:
+        return helpers.write_file_in_background(filename, page, raw_codec.encode_raw)
+    page2 = raw_codec.encode_raw(page)
     w = open(filename, 'wb')
     w.write(page2)
     w.close()
@@ -120,6 +142,7 @@ def save_raw_toi_from_html(page, season, game, homeroad):
         filename = get_home_shiftlog_filename(season, game)
     elif homeroad == 'R':
         filename = get_road_shiftlog_filename(season, game)
+    raw_archive.discard_raw(season, game, 'toi_' + homeroad)
     w = open(filename, 'w')
     if type(page) != str:
         page = page.decode('latin-1')
@@ -129,7 +152,8 @@ def save_raw_toi_from_html(page, season, game, homeroad):
 
 def get_raw_html_toi(season, game, homeroad):
     """
-    Loads the html file containing this game's toi from disk.
+    Loads the html file containing this game's toi from disk, or from the season's raw archive (see
+    raw_archive.read_raw_or_file).
 
     :param season: int, the season
     :param game: int, the game
@@ -141,23 +165,37 @@ def get_raw_html_toi(season, game, homeroad):
         filename = get_home_shiftlog_filename(season, game)
     elif homeroad == 'R':
         filename = get_road_shiftlog_filename(season, game)
-    with open(filename, 'r') as reader:
-        page = reader.read()
-    return page
 
+    def read_file():
+        with open(filename, 'r') as reader:
+            return reader.read()
+
+    return raw_archive.read_raw_or_file(season, game, 'toi_' + homeroad, read_file)
 
+
+@instrumentation.instrument('scrape.read_raw_toi')
 def get_raw_toi(season, game):
     """
-    Loads the compressed json file containing this game's shifts from disk.
+    Loads the compressed json file containing this game's shifts from disk, or from the season's raw archive (see
+    raw_archive.read_raw_or_file).
 
     :param season: int, the season
     :param game: int, the game
 
     :return: dict, the json shifts
     """
-    with open(get_game_raw_toi_filename(season, game), 'rb') as reader:
-        page = reader.read()
-    return json.loads(str(zlib.decompress(page).decode('latin-1')))
+    filename = get_game_raw_toi_filename(season, game)
+
+    def read_file():
+        with open(filename, 'rb') as reader:
+            return reader.read()
+
+    page = helpers.get_pending_write(filename)
+    if page is not None:
+        return json.loads(page)  # Not written yet, so not compressed yet either
+    page = raw_archive.read_raw_or_file(season, game, 'toi', read_file)
+    instrumentation.add_bytes_read(len(page))
+    return json.loads(raw_codec.decode_raw(page))
 
 
 def get_home_shiftlog_url(season, game):
@@ -0,0 +1,218 @@
+"""
+This module reads shift rows from NHL HTML shift reports (the TH and TV reports, saved as [game]H.html and
+[game]R.html by scrape_toi).
+
+Only the rows parse_toi needs are extracted: each player's heading ("8 OVECHKIN, ALEX") and the shift rows under it
+(shift number, period, start and end of shift, duration, and event). Per-period summary tables and page headers are
+skipped.
+
+Two backends are supported, chosen with SCRAPENHL2_HTML_PARSER:
+
+- lxml (the default, if installed): streams through the page with lxml.etree.iterparse
+- html.parser: the standard library's parser, which is slower but always available
+
+Example::
+
+    from scrapenhl2.scrape import shift_report
+    for number, name, period, start, end, duration in shift_report.read_shift_report(page):
+        ...
+"""
+
+import html.parser
+import io
+import os
+import re
+
+
+def get_parsers():
+    """
+    Returns names of supported HTML parsers.
+
+    :return: list of str
+    """
+    return ['lxml', 'html.parser']
+
+
+def get_available_parsers():
+    """
+    Returns names of supported HTML parsers that are installed.
+
+    :return: list of str
+    """
+    return [parser for parser in get_parsers() if parser == 'html.parser' or _import_lxml() is not None]
+
+
+def get_parser():
+    """
+    Returns the HTML parser read_shift_report uses by default (see SCRAPENHL2_HTML_PARSER).
+
+    :return: str
+    """
+    return _PARSER
+
+
+def read_shift_report(page, parser=None):
+    """
+    Reads shift rows from one team's HTML shift report.
+
+    :param page: str, the html page
+    :param parser: str, 'lxml' or 'html.parser'. Defaults to get_parser()
+
+    :return: list of (sweater number, name, period, start, end, duration), all str except the sweater number (int).
+        Names are as in the report ("OVECHKIN, ALEX"), start and end are elapsed time in the period ("12:34"), and
+        duration is mm:ss
+    """
+    if parser is None:
+        parser = _PARSER
+    if parser == 'lxml':
+        rows = _read_rows_lxml(page)
+    elif parser == 'html.parser':
+        rows = _read_rows_stdlib(page)
+    else:
+        raise ValueError('Unknown HTML parser {0:s}. Options: {1:s}'.format(str(parser), ', '.join(get_parsers())))
+    return _extract_shifts(rows)
+
+
+def _extract_shifts(rows):
+    """
+    Picks out player headings and the shift rows under them.
+
+    :param rows: iterable of lists of str, the text of each table row's cells
+
+    :return: list of (sweater number, name, period, start, end, duration)
+    """
+    shifts = []
+    number = None
+    name = None
+    for cells in rows:
+        if len(cells) == 1:
+            match = _PLAYER_HEADING.match(cells[0])
+            if match is not None:
+                number, name = int(match.group(1)), match.group(2)
+        elif len(cells) == 6 and name is not None and cells[0].isdigit() and '/' in cells[2] and '/' in cells[3]:
+            shiftnum, period, start, end, duration, event = cells
+            shifts.append((number, name, period, start[:start.index('/')].strip(), end[:end.index('/')].strip(),
+                           duration))
+    return shifts
+
+
+def _read_rows_lxml(page):
+    """
+    Yields the text of each table row's cells, using lxml. Rows are cleared once read, so a row containing a nested
+    table doesn't repeat its text.
+
+    :param page: str, the html page
+
+    :return: generator of lists of str
+    """
+    etree = _import_lxml()
+    if etree is None:
+        raise ValueError('lxml is not installed; use the html.parser parser instead')
+    source = io.BytesIO(page.encode('utf-8'))
+    for _, row in etree.iterparse(source, events=('end',), tag='tr', html=True, encoding='utf-8'):
+        cells = [_clean_text(''.join(cell.itertext())) for cell in row if cell.tag in ('td', 'th')]
+        row.clear()
+        yield cells
+
+
+def _read_rows_stdlib(page):
+    """
+    Returns the text of each table row's cells, using the standard library's html.parser.
+
+    :param page: str, the html page
+
+    :return: list of lists of str
+    """
+    parser = _ShiftReportParser()
+    parser.feed(page)
+    parser.close()
+    return parser.rows
+
+
+class _ShiftReportParser(html.parser.HTMLParser):
+    """
+    Collects the text of each table row's cells. Text in a nested table goes to the nested table's cells only, and
+    unclosed cells are closed by the next cell or the end of the row.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.rows = []
+        self._open_rows = []
+        self._open_cells = []  # (depth of the row the cell is in, list of text pieces)
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self._open_rows.append([])
+        elif tag in ('td', 'th') and self._open_rows:
+            depth = len(self._open_rows)
+            while self._open_cells and self._open_cells[-1][0] >= depth:
+                self._open_cells.pop()
+            cell = []
+            self._open_rows[-1].append(cell)
+            self._open_cells.append((depth, cell))
+
+    def handle_endtag(self, tag):
+        if tag in ('td', 'th'):
+            if self._open_cells and self._open_cells[-1][0] == len(self._open_rows):
+                self._open_cells.pop()
+        elif tag == 'tr' and self._open_rows:
+            depth = len(self._open_rows)
+            while self._open_cells and self._open_cells[-1][0] >= depth:
+                self._open_cells.pop()
+            self.rows.append([_clean_text(''.join(cell)) for cell in self._open_rows.pop()])
+
+    def handle_data(self, data):
+        if self._open_cells:
+            self._open_cells[-1][1].append(data)
+
+
+def _clean_text(text):
+    """
+    Strips a cell's text, treating non-breaking spaces as spaces.
+
+    :param text: str
+
+    :return: str
+    """
+    return text.replace('\xa0', ' ').strip()
+
+
+def _import_lxml():
+    """
+    Imports lxml.etree, which is optional.
+
+    :return: module, or None if not installed
+    """
+    try:
+        from lxml import etree
+        return etree
+    except ImportError:
+        return None
+
+
+def shift_report_setup():
+    """
+    Reads SCRAPENHL2_HTML_PARSER. Defaults to lxml if it's installed, and html.parser otherwise.
+
+    :return: nothing
+    """
+    global _PARSER
+    if 'SCRAPENHL2_HTML_PARSER' in os.environ:
+        parser = os.environ['SCRAPENHL2_HTML_PARSER'].lower()
+        if parser not in get_parsers():
+            print('Unknown HTML parser {0:s}; using html.parser. Options: {1:s}'.format(parser,
+                                                                                       ', '.join(get_parsers())))
+            parser = 'html.parser'
+        elif parser not in get_available_parsers():
+            print('HTML parser {0:s} is not installed; using html.parser'.format(parser))
+            parser = 'html.parser'
+    else:
+        parser = get_available_parsers()[0]
+    _PARSER = parser
+
+
+# "8 OVECHKIN, ALEX"
+_PLAYER_HEADING = re.compile(r'^(\d{1,2})\s+(\S.*,.*)$')
+_PARSER = 'html.parser'
+shift_report_setup()
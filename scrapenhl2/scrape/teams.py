@@ -8,7 +8,8 @@ import feather
 import pandas as pd
 import pyarrow
 
-from scrapenhl2.scrape import organization, parse_pbp, parse_toi, schedules, team_info, general_helpers as helpers
+from scrapenhl2.scrape import organization, parse_pbp, parse_toi, schedules, team_info, data_cache, instrumentation, \
+    profiling, general_helpers as helpers
 
 
 def get_team_pbp(season, team):
@@ -20,7 +21,9 @@ def get_team_pbp(season, team):
 
     :return: df, the pbp of given team in given season
     """
-    return feather.read_dataframe(get_team_pbp_filename(season, team_info.team_as_str(team, True)))
+    team = team_info.team_as_str(team, True)
+    return data_cache.get_cached_dataframe('team_pbp', season, team, get_team_pbp_filename(season, team),
+                                           feather.read_dataframe)
 
 
 def get_team_toi(season, team):
@@ -32,9 +35,31 @@ def get_team_toi(season, team):
 
     :return: df, the toi of given team in given season
     """
-    return feather.read_dataframe(get_team_toi_filename(season, team_info.team_as_str(team, True)))
+    team = team_info.team_as_str(team, True)
+    return data_cache.get_cached_dataframe('team_toi', season, team, get_team_toi_filename(season, team),
+                                           feather.read_dataframe)
 
 
+def get_team_log_games(season, team, log='toi'):
+    """
+    Returns the games in the team's pbp or toi log. Reads only the Game column.
+
+    :param season: int, the season
+    :param team: int or str, the team
+    :param log: str, 'pbp' or 'toi'
+
+    :return: list of int, or an empty list if there is no log
+    """
+    if log == 'pbp':
+        filename = get_team_pbp_filename(season, team)
+    else:
+        filename = get_team_toi_filename(season, team)
+    if not os.path.exists(filename):
+        return []
+    return [int(game) for game in feather.read_dataframe(filename, columns=['Game']).Game.unique()]
+
+
+@instrumentation.instrument('teams.write_pbp')
 def write_team_pbp(pbp, season, team):
     """
     Writes the given pbp dataframe to file.
@@ -49,8 +74,11 @@ def write_team_pbp(pbp, season, team):
         print('PBP df is None, will not write team log')
         return
     feather.write_dataframe(pbp, get_team_pbp_filename(season, team_info.team_as_str(team, True)))
+    instrumentation.add_file_written(get_team_pbp_filename(season, team))
+    data_cache.invalidate('team_pbp', season, team_info.team_as_str(team, True))
 
 
+@instrumentation.instrument('teams.write_toi')
 def write_team_toi(toi, season, team):
     """
     Writes team TOI log to file
@@ -74,6 +102,8 @@ def write_team_toi(toi, season, team):
             except ValueError:
                 toi.loc[:, col] = toi[col].astype(str)
         feather.write_dataframe(toi, get_team_toi_filename(season, team_info.team_as_str(team, True)))
+    instrumentation.add_file_written(get_team_toi_filename(season, team))
+    data_cache.invalidate('team_toi', season, team_info.team_as_str(team, True))
 
 
 def get_team_pbp_filename(season, team):
@@ -102,7 +132,9 @@ def get_team_toi_filename(season, team):
                         "{0:s}.feather".format(team_info.team_as_str(team, abbreviation=True)))
 
 
-def update_team_logs(season, force_overwrite=False, force_games=None):
+@profiling.profiled('update_team_logs')
+@instrumentation.instrument('teams.update_logs')
+def update_team_logs(season, force_overwrite=False, force_games=None, for_teams=None):
     """
     This method looks at the schedule for the given season and writes pbp for scraped games to file.
     It also adds the strength at each pbp event to the log.
@@ -110,6 +142,7 @@ def update_team_logs(season, force_overwrite=False, force_games=None):
     :param season: int, the season
     :param force_overwrite: bool, whether to generate from scratch
     :param force_games: None or iterable of games to force_overwrite specifically
+    :param for_teams: None or iterable of teams (int or str) to update. If None, updates all teams.
 
     :return: nothing
     """
@@ -126,6 +159,9 @@ def update_team_logs(season, force_overwrite=False, force_games=None):
             .sort_values('Game')
 
     allteams = sorted(list(new_games_to_do.Home.append(new_games_to_do.Road).unique()))
+    if for_teams is not None:
+        for_teams = {team_info.team_as_id(team) for team in for_teams}
+        allteams = [team for team in allteams if team in for_teams]
 
     for teami, team in enumerate(allteams):
         print('Updating team log for {0:d} {1:s}'.format(season, team_info.team_as_str(team)))
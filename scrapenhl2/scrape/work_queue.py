@@ -0,0 +1,560 @@
+"""
+This module contains a persistent work queue for scraping and parsing games, used by autoupdate and for backfills.
+
+There is one task per game per stage:
+
+- fetch_pbp: scrape the raw pbp JSON
+- fetch_toi: scrape the raw shifts (JSON, or HTML before 2010)
+- parse_pbp: parse pbp (after fetch_pbp)
+- parse_toi: parse shifts (after fetch_toi). Falls back to the HTML shift reports if the JSON is incomplete.
+
+and one per season for team_logs, which updates team logs once all the season's other tasks have finished.
+
+Tasks live in a SQLite file (SCRAPENHL2_WORK_QUEUE_FILE, default work_queue.sqlite in the other data folder), so a run
+that is interrupted picks up where it left off: finished stages are not redone. Failed tasks are retried with
+exponential backoff up to a number of attempts per stage; after that they (and tasks that depend on them) are marked
+failed, with the error. Each stage runs in a thread pool with its own concurrency limit. Parsing pbp rewrites the
+schedule file, so it is limited to one at a time.
+
+Fetching and parsing are pipelined: fetch tasks hand the JSON they download to the matching parse task in memory, so
+parsing doesn't read and decompress it back from disk, and network and CPU time overlap. The raw file is compressed
+and written in the background meanwhile; the parse task can start before that finishes, but the fetch task is only
+marked done (and the game marked scraped in the schedule) once the file is on disk. If the write fails, the fetch is
+retried. Payloads waiting to be parsed are held in a bounded buffer (SCRAPENHL2_QUEUE_PAYLOAD_BUFFER, default 16);
+when it is full, no more fetches start until parsers catch up.
+
+Schedule status columns (PBPStatus and TOIStatus) are updated in batches, rather than rewriting the schedule once per
+game.
+
+Example (a restartable backfill)::
+
+    from scrapenhl2.scrape import work_queue
+    work_queue.backfill(2010, 2017)
+    print(work_queue.get_queue_status())
+"""
+
+import concurrent.futures
+import contextlib
+import json
+import os
+import os.path
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+import scrapenhl2.scrape.manipulate_schedules as manipulate_schedules
+import scrapenhl2.scrape.organization as organization
+import scrapenhl2.scrape.parse_pbp as parse_pbp
+import scrapenhl2.scrape.parse_toi as parse_toi
+import scrapenhl2.scrape.schedules as schedules
+import scrapenhl2.scrape.scrape_pbp as scrape_pbp
+import scrapenhl2.scrape.scrape_toi as scrape_toi
+import scrapenhl2.scrape.teams as teams
+
+
+def get_stages():
+    """
+    Returns queue stages, in order.
+
+    :return: tuple of str
+    """
+    return 'fetch_pbp', 'fetch_toi', 'parse_pbp', 'parse_toi', 'team_logs'
+
+
+def get_work_queue_filename():
+    """
+    Returns the queue's SQLite file.
+
+    :return: str, SCRAPENHL2_WORK_QUEUE_FILE if set, otherwise /scrape/data/other/work_queue.sqlite
+    """
+    if 'SCRAPENHL2_WORK_QUEUE_FILE' in os.environ:
+        return os.environ['SCRAPENHL2_WORK_QUEUE_FILE']
+    return os.path.join(organization.get_other_data_folder(), 'work_queue.sqlite')
+
+
+def enqueue_games(season, games, stages=None, redo=False):
+    """
+    Adds tasks for these games. Also adds the season's team_logs task, if team_logs is in stages. Tasks that already
+    finished are left alone unless redo is True; tasks that failed are reset so they are tried again.
+
+    :param season: int, the season
+    :param games: iterable of int, the games
+    :param stages: iterable of str, or None for all. See get_stages
+    :param redo: bool. If True, resets finished tasks too
+
+    :return: nothing
+    """
+    if stages is None:
+        stages = get_stages()
+    now = time.time()
+    resettable = ('failed', 'done') if redo else ('failed',)
+    rows = [(int(season), int(game), stage) for game in games for stage in stages if stage != 'team_logs']
+    if 'team_logs' in stages:
+        rows.append((int(season), 0, 'team_logs'))
+
+    with _connect() as conn:
+        changes = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO tasks (season, game, stage, status, attempts, next_try, updated) "
+                         "VALUES (?, ?, ?, 'pending', 0, 0, ?)", [row + (now,) for row in rows])
+        conn.executemany("UPDATE tasks SET status = 'pending', attempts = 0, next_try = 0, error = NULL, updated = ? "
+                         "WHERE season = ? AND game = ? AND stage = ? AND status IN ({0:s})"
+                         .format(', '.join("'{0:s}'".format(status) for status in resettable)),
+                         [(now,) + row for row in rows])
+        if conn.total_changes > changes:
+            # New game data means team logs need updating again
+            conn.execute("UPDATE tasks SET status = 'pending', attempts = 0, next_try = 0, error = NULL, updated = ? "
+                         "WHERE season = ? AND stage = 'team_logs' AND status = 'done'", (now, int(season)))
+
+
+def run_queue(seasons=None, limits=None, retries=None, force_overwrite=True, verbose=True, functions=None):
+    """
+    Runs pending tasks until none are left (waiting out retry backoff as needed).
+
+    :param seasons: iterable of int, or None for all seasons in the queue
+    :param limits: dict of stage to max concurrent tasks, overriding the defaults
+    :param retries: dict of stage to (max attempts, base backoff in seconds), overriding the defaults
+    :param force_overwrite: bool, passed to the scrape and parse methods
+    :param verbose: bool. If True, prints failures and a summary
+    :param functions: dict of stage to method taking (season, game, force_overwrite), overriding the defaults. Fetch
+        methods may return a payload, which is passed to the matching parse method as payload=, or (payload, write),
+        where write is a concurrent.futures.Future saving the raw file; the fetch task is done once it finishes
+
+    :return: dataframe of task counts by stage and status. See get_queue_status
+    """
+    limits = dict(_STAGE_LIMITS, **(limits or {}))
+    retries = dict(_STAGE_RETRIES, **(retries or {}))
+    functions = dict(_get_stage_functions(), **(functions or {}))
+    seasons = None if seasons is None else [int(season) for season in seasons]
+    status_batch = {'PBP': {}, 'TOI': {}}
+    payloads = {}  # (season, game, fetch stage) to payload, waiting for its parse task
+    writes = {}  # Raw file write to its (season, game, fetch stage), which is done once the write finishes
+
+    with _connect() as conn:
+        # Tasks left running by an interrupted run
+        conn.execute("UPDATE tasks SET status = 'pending' WHERE status = 'running'")
+
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, sum(limits.values()))) as executor, \
+            _connect() as conn:
+        while True:
+            nrunning = {stage: 0 for stage in get_stages()}
+            for task in running.values():
+                nrunning[task[2]] += 1
+            buffer_free = _PAYLOAD_BUFFER_SIZE - len(payloads) - sum(nrunning[stage] for stage in _PRODUCERS)
+
+            # Parsers first, so payloads are consumed before more are fetched
+            for stage in ('parse_pbp', 'parse_toi', 'team_logs', 'fetch_pbp', 'fetch_toi'):
+                if stage == 'team_logs' and _get_batch_size(status_batch) > 0:
+                    _flush_schedule_status(status_batch)
+                nclaim = limits[stage] - nrunning[stage]
+                if stage in _PRODUCERS:
+                    nclaim = min(nclaim, buffer_free)
+                ready = [(season, game) for season, game, fetch in payloads if fetch == _DEPENDENCIES.get(stage)]
+                tasks = _claim_tasks(conn, stage, nclaim, seasons, ready)
+                if stage in _PRODUCERS:
+                    buffer_free -= len(tasks)
+                for task in tasks:
+                    kwargs = {}
+                    if stage in _DEPENDENCIES:
+                        payload = payloads.pop((task[0], task[1], _DEPENDENCIES[stage]), None)
+                        if payload is not None:
+                            kwargs['payload'] = payload
+                    running[executor.submit(functions[stage], task[0], task[1], force_overwrite, **kwargs)] = task
+
+            if len(running) == 0 and len(writes) == 0:
+                next_try = _get_next_retry_time(conn, seasons)
+                if next_try is None:
+                    break
+                time.sleep(min(max(next_try - time.time(), 0), 5))
+                continue
+
+            done, _ = concurrent.futures.wait(list(running) + list(writes), timeout=5,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                written = future in writes
+                task = writes.pop(future) if written else running.pop(future)
+                try:
+                    result = future.result()
+                    if task[2] in _PRODUCERS and not written:
+                        payload, write = result if isinstance(result, tuple) else (result, None)
+                        if payload is not None and _has_pending_dependent(conn, task):
+                            payloads[task] = payload
+                        if write is not None:
+                            writes[write] = task  # Parsing can start, but the fetch isn't done until this is
+                            continue
+                    _mark_done(conn, task)
+                    if task[2] in _PRODUCERS:
+                        column = 'PBP' if task[2] == 'fetch_pbp' else 'TOI'
+                        status_batch[column].setdefault(task[0], set()).add(task[1])
+                except Exception as e:
+                    payloads.pop(task, None)
+                    _mark_failed(conn, task, e, retries[task[2]], verbose)
+            if _get_batch_size(status_batch) >= _STATUS_BATCH_SIZE:
+                _flush_schedule_status(status_batch)
+
+    _flush_schedule_status(status_batch)
+    status = get_queue_status(seasons)
+    if verbose:
+        print(status)
+    return status
+
+
+def backfill(startseason, endseason=None, limits=None, redo=False):
+    """
+    Scrapes and parses all final regular season and playoff games in these seasons, through the queue. If
+    interrupted, run again to continue. Files already scraped or parsed are not redone.
+
+    :param startseason: int, the first season
+    :param endseason: int, the last season. Defaults to startseason
+    :param limits: dict of stage to max concurrent tasks. See run_queue
+    :param redo: bool. If True, redoes finished tasks. See enqueue_games
+
+    :return: dataframe of task counts by stage and status. See get_queue_status
+    """
+    if endseason is None:
+        endseason = startseason
+    seasons = list(range(startseason, endseason + 1))
+    for season in seasons:
+        sch = schedules.get_season_schedule(season).query('Status == "Final" & Game >= 20001')
+        enqueue_games(season, sorted(sch.Game), redo=redo)
+    return run_queue(seasons, limits=limits, force_overwrite=redo)
+
+
+def get_queue_status(seasons=None):
+    """
+    Returns task counts by stage and status.
+
+    :param seasons: iterable of int, or None for all
+
+    :return: dataframe with columns Stage, pending, running, done, failed
+    """
+    with _connect() as conn:
+        sql, params = _add_season_filter("SELECT stage, status, COUNT(*) FROM tasks", seasons, 'WHERE')
+        rows = conn.execute(sql + " GROUP BY stage, status", params).fetchall()
+    df = pd.DataFrame(rows, columns=['Stage', 'Status', 'N'])
+    df = df.pivot_table(index='Stage', columns='Status', values='N', aggfunc='sum', fill_value=0) \
+        .reindex(index=list(get_stages()), columns=['pending', 'running', 'done', 'failed'], fill_value=0) \
+        .fillna(0).astype(int)
+    df.columns.name = None
+    return df.reset_index()
+
+
+def get_failed_tasks(seasons=None):
+    """
+    Returns failed tasks, with their errors.
+
+    :param seasons: iterable of int, or None for all
+
+    :return: dataframe with columns Season, Game, Stage, Attempts, Error
+    """
+    with _connect() as conn:
+        sql, params = _add_season_filter("SELECT season, game, stage, attempts, error FROM tasks "
+                                         "WHERE status = 'failed'", seasons, 'AND')
+        rows = conn.execute(sql + " ORDER BY season, game, stage", params).fetchall()
+    return pd.DataFrame(rows, columns=['Season', 'Game', 'Stage', 'Attempts', 'Error'])
+
+
+def clear_queue(seasons=None):
+    """
+    Deletes tasks.
+
+    :param seasons: iterable of int, or None for all
+
+    :return: nothing
+    """
+    with _connect() as conn:
+        sql, params = _add_season_filter("DELETE FROM tasks", seasons, 'WHERE')
+        conn.execute(sql, params)
+
+
+def _fetch_pbp(season, game, force_overwrite):
+    """
+    The fetch_pbp stage. Returns the json pbp, or None if it was scraped already, and the background write of the raw
+    file.
+    """
+    page, write = scrape_pbp.fetch_game_pbp(season, game, force_overwrite)
+    return (None if page is None else json.loads(page)), write
+
+
+def _fetch_toi(season, game, force_overwrite):
+    """
+    The fetch_toi stage. Reads the HTML shift reports before 2010, and JSON from then on. Returns the json shifts, or
+    None if they were scraped already (or are HTML), and the background write of the raw file, if any.
+    """
+    if season < 2010:
+        scrape_toi.scrape_game_toi_from_html(season, game, force_overwrite)
+        return None
+    page, write = scrape_toi.fetch_game_toi(season, game, force_overwrite)
+    return (None if page is None else json.loads(page)), write
+
+
+def _parse_pbp(season, game, force_overwrite, payload=None):
+    """
+    The parse_pbp stage. Holds the schedule lock, since it updates coaches and results in the schedule.
+    """
+    with _SCHEDULE_LOCK:
+        parse_pbp.parse_game_pbp(season, game, force_overwrite, rawpbp=payload)
+
+
+def _parse_toi(season, game, force_overwrite, payload=None):
+    """
+    The parse_toi stage. If you scrape soon after a game the JSON only has e.g. the first period; if it doesn't have
+    the full game, this reads the HTML shift reports instead.
+    """
+    if season < 2010:
+        parse_toi.parse_game_toi_from_html(season, game, force_overwrite)
+        return
+
+    parse_toi.parse_game_toi(season, game, force_overwrite, rawtoi=payload)
+    if len(parse_toi.get_parsed_toi(season, game)) < 3600:
+        print('Not enough rows in json for {0:d} {1:d}; reading from html'.format(int(season), int(game)))
+        scrape_toi.scrape_game_toi_from_html(season, game, True)
+        parse_toi.parse_game_toi_from_html(season, game, True)
+
+
+def _update_team_logs(season, game, force_overwrite):
+    """
+    The team_logs stage. Game is 0 (one task per season). Always incremental.
+    """
+    with _SCHEDULE_LOCK:
+        teams.update_team_logs(season, force_overwrite=False)
+
+
+def _get_stage_functions():
+    """
+    Returns the method for each stage.
+
+    :return: dict of stage to method taking (season, game, force_overwrite)
+    """
+    return {'fetch_pbp': _fetch_pbp,
+            'fetch_toi': _fetch_toi,
+            'parse_pbp': _parse_pbp,
+            'parse_toi': _parse_toi,
+            'team_logs': _update_team_logs}
+
+
+def _claim_tasks(conn, stage, n, seasons, ready=()):
+    """
+    Marks up to n runnable tasks of this stage as running. A task is runnable if it is pending, past its retry time,
+    and what it depends on is done, or has handed over its payload (its raw file may still be being written).
+
+    :param conn: sqlite3 connection
+    :param stage: str
+    :param n: int
+    :param seasons: list of int, or None for all
+    :param ready: list of (season, game) whose payload for this stage is in memory. These go first
+
+    :return: list of (season, game, stage)
+    """
+    if n <= 0:
+        return []
+    readyrows = [(season, game) for season, game in ready
+                 if conn.execute("SELECT COUNT(*) FROM tasks WHERE season = ? AND game = ? AND stage = ? "
+                                 "AND status = 'pending' AND next_try <= ?",
+                                 (season, game, stage, time.time())).fetchone()[0] > 0]
+    sql = "SELECT season, game FROM tasks t WHERE stage = ? AND status = 'pending' AND next_try <= ?"
+    params = [stage, time.time()]
+    if stage == 'team_logs':
+        sql += (" AND NOT EXISTS (SELECT 1 FROM tasks d WHERE d.season = t.season AND d.stage != 'team_logs' "
+                "AND d.status IN ('pending', 'running'))")
+    elif stage in _DEPENDENCIES:
+        sql += (" AND NOT EXISTS (SELECT 1 FROM tasks d WHERE d.season = t.season AND d.game = t.game "
+                "AND d.stage = ? AND d.status != 'done')")
+        params.append(_DEPENDENCIES[stage])
+    sql, params = _add_season_filter(sql, seasons, 'AND', params)
+    rows = conn.execute(sql + " ORDER BY season, game LIMIT ?", params + [n]).fetchall()
+    rows = (readyrows + [row for row in rows if row not in readyrows])[:n]
+
+    tasks = [(season, game, stage) for season, game in rows]
+    conn.executemany("UPDATE tasks SET status = 'running', attempts = attempts + 1, updated = ? "
+                     "WHERE season = ? AND game = ? AND stage = ?", [(time.time(),) + task for task in tasks])
+    conn.commit()
+    return tasks
+
+
+def _mark_done(conn, task):
+    """
+    Marks a task as done.
+
+    :param conn: sqlite3 connection
+    :param task: (season, game, stage)
+
+    :return: nothing
+    """
+    conn.execute("UPDATE tasks SET status = 'done', error = NULL, updated = ? WHERE season = ? AND game = ? "
+                 "AND stage = ?", (time.time(),) + task)
+    conn.commit()
+
+
+def _mark_failed(conn, task, error, retry, verbose):
+    """
+    Schedules a retry for a failed task, or marks it (and tasks depending on it) as failed if out of attempts.
+
+    :param conn: sqlite3 connection
+    :param task: (season, game, stage)
+    :param error: the exception
+    :param retry: (max attempts, base backoff in seconds)
+    :param verbose: bool. If True, prints the error
+
+    :return: nothing
+    """
+    season, game, stage = task
+    max_attempts, backoff = retry
+    attempts = conn.execute("SELECT attempts FROM tasks WHERE season = ? AND game = ? AND stage = ?",
+                            task).fetchone()[0]
+    message = '{0:s}: {1:s}'.format(type(error).__name__, str(error))
+    now = time.time()
+    if attempts < max_attempts:
+        conn.execute("UPDATE tasks SET status = 'pending', next_try = ?, error = ?, updated = ? WHERE season = ? "
+                     "AND game = ? AND stage = ?", (now + backoff * 2 ** (attempts - 1), message, now) + task)
+    else:
+        conn.execute("UPDATE tasks SET status = 'failed', error = ?, updated = ? WHERE season = ? AND game = ? "
+                     "AND stage = ?", (message, now) + task)
+        for dependent, dependency in _DEPENDENCIES.items():
+            if dependency == stage:
+                conn.execute("UPDATE tasks SET status = 'failed', error = ?, updated = ? WHERE season = ? "
+                             "AND game = ? AND stage = ? AND status = 'pending'",
+                             ('Skipped because {0:s} failed'.format(stage), now, season, game, dependent))
+    conn.commit()
+    if verbose:
+        print('{0:s} failed for {1:d} {2:d} (attempt {3:d} of {4:d}): {5:s}'.format(
+            stage, season, game, attempts, max_attempts, message))
+
+
+def _has_pending_dependent(conn, task):
+    """
+    Returns whether the parse task for this fetch task is waiting to run.
+
+    :param conn: sqlite3 connection
+    :param task: (season, game, fetch stage)
+
+    :return: bool
+    """
+    season, game, stage = task
+    dependents = [dependent for dependent, dependency in _DEPENDENCIES.items() if dependency == stage]
+    return conn.execute("SELECT COUNT(*) FROM tasks WHERE season = ? AND game = ? AND stage = ? AND status = 'pending'",
+                        (season, game, dependents[0])).fetchone()[0] > 0
+
+
+def _get_next_retry_time(conn, seasons):
+    """
+    Returns when the next pending task can be tried.
+
+    :param conn: sqlite3 connection
+    :param seasons: list of int, or None for all
+
+    :return: float, epoch seconds, or None if there are no pending tasks
+    """
+    sql, params = _add_season_filter("SELECT MIN(next_try) FROM tasks WHERE status = 'pending'", seasons, 'AND')
+    return conn.execute(sql, params).fetchone()[0]
+
+
+def _get_batch_size(status_batch):
+    """
+    Returns the number of games waiting for a schedule status update.
+
+    :param status_batch: dict of 'PBP' or 'TOI' to dict of season to set of games
+
+    :return: int
+    """
+    return sum(len(games) for byseason in status_batch.values() for games in byseason.values())
+
+
+def _flush_schedule_status(status_batch):
+    """
+    Sets PBPStatus and TOIStatus to Scraped in the schedule for these games, one schedule write per season and
+    column, and empties the batch.
+
+    :param status_batch: dict of 'PBP' or 'TOI' to dict of season to set of games
+
+    :return: nothing
+    """
+    with _SCHEDULE_LOCK:
+        for season, games in status_batch['PBP'].items():
+            manipulate_schedules.update_schedule_with_pbp_scrape(season, sorted(games))
+        for season, games in status_batch['TOI'].items():
+            manipulate_schedules.update_schedule_with_toi_scrape(season, sorted(games))
+    status_batch['PBP'].clear()
+    status_batch['TOI'].clear()
+
+
+def _add_season_filter(sql, seasons, keyword, params=None):
+    """
+    Adds a season filter to a query.
+
+    :param sql: str
+    :param seasons: iterable of int, or None for no filter
+    :param keyword: str, 'WHERE' or 'AND'
+    :param params: list of query parameters so far
+
+    :return: (sql, params)
+    """
+    params = [] if params is None else list(params)
+    if seasons is None:
+        return sql, params
+    seasons = [int(season) for season in seasons]
+    sql += " {0:s} season IN ({1:s})".format(keyword, ', '.join('?' * len(seasons)))
+    return sql, params + seasons
+
+
+@contextlib.contextmanager
+def _connect():
+    """
+    Opens the queue file, creating it if need be, and commits and closes it when done.
+
+    :return: sqlite3 connection
+    """
+    conn = sqlite3.connect(get_work_queue_filename(), timeout=60)
+    try:
+        _create_tables(conn)
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _create_tables(conn):
+    """
+    Creates the tasks table, if it doesn't exist yet.
+
+    :param conn: sqlite3 connection
+
+    :return: nothing
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS tasks (season INTEGER NOT NULL, game INTEGER NOT NULL, "
+                 "stage TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL, next_try REAL NOT NULL, "
+                 "error TEXT, updated REAL, PRIMARY KEY (season, game, stage))")
+    conn.execute("CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (stage, status, next_try)")
+
+
+def work_queue_setup():
+    """
+    Reads concurrency limits from SCRAPENHL2_QUEUE_FETCH_WORKERS (fetch stages, default 4) and
+    SCRAPENHL2_QUEUE_PARSE_WORKERS (parse_toi, default 2), and the payload buffer size from
+    SCRAPENHL2_QUEUE_PAYLOAD_BUFFER (default 16).
+
+    :return: nothing
+    """
+    global _STAGE_LIMITS, _PAYLOAD_BUFFER_SIZE
+    try:
+        fetchers = max(1, int(os.environ.get('SCRAPENHL2_QUEUE_FETCH_WORKERS', 4)))
+        parsers = max(1, int(os.environ.get('SCRAPENHL2_QUEUE_PARSE_WORKERS', 2)))
+        _PAYLOAD_BUFFER_SIZE = max(1, int(os.environ.get('SCRAPENHL2_QUEUE_PAYLOAD_BUFFER', 16)))
+    except ValueError:
+        print('Could not read queue settings; using defaults')
+        fetchers, parsers, _PAYLOAD_BUFFER_SIZE = 4, 2, 16
+    _STAGE_LIMITS = {'fetch_pbp': fetchers, 'fetch_toi': fetchers, 'parse_pbp': 1, 'parse_toi': parsers,
+                     'team_logs': 1}
+
+
+_DEPENDENCIES = {'parse_pbp': 'fetch_pbp', 'parse_toi': 'fetch_toi'}
+_PRODUCERS = set(_DEPENDENCIES.values())
+_STAGE_RETRIES = {'fetch_pbp': (5, 30), 'fetch_toi': (5, 30), 'parse_pbp': (2, 5), 'parse_toi': (2, 5),
+                  'team_logs': (2, 5)}
+_STATUS_BATCH_SIZE = 100
+_SCHEDULE_LOCK = threading.RLock()
+_STAGE_LIMITS = None
+_PAYLOAD_BUFFER_SIZE = 16
+work_queue_setup()
@@ -0,0 +1,16 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+from scrapenhl2.scrape import raw_codec, schedules
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare raw file codecs on a season's raw JSON pbp and shifts")
+    parser.add_argument("-s", "--season", type=int, default=None)
+    parser.add_argument("-c", "--codecs", type=str, nargs="+", default=None, help="Codecs, e.g. zlib zstd lz4")
+    parser.add_argument("-n", "--max-files", type=int, default=None, help="Use at most this many files")
+    arguments = parser.parse_args()
+
+    season = arguments.season if arguments.season is not None else schedules.get_current_season()
+    raw_codec.benchmark_codecs(season, arguments.codecs, arguments.max_files)
@@ -0,0 +1,20 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+from scrapenhl2.manipulate import build_graph
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild stale schedule, game, team log, and player log files")
+    parser.add_argument("-s", "--season", type=int, default=None)
+    parser.add_argument("-n", "--dry-run", action="store_true", help="Only report what would be rebuilt")
+    parser.add_argument("-w", "--workers", type=int, default=4)
+    parser.add_argument("--hash", action="store_true", help="Fingerprint files by content instead of mtime")
+    parser.add_argument("--no-schedule", action="store_true", help="Don't refresh the schedule first")
+    parser.add_argument("--tolerance", type=float, default=0, help="TOI60 staleness tolerance for TOICOMP")
+    arguments = parser.parse_args()
+
+    build_graph.build_season(season=arguments.season, dry_run=arguments.dry_run, workers=arguments.workers,
+                             method='hash' if arguments.hash else 'mtime',
+                             refresh_schedule=not arguments.no_schedule, tolerance=arguments.tolerance)
@@ -0,0 +1,22 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+from scrapenhl2.scrape import raw_codec
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rewrite raw JSON pbp and shift files in another codec")
+    parser.add_argument("-s", "--start", type=int, required=True, help="First season")
+    parser.add_argument("-e", "--end", type=int, default=None, help="Last season (defaults to first)")
+    parser.add_argument("-c", "--codec", type=str, default=None, choices=raw_codec.get_codecs(),
+                        help="Codec to write (defaults to SCRAPENHL2_RAW_CODEC)")
+    parser.add_argument("--train-dict", action="store_true",
+                        help="Train a zstd dictionary on these seasons first (for --codec zstd)")
+    arguments = parser.parse_args()
+
+    if arguments.train_dict:
+        print('Saved dictionary to', raw_codec.train_zstd_dictionary(arguments.start, arguments.end))
+    counts = raw_codec.migrate_raw_files(arguments.start, arguments.end, arguments.codec)
+    print('Rewrote {0:d} files ({1:.1f} MB to {2:.1f} MB); {3:d} were already in this codec'.format(
+        counts['rewritten'], counts['bytes_before'] / 1e6, counts['bytes_after'] / 1e6, counts['skipped']))
@@ -0,0 +1,19 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+from scrapenhl2.scrape import raw_archive
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Move a season's raw files into a single per-season archive")
+    parser.add_argument("-s", "--seasons", type=int, nargs="+", required=True)
+    parser.add_argument("--keep-files", action="store_true", help="Don't delete files once archived")
+    parser.add_argument("--unpack", action="store_true", help="Write archived data back out as files instead")
+    arguments = parser.parse_args()
+
+    for season in arguments.seasons:
+        if arguments.unpack:
+            print('Wrote {0:d} files for {1:d}'.format(raw_archive.unpack_season(season), season))
+        else:
+            raw_archive.pack_season(season, delete_files=not arguments.keep_files)
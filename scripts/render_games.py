@@ -0,0 +1,32 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+from scrapenhl2.scrape import schedules
+from scrapenhl2.plot import batch_render
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render game charts for a night, a list of games, or a season")
+    parser.add_argument("-s", "--season", type=int, default=None)
+    parser.add_argument("-g", "--games", type=int, nargs="+", default=None, help="Games to render")
+    parser.add_argument("-d", "--date", type=str, default=None, help="Render all final games on this date (YYYY-MM-DD)")
+    parser.add_argument("-c", "--charts", type=str, nargs="+", default=None, help="Chart types, e.g. H2H TL")
+    parser.add_argument("-w", "--workers", type=int, default=4)
+    parser.add_argument("-o", "--outdir", type=str, default=None)
+    parser.add_argument("-f", "--force", action="store_true", help="Render even if charts are up to date")
+    arguments = parser.parse_args()
+
+    season = arguments.season if arguments.season is not None else schedules.get_current_season()
+    if arguments.games is not None:
+        games = arguments.games
+    elif arguments.date is not None:
+        games = batch_render.get_games_on_date(season, arguments.date)
+    else:
+        games = None
+
+    if games is None:
+        batch_render.render_season(season, arguments.charts, arguments.workers, arguments.outdir, arguments.force)
+    else:
+        batch_render.render_games(season, games, arguments.charts, arguments.workers, arguments.outdir,
+                                  arguments.force)
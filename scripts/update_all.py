@@ -2,16 +2,25 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-from scrapenhl2.scrape import autoupdate
+from scrapenhl2.scrape import autoupdate, schedules
+from scrapenhl2.manipulate import manipulate
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-s", "--season", type=int, default=None)
+    parser.add_argument("--player-log", action="store_true",
+                        help="Also add newly final games to the 5v5 player log")
+    parser.add_argument("--prerender", action="store_true",
+                        help="Also render game charts for newly final games")
     arguments = parser.parse_args()
 
     if arguments.season is not None and 2017 < arguments.season < 2005:
         print("Invalid season")
 
-    autoupdate.autoupdate(season=arguments.season)
+    autoupdate.autoupdate(season=arguments.season, prerender=arguments.prerender)
+
+    if arguments.player_log:
+        season = arguments.season if arguments.season is not None else schedules.get_current_season()
+        manipulate.update_5v5_player_log(season)
 
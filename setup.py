@@ -33,7 +33,7 @@ setuptools.setup(
                       'python-Levenshtein',  # for fast fuzzy matching
                       'fuzzywuzzy',  # for fuzzy string matching
                       'beautifulsoup4==4.5.3',  # for html parsing
-                      'html-table-extractor',  # for html parsing
+                      'lxml',  # for fast html parsing
                       'plotly',  # for interactive charts
                       'tqdm',  # CLI progress bar
                       #'tables',
@@ -47,6 +47,7 @@ setuptools.setup(
                       'pytest',  # Testrunner
                       'pytest-cov',  # Coverage reports
                       'pytest-mock',  # Test mocking framework
+                      'pytest-benchmark',  # Benchmarks
                       ],
     long_description=read('README.rst'),
     classifiers=[
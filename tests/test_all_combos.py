@@ -0,0 +1,63 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+from scrapenhl2.manipulate import manipulate as manip
+
+
+def _cross_join_combos(df, fillval, *args):
+    # How convert_to_all_combos used to build combinations
+    dfs_with_unique = []
+    for combo in args:
+        cols = [combo] if isinstance(combo, str) else list(combo)
+        dfs_with_unique.append(df[cols].drop_duplicates().assign(JoinKey=1))
+    complete_df = functools.reduce(lambda x, y: pd.merge(x, y, how='inner', on='JoinKey'), dfs_with_unique)
+    all_key_cols = set()
+    for tempdf in dfs_with_unique:
+        all_key_cols = all_key_cols.union(set(tempdf.columns))
+    final_df = complete_df.merge(df.assign(JoinKey=1), how='left', on=list(all_key_cols)).drop('JoinKey', axis=1)
+    for col in final_df.columns:
+        if col not in all_key_cols:
+            final_df.loc[:, col] = final_df.loc[:, col].fillna(fillval)
+    return final_df
+
+
+def _assert_same(result, expected, keys):
+    expected = expected[list(result.columns)]
+    result = result.sort_values(keys).reset_index(drop=True)
+    expected = expected.sort_values(keys).reset_index(drop=True)
+    assert len(result) == len(expected)
+    for col in result.columns:
+        np.testing.assert_array_equal(result[col].values.astype(float), expected[col].values.astype(float))
+
+
+def test_player_game_combos():
+    df = pd.DataFrame({'Game': [20001, 20001, 20002, 20003, 20003],
+                       'PlayerID': [1, 2, 2, 3, np.nan],
+                       'CF': [5, 3, 4, np.nan, 1]})
+    result = manip.convert_to_all_combos(df.copy(), 0, 'Game', 'PlayerID')
+    expected = _cross_join_combos(df, 0, 'Game', 'PlayerID')
+    _assert_same(result, expected, ['Game', 'PlayerID'])
+    assert list(result.columns[:2]) == ['Game', 'PlayerID']
+    assert len(result) == 12
+
+
+def test_pair_combos_with_tuples():
+    df = pd.DataFrame({'PlayerID1': [1, 1, 2, 3], 'Team1': ['H', 'H', 'H', 'R'],
+                       'PlayerID2': [1, 2, 2, 3], 'Team2': ['H', 'H', 'H', 'R'],
+                       'Secs': [10, 4, 6, 8]})
+    result = manip.convert_to_all_combos(df.copy(), 0, ('PlayerID1', 'Team1'), ('PlayerID2', 'Team2'))
+    expected = _cross_join_combos(df, 0, ('PlayerID1', 'Team1'), ('PlayerID2', 'Team2'))
+    assert set(result.Team1) == {'H', 'R'}
+    _assert_same(result.drop(['Team1', 'Team2'], axis=1), expected.drop(['Team1', 'Team2'], axis=1),
+                 ['PlayerID1', 'PlayerID2'])
+
+
+def test_nan_fill_and_duplicate_keys():
+    df = pd.DataFrame({'Season': [2017, 2017, 2017], 'Game': [20001, 20002, 20002],
+                       'PlayerID': [1, 2, 2], 'iG': [1, 0, 1]})
+    for fillval in (np.nan, 0):
+        result = manip.convert_to_all_combos(df.copy(), fillval, ('Season', 'Game'), 'PlayerID')
+        expected = _cross_join_combos(df, fillval, ('Season', 'Game'), 'PlayerID')
+        _assert_same(result, expected, ['Game', 'PlayerID', 'iG'])
@@ -0,0 +1,25 @@
+import pandas as pd
+
+from scrapenhl2.scrape import autoupdate
+
+
+def test_clears_live_state_only_for_newly_final_games(monkeypatch):
+    before = pd.DataFrame({'Game': [20001, 20002, 20003], 'Status': ['In Progress', 'In Progress', 'Scheduled'],
+                           'Result': 'N/A'})
+    after = before.assign(Status=['Final', 'In Progress', 'In Progress'])
+    schedule = {'current': before}
+    cleared = []
+
+    monkeypatch.setattr(autoupdate.schedules, 'get_season_schedule', lambda season: schedule['current'])
+    monkeypatch.setattr(autoupdate.schedules, 'generate_season_schedule_file',
+                        lambda season: schedule.update(current=after))
+    monkeypatch.setattr(autoupdate.manipulate_schedules, 'update_schedule_with_pbp_scrape', lambda season, games: None)
+    monkeypatch.setattr(autoupdate.manipulate_schedules, 'update_schedule_with_toi_scrape', lambda season, games: None)
+    monkeypatch.setattr(autoupdate, 'read_inprogress_games', lambda games, season: None)
+    monkeypatch.setattr(autoupdate, 'read_final_games', lambda games, season: None)
+    monkeypatch.setattr(autoupdate.teams, 'update_team_logs', lambda season, force_overwrite: None)
+    monkeypatch.setattr(autoupdate, 'delete_game_html', lambda season, game: cleared.append(('html', game)))
+    monkeypatch.setattr(autoupdate.parse_live, 'clear_live_state', lambda season, game: cleared.append(('live', game)))
+
+    autoupdate.autoupdate(2017)
+    assert cleared == [('html', 20001), ('live', 20001)]
@@ -0,0 +1,89 @@
+import os
+import os.path
+import runpy
+import sys
+
+import pytest
+
+from scrapenhl2.plot import batch_render
+
+
+@pytest.fixture
+def charts(tmpdir, monkeypatch):
+    data = {game: [os.path.join(str(tmpdir), '{0:d}.{1:s}'.format(game, kind)) for kind in ('pbp', 'toi')]
+            for game in (20001, 20002)}
+    for files in data.values():
+        for filename in files:
+            open(filename, 'w').close()
+            os.utime(filename, (1000, 1000))
+    calls = []
+
+    def timeline(season, game, save_file):
+        calls.append((game, 'TL'))
+        open(save_file, 'w').close()
+
+    def h2h(season, game, save_file):
+        calls.append((game, 'H2H'))
+        raise ValueError('no shifts for {0:d}'.format(game))
+
+    monkeypatch.setattr(batch_render.render_cache, 'get_game_chart_types', lambda: {'H2H': h2h, 'TL': timeline})
+    monkeypatch.setattr(batch_render.parse_pbp, 'get_game_parsed_pbp_filename', lambda season, game: data[game][0])
+    monkeypatch.setattr(batch_render.parse_toi, 'get_game_parsed_toi_filename', lambda season, game: data[game][1])
+    return data, calls
+
+
+def _statuses(timings):
+    return {(row.Game, row.Chart): row.Status for row in timings.itertuples()}
+
+
+def test_skips_up_to_date_charts(tmpdir, charts):
+    data, calls = charts
+    outdir = os.path.join(str(tmpdir), 'out')
+
+    timings = batch_render.render_games(2017, [20001, 20002], workers=1, outdir=outdir, verbose=False)
+    assert _statuses(timings) == {(20001, 'H2H'): 'error', (20001, 'TL'): 'rendered',
+                                  (20002, 'H2H'): 'error', (20002, 'TL'): 'rendered'}
+    errors = timings[timings.Status == 'error']
+    assert list(errors.Error) == ['no shifts for 20001', 'no shifts for 20002']
+    assert os.path.exists(batch_render.get_output_filename(outdir, 2017, 20001, 'TL'))
+
+    # Charts newer than the parsed files are skipped; failed ones are tried again
+    calls.clear()
+    timings = batch_render.render_games(2017, [20001, 20002], workers=1, outdir=outdir, verbose=False)
+    assert _statuses(timings)[(20001, 'TL')] == 'skipped' and _statuses(timings)[(20001, 'H2H')] == 'error'
+    assert (20001, 'TL') not in calls and (20001, 'H2H') in calls
+
+    # Reparsed after the chart was drawn
+    os.utime(data[20002][1], None)
+    timings = batch_render.render_games(2017, [20001, 20002], ['TL'], workers=1, outdir=outdir, verbose=False)
+    assert _statuses(timings) == {(20001, 'TL'): 'skipped', (20002, 'TL'): 'rendered'}
+
+    timings = batch_render.render_games(2017, [20001], ['TL'], workers=1, outdir=outdir, force=True, verbose=False)
+    assert _statuses(timings) == {(20001, 'TL'): 'rendered'}
+
+
+def test_missing_data_and_unknown_charts(tmpdir, charts):
+    data, calls = charts
+    outdir = os.path.join(str(tmpdir), 'out')
+    batch_render.render_games(2017, [20001], ['TL'], workers=1, outdir=outdir, verbose=False)
+    os.remove(data[20001][0])  # No parsed pbp, so the chart is never up to date
+
+    timings = batch_render.render_games(2017, [20001], ['TL', 'XYZ'], workers=1, outdir=outdir, verbose=False)
+    assert _statuses(timings) == {(20001, 'TL'): 'rendered', (20001, 'XYZ'): 'error'}
+    assert timings.set_index('Chart').loc['XYZ', 'Error'] == 'Unknown chart type: XYZ'
+
+
+@pytest.mark.parametrize('argv, expected', [
+    (['-s', '2016', '-g', '20001', '20002', '-w', '1'], ('games', 2016, [20001, 20002], None, 1, None, False)),
+    (['-s', '2016', '-d', '2016-10-12', '-c', 'TL', '-f'], ('games', 2016, [20003], ['TL'], 4, None, True)),
+    (['-o', '/tmp/charts'], ('season', 2017, None, 4, '/tmp/charts', False))])
+def test_render_games_script(monkeypatch, argv, expected):
+    calls = []
+    monkeypatch.setattr(batch_render.schedules, 'get_current_season', lambda: 2017)
+    monkeypatch.setattr(batch_render, 'get_games_on_date', lambda season, date: [20003])
+    monkeypatch.setattr(batch_render, 'render_games', lambda *args: calls.append(('games',) + args))
+    monkeypatch.setattr(batch_render, 'render_season', lambda *args: calls.append(('season',) + args))
+    monkeypatch.setattr(sys, 'argv', ['render_games.py'] + argv)
+    runpy.run_path(os.path.join(os.path.dirname(__file__), os.pardir, 'scripts', 'render_games.py'),
+                   run_name='__main__')
+    assert calls == [expected]
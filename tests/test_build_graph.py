@@ -0,0 +1,115 @@
+import collections
+import os.path
+import threading
+import time
+
+from scrapenhl2.manipulate import build_graph
+
+
+def _write(filename, text):
+    with open(filename, 'w') as writer:
+        writer.write(text)
+
+
+def _read(filename):
+    with open(filename) as reader:
+        return reader.read()
+
+
+def _graph(tmpdir, calls):
+    raw = os.path.join(str(tmpdir), 'raw.txt')
+    parsed = os.path.join(str(tmpdir), 'parsed.txt')
+    toi60 = os.path.join(str(tmpdir), 'toi60.txt')
+    toicomp = os.path.join(str(tmpdir), 'toicomp.txt')
+
+    def update_toi60():
+        # Like manipulate.update_player_toion_toioff_file: only rewrites when the contents change
+        text = _read(parsed)
+        if not os.path.exists(toi60) or _read(toi60) != text:
+            _write(toi60, text)
+
+    def action(name, func):
+        def run(old, new):
+            calls.append(name)
+            func()
+        return run
+
+    graph = collections.OrderedDict()
+    graph['raw_pbp:20001'] = build_graph.Node('raw_pbp:20001', 'raw_pbp', [], build_graph._constant('Final'), [raw],
+                                              action('raw_pbp:20001', lambda: _write(raw, 'raw')), 'scrape')
+    graph['parsed_pbp:20001'] = build_graph.Node('parsed_pbp:20001', 'parsed_pbp', ['raw_pbp:20001'],
+                                                 build_graph._files('mtime', [raw]), [parsed],
+                                                 action('parsed_pbp:20001', lambda: _write(parsed, 'parsed')),
+                                                 'parse')
+    graph['toi60'] = build_graph.Node('toi60', 'toi60', ['parsed_pbp:20001'], build_graph._files('mtime', [parsed]),
+                                      [toi60], action('toi60', update_toi60), 'season')
+    # Touches its own input, as update_toicomp_file used to by always rewriting TOI60
+    graph['toicomp'] = build_graph.Node('toicomp', 'toicomp', ['toi60'], build_graph._files('mtime', [toi60]),
+                                        [toicomp], action('toicomp', lambda: (_write(toi60, _read(parsed)),
+                                                                              _write(toicomp, 'c'))),
+                                        'season')
+    return graph, raw, parsed
+
+
+def _build(graph, state):
+    stale = build_graph.find_stale_nodes(graph, state)
+    report = {'stale': stale, 'built': [], 'failed': [], 'skipped': []}
+    build_graph._run_nodes(graph, stale, state, report, 2, build_graph.get_default_group_limits())
+    return report
+
+
+def test_settles_after_one_build(tmpdir):
+    calls = []
+    graph, raw, parsed = _graph(tmpdir, calls)
+    state = {}
+    _build(graph, state)
+    assert calls == ['raw_pbp:20001', 'parsed_pbp:20001', 'toi60', 'toicomp']
+
+    calls.clear()
+    report = _build(graph, state)
+    assert calls == [] and len(report['stale']) == 0
+
+
+def test_adopts_existing_game_files(tmpdir):
+    calls = []
+    graph, raw, parsed = _graph(tmpdir, calls)
+    _write(raw, 'raw')
+    _write(parsed, 'parsed')
+    state = {}
+    _build(graph, state)
+    assert calls == ['toi60', 'toicomp']
+    assert 'raw_pbp:20001' in state and 'parsed_pbp:20001' in state
+
+    # A missing parsed file is still rebuilt, and so is everything downstream
+    calls.clear()
+    os.remove(parsed)
+    _build(graph, state)
+    assert calls == ['parsed_pbp:20001', 'toi60', 'toicomp']
+
+
+def test_team_nodes_are_limited(tmpdir):
+    running = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    def update_team_logs(filename):
+        def run(old, new):
+            with lock:
+                running['now'] += 1
+                running['max'] = max(running['max'], running['now'])
+            time.sleep(0.05)
+            _write(filename, 'team')
+            with lock:
+                running['now'] -= 1
+        return run
+
+    graph = collections.OrderedDict()
+    for team in range(8):
+        name = 'team:{0:d}'.format(team)
+        filename = os.path.join(str(tmpdir), '{0:d}.txt'.format(team))
+        graph[name] = build_graph.Node(name, 'team', [], build_graph._constant(team), [filename],
+                                       update_team_logs(filename), 'team')
+    stale = build_graph.find_stale_nodes(graph, {})
+    report = {'stale': stale, 'built': [], 'failed': [], 'skipped': []}
+    build_graph._run_nodes(graph, stale, {}, report, 8, build_graph.get_default_group_limits())
+    assert len(report['built']) == 8
+    assert running['max'] == 2  # Not one per worker
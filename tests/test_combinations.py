@@ -0,0 +1,51 @@
+import pandas as pd
+
+from scrapenhl2.manipulate import manipulate as manip
+
+
+def _on_ice(seconds):
+    rows = [(time, pid) for time, pids in enumerate(seconds) for pid in pids]
+    return pd.DataFrame(rows, columns=['Time', 'PlayerID'])
+
+
+def test_each_line_counted_once():
+    df = _on_ice([[3, 1, 2], [2, 3, 1], [1, 2, 4]])
+    counts = manip.count_player_combinations(df, 3)
+
+    assert len(counts) == 2
+    top = counts.iloc[0]
+    assert (top.PlayerID1, top.PlayerID2, top.PlayerID3, top.Secs) == (1, 2, 3, 2)
+
+
+def test_extra_players_give_all_subsets():
+    df = _on_ice([[1, 2, 3, 4]])
+    counts = manip.count_player_combinations(df, 3)
+
+    assert len(counts) == 4
+    assert (counts.Secs == 1).all()
+
+
+def test_too_few_players():
+    counts = manip.count_player_combinations(_on_ice([[1, 2]]), 3)
+    assert len(counts) == 0
+    assert list(counts.columns) == ['PlayerID1', 'PlayerID2', 'PlayerID3', 'Secs']
+
+
+def test_most_common_lines_skips_used_players():
+    lines = pd.DataFrame({'PlayerID1': [1, 1, 4], 'PlayerID2': [2, 2, 5], 'PlayerID3': [3, 4, 6],
+                          'Secs': [30, 20, 10]})
+    pairs = pd.DataFrame({'PlayerID1': [7, 8], 'PlayerID2': [8, 9], 'Secs': [5, 4]})
+    picked_lines, picked_pairs = manip.get_most_common_lines(lines, pairs, 2, 2)
+
+    assert picked_lines == [[1, 2, 3], [4, 5, 6]]
+    assert picked_pairs == [[7, 8]]
+
+
+def test_object_dtype_player_ids():
+    # Parsed TOI player columns come back as object dtype, with missing players as None
+    df = _on_ice([[3, 1, 2], [2, 3, 1], [1, 2, None]]).astype({'PlayerID': object})
+    counts = manip.count_player_combinations(df, 2)
+
+    assert len(counts) == 3
+    top = counts.iloc[0]
+    assert (top.PlayerID1, top.PlayerID2, top.Secs) == (1, 2, 3)
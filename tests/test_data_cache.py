@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+import pytest
+
+from scrapenhl2.scrape import data_cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    budget = data_cache.get_memory_budget()
+    data_cache.set_memory_budget(10 * 1024 * 1024)
+    data_cache.clear_cache()
+    yield
+    data_cache.clear_cache()
+    data_cache.set_memory_budget(budget)
+
+
+def _write(tmpdir, name, df):
+    filename = str(tmpdir.join(name))
+    df.to_pickle(filename)
+    return filename
+
+
+def test_hit_returns_copy(tmpdir):
+    filename = _write(tmpdir, 'a.pkl', pd.DataFrame({'A': [1, 2, 3]}))
+
+    df1 = data_cache.get_cached_dataframe('test', 2017, 'a', filename, pd.read_pickle)
+    df1.loc[:, 'A'] = 0
+    df2 = data_cache.get_cached_dataframe('test', 2017, 'a', filename, pd.read_pickle)
+
+    assert list(df2.A) == [1, 2, 3]
+    stats = data_cache.get_cache_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+
+def test_rewritten_file_is_reread(tmpdir):
+    filename = _write(tmpdir, 'a.pkl', pd.DataFrame({'A': [1]}))
+    data_cache.get_cached_dataframe('test', 2017, 'a', filename, pd.read_pickle)
+
+    pd.DataFrame({'A': [5]}).to_pickle(filename)
+    mtime = os.path.getmtime(filename)
+    os.utime(filename, (mtime + 10, mtime + 10))
+
+    df = data_cache.get_cached_dataframe('test', 2017, 'a', filename, pd.read_pickle)
+    assert list(df.A) == [5]
+
+
+def test_lru_eviction(tmpdir):
+    df = pd.DataFrame({'A': range(1000)})
+    size = int(df.memory_usage(deep=True).sum())
+    data_cache.set_memory_budget(2 * size)
+
+    files = [_write(tmpdir, '{0:d}.pkl'.format(i), df) for i in range(3)]
+    data_cache.get_cached_dataframe('test', 2017, 0, files[0], pd.read_pickle)
+    data_cache.get_cached_dataframe('test', 2017, 1, files[1], pd.read_pickle)
+    data_cache.get_cached_dataframe('test', 2017, 0, files[0], pd.read_pickle)  # 0 is now most recent
+    data_cache.get_cached_dataframe('test', 2017, 2, files[2], pd.read_pickle)  # evicts 1
+
+    stats = data_cache.get_cache_stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] == 1
+    assert stats['bytes'] <= 2 * size
+
+    data_cache.get_cached_dataframe('test', 2017, 0, files[0], pd.read_pickle)
+    assert data_cache.get_cache_stats()['hits'] == 2
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scrapenhl2.manipulate import game_context
+from scrapenhl2.manipulate import manipulate as manip
+
+SEASON, GAME, HOME, ROAD = 2017, 20001, 15, 5
+
+
+def _toi(rng):
+    # Lines and pairs change every 40 seconds; every tenth shift is a power play
+    rows = []
+    for start in range(0, 1200, 40):
+        strength = '4' if start % 400 == 360 else '5'
+        players = []
+        for base in (0, 100):
+            fwds = rng.choice(np.arange(base + 1, base + 13), 3, replace=False)
+            dmen = rng.choice(np.arange(base + 13, base + 19), 2, replace=False)
+            players += list(fwds) + list(dmen)
+        for time in range(start, start + 40):
+            rows.append([time] + players + [strength, '5'])
+    return pd.DataFrame(rows, columns=['Time', 'H1', 'H2', 'H3', 'H4', 'H5', 'R1', 'R2', 'R3', 'R4', 'R5',
+                                       'HomeStrength', 'RoadStrength'])
+
+
+def _pbp(rng, times):
+    events = rng.choice(['Shot', 'Missed Shot', 'Blocked Shot', 'Goal', 'Hit', 'Faceoff'], len(times))
+    return pd.DataFrame({'Time': times, 'Event': events, 'Team': rng.choice([HOME, ROAD], len(times))})
+
+
+def _positions():
+    ids = list(range(1, 19)) + list(range(101, 119))
+    return pd.DataFrame({'ID': ids, 'Pos': (['C', 'L', 'R'] * 4 + ['D'] * 6) * 2})
+
+
+@pytest.fixture
+def game(monkeypatch):
+    rng = np.random.RandomState(0)
+    data = {'toi': _toi(rng), 'pbp': _pbp(rng, sorted(rng.choice(1200, 300, replace=False)))}
+    monkeypatch.setattr(manip.parse_toi, 'get_parsed_toi', lambda season, game: data['toi'])
+    monkeypatch.setattr(manip.parse_pbp, 'get_parsed_pbp', lambda season, game: data['pbp'])
+    monkeypatch.setattr(manip, 'get_player_positions', _positions)
+    monkeypatch.setattr(manip.schedules, 'get_home_team', lambda season, game: HOME)
+    return data
+
+
+def _sorted(df):
+    return df.sort_values(list(df.columns)).reset_index(drop=True)
+
+
+def test_matches_module_functions(game):
+    context = game_context.GameContext(SEASON, GAME)
+    for homeroad in ('H', 'R'):
+        for pos in (None, 'F', 'D', 'C'):
+            pd.testing.assert_frame_equal(_sorted(context.player_toi(pos, homeroad)),
+                                          _sorted(manip.get_player_toi(SEASON, GAME, pos, homeroad)))
+        pd.testing.assert_frame_equal(_sorted(context.line_combos(homeroad)),
+                                      _sorted(manip.get_line_combos(SEASON, GAME, homeroad)))
+        pd.testing.assert_frame_equal(_sorted(context.pairings(homeroad)),
+                                      _sorted(manip.get_pairings(SEASON, GAME, homeroad)))
+    pd.testing.assert_frame_equal(_sorted(context.h2h_toi), _sorted(manip.get_game_h2h_toi(SEASON, GAME)))
+    for cfca in (None, 'cf', 'ca'):
+        pd.testing.assert_frame_equal(_sorted(context.h2h_corsi(cfca)),
+                                      _sorted(manip.get_game_h2h_corsi(SEASON, GAME, cfca)))
+
+    assert context.line_combos('H') is context.line_combos('H')
+    assert context.player_toi(None, 'H').Secs.sum() == 5 * (game['toi'].HomeStrength == '5').sum()
+    assert len(context.line_combos('H')) > 0 and len(context.pairings('R')) > 0
+
+
+def test_h2h_corsi_counts_each_attempt_once(game):
+    # Two home attempts in the same 5v5 second, and nothing else
+    game['pbp'] = pd.DataFrame({'Time': [100, 100], 'Event': ['Shot', 'Missed Shot'], 'Team': [HOME, HOME]})
+    onice = game['toi'][game['toi'].Time == 100]
+    home = list(onice[['H1', 'H2', 'H3', 'H4', 'H5']].values[0])
+    road = list(onice[['R1', 'R2', 'R3', 'R4', 'R5']].values[0])
+
+    corsi = game_context.GameContext(SEASON, GAME).h2h_corsi('cf').set_index(['PlayerID1', 'PlayerID2'])
+    for p1, p2 in ((home[0], home[1]), (home[0], road[0]), (road[0], home[0]), (road[0], road[1])):
+        assert corsi.loc[(p1, p2), 'HomeCorsi'] == 2  # The road pairs used to be counted 4 times
+
+    plusminus = manip.get_game_h2h_corsi(SEASON, GAME).set_index(['PlayerID1', 'PlayerID2'])
+    assert plusminus.loc[(home[0], road[0]), 'HomeCorsi'] == 2
+    assert plusminus.loc[(road[0], road[1]), 'HomeCorsi'] == -2
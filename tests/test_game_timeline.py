@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from scrapenhl2.plot import game_timeline
+
+
+def _merge_based_cf(shot_times, maxtime, granularity):
+    # How _get_cf_for_timeline used to build the series
+    df = pd.DataFrame({'Time': list(range(maxtime))})
+    df = df.merge(pd.DataFrame({'Time': shot_times}).assign(CF=1), how='left', on='Time')
+    df.loc[:, 'CF'] = df.CF.fillna(0)
+    df.loc[:, 'CumCF'] = df.CF.cumsum()
+    if granularity == 'min':
+        df.loc[:, 'Time'] = df.Time // 60
+        df = df.groupby('Time').max().reset_index()
+    df = pd.concat([pd.DataFrame({'Time': [-1], 'CumCF': [0], 'CF': [0]}), df])
+    df.loc[:, 'Time'] = df.Time + 1
+    return df.drop('CF', axis=1).reset_index(drop=True)
+
+
+def test_cumulative_cf_matches_merge():
+    shots = [0, 5, 5, 59, 60, 130, 200]
+    for granularity in ('sec', 'min'):
+        expected = _merge_based_cf(shots, 150, granularity)
+        result = game_timeline._cumulative_cf_for_timeline(np.array(shots), 150, granularity)
+        assert list(result.Time) == list(expected.Time)
+        assert list(result.CumCF) == list(expected.CumCF)
+
+
+def test_contiguous_times():
+    assert game_timeline._get_contiguous_times([1, 2, 3, 5, 6, 7, 10], 0) == ((1, 3), (5, 7), (10, 10))
+    assert game_timeline._get_contiguous_times([1, 2, 3, 5, 6, 10]) == ((1, 3),)
+    assert game_timeline._get_contiguous_times([]) == ()
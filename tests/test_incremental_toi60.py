@@ -0,0 +1,86 @@
+import os.path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scrapenhl2.manipulate import manipulate as manip
+
+SEASON = 2017
+GAMES = [20001, 20002, 20003, 20004, 20005]
+PLAYERS = {1: list(range(100, 112)) + list(range(200, 206)), 2: list(range(300, 312)) + list(range(400, 406))}
+
+
+def _team_toi(game, rng):
+    rows = []
+    for time in range(600):
+        home = list(rng.choice(PLAYERS[1][:12], 3, replace=False)) + list(rng.choice(PLAYERS[1][12:], 2, replace=False))
+        road = list(rng.choice(PLAYERS[2][:12], 3, replace=False)) + list(rng.choice(PLAYERS[2][12:], 2, replace=False))
+        strength = '5' if time % 10 else '4'
+        rows.append([game, time, strength, strength] + home + road)
+    columns = ['Game', 'Time', 'TeamStrength', 'OppStrength'] + ['Team{0:d}'.format(i) for i in range(1, 6)] + \
+        ['Opp{0:d}'.format(i) for i in range(1, 6)]
+    home = pd.DataFrame(rows, columns=columns)
+    road = home.rename(columns=dict([('Team{0:d}'.format(i), 'Opp{0:d}'.format(i)) for i in range(1, 6)] +
+                                    [('Opp{0:d}'.format(i), 'Team{0:d}'.format(i)) for i in range(1, 6)]))
+    return {1: home, 2: road}
+
+
+@pytest.fixture
+def season_data(tmpdir, monkeypatch):
+    rng = np.random.RandomState(0)
+    bygame = {game: _team_toi(game, rng) for game in GAMES}
+    written = {'games': GAMES[:2]}
+
+    def get_team_toi(season, team):
+        return pd.concat([bygame[game][team] for game in written['games']], ignore_index=True)
+
+    # Every game is final in the schedule, but only some are in the team logs yet
+    schedule = pd.DataFrame({'Game': GAMES, 'Home': 1, 'Road': 2, 'Status': 'Final'})
+    positions = pd.DataFrame({'ID': PLAYERS[1] + PLAYERS[2],
+                              'Pos': (['C'] * 12 + ['D'] * 6) * 2})
+
+    monkeypatch.setattr(manip.organization, 'get_other_data_folder', lambda: str(tmpdir))
+    monkeypatch.setattr(manip.schedules, 'get_season_schedule', lambda season: schedule)
+    monkeypatch.setattr(manip.schedules, 'get_teams_in_season', lambda season: [1, 2])
+    monkeypatch.setattr(manip.teams, 'get_team_toi', get_team_toi)
+    monkeypatch.setattr(manip.teams, 'get_team_toi_filename', lambda season, team: str(tmpdir))
+    monkeypatch.setattr(manip.teams, 'get_team_log_games', lambda season, team, log='toi': list(written['games']))
+    monkeypatch.setattr(manip.team_info, 'team_as_str', lambda team, abbreviation=False: str(team))
+    monkeypatch.setattr(manip.players, 'get_player_ids_file', lambda: positions)
+    return written
+
+
+def _sorted(df, keys):
+    return df.sort_values(keys).reset_index(drop=True)
+
+
+def test_incremental_toi60_and_toicomp_match_full_rebuild(season_data):
+    for ngames in (2, 4, 5):
+        season_data['games'] = GAMES[:ngames]
+        toi60 = manip.update_player_toion_toioff_file(SEASON)
+        toicomp = manip.update_toicomp_file(SEASON)
+
+        expected60 = manip.generate_player_toion_toioff(SEASON)
+        pd.testing.assert_frame_equal(_sorted(toi60, ['PlayerID']), _sorted(expected60, ['PlayerID']),
+                                      check_dtype=False)
+
+        manip.save_player_toion_toioff_file(expected60, SEASON)
+        expected = manip.generate_toicomp(SEASON)
+        assert set(toicomp.Game) == set(GAMES[:ngames])
+        result = _sorted(toicomp, ['Game', 'PlayerID'])[expected.columns]
+        pd.testing.assert_frame_equal(result, _sorted(expected, ['Game', 'PlayerID']), check_dtype=False)
+
+    # With no new games, TOI60 isn't rewritten (build_graph fingerprints it by modification time)
+    mtime = os.path.getmtime(manip.get_player_toion_toioff_filename(SEASON))
+    manip.update_player_toion_toioff_file(SEASON)
+    assert os.path.getmtime(manip.get_player_toion_toioff_filename(SEASON)) == mtime
+
+
+def test_team_games_not_in_uses_team_logs(season_data, monkeypatch):
+    logged = {'toi': GAMES[:4], 'pbp': GAMES[:3]}
+    monkeypatch.setattr(manip.teams, 'get_team_log_games', lambda season, team, log='toi': logged[log])
+    done = pd.DataFrame({'Game': [20001, 20001], 'Team': [1, 2]})
+
+    assert manip.get_team_games_not_in(SEASON, done) == {1: [20002, 20003, 20004], 2: [20002, 20003, 20004]}
+    assert manip.get_team_games_not_in(SEASON, done, logs=('pbp', 'toi')) == {1: [20002, 20003], 2: [20002, 20003]}
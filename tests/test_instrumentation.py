@@ -0,0 +1,48 @@
+import json
+import os.path
+
+import numpy as np
+
+from scrapenhl2.scrape import instrumentation
+
+
+@instrumentation.instrument('test.double')
+def _double(arr, season=2017):
+    instrumentation.add_bytes_read(10)
+    return np.concatenate([arr, arr])
+
+
+def test_disabled_calls_through():
+    assert not instrumentation.is_enabled()
+    assert len(_double(np.arange(3))) == 6
+    with instrumentation.stage('test.noop') as st:
+        st.rows_out = 5
+        st.bytes_written += 1
+    assert 'test.noop' not in instrumentation.get_stage_totals()
+
+
+def test_records_json_and_prometheus(tmpdir):
+    json_file = os.path.join(str(tmpdir), 'metrics.jsonl')
+    prom_file = os.path.join(str(tmpdir), 'metrics.prom')
+    instrumentation.enable(json_file, prom_file)
+    try:
+        _double(np.arange(4), season=2016)
+        with instrumentation.stage('test.outer', game=20001) as st:
+            st.rows_out = 7
+            _double(np.arange(2))
+        instrumentation.write_prometheus_file()
+    finally:
+        instrumentation.disable()
+
+    with open(json_file) as reader:
+        records = [json.loads(line) for line in reader]
+    assert [r['stage'] for r in records] == ['test.double', 'test.double', 'test.outer']
+    assert records[0]['labels'] == {'season': 2016}
+    assert records[0]['rows_in'] == 4 and records[0]['rows_out'] == 8 and records[0]['bytes_read'] == 10
+    assert records[2]['rows_out'] == 7 and records[2]['bytes_read'] == 0  # Bytes go to the innermost stage
+    assert records[2]['secs'] >= records[1]['secs']
+
+    with open(prom_file) as reader:
+        prom = reader.read()
+    assert 'scrapenhl2_stage_calls_total{stage="test.double"} 2' in prom
+    assert 'scrapenhl2_stage_bytes_read_total{stage="test.double"} 20' in prom
@@ -0,0 +1,78 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scrapenhl2.manipulate import log_store
+
+
+def _season(season, rng):
+    games = list(range(20001, 20021))
+    start = datetime.date(season, 10, 1)
+    # Rescheduled games: IDs aren't in date order
+    dates = [(start + datetime.timedelta(days=int(day))).isoformat() for day in rng.permutation(len(games)) * 4]
+    schedule = pd.DataFrame({'Game': games, 'Date': dates})
+    rows = [(game, team, pid, float(rng.randint(300, 1200)))
+            for game in games for team in (1, 2) for pid in rng.choice(range(team * 100, team * 100 + 30), 18,
+                                                                          replace=False)]
+    log = pd.DataFrame(rows, columns=['Game', 'TeamID', 'PlayerID', 'TOION'])
+    return log, schedule
+
+
+@pytest.fixture
+def logs(tmpdir, monkeypatch):
+    rng = np.random.RandomState(0)
+    data = {season: _season(season, rng) for season in (2016, 2017)}
+    for season in data:
+        tmpdir.join('{0:d}.feather'.format(season)).write('')
+
+    monkeypatch.setattr(log_store.manip, 'get_5v5_player_log', lambda season: data[season][0])
+    monkeypatch.setattr(log_store.manip, 'get_5v5_player_log_filename',
+                        lambda season: str(tmpdir.join('{0:d}.feather'.format(season))))
+    monkeypatch.setattr(log_store.schedules, 'get_season_schedule', lambda season: data[season][1])
+    log_store.clear_5v5_log_store()
+    yield data
+    log_store.clear_5v5_log_store()
+
+
+def _old_filter(data, startdate, enddate, players=None, team=None):
+    # What visualization_helper did before the store: read each season, attach dates, filter, sort by date
+    df = []
+    for season in range(int(startdate[:4]) - 1, int(enddate[:4]) + 1):
+        if season not in data:
+            continue
+        log, schedule = data[season]
+        temp = log.merge(schedule, how='left', on='Game')
+        df.append(temp[(temp.Date >= startdate) & (temp.Date <= enddate)].assign(Season=season))
+    df = pd.concat(df)
+    if players is not None:
+        df = df[df.PlayerID.isin(players)]
+    if team is not None:
+        df = df[df.TeamID == team]
+    return df.sort_values(['Date', 'Game', 'PlayerID']).drop('Date', axis=1).reset_index(drop=True)
+
+
+def _with_dates(df, data):
+    dates = pd.concat([schedule.assign(Season=season) for season, (_, schedule) in data.items()])
+    return df.merge(dates, how='left', on=['Season', 'Game'])
+
+
+@pytest.mark.parametrize('startdate, enddate, players, team', [
+    ('2016-10-05', '2016-11-10', None, None),
+    ('2016-10-01', '2017-12-31', None, 2),
+    ('2016-11-01', '2017-11-01', [105, 210, 999], None),
+    ('2017-10-20', '2017-10-20', [212], 2),
+    ('2016-10-01', '2017-12-31', [105], 2)])
+def test_matches_filtering_feather_logs(logs, startdate, enddate, players, team):
+    result = _with_dates(log_store.get_5v5_log(startdate, enddate, players, team), logs)
+    expected = _old_filter(logs, startdate, enddate, players, team)
+
+    assert (result.Date.values[1:] >= result.Date.values[:-1]).all()
+    result = result.sort_values(['Date', 'Game', 'PlayerID']).drop('Date', axis=1).reset_index(drop=True)
+    pd.testing.assert_frame_equal(result[expected.columns], expected, check_dtype=False)
+
+
+def test_rejects_unresolved_players(logs):
+    with pytest.raises(ValueError):
+        log_store.get_5v5_log('2016-10-01', '2016-12-31', [105, None])
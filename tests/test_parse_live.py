@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from scrapenhl2.scrape import parse_live
+
+SEASON = 2017
+GAME = 20001
+HOME = list(range(100, 110))
+ROAD = list(range(200, 210))
+
+
+def _shifts(length=2400):
+    """Two periods of shifts as parse_toi.read_shift_rows_from_html_page makes them: Start is one past the clock."""
+    rows = []
+    for team, skaters, goalie in ((1, HOME, 90), (2, ROAD, 91)):
+        for period in (1, 2):
+            rows.append((goalie, period, 1200 * (period - 1) + 1, 1200 * period, team))
+        for i, clock in enumerate(range(0, length, 40)):
+            end = min(clock + 40, length)
+            for pid in skaters[(i % 2) * 5:(i % 2) * 5 + 5]:
+                rows.append((pid, clock // 1200 + 1, clock + 1, end, team))
+    df = pd.DataFrame(rows, columns=['PlayerID', 'Period', 'Start', 'End', 'Team'])
+    return df.assign(Duration=df.End - df.Start)
+
+
+@pytest.fixture
+def live_game(monkeypatch):
+    gameinfo = {'Home': 1, 'Road': 2}
+    positions = pd.DataFrame({'ID': HOME + ROAD + [90, 91], 'Pos': ['C'] * 20 + ['G', 'G']})
+    monkeypatch.setattr(parse_live.parse_toi.schedules, 'get_game_data_from_schedule', lambda season, game: gameinfo)
+    monkeypatch.setattr(parse_live.parse_toi.players, 'get_player_ids_file', lambda: positions)
+    return {'season': SEASON, 'game': GAME, 'pbp': None, 'shifts': None, 'toi': None}
+
+
+def test_incremental_toi_matches_full_parse(live_game):
+    shifts = _shifts()
+
+    # Poll as the shift report fills in: shifts appear once they've ended, including goalies at period ends. Every
+    # line changes at once, so each poll's new shifts start one second past the last poll's boundary.
+    for polltime in list(range(320, 2400, 320)) + [2400]:
+        polled = shifts[shifts.End <= polltime].reset_index(drop=True)
+        assert parse_live.update_live_toi(live_game, polled)
+        if 1200 < polltime < 2400:
+            # Goalies are only listed once their shift ends, so mid-period the placeholder goalie columns differ
+            continue
+        full = parse_live.parse_toi._finish_toidf_manipulations(polled, SEASON, GAME)
+        pd.testing.assert_frame_equal(live_game['toi'].reset_index(drop=True), full.reset_index(drop=True),
+                                      check_dtype=False)
+    assert not parse_live.update_live_toi(live_game, shifts)
+
+
+def test_corrected_shift_recalculates_everything(live_game):
+    shifts = _shifts()
+    parse_live.update_live_toi(live_game, shifts[shifts.End <= 1200].reset_index(drop=True))
+
+    corrected = shifts[shifts.End <= 1500].reset_index(drop=True)
+    corrected.loc[0, 'End'] = 1190
+    assert parse_live.update_live_toi(live_game, corrected)
+    full = parse_live.parse_toi._finish_toidf_manipulations(corrected, SEASON, GAME)
+    pd.testing.assert_frame_equal(live_game['toi'].reset_index(drop=True), full.reset_index(drop=True),
+                                  check_dtype=False)
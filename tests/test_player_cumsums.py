@@ -0,0 +1,62 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scrapenhl2.manipulate import player_cumsums
+from scrapenhl2.plot import visualization_helper as vhelper
+
+PLAYERS = [101, 102, 103, 104]
+
+
+def _season(season, rng):
+    games = list(range(20001, 20013))
+    start = datetime.date(season, 10, 1)
+    # Rescheduled games: IDs aren't in date order
+    dates = [(start + datetime.timedelta(days=int(day))).isoformat() for day in rng.permutation(len(games)) * 3]
+    schedule = pd.DataFrame({'Game': games, 'Date': dates})
+    # Each player misses some games, so players' windows cover different games
+    rows = [(season, game, 1, pid, float(rng.randint(0, 20)), float(rng.randint(0, 20)))
+            for game in games for pid in PLAYERS if rng.rand() < 0.8]
+    log = pd.DataFrame(rows, columns=['Season', 'Game', 'TeamID', 'PlayerID', 'CFON', 'CAON'])
+    return log, schedule
+
+
+@pytest.fixture
+def logs(tmpdir, monkeypatch):
+    rng = np.random.RandomState(0)
+    data = {season: _season(season, rng) for season in (2016, 2017)}
+    monkeypatch.setattr(player_cumsums.organization, 'get_other_data_folder', lambda: str(tmpdir))
+    monkeypatch.setattr(player_cumsums.schedules, 'get_season_schedule', lambda season: data[season][1])
+    monkeypatch.setattr(player_cumsums, '_INDEXES', {})
+    for season, (log, _) in data.items():
+        player_cumsums.generate_player_cumsums(season, log.drop('Season', axis=1))
+    return data
+
+
+def _expected(data, player, startdate, enddate, roll_len):
+    # As the player page does without cumsums: filter the log to the player and dates, then roll
+    df = pd.concat([log.merge(schedule, on='Game') for log, schedule in data.values()])
+    df = df[(df.PlayerID == player) & (df.Date >= startdate) & (df.Date <= enddate)].drop('Date', axis=1)
+    return vhelper.make_5v5_rolling_gp(df, roll_len=roll_len)
+
+
+@pytest.mark.parametrize('player, startdate, enddate, roll_len', [
+    (101, '2016-10-01', '2017-06-30', 3),  # whole season, from the player's first game
+    (102, '2016-10-10', '2016-10-25', 4),  # starts mid-season, so windows are cut off at startdate
+    (103, '2016-10-01', '2016-10-05', 10),  # fewer games than the window
+    (104, '2016-10-20', '2017-10-20', 5),  # spans seasons, so windows cross the season boundary
+    (101, '2016-10-01', '2018-06-30', 1)])
+def test_matches_rolling_sums_of_filtered_log(logs, player, startdate, enddate, roll_len):
+    result = player_cumsums.get_player_rolling_sums(player, startdate, enddate, roll_len, ['CFON', 'CAON'])
+    expected = _expected(logs, player, startdate, enddate, roll_len)
+
+    assert list(result.Game) == list(expected.Game) and list(result.Season) == list(expected.Season)
+    for col in ('CFON', 'CAON'):
+        col = '{0:d}-game {1:s}'.format(roll_len, col)
+        np.testing.assert_allclose(result[col].values, expected[col].values)
+
+
+def test_no_games_in_range(logs):
+    assert player_cumsums.get_player_rolling_sums(101, '2016-07-01', '2016-07-31', 3) is None
@@ -0,0 +1,190 @@
+import os.path
+import runpy
+import sys
+
+import feather
+import pandas as pd
+import pytest
+
+from scrapenhl2.manipulate import manipulate as manip
+
+SEASON = 2017
+TEAMS = [1, 2, 3, 4]
+
+
+def _schedule(ngames):
+    rows = []
+    for i in range(ngames):
+        home, road = TEAMS[i % 4], TEAMS[(i + 1 + i // 4) % 4]
+        if home == road:
+            road = TEAMS[(i + 2) % 4]
+        rows.append((20001 + i, home, road, 'Final'))
+    return pd.DataFrame(rows, columns=['Game', 'Home', 'Road', 'Status'])
+
+
+class _Season(object):
+    """
+    A season whose team logs are dataframes, rather than files: each team-game has five players, whose numbers are
+    set by the team, game, and an edit counter (so a test can change a game's data, as a reparse would). QoC depends
+    on the number of final games, so it changes for old rows as games are added, like TOI60.
+    """
+
+    def __init__(self, ngames):
+        self.schedule = _schedule(ngames)
+        self.edits = {}
+        self.calls = []
+
+    def final_games(self):
+        sch = self.schedule.query('Status == "Final"')
+        return pd.concat([sch[['Game', 'Home']].rename(columns={'Home': 'Team'}),
+                          sch[['Game', 'Road']].rename(columns={'Road': 'Team'})])
+
+    def team_games(self, team, games=None):
+        teamgames = self.final_games()
+        teamgames = sorted(teamgames[teamgames.Team == team].Game)
+        return teamgames if games is None else [game for game in teamgames if game in games]
+
+    def rows(self, team, games, **cols):
+        rows = []
+        for game in self.team_games(team, games):
+            for pid in range(team * 100, team * 100 + 5):
+                row = {'Game': game, 'PlayerID': pid}
+                for col, mult in cols.items():
+                    row[col] = (pid + game * mult + self.edits.get((game, team), 0)) % 97
+                rows.append(row)
+        return pd.DataFrame(rows, columns=['Game', 'PlayerID'] + sorted(cols))
+
+    def toicomp(self, team=None):
+        teams = TEAMS if team is None else [team]
+        nfinal = len(self.final_games())
+        df = pd.concat([self.rows(t, None, FQoC=3).assign(Team=t) for t in teams], ignore_index=True)
+        df.loc[:, 'FQoC'] = df.FQoC + nfinal
+        return df
+
+    def toi(self, season, team, games=None):
+        self.calls.append((team, None if games is None else tuple(games)))
+        return self.rows(team, games, TOION=1, TOIOFF=2)
+
+
+@pytest.fixture
+def season(tmpdir, monkeypatch):
+    data = _Season(12)
+    monkeypatch.delenv('SCRAPENHL2_PLAYER_CUMSUMS', raising=False)
+    monkeypatch.setattr(manip.organization, 'get_other_data_folder', lambda: str(tmpdir))
+    monkeypatch.setattr(manip.schedules, 'get_season_schedule', lambda season: data.schedule.copy())
+    monkeypatch.setattr(manip.schedules, 'get_teams_in_season', lambda season: set(TEAMS))
+    monkeypatch.setattr(manip.teams, 'get_team_log_games', lambda season, team, log: data.team_games(team))
+    monkeypatch.setattr(manip.teams, 'get_team_toi_filename', lambda season, team: str(tmpdir))
+    monkeypatch.setattr(manip, 'get_player_toion_toioff_file', lambda season, force_create=False: None)
+    monkeypatch.setattr(manip, 'update_toicomp_file', lambda season, tolerance=0: data.toicomp())
+    monkeypatch.setattr(manip, 'get_5v5_player_game_toicomp', lambda season, team: data.toicomp(team))
+    monkeypatch.setattr(manip, 'get_5v5_player_game_toi', data.toi)
+    for func, cols in (('boxcars', {'iCF': 4, 'iG': 5}), ('cfca', {'CFON': 6, 'CAON': 7}),
+                       ('gfga', {'GFON': 8}), ('shift_startend', {'OZ': 9})):
+        monkeypatch.setattr(manip, 'get_5v5_player_game_{0:s}'.format(func),
+                            lambda season, team, games=None, cols=cols: data.rows(team, games, **cols))
+    return data
+
+
+def _sorted(df):
+    return df.sort_values(['Game', 'TeamID', 'PlayerID'])[sorted(df.columns)].reset_index(drop=True)
+
+
+def _assert_matches_full_log(data):
+    updated = manip.update_5v5_player_log(SEASON)
+    expected = manip.generate_5v5_player_log(SEASON)
+    pd.testing.assert_frame_equal(_sorted(updated), _sorted(expected), check_dtype=False)
+    pd.testing.assert_frame_equal(_sorted(feather.read_dataframe(manip.get_5v5_player_log_filename(SEASON))),
+                                  _sorted(expected), check_dtype=False)
+    manifest = manip.get_5v5_player_log_manifest(SEASON)
+    assert sorted(map(tuple, manifest[['Game', 'Team']].values.tolist())) == \
+        sorted(map(tuple, data.final_games()[['Game', 'Team']].values.tolist()))
+    return updated
+
+
+def _new_team_games(data):
+    # Team-games recalculated by the last update
+    return {(team, game) for team, games in data.calls if games is not None for game in games}
+
+
+def test_appends_new_games(season):
+    ngames = len(season.schedule)
+    season.schedule.loc[season.schedule.Game > 20008, 'Status'] = 'Scheduled'
+    manip.save_5v5_player_log(manip.generate_5v5_player_log(SEASON), SEASON)
+
+    season.schedule.loc[:, 'Status'] = 'Final'
+    season.calls.clear()
+    _assert_matches_full_log(season)
+    new = season.final_games().query('Game > 20008')
+    assert _new_team_games(season) == set(zip(new.Team, new.Game))
+    assert len(manip.get_5v5_player_log(SEASON).Game.unique()) == ngames
+
+
+def test_first_update_generates_whole_season(season):
+    _assert_matches_full_log(season)
+    assert all(games is None for _, games in season.calls)
+
+
+def test_game_no_longer_final(season):
+    manip.save_5v5_player_log(manip.generate_5v5_player_log(SEASON), SEASON)
+
+    # Reopened (e.g. to reparse after a correction): dropped from the log
+    season.schedule.loc[season.schedule.Game == 20003, 'Status'] = 'In Progress'
+    season.edits[(20003, 3)] = 1
+    log = _assert_matches_full_log(season)
+    assert 20003 not in set(log.Game)
+
+    # Final again: recalculated, with the new data
+    season.schedule.loc[:, 'Status'] = 'Final'
+    season.calls.clear()
+    _assert_matches_full_log(season)
+    assert _new_team_games(season) == {(3, 20003), (4, 20003)}
+
+
+def test_team_game_missing_from_manifest(season):
+    manip.save_5v5_player_log(manip.generate_5v5_player_log(SEASON), SEASON)
+    manifest = manip.get_5v5_player_log_manifest(SEASON)
+    manifest[~((manifest.Game == 20005) & (manifest.Team == 1))] \
+        .to_csv(manip.get_5v5_player_log_manifest_filename(SEASON), index=False)
+
+    season.edits[(20005, 1)] = 1
+    season.calls.clear()
+    _assert_matches_full_log(season)
+    assert _new_team_games(season) == {(1, 20005)}
+
+
+def test_manifest_row_without_log_rows(season):
+    manip.save_5v5_player_log(manip.generate_5v5_player_log(SEASON), SEASON)
+    fname = manip.get_5v5_player_log_filename(SEASON)
+    log = feather.read_dataframe(fname)
+    feather.write_dataframe(log[~((log.Game == 20006) & (log.TeamID == 2))].reset_index(drop=True), fname)
+
+    season.calls.clear()
+    _assert_matches_full_log(season)
+    assert _new_team_games(season) == {(2, 20006)}
+
+
+def test_no_manifest_rebuilds_everything(season):
+    # A log written before manifests existed
+    manip.save_5v5_player_log(manip.generate_5v5_player_log(SEASON), SEASON)
+    os.remove(manip.get_5v5_player_log_manifest_filename(SEASON))
+    for game, team in season.final_games()[['Game', 'Team']].values:
+        season.edits[(game, team)] = 1
+
+    season.calls.clear()
+    _assert_matches_full_log(season)
+    assert _new_team_games(season) == set(zip(season.final_games().Team, season.final_games().Game))
+
+
+@pytest.mark.parametrize('argv, updated', [([], []), (['--player-log'], [2017]),
+                                           (['-s', '2016', '--player-log'], [2016])])
+def test_update_all_script(monkeypatch, argv, updated):
+    calls = []
+    monkeypatch.setattr(manip.schedules, 'get_current_season', lambda: 2017)
+    monkeypatch.setattr(manip, 'update_5v5_player_log', calls.append)
+    from scrapenhl2.scrape import autoupdate
+    monkeypatch.setattr(autoupdate, 'autoupdate', lambda season=None, prerender=False: None)
+    monkeypatch.setattr(sys, 'argv', ['update_all.py'] + argv)
+    runpy.run_path(os.path.join(os.path.dirname(__file__), os.pardir, 'scripts', 'update_all.py'),
+                   run_name='__main__')
+    assert calls == updated
@@ -0,0 +1,67 @@
+import os
+import os.path
+
+import pytest
+
+from scrapenhl2.scrape import profiling
+
+
+@profiling.profiled('busy')
+def _busy(n):
+    return _inner(n)
+
+
+@profiling.profiled('inner')
+def _inner(n):
+    total = 0
+    for i in range(n):
+        total += i * i
+    return total
+
+
+@pytest.fixture
+def run_state(monkeypatch):
+    # enable() and get_run_folder() set the run folder in module globals and the environment; monkeypatch puts them
+    # back afterwards, so this process doesn't write a summary for the test's folder at exit. (setenv before delenv,
+    # so the variable is restored, or removed, even if it wasn't set)
+    monkeypatch.setenv('SCRAPENHL2_PROFILE_RUN_DIR', '')
+    monkeypatch.delenv('SCRAPENHL2_PROFILE_RUN_DIR')
+    monkeypatch.setattr(profiling, '_RUN_FOLDER', None)
+    monkeypatch.setattr(profiling, '_RUN_OWNER_PID', None)
+    monkeypatch.setattr(profiling, '_MODES', ())
+
+
+def test_off_by_default():
+    assert _busy(1000, profile=False) == _inner(1000)
+
+
+def test_profile_run(tmpdir, run_state):
+    folder = str(tmpdir)
+    profiling.enable('cprofile,sample', folder=folder)
+    for _ in range(3):
+        _busy(200000)
+    profiling.disable()
+
+    files = os.listdir(folder)
+    assert len([f for f in files if f.startswith('busy.') and f.endswith('.prof')]) == 3
+    assert len([f for f in files if f.endswith('.collapsed')]) == 3
+    assert not any(f.startswith('inner.') for f in files)  # Nested calls aren't profiled separately
+
+    summary = profiling.summarize_profiles(folder, top=10)
+    assert '_inner' in summary
+    assert os.path.exists(os.path.join(folder, 'summary.txt'))
+    with open(os.path.join(folder, 'all.collapsed')) as reader:
+        for line in reader:
+            stack, count = line.rsplit(' ', 1)
+            assert int(count) > 0
+
+
+def test_workers_share_run_folder(tmpdir, monkeypatch, run_state):
+    monkeypatch.setenv('SCRAPENHL2_PROFILE_DIR', str(tmpdir))
+    profiling.prepare_worker_processes()
+    assert 'SCRAPENHL2_PROFILE_RUN_DIR' not in os.environ  # Profiling is off, so no folder
+
+    profiling.enable('sample')
+    profiling.prepare_worker_processes()
+    folder = os.environ['SCRAPENHL2_PROFILE_RUN_DIR']
+    assert os.path.dirname(folder) == str(tmpdir) and os.path.isdir(folder)
@@ -0,0 +1,83 @@
+import json
+import os
+import threading
+import zlib
+
+import pytest
+
+from scrapenhl2.scrape import organization, raw_archive, raw_codec, scrape_pbp, scrape_toi
+
+
+def _write_raw_files(season, games):
+    os.makedirs(organization.get_season_raw_pbp_folder(season))
+    os.makedirs(organization.get_season_raw_toi_folder(season))
+    for game in games:
+        with open(raw_archive.get_raw_filename(season, game, 'pbp'), 'wb') as writer:
+            writer.write(zlib.compress(json.dumps({'Game': game}).encode('latin-1'), 9))
+        with open(raw_archive.get_raw_filename(season, game, 'toi_R'), 'w') as writer:
+            writer.write('<td>{0:d}</td>'.format(game))
+
+
+def test_pack_read_and_unpack(tmpdir, monkeypatch):
+    monkeypatch.setenv('SCRAPENHL2_DATA_DIR', str(tmpdir))
+    _write_raw_files(2016, [20001, 20002, 30111])
+    pbpfile = raw_archive.get_raw_filename(2016, 20002, 'pbp')
+    stat = os.stat(pbpfile)
+
+    assert raw_archive.pack_season(2016, verbose=False) == 6
+    assert os.listdir(organization.get_season_raw_pbp_folder(2016)) == []
+    assert raw_archive.get_archived_games(2016, 'pbp') == [20001, 20002, 30111]
+    assert raw_archive.has_raw(2016, 30111, 'toi_R') and not raw_archive.has_raw(2016, 30111, 'toi')
+    assert json.loads(raw_codec.decode_raw(raw_archive.read_raw(2016, 20002, 'pbp'))) == {'Game': 20002}
+    assert raw_archive.read_raw_html(2016, 20001, 'toi_R') == '<td>20001</td>'
+    assert raw_archive.read_raw(2017, 20001, 'pbp') is None
+
+    # Fingerprints match the file's, so packing doesn't look like a change to build_graph
+    assert raw_archive.get_archived_file_fingerprint(pbpfile) == \
+        '{0:d}-{1:d}'.format(int(stat.st_mtime * 1e6), stat.st_size)
+    assert raw_archive.is_archived_file(pbpfile)
+
+    assert raw_archive.unpack_season(2016) == 6
+    with open(raw_archive.get_raw_filename(2016, 20001, 'toi_R')) as reader:
+        assert reader.read() == '<td>20001</td>'
+
+
+def test_reads_packed_seasons_from_archive(tmpdir, monkeypatch):
+    monkeypatch.setenv('SCRAPENHL2_DATA_DIR', str(tmpdir))
+    _write_raw_files(2016, [20001, 20002])
+    assert scrape_pbp.get_raw_pbp(2016, 20001) == {'Game': 20001}  # Not packed yet
+
+    # Packed by another thread (or process), after this one found no archive
+    thread = threading.Thread(target=raw_archive.pack_season, args=(2016,), kwargs={'verbose': False})
+    thread.start()
+    thread.join()
+    assert scrape_pbp.get_raw_pbp(2016, 20002) == {'Game': 20002}
+
+    # From then on, reads go straight to the archive
+    opened = []
+    monkeypatch.setattr(scrape_pbp, 'open', lambda *args: opened.append(args), raising=False)
+    monkeypatch.setattr(scrape_toi, 'open', lambda *args: opened.append(args), raising=False)
+    assert scrape_pbp.get_raw_pbp(2016, 20001) == {'Game': 20001}
+    assert scrape_toi.get_raw_html_toi(2016, 20002, 'R') == '<td>20002</td>'
+    assert opened == []
+    monkeypatch.undo()
+    monkeypatch.setenv('SCRAPENHL2_DATA_DIR', str(tmpdir))
+
+    # A game scraped again after packing is read from its new file
+    scrape_pbp.save_raw_pbp(json.dumps({'Game': 20001, 'Corrected': True}), 2016, 20001)
+    assert scrape_pbp.get_raw_pbp(2016, 20001) == {'Game': 20001, 'Corrected': True}
+    assert not raw_archive.has_raw(2016, 20001, 'pbp') and raw_archive.has_raw(2016, 20002, 'pbp')
+
+
+def test_migrates_packed_seasons(tmpdir, monkeypatch):
+    if 'zstd' not in raw_codec.get_available_codecs():
+        pytest.skip('zstd is not installed')
+    monkeypatch.setenv('SCRAPENHL2_DATA_DIR', str(tmpdir))
+    _write_raw_files(2016, [20001, 20002])
+    raw_archive.pack_season(2016, verbose=False)
+
+    assert raw_codec.migrate_raw_files(2016, codec='zstd', verbose=False)['rewritten'] == 4
+    assert raw_codec.get_codec_of(raw_archive.read_raw(2016, 20001, 'pbp')) == 'zstd'
+    assert scrape_pbp.get_raw_pbp(2016, 20001) == {'Game': 20001}
+    assert scrape_toi.get_raw_html_toi(2016, 20002, 'R') == '<td>20002</td>'
+    assert raw_codec.migrate_raw_files(2016, codec='zstd', verbose=False)['rewritten'] == 0
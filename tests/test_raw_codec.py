@@ -0,0 +1,77 @@
+import json
+import random
+import zlib
+
+import pytest
+
+from scrapenhl2.scrape import raw_codec
+
+PAGE = json.dumps({'gameData': {'players': {'ID8471214': {'fullName': 'Alex Ovechkin', 'birthCity': 'Moskva'}}},
+                   'liveData': {'plays': {'allPlays': [{'result': {'event': 'Shot'}, 'about': {'period': p}}
+                                                       for p in range(1, 4)] * 100}},
+                   'note': 'Montr\xe9al'})
+
+
+def test_reads_existing_zlib_files():
+    for level in (9, 1):
+        data = zlib.compress(PAGE.encode('latin-1'), level)
+        assert raw_codec.get_codec_of(data) == 'zlib'
+        assert raw_codec.decode_raw(data) == PAGE
+
+
+@pytest.mark.parametrize('codec', ['zlib', 'zstd', 'lz4'])
+def test_round_trip(codec):
+    if codec not in raw_codec.get_available_codecs():
+        pytest.skip('{0:s} is not installed'.format(codec))
+    data = raw_codec.encode_raw(PAGE, codec)
+    assert raw_codec.get_codec_of(data) == codec
+    assert raw_codec.decode_raw(data) == PAGE
+    assert len(data) < len(PAGE)
+
+
+def _write_pages(folder, seed, count=300):
+    rng = random.Random(seed)
+    filenames = []
+    for i in range(count):
+        page = json.dumps({'gamePk': seed * 1000 + i,
+                           'data': [{'playerId': rng.randint(8470000, 8480000), 'period': rng.randint(1, 3),
+                                     'startTime': '{0:02d}:{1:02d}'.format(rng.randint(0, 19), rng.randint(0, 59)),
+                                     'eventDescription': rng.choice(['Shot', 'Hit', 'Goal', 'Faceoff', 'Block'])}
+                                    for _ in range(rng.randint(20, 60))]})
+        filename = str(folder.join('{0:d}-{1:d}.zlib'.format(seed, i)))
+        with open(filename, 'wb') as writer:
+            writer.write(zlib.compress(page.encode('latin-1')))
+        filenames.append(filename)
+    return filenames
+
+
+@pytest.fixture
+def zstd_dictionary(tmpdir, monkeypatch):
+    if 'zstd' not in raw_codec.get_available_codecs():
+        pytest.skip('zstd is not installed')
+    monkeypatch.setenv('SCRAPENHL2_ZSTD_DICT', str(tmpdir.join('raw_zstd.dict')))
+    files = {}
+    monkeypatch.setattr(raw_codec, 'get_raw_filenames', lambda season: files[season])
+    raw_codec.raw_codec_setup()
+    yield files
+    monkeypatch.undo()
+    raw_codec.raw_codec_setup()
+
+
+def test_retrained_dictionary_still_reads_old_files(tmpdir, zstd_dictionary):
+    zstd_dictionary[2016] = _write_pages(tmpdir.mkdir('2016'), 2016)
+    zstd_dictionary[2017] = _write_pages(tmpdir.mkdir('2017'), 2017)
+
+    raw_codec.train_zstd_dictionary(2016)
+    old = raw_codec.encode_raw(PAGE, 'zstd')
+    raw_codec.migrate_raw_files(2016, codec='zstd', verbose=False)
+
+    raw_codec.train_zstd_dictionary(2017)
+    new = raw_codec.encode_raw(PAGE, 'zstd')
+    assert raw_codec._is_current_encoding(new, 'zstd') and not raw_codec._is_current_encoding(old, 'zstd')
+    assert raw_codec.decode_raw(old) == raw_codec.decode_raw(new) == PAGE
+
+    # Files written with the old dictionary are rewritten with the new one
+    counts = raw_codec.migrate_raw_files(2016, codec='zstd', verbose=False)
+    assert counts['rewritten'] == len(zstd_dictionary[2016])
+    assert raw_codec.migrate_raw_files(2016, codec='zstd', verbose=False)['rewritten'] == 0
@@ -0,0 +1,55 @@
+import os
+import os.path
+
+from scrapenhl2.plot import render_cache
+
+
+def test_final_version_changes_when_game_is_reparsed(tmpdir, monkeypatch):
+    pbp = os.path.join(str(tmpdir), 'pbp.h5')
+    toi = os.path.join(str(tmpdir), 'toi.h5')
+    for filename in (pbp, toi):
+        open(filename, 'w').close()
+        os.utime(filename, (1000, 1000))
+    monkeypatch.setattr(render_cache.parse_pbp, 'get_game_parsed_pbp_filename', lambda season, game: pbp)
+    monkeypatch.setattr(render_cache.parse_toi, 'get_game_parsed_toi_filename', lambda season, game: toi)
+    monkeypatch.setattr(render_cache.schedules, 'get_game_status', lambda season, game: 'Final')
+
+    version = render_cache.get_game_data_version(2017, 20001)
+    assert version.startswith('final')
+    assert render_cache.get_game_data_version(2017, 20001) == version
+
+    os.utime(toi, (2000, 2000))
+    assert render_cache.get_game_data_version(2017, 20001) != version
+
+    # Reparsed within the same second
+    version = render_cache.get_game_data_version(2017, 20001)
+    os.utime(toi, ns=(2000 * 10 ** 9 + 1, 2000 * 10 ** 9 + 1))
+    assert render_cache.get_game_data_version(2017, 20001) != version
+    version = render_cache.get_game_data_version(2017, 20001)
+    with open(toi, 'w') as writer:
+        writer.write('more rows')
+    os.utime(toi, ns=(2000 * 10 ** 9 + 1, 2000 * 10 ** 9 + 1))
+    assert render_cache.get_game_data_version(2017, 20001) != version
+
+
+def test_rerenders_when_version_changes(tmpdir, monkeypatch):
+    versions = ['live1-0']
+    renders = []
+
+    def chart(season, game, save_file):
+        renders.append(save_file)
+        open(save_file, 'w').close()
+
+    monkeypatch.setattr(render_cache.organization, 'get_other_data_folder', lambda: str(tmpdir))
+    monkeypatch.setattr(render_cache, 'get_game_chart_types', lambda: {'H2H': chart, 'TL': chart})
+    monkeypatch.setattr(render_cache, 'get_game_data_version', lambda season, game: versions[-1])
+
+    first = render_cache.get_game_chart(2017, 20001, 'H2H')
+    other = render_cache.get_game_chart(2017, 20001, 'TL')
+    assert render_cache.get_game_chart(2017, 20001, 'H2H') == first and len(renders) == 2
+
+    versions.append('live2-0')
+    second = render_cache.get_game_chart(2017, 20001, 'H2H')
+    assert second != first and len(renders) == 3
+    assert os.path.exists(second) and not os.path.exists(first)
+    assert os.path.exists(other)  # Other chart types are left alone
@@ -0,0 +1,65 @@
+import os.path
+import time
+
+import pytest
+
+from scrapenhl2.plot import render_pool
+
+
+def line_chart(n, save_file, sleep=0):
+    # A chart method as the pool expects one: draws with pyplot and saves to save_file
+    import matplotlib
+    import matplotlib.pyplot as plt
+    time.sleep(sleep)
+    plt.plot(range(n))
+    plt.savefig(save_file)
+    with open(save_file + '.backend', 'w') as writer:
+        writer.write(matplotlib.get_backend())
+
+
+def bad_chart(save_file):
+    raise ValueError('no data')
+
+
+@pytest.fixture
+def pool():
+    render_pool.set_render_pool_size(workers=1, max_outstanding=2)
+    yield
+    render_pool.shutdown_render_pool()
+    render_pool.render_pool_setup()
+
+
+def test_renders_in_workers(tmpdir, pool):
+    files = [os.path.join(str(tmpdir), '{0:d}.png'.format(i)) for i in range(4)]
+    assert render_pool.render_many((line_chart, filename, (i + 2,), {}) for i, filename in enumerate(files)) == files
+    for filename in files:
+        assert os.path.getsize(filename) > 0
+        with open(filename + '.backend') as reader:
+            assert reader.read().lower() == 'agg'
+
+    filename = os.path.join(str(tmpdir), 'one.png')
+    assert render_pool.submit_render(line_chart, filename, 3).result(timeout=60) == filename
+
+
+def test_errors_reach_caller(tmpdir, pool):
+    filename = os.path.join(str(tmpdir), 'bad.png')
+    with pytest.raises(ValueError, match='no data'):
+        render_pool.render(bad_chart, filename)
+
+    good = os.path.join(str(tmpdir), 'good.png')
+    results = render_pool.render_many([(bad_chart, filename, (), {}), (line_chart, good, (2,), {}),
+                                       ('no_such_chart', filename, (), {})])
+    assert isinstance(results[0], ValueError) and results[1] == good and isinstance(results[2], ValueError)
+
+
+def test_outstanding_job_cap(tmpdir, pool):
+    slow = [render_pool.submit_render(line_chart, os.path.join(str(tmpdir), '{0:d}.png'.format(i)), 2, sleep=1)
+            for i in range(2)]
+    with pytest.raises(RuntimeError, match='queue is full'):
+        render_pool.submit_render(line_chart, os.path.join(str(tmpdir), 'late.png'), 2, submit_timeout=0.1)
+
+    # Slots free up as jobs finish
+    slow[0].result(timeout=60)
+    late = render_pool.submit_render(line_chart, os.path.join(str(tmpdir), 'late.png'), 2, submit_timeout=60)
+    assert late.result(timeout=60).endswith('late.png')
+    slow[1].result(timeout=60)
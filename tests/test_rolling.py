@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from scrapenhl2.manipulate import rolling
+
+
+def _log():
+    rng = np.random.RandomState(0)
+    dates = pd.date_range('2017-10-01', periods=60, freq='2D')
+    rows = []
+    for pid in (8471214, 8474590, 8476880):
+        for date in sorted(rng.choice(dates, 25, replace=False)):
+            rows.append((pid, pd.Timestamp(date).strftime('%Y-%m-%d'), rng.randint(0, 20), rng.rand()))
+    df = pd.DataFrame(rows, columns=['PlayerID', 'Date', 'CF', 'TOION'])
+    df.loc[df.index % 7 == 3, 'TOION'] = np.nan
+    return df
+
+
+def test_count_window_matches_pandas():
+    df = _log()
+    result = rolling.rolling_sum_by_count(df, 'PlayerID', ['CF', 'TOION'], 5)
+    expected = df.groupby('PlayerID')[['CF', 'TOION']].rolling(5, min_periods=1).sum().reset_index(drop=True)
+    np.testing.assert_allclose(result.values, expected.values)
+
+
+def test_day_window_matches_pandas():
+    df = _log()
+    result = rolling.rolling_sum_by_days(df, 'PlayerID', 'Date', ['CF', 'TOION'], 10)
+
+    # Same as a rolling sum over one row per player per calendar day
+    expected = []
+    for pid, group in df.groupby('PlayerID', sort=False):
+        daily = group.assign(Date=pd.to_datetime(group.Date)).set_index('Date')[['CF', 'TOION']].asfreq('1D')
+        summed = daily.rolling(10, min_periods=1).sum()
+        expected.append(summed.loc[pd.to_datetime(group.Date)])
+    expected = pd.concat(expected)
+    np.testing.assert_allclose(result.values, expected.values)
+
+
+def test_all_missing_window_is_nan():
+    df = pd.DataFrame({'PlayerID': [1, 1, 2], 'X': [np.nan, 1.0, np.nan]})
+    result = rolling.rolling_sum_by_count(df, 'PlayerID', ['X'], 1)
+    assert np.isnan(result.X.iloc[0])
+    assert result.X.iloc[1] == 1
+    assert np.isnan(result.X.iloc[2])
@@ -0,0 +1,47 @@
+import os.path
+
+import pytest
+
+from scrapenhl2.scrape import parse_toi, shift_report
+
+with open(os.path.join(os.path.dirname(__file__), 'data', 'TH020001.html'), 'r', encoding='latin-1') as reader:
+    PAGE = reader.read()
+
+SHIFTS = [(8, 'OVECHKIN, ALEX', '1', '0:00', '0:41', '00:41'),
+          (8, 'OVECHKIN, ALEX', '1', '2:15', '3:02', '00:47'),
+          (8, 'OVECHKIN, ALEX', '2', '19:10', '20:00', '00:50'),
+          (44, "O'BRIEN, LIAM", '3', '5:05', '5:39', '00:34'),
+          (70, 'HOLTBY, BRADEN', '1', '0:00', '20:00', '20:00')]
+
+
+@pytest.mark.parametrize('parser', shift_report.get_parsers())
+def test_read_shift_report(parser):
+    if parser not in shift_report.get_available_parsers():
+        pytest.skip('{0:s} is not installed'.format(parser))
+    assert shift_report.read_shift_report(PAGE, parser) == SHIFTS
+
+
+def test_unclosed_cells():
+    page = PAGE.replace('</td>', '')
+    assert shift_report.read_shift_report(page, 'html.parser') == SHIFTS
+
+
+def test_sweaters_before_names(monkeypatch):
+    looked_up = []
+
+    def player_as_id(name):
+        looked_up.append(name)
+        return {'Alex Ovechkin': 8471214, "Liam O'Brien": 8477070, 'Braden Holtby': 8474651}[name]
+
+    monkeypatch.setattr(parse_toi.players, 'player_as_id', player_as_id)
+
+    # Numbers in sweaters win, even over a name that matches someone else; other players are looked up by name
+    shifts = parse_toi.read_shift_rows_from_html_page(PAGE, 15, {8: 1, 70: 3, 9: 4})
+    assert list(shifts.PlayerID) == [1, 1, 1, 8477070, 3]
+    assert looked_up == ["Liam O'Brien"]
+
+    looked_up.clear()
+    shifts = parse_toi.read_shift_rows_from_html_page(PAGE, 15)
+    assert list(shifts.PlayerID) == [8471214, 8471214, 8471214, 8477070, 8474651]
+    assert looked_up == ['Alex Ovechkin', "Liam O'Brien", 'Braden Holtby']
+    assert list(shifts.Start) == [1, 136, 2351, 2706, 1] and list(shifts.End) == [41, 182, 2400, 2739, 1200]
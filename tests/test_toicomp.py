@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from scrapenhl2.manipulate import manipulate as manip
+
+
+def _toidf():
+    rng = np.random.RandomState(0)
+    fwds = list(range(100, 112))
+    dmen = list(range(200, 206))
+    oppfwds = list(range(300, 312))
+    oppdmen = list(range(400, 406))
+    rows = []
+    for game in (20001, 20002):
+        for _ in range(300):
+            team = list(rng.choice(fwds, 3, replace=False)) + list(rng.choice(dmen, 2, replace=False))
+            opp = list(rng.choice(oppfwds, 3, replace=False)) + list(rng.choice(oppdmen, 2, replace=False))
+            rows.append([game] + team + opp)
+    # An opponent lineup with no defensemen
+    rows.append([20002, 100, 101, 102, 200, 201, 300, 301, 302, 303, 304])
+    toidf = pd.DataFrame(rows, columns=['Game', 'Team1', 'Team2', 'Team3', 'Team4', 'Team5',
+                                        'Opp1', 'Opp2', 'Opp3', 'Opp4', 'Opp5'])
+
+    ids = fwds + dmen + oppfwds + oppdmen + [999]
+    toi60df = pd.DataFrame({'PlayerID': ids[:-3], 'TOI60': rng.rand(len(ids) - 3) * 20})  # some unknown TOI60
+    posdf = pd.DataFrame({'ID': ids, 'Pos': ['C'] * 12 + ['D'] * 6 + ['R'] * 12 + ['D'] * 6 + ['G']})
+    return toidf, toi60df, posdf
+
+
+def _melt_based_sums(toidf, toi60df, posdf, suffix):
+    # How _long_on_player_and_opp and _merge_toi60_position_calculate_sums used to calculate sums
+    if suffix == 'Team':
+        toidf = toidf.assign(Opp1=toidf.Team1, Opp2=toidf.Team2, Opp3=toidf.Team3, Opp4=toidf.Team4, Opp5=toidf.Team5)
+    df2 = pd.melt(toidf, id_vars=['Game', 'Team1', 'Team2', 'Team3', 'Team4', 'Team5'],
+                  value_vars=['Opp1', 'Opp2', 'Opp3', 'Opp4', 'Opp5'],
+                  var_name='OppNum', value_name='OppPlayerID').drop('OppNum', axis=1).assign(Secs=1)
+    df2 = df2.groupby(['Game', 'OppPlayerID', 'Team1', 'Team2', 'Team3', 'Team4', 'Team5']).sum().reset_index()
+    df2 = pd.melt(df2, id_vars=['Game', 'OppPlayerID', 'Secs'],
+                  value_vars=['Team1', 'Team2', 'Team3', 'Team4', 'Team5'],
+                  var_name='TeamNum', value_name='TeamPlayerID').drop('TeamNum', axis=1)
+    df2 = df2.query("TeamPlayerID != OppPlayerID")
+    df = df2.groupby(['Game', 'TeamPlayerID', 'OppPlayerID']).sum().reset_index()
+
+    qoc = df.merge(toi60df, how='left', left_on='OppPlayerID', right_on='PlayerID') \
+        .merge(posdf, how='left', left_on='OppPlayerID', right_on='ID') \
+        .drop(['PlayerID', 'ID'], axis=1)
+    qoc.loc[:, 'Pos2'] = qoc.Pos.apply(lambda x: 'D' + suffix if x == 'D' else 'F' + suffix)
+    qoc.loc[:, 'TOI60Sum'] = qoc.Secs * qoc.TOI60
+    qoc = qoc.drop(['Pos', 'OppPlayerID', 'TOI60'], axis=1) \
+        .groupby(['Game', 'TeamPlayerID', 'Pos2']).sum().reset_index()
+
+    sums = qoc.drop('Secs', axis=1)
+    sums.loc[:, 'Pos2'] = sums.Pos2.apply(lambda x: x + 'Sum')
+    sums = sums.pivot_table(index=['Game', 'TeamPlayerID'], columns='Pos2', values='TOI60Sum').reset_index()
+    ns = qoc.drop('TOI60Sum', axis=1)
+    ns.loc[:, 'Pos2'] = ns.Pos2.apply(lambda x: x + 'N')
+    ns = ns.pivot_table(index=['Game', 'TeamPlayerID'], columns='Pos2', values='Secs').reset_index()
+    return sums.merge(ns, how='inner', on=['Game', 'TeamPlayerID'])
+
+
+def test_toicomp_sums_match_melt():
+    toidf, toi60df, posdf = _toidf()
+    for suffix in ('Comp', 'Team'):
+        expected = _melt_based_sums(toidf, toi60df, posdf, suffix)
+        result = manip._get_toicomp_sums_from_toi(toidf, toi60df, posdf, suffix)
+        assert list(result.columns) == list(expected.columns)
+        np.testing.assert_allclose(result.values.astype(float), expected.values.astype(float))
+
+
+def test_long_on_player_and_opp_counts_pairs():
+    toidf, _, _ = _toidf()
+    pairs = manip._long_on_player_and_opp(toidf)
+    assert pairs.Secs.sum() == 25 * len(toidf)
+    row = pairs[(pairs.Game == 20002) & (pairs.TeamPlayerID == 100) & (pairs.OppPlayerID == 304)]
+    assert row.Secs.iloc[0] == len(toidf[(toidf.Game == 20002)
+                                         & (toidf[['Team1', 'Team2', 'Team3', 'Team4', 'Team5']] == 100).any(axis=1)
+                                         & (toidf[['Opp1', 'Opp2', 'Opp3', 'Opp4', 'Opp5']] == 304).any(axis=1)])
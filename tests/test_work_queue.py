@@ -0,0 +1,151 @@
+import os.path
+import threading
+
+from scrapenhl2.scrape import work_queue
+
+
+def _make_stage_functions(calls, fail):
+    def make(stage):
+        def run(season, game, force_overwrite):
+            calls.append((stage, game))
+            if fail(stage, game):
+                raise ValueError('{0:s} {1:d}'.format(stage, game))
+        return run
+    return {stage: make(stage) for stage in work_queue.get_stages()}
+
+
+def test_retries_failures_and_resume(tmpdir, monkeypatch):
+    monkeypatch.setenv('SCRAPENHL2_WORK_QUEUE_FILE', os.path.join(str(tmpdir), 'queue.sqlite'))
+    flushed = []
+    monkeypatch.setattr(work_queue.manipulate_schedules, 'update_schedule_with_pbp_scrape',
+                        lambda season, games: flushed.append(('PBP', season, list(games))))
+    monkeypatch.setattr(work_queue.manipulate_schedules, 'update_schedule_with_toi_scrape',
+                        lambda season, games: flushed.append(('TOI', season, list(games))))
+
+    calls = []
+    flaky = {'left': 1}
+
+    def fail(stage, game):
+        if stage == 'fetch_pbp' and game == 20003:
+            return True
+        if stage == 'parse_toi' and game == 20002 and flaky['left'] > 0:
+            flaky['left'] -= 1
+            return True
+        return False
+
+    retries = {stage: (2, 0) for stage in work_queue.get_stages()}
+    work_queue.enqueue_games(2017, [20001, 20002, 20003])
+    status = work_queue.run_queue([2017], retries=retries, functions=_make_stage_functions(calls, fail),
+                                  verbose=False).set_index('Stage')
+
+    assert calls.count(('fetch_pbp', 20003)) == 2
+    assert calls.count(('parse_toi', 20002)) == 2
+    assert ('parse_pbp', 20003) not in calls  # Skipped, since its fetch failed
+    assert calls[-1] == ('team_logs', 0)
+    assert status.loc['fetch_pbp', 'failed'] == 1 and status.loc['parse_pbp', 'failed'] == 1
+    assert status.loc['parse_toi', 'done'] == 3
+    assert ('PBP', 2017, [20001, 20002]) in flushed and ('TOI', 2017, [20001, 20002, 20003]) in flushed
+
+    failed = work_queue.get_failed_tasks([2017])
+    assert list(failed.Stage) == ['fetch_pbp', 'parse_pbp']
+
+    # Running again only redoes what failed, then team logs
+    calls.clear()
+    work_queue.enqueue_games(2017, [20001, 20002, 20003])
+    work_queue.run_queue([2017], retries=retries, functions=_make_stage_functions(calls, lambda stage, game: False),
+                         verbose=False)
+    assert calls == [('fetch_pbp', 20003), ('parse_pbp', 20003), ('team_logs', 0)]
+    assert len(work_queue.get_failed_tasks([2017])) == 0
+
+
+def test_fetch_payloads_go_to_parsers(tmpdir, monkeypatch):
+    monkeypatch.setenv('SCRAPENHL2_WORK_QUEUE_FILE', os.path.join(str(tmpdir), 'queue.sqlite'))
+    monkeypatch.setattr(work_queue.manipulate_schedules, 'update_schedule_with_pbp_scrape', lambda season, games: None)
+    monkeypatch.setattr(work_queue.manipulate_schedules, 'update_schedule_with_toi_scrape', lambda season, games: None)
+    monkeypatch.setattr(work_queue, '_PAYLOAD_BUFFER_SIZE', 2)
+
+    parsed = []
+
+    def fetch(season, game, force_overwrite):
+        return {'Game': game}
+
+    def parse(season, game, force_overwrite, payload=None):
+        parsed.append((game, payload))
+
+    functions = {'fetch_pbp': fetch, 'fetch_toi': lambda season, game, force_overwrite: None,
+                 'parse_pbp': parse, 'parse_toi': lambda season, game, force_overwrite, payload=None: None,
+                 'team_logs': lambda season, game, force_overwrite: None}
+    games = list(range(20001, 20011))
+    work_queue.enqueue_games(2017, games)
+    work_queue.run_queue([2017], functions=functions, verbose=False)
+
+    assert sorted(parsed, key=lambda x: x[0]) == [(game, {'Game': game}) for game in games]
+
+
+def _use_raw_pbp_folder(monkeypatch, folder):
+    monkeypatch.setattr(work_queue.scrape_pbp, 'get_game_raw_pbp_filename',
+                        lambda season, game: os.path.join(folder, '{0:d}.zlib'.format(game)))
+    monkeypatch.setattr(work_queue.scrape_pbp, 'get_game_from_url', lambda season, game: '{"gamePk": 1}')
+    monkeypatch.setattr(work_queue.scrape_pbp.raw_archive, 'has_raw', lambda season, game, kind: False)
+    monkeypatch.setattr(work_queue.scrape_pbp, 'sleep', lambda seconds: None)
+
+
+def _parse_only_pbp(parsed):
+    functions = _make_stage_functions([], lambda stage, game: False)
+    del functions['fetch_pbp']
+    functions['parse_pbp'] = lambda season, game, force_overwrite, payload=None: parsed.append((game, payload))
+    return functions
+
+
+def test_failed_raw_write_fails_fetch(tmpdir, monkeypatch):
+    monkeypatch.setenv('SCRAPENHL2_WORK_QUEUE_FILE', os.path.join(str(tmpdir), 'queue.sqlite'))
+    flushed = []
+    monkeypatch.setattr(work_queue.manipulate_schedules, 'update_schedule_with_pbp_scrape',
+                        lambda season, games: flushed.append(list(games)))
+    monkeypatch.setattr(work_queue.manipulate_schedules, 'update_schedule_with_toi_scrape', lambda season, games: None)
+    # The raw file goes to a folder that doesn't exist, so the background write fails
+    _use_raw_pbp_folder(monkeypatch, os.path.join(str(tmpdir), 'missing'))
+
+    parsed = []
+    work_queue.enqueue_games(2017, [20001])
+    status = work_queue.run_queue([2017], retries={'fetch_pbp': (1, 0)}, functions=_parse_only_pbp(parsed),
+                                  verbose=False).set_index('Stage')
+
+    # Parsing started from the payload before the write failed, but the fetch is not done
+    assert parsed == [(20001, {'gamePk': 1})] and status.loc['parse_pbp', 'done'] == 1
+    assert status.loc['fetch_pbp', 'failed'] == 1
+    assert flushed == []  # Not marked scraped in the schedule
+    assert 'No such file' in work_queue.get_failed_tasks([2017]).Error.iloc[0]
+
+
+def test_parse_does_not_wait_for_raw_write(tmpdir, monkeypatch):
+    monkeypatch.setenv('SCRAPENHL2_WORK_QUEUE_FILE', os.path.join(str(tmpdir), 'queue.sqlite'))
+    flushed = []
+    monkeypatch.setattr(work_queue.manipulate_schedules, 'update_schedule_with_pbp_scrape',
+                        lambda season, games: flushed.append(list(games)))
+    monkeypatch.setattr(work_queue.manipulate_schedules, 'update_schedule_with_toi_scrape', lambda season, games: None)
+    _use_raw_pbp_folder(monkeypatch, str(tmpdir))
+
+    # Compression (in the background write) can't finish until the game is parsed
+    events = []
+    parsed = threading.Event()
+
+    def encode(page):
+        events.append(('encode', parsed.wait(30)))
+        return page.encode('latin-1')
+
+    def parse(season, game, force_overwrite, payload=None):
+        events.append(('parse', payload))
+        parsed.set()
+
+    monkeypatch.setattr(work_queue.scrape_pbp.raw_codec, 'encode_raw', encode)
+    functions = _parse_only_pbp([])
+    functions['parse_pbp'] = parse
+    work_queue.enqueue_games(2017, [20001])
+    status = work_queue.run_queue([2017], functions=functions, verbose=False).set_index('Stage')
+
+    assert events == [('parse', {'gamePk': 1}), ('encode', True)]
+    assert status.loc['fetch_pbp', 'done'] == 1 and status.loc['parse_pbp', 'done'] == 1
+    assert flushed == [[20001]]
+    with open(os.path.join(str(tmpdir), '20001.zlib')) as reader:
+        assert reader.read() == '{"gamePk": 1}'